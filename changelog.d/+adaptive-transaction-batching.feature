@@ -0,0 +1 @@
+Add a `federation_adaptive_transaction_batching` option, which adapts the federation transactions sent to each server to how quickly it responds.
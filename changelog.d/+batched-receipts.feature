@@ -0,0 +1 @@
+Improve the performance of handling read receipts by persisting them in batches.
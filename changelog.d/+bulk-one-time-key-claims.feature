@@ -0,0 +1 @@
+Improve the performance of claiming one time keys for many devices at once.
@@ -0,0 +1 @@
+Improve the performance of `/keys/query` by caching the device keys of local users.
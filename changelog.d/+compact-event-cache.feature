@@ -0,0 +1 @@
+Add a `compact_event_cache` option to cache events in a compact form which uses less memory.
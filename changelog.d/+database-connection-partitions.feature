@@ -0,0 +1 @@
+Add `connection_partitions` and `adaptive_connection_partitions` database options to limit how many connections each kind of work can use.
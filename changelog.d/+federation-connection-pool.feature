@@ -0,0 +1 @@
+Add `federation_client_max_idle_connections_per_host` and `federation_client_idle_connection_timeout` options to configure the federation client's connection pool, and report metrics on how its connections are reused.
@@ -0,0 +1 @@
+Improve the performance of repeated incremental syncs by reusing the unchanged parts of the previous response.
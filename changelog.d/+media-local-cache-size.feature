@@ -0,0 +1 @@
+Add a `media_local_cache_size` option to limit the size of the local media store when media is also kept in a storage provider.
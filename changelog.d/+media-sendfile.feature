@@ -0,0 +1 @@
+Add a `media_use_sendfile` option to serve large local media files using `sendfile`, and support range requests for local media.
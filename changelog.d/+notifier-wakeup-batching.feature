@@ -0,0 +1 @@
+Add `notifier_wakeup_batch_window` and `notifier_max_wakeups_per_iteration` options to wake up requests waiting for new events in batches.
@@ -0,0 +1 @@
+Improve the performance of sending events in large rooms by evaluating each distinct set of push rules only once per event.
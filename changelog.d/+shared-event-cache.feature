@@ -0,0 +1 @@
+Add an `external_event_cache_duration` option to share newly persisted events between workers via Redis, so that workers don't each have to load them from the database.
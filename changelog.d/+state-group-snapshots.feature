@@ -0,0 +1 @@
+Improve the performance of looking up room state by cutting long chains of state group deltas short in the background.
@@ -0,0 +1 @@
+Reduce the memory used by large `/sync` responses by streaming them to the client as they are encoded.
@@ -0,0 +1 @@
+Improve the performance of catching up remote servers which have been offline by streaming the events to send to them.
@@ -0,0 +1 @@
+Add a `thumbnail_worker_processes` option to generate thumbnails in separate processes.
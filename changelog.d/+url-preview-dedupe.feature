@@ -0,0 +1 @@
+Improve the performance of URL previews by sharing image downloads between previews and parsing HTML off the main thread.
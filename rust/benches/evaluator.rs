@@ -15,8 +15,8 @@
 #![feature(test)]
 use std::collections::BTreeSet;
 use synapse::push::{
-    evaluator::PushRuleEvaluator, Condition, EventMatchCondition, FilteredPushRules, JsonValue,
-    PushRules, SimpleJsonValue,
+    compiled::CompiledPushRules, evaluator::PushRuleEvaluator, Condition, EventMatchCondition,
+    FilteredPushRules, JsonValue, PushRules, SimpleJsonValue,
 };
 use test::Bencher;
 
@@ -216,3 +216,52 @@ fn bench_eval_message(b: &mut Bencher) {
 
     b.iter(|| eval.run(&rules, Some("bob"), Some("person")));
 }
+
+#[bench]
+fn bench_eval_message_compiled(b: &mut Bencher) {
+    let flattened_keys = [
+        (
+            "type".to_string(),
+            JsonValue::Value(SimpleJsonValue::Str("m.text".to_string())),
+        ),
+        (
+            "room_id".to_string(),
+            JsonValue::Value(SimpleJsonValue::Str("!room:server".to_string())),
+        ),
+        (
+            "content.body".to_string(),
+            JsonValue::Value(SimpleJsonValue::Str("test message".to_string())),
+        ),
+    ]
+    .into_iter()
+    .collect();
+
+    let eval = PushRuleEvaluator::py_new(
+        flattened_keys,
+        false,
+        BTreeSet::new(),
+        10,
+        Some(0),
+        Default::default(),
+        Default::default(),
+        true,
+        vec![],
+        false,
+        false,
+        false,
+    )
+    .unwrap();
+
+    let rules = FilteredPushRules::py_new(
+        PushRules::new(Vec::new()),
+        Default::default(),
+        false,
+        false,
+        false,
+        false,
+        false,
+    );
+    let compiled = CompiledPushRules::py_new(&rules);
+
+    b.iter(|| eval.run_compiled(&compiled, Some("bob"), Some("person")));
+}
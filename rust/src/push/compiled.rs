@@ -0,0 +1,270 @@
+// Copyright 2023 The Matrix.org Foundation C.I.C.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//     http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+//! Push rules with the glob patterns of their conditions compiled ahead of
+//! time, so that they can be evaluated against many events.
+
+use std::collections::BTreeMap;
+
+use log::warn;
+use pyo3::prelude::*;
+use regex::{RegexSet, RegexSetBuilder, SetMatches};
+
+use super::{
+    evaluator::PushRuleEvaluator,
+    utils::{glob_to_regex_str, GlobMatchType},
+    Action, Condition, FilteredPushRules, KnownCondition, PushRule,
+};
+
+/// A reference to a compiled pattern: the index of the [`RegexSet`] the
+/// pattern is in, and the index of the pattern within that set.
+#[derive(Debug, Clone, Copy)]
+pub struct PatternRef {
+    set: usize,
+    pattern: usize,
+}
+
+/// A push rule, along with the compiled patterns for its conditions.
+#[derive(Debug, Clone)]
+pub(super) struct CompiledPushRule {
+    pub rule: PushRule,
+    pub enabled: bool,
+    /// The compiled pattern for each of the rule's conditions, if any.
+    pub patterns: Vec<Option<PatternRef>>,
+}
+
+/// A user's push rules, with the glob patterns of their `event_match` and
+/// `related_event_match` conditions compiled ahead of time.
+///
+/// All the patterns which are matched against the same value of an event are
+/// compiled into a single [`RegexSet`], so the value only needs to be scanned
+/// once to find out which of them match, no matter how many conditions (or
+/// rules) use them.
+#[derive(Debug, Clone)]
+#[pyclass(frozen)]
+pub struct CompiledPushRules {
+    /// The rules and their enabled state, in the order they should be executed
+    /// in.
+    pub(super) rules: Vec<CompiledPushRule>,
+    /// The compiled sets of patterns, or None if a set failed to compile (in
+    /// which case the conditions fall back to compiling their own pattern).
+    pattern_sets: Vec<Option<RegexSet>>,
+}
+
+#[pymethods]
+impl CompiledPushRules {
+    #[new]
+    pub fn py_new(push_rules: &FilteredPushRules) -> Self {
+        // The set index for each value patterns are matched against, keyed by
+        // the relation type (for related events) and the flattened key.
+        let mut set_indices: BTreeMap<(Option<String>, String), usize> = BTreeMap::new();
+        let mut set_regexes: Vec<Vec<String>> = Vec::new();
+
+        let mut rules = Vec::new();
+        for (rule, enabled) in push_rules.iter() {
+            let mut patterns = Vec::with_capacity(rule.conditions.len());
+
+            for condition in rule.conditions.iter() {
+                let (source, glob) = if let Some(pattern) = get_literal_pattern(condition) {
+                    pattern
+                } else {
+                    patterns.push(None);
+                    continue;
+                };
+
+                // For the content.body we match against "words", but for everything
+                // else we match against the entire value.
+                let match_type = if source.1 == "content.body" {
+                    GlobMatchType::Word
+                } else {
+                    GlobMatchType::Whole
+                };
+                let regex = glob_to_regex_str(glob, match_type);
+
+                let set = if let Some(set) = set_indices.get(&source) {
+                    *set
+                } else {
+                    set_indices.insert(source, set_regexes.len());
+                    set_regexes.push(Vec::new());
+                    set_regexes.len() - 1
+                };
+
+                let regexes = &mut set_regexes[set];
+                let pattern = if let Some(pattern) = regexes.iter().position(|r| *r == regex) {
+                    pattern
+                } else {
+                    regexes.push(regex);
+                    regexes.len() - 1
+                };
+
+                patterns.push(Some(PatternRef { set, pattern }));
+            }
+
+            rules.push(CompiledPushRule {
+                rule: rule.clone(),
+                enabled,
+                patterns,
+            });
+        }
+
+        let pattern_sets = set_regexes
+            .iter()
+            .map(
+                |regexes| match RegexSetBuilder::new(regexes).case_insensitive(true).build() {
+                    Ok(set) => Some(set),
+                    Err(err) => {
+                        warn!("Failed to compile push rule patterns: {err}");
+                        None
+                    }
+                },
+            )
+            .collect();
+
+        CompiledPushRules {
+            rules,
+            pattern_sets,
+        }
+    }
+
+    /// Run the evaluator with these push rules, see `PushRuleEvaluator.run`.
+    pub fn run(
+        &self,
+        evaluator: PyRef<'_, PushRuleEvaluator>,
+        user_id: Option<&str>,
+        display_name: Option<&str>,
+    ) -> Vec<Action> {
+        evaluator.run_compiled(self, user_id, display_name)
+    }
+}
+
+/// Returns the value a condition is matched against (as the relation type of
+/// the related event, if any, and the flattened key) and its pattern, if the
+/// condition has a pattern that doesn't depend on the user.
+fn get_literal_pattern(condition: &Condition) -> Option<((Option<String>, String), &str)> {
+    match condition {
+        Condition::Known(KnownCondition::EventMatch(event_match)) => {
+            let pattern = event_match.pattern.as_ref()?;
+            Some(((None, event_match.key.to_string()), &**pattern))
+        }
+        Condition::Known(KnownCondition::RelatedEventMatch(event_match)) => {
+            let key = event_match.key.as_ref()?;
+            let pattern = event_match.pattern.as_ref()?;
+            Some((
+                (Some(event_match.rel_type.to_string()), key.to_string()),
+                &**pattern,
+            ))
+        }
+        _ => None,
+    }
+}
+
+/// The results of matching the patterns of a [`CompiledPushRules`] against a
+/// single event. Each set of patterns is only run when it is first needed.
+pub struct PatternMatches<'a> {
+    pattern_sets: &'a [Option<RegexSet>],
+    matches: Vec<Option<SetMatches>>,
+}
+
+impl<'a> PatternMatches<'a> {
+    pub fn new(compiled: &'a CompiledPushRules) -> Self {
+        PatternMatches {
+            pattern_sets: &compiled.pattern_sets,
+            matches: vec![None; compiled.pattern_sets.len()],
+        }
+    }
+
+    /// Check if the given pattern matches. The `haystack` must be the value
+    /// the pattern is matched against, which is the same for all patterns in
+    /// the set.
+    ///
+    /// Returns None if the pattern couldn't be compiled.
+    pub fn is_match(&mut self, pattern: PatternRef, haystack: &str) -> Option<bool> {
+        let pattern_sets = self.pattern_sets;
+        let set = pattern_sets[pattern.set].as_ref()?;
+
+        let matches = self.matches[pattern.set].get_or_insert_with(|| {
+            // As in `Matcher`, we convert to lowercase first to match
+            // case-insensitively.
+            set.matches(&haystack.to_lowercase())
+        });
+
+        Some(matches.matched(pattern.pattern))
+    }
+}
+
+#[test]
+fn test_compiled_push_rules() {
+    use std::borrow::Cow;
+    use std::collections::BTreeSet;
+
+    use super::{EventMatchCondition, JsonValue, PushRules, SimpleJsonValue};
+
+    let keyword_rule = PushRule {
+        rule_id: Cow::from("coffee"),
+        priority_class: 4, // content
+        conditions: Cow::from(vec![Condition::Known(KnownCondition::EventMatch(
+            EventMatchCondition {
+                key: Cow::from("content.body"),
+                pattern: Some(Cow::from("cof*")),
+                pattern_type: None,
+            },
+        ))]),
+        actions: Cow::from(vec![Action::Notify]),
+        default: false,
+        default_enabled: true,
+    };
+    let rules = FilteredPushRules::py_new(
+        PushRules::new(vec![keyword_rule]),
+        BTreeMap::new(),
+        true,
+        true,
+        true,
+        true,
+        true,
+    );
+    let compiled = CompiledPushRules::py_new(&rules);
+
+    // The compiled rules should give the same results as the uncompiled ones,
+    // for each of the keyword rule, the display name rule and no rules matching.
+    for body in ["COFFEE time", "hello bob", "decaf"] {
+        let mut flattened_keys = BTreeMap::new();
+        flattened_keys.insert(
+            "type".to_string(),
+            JsonValue::Value(SimpleJsonValue::Str("m.room.message".to_string())),
+        );
+        flattened_keys.insert(
+            "content.body".to_string(),
+            JsonValue::Value(SimpleJsonValue::Str(body.to_string())),
+        );
+        let evaluator = PushRuleEvaluator::py_new(
+            flattened_keys,
+            false,
+            BTreeSet::new(),
+            10,
+            Some(0),
+            BTreeMap::new(),
+            BTreeMap::new(),
+            true,
+            vec![],
+            true,
+            true,
+            true,
+        )
+        .unwrap();
+
+        let expected = evaluator.run(&rules, Some("@alice:test"), Some("bob"));
+        let result = evaluator.run_compiled(&compiled, Some("@alice:test"), Some("bob"));
+        assert_eq!(result, expected, "{body}");
+    }
+}
@@ -22,9 +22,10 @@ use pyo3::prelude::*;
 use regex::Regex;
 
 use super::{
+    compiled::{CompiledPushRules, PatternMatches, PatternRef},
     utils::{get_glob_matcher, get_localpart_from_id, GlobMatchType},
     Action, Condition, EventMatchCondition, ExactEventMatchCondition, FilteredPushRules,
-    KnownCondition, RelatedEventMatchCondition, SimpleJsonValue,
+    KnownCondition, PushRule, RelatedEventMatchCondition, SimpleJsonValue,
 };
 
 lazy_static! {
@@ -160,7 +161,58 @@ impl PushRuleEvaluator {
         user_id: Option<&str>,
         display_name: Option<&str>,
     ) -> Vec<Action> {
-        'outer: for (push_rule, enabled) in push_rules.iter() {
+        let rules = push_rules
+            .iter()
+            .map(|(rule, enabled)| (rule, enabled, None));
+        self.run_rules(rules, None, user_id, display_name)
+    }
+
+    /// Check if the given condition matches.
+    fn matches(
+        &self,
+        condition: Condition,
+        user_id: Option<&str>,
+        display_name: Option<&str>,
+    ) -> bool {
+        match self.match_condition(&condition, user_id, display_name) {
+            Ok(true) => true,
+            Ok(false) => false,
+            Err(err) => {
+                warn!("Condition match failed {err}");
+                false
+            }
+        }
+    }
+}
+
+impl PushRuleEvaluator {
+    /// Run the evaluator with the given precompiled push rules, see
+    /// [`PushRuleEvaluator::run`].
+    pub fn run_compiled(
+        &self,
+        compiled: &CompiledPushRules,
+        user_id: Option<&str>,
+        display_name: Option<&str>,
+    ) -> Vec<Action> {
+        let mut pattern_matches = PatternMatches::new(compiled);
+        let rules = compiled
+            .rules
+            .iter()
+            .map(|r| (&r.rule, r.enabled, Some(&*r.patterns)));
+        self.run_rules(rules, Some(&mut pattern_matches), user_id, display_name)
+    }
+
+    /// Run the evaluator with the given push rules and their enabled state,
+    /// along with the compiled patterns for their conditions if the rules have
+    /// been compiled.
+    fn run_rules<'a>(
+        &self,
+        rules: impl Iterator<Item = (&'a PushRule, bool, Option<&'a [Option<PatternRef>]>)>,
+        mut pattern_matches: Option<&mut PatternMatches>,
+        user_id: Option<&str>,
+        display_name: Option<&str>,
+    ) -> Vec<Action> {
+        'outer: for (push_rule, enabled, patterns) in rules {
             if !enabled {
                 continue;
             }
@@ -184,14 +236,20 @@ impl PushRuleEvaluator {
             let safe_from_rver_condition = SAFE_EXTENSIBLE_EVENTS_RULE_IDS.contains(rule_id);
             let mut has_rver_condition = false;
 
-            for condition in push_rule.conditions.iter() {
+            for (i, condition) in push_rule.conditions.iter().enumerate() {
                 has_rver_condition |= matches!(
                     condition,
                     // per MSC3932, we just need *any* room version condition to match
                     Condition::Known(KnownCondition::RoomVersionSupports { feature: _ }),
                 );
 
-                match self.match_condition(condition, user_id, display_name) {
+                let pattern = patterns.and_then(|p| p[i]);
+                let compiled = match (pattern_matches.as_deref_mut(), pattern) {
+                    (Some(pattern_matches), Some(pattern)) => Some((pattern_matches, pattern)),
+                    _ => None,
+                };
+
+                match self.match_condition_with(condition, user_id, display_name, compiled) {
                     Ok(true) => {}
                     Ok(false) => continue 'outer,
                     Err(err) => {
@@ -222,31 +280,24 @@ impl PushRuleEvaluator {
         Vec::new()
     }
 
-    /// Check if the given condition matches.
-    fn matches(
+    /// Match a given `Condition` for a push rule.
+    pub fn match_condition(
         &self,
-        condition: Condition,
+        condition: &Condition,
         user_id: Option<&str>,
         display_name: Option<&str>,
-    ) -> bool {
-        match self.match_condition(&condition, user_id, display_name) {
-            Ok(true) => true,
-            Ok(false) => false,
-            Err(err) => {
-                warn!("Condition match failed {err}");
-                false
-            }
-        }
+    ) -> Result<bool, Error> {
+        self.match_condition_with(condition, user_id, display_name, None)
     }
-}
 
-impl PushRuleEvaluator {
-    /// Match a given `Condition` for a push rule.
-    pub fn match_condition(
+    /// Match a given `Condition` for a push rule, using the compiled pattern
+    /// for it if given.
+    fn match_condition_with(
         &self,
         condition: &Condition,
         user_id: Option<&str>,
         display_name: Option<&str>,
+        compiled: Option<(&mut PatternMatches, PatternRef)>,
     ) -> Result<bool, Error> {
         let known_condition = match condition {
             Condition::Known(known) => known,
@@ -257,13 +308,13 @@ impl PushRuleEvaluator {
 
         let result = match known_condition {
             KnownCondition::EventMatch(event_match) => {
-                self.match_event_match(event_match, user_id)?
+                self.match_event_match(event_match, user_id, compiled)?
             }
             KnownCondition::ExactEventMatch(exact_event_match) => {
                 self.match_exact_event_match(exact_event_match)?
             }
             KnownCondition::RelatedEventMatch(event_match) => {
-                self.match_related_event_match(event_match, user_id)?
+                self.match_related_event_match(event_match, user_id, compiled)?
             }
             KnownCondition::ExactEventPropertyContains(exact_event_match) => {
                 self.match_exact_event_property_contains(exact_event_match)?
@@ -327,6 +378,7 @@ impl PushRuleEvaluator {
         &self,
         event_match: &EventMatchCondition,
         user_id: Option<&str>,
+        compiled: Option<(&mut PatternMatches, PatternRef)>,
     ) -> Result<bool, Error> {
         let pattern = if let Some(pattern) = &event_match.pattern {
             pattern
@@ -357,6 +409,12 @@ impl PushRuleEvaluator {
             return Ok(false);
         };
 
+        if let Some((pattern_matches, pattern)) = compiled {
+            if let Some(matched) = pattern_matches.is_match(pattern, haystack) {
+                return Ok(matched);
+            }
+        }
+
         // For the content.body we match against "words", but for everything
         // else we match against the entire value.
         let match_type = if event_match.key == "content.body" {
@@ -397,6 +455,7 @@ impl PushRuleEvaluator {
         &self,
         event_match: &RelatedEventMatchCondition,
         user_id: Option<&str>,
+        compiled: Option<(&mut PatternMatches, PatternRef)>,
     ) -> Result<bool, Error> {
         // First check if related event matching is enabled...
         if !self.related_event_match_enabled {
@@ -454,6 +513,12 @@ impl PushRuleEvaluator {
                 return Ok(false);
             };
 
+        if let Some((pattern_matches, pattern)) = compiled {
+            if let Some(matched) = pattern_matches.is_match(pattern, haystack) {
+                return Ok(matched);
+            }
+        }
+
         // For the content.body we match against "words", but for everything
         // else we match against the entire value.
         let match_type = if key == "content.body" {
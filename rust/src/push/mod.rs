@@ -64,9 +64,11 @@ use serde::de::Error as _;
 use serde::{Deserialize, Serialize};
 use serde_json::Value;
 
+use self::compiled::CompiledPushRules;
 use self::evaluator::PushRuleEvaluator;
 
 mod base_rules;
+pub mod compiled;
 pub mod evaluator;
 pub mod utils;
 
@@ -77,6 +79,7 @@ pub fn register_module(py: Python<'_>, m: &PyModule) -> PyResult<()> {
     child_module.add_class::<PushRules>()?;
     child_module.add_class::<FilteredPushRules>()?;
     child_module.add_class::<PushRuleEvaluator>()?;
+    child_module.add_class::<CompiledPushRules>()?;
     child_module.add_function(wrap_pyfunction!(get_base_rule_ids, m)?)?;
 
     m.add_submodule(child_module)?;
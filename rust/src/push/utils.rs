@@ -51,6 +51,14 @@ pub enum GlobMatchType {
 /// Convert a "glob" style expression to a regex, anchoring either to the entire
 /// input or to individual words.
 pub fn glob_to_regex(glob: &str, match_type: GlobMatchType) -> Result<Regex, Error> {
+    Ok(RegexBuilder::new(&glob_to_regex_str(glob, match_type))
+        .case_insensitive(true)
+        .build()?)
+}
+
+/// Convert a "glob" style expression to the source of a regex, see
+/// [`glob_to_regex`]. The regex must be compiled to be case-insensitive.
+pub fn glob_to_regex_str(glob: &str, match_type: GlobMatchType) -> String {
     let mut chunks = Vec::new();
 
     // Patterns with wildcards must be simplified to avoid performance cliffs
@@ -78,17 +86,13 @@ pub fn glob_to_regex(glob: &str, match_type: GlobMatchType) -> Result<Regex, Err
 
     let joined = chunks.join("");
 
-    let regex_str = match match_type {
+    match match_type {
         GlobMatchType::Whole => format!(r"\A{joined}\z"),
 
         // `^|\W` and `\W|$` handle the case where `pattern` starts or ends with a non-word
         // character.
         GlobMatchType::Word => format!(r"(?:^|\b|\W){joined}(?:\b|\W|$)"),
-    };
-
-    Ok(RegexBuilder::new(&regex_str)
-        .case_insensitive(true)
-        .build()?)
+    }
 }
 
 /// Compiles the glob into a `Matcher`.
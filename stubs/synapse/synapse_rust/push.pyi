@@ -78,3 +78,12 @@ class PushRuleEvaluator:
     def matches(
         self, condition: JsonDict, user_id: Optional[str], display_name: Optional[str]
     ) -> bool: ...
+
+class CompiledPushRules:
+    def __init__(self, push_rules: FilteredPushRules): ...
+    def run(
+        self,
+        evaluator: PushRuleEvaluator,
+        user_id: Optional[str],
+        display_name: Optional[str],
+    ) -> Collection[Union[Mapping, str]]: ...
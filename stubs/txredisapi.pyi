@@ -34,6 +34,8 @@ class RedisProtocol(protocol.Protocol):
         only_if_exists: bool = False,
     ) -> "Deferred[None]": ...
     def get(self, key: str) -> "Deferred[Any]": ...
+    def mget(self, keys: List[str]) -> "Deferred[List[Any]]": ...
+    def delete(self, keys: Union[str, List[str]]) -> "Deferred[int]": ...
 
 class SubscriberProtocol(RedisProtocol):
     def __init__(self, *args: object, **kwargs: object): ...
@@ -102,6 +102,8 @@ class CacheConfig(Config):
     track_memory_usage: bool
     expiry_time_msec: Optional[int]
     sync_response_cache_duration: int
+    external_event_cache_duration: int
+    compact_event_cache: bool
 
     @staticmethod
     def reset() -> None:
@@ -204,6 +206,14 @@ class CacheConfig(Config):
             cache_config.get("sync_response_cache_duration", "2m")
         )
 
+        self.external_event_cache_duration = self.parse_duration(
+            cache_config.get("external_event_cache_duration", 0)
+        )
+
+        self.compact_event_cache = cache_config.get("compact_event_cache", False)
+        if not isinstance(self.compact_event_cache, bool):
+            raise ConfigError("caches.compact_event_cache must be a boolean")
+
     def resize_all_caches(self) -> None:
         """Ensure all cache sizes are up-to-date.
 
@@ -15,7 +15,7 @@
 import argparse
 import logging
 import os
-from typing import Any, List
+from typing import Any, Dict, List
 
 from synapse.config._base import Config, ConfigError
 from synapse.types import JsonDict
@@ -34,6 +34,22 @@ database:
     database: %(database_path)s
 """
 
+# The workloads which database connections are shared between. Each gets its own
+# limit on the number of connections it may hold at once, so that (for example) a
+# large purge cannot take every connection away from client requests.
+INTERACTIVE_PARTITION = "interactive"
+BACKGROUND_PARTITION = "background"
+REPLICATION_PARTITION = "replication"
+
+CONNECTION_PARTITIONS = (
+    INTERACTIVE_PARTITION,
+    BACKGROUND_PARTITION,
+    REPLICATION_PARTITION,
+)
+
+# The default connection pool size used by twisted's `adbapi.ConnectionPool`.
+DEFAULT_CP_MAX = 5
+
 
 class DatabaseConnectionConfig:
     """Contains the connection config for a particular database.
@@ -69,6 +85,61 @@ class DatabaseConnectionConfig:
         # changed the name).
         self.databases = data_stores
 
+        cp_max = int(db_config.get("args", {}).get("cp_max", DEFAULT_CP_MAX))
+
+        # By default background work may only use half of the connections, so
+        # that there is always room left for requests.
+        self.connection_partitions: Dict[str, int] = {
+            INTERACTIVE_PARTITION: cp_max,
+            BACKGROUND_PARTITION: max(1, cp_max // 2),
+            REPLICATION_PARTITION: cp_max,
+        }
+
+        partitions_config = db_config.get("connection_partitions") or {}
+        if not isinstance(partitions_config, dict):
+            raise ConfigError(
+                "'connection_partitions' must be a dictionary",
+                ("database", "connection_partitions"),
+            )
+
+        for partition, partition_config in partitions_config.items():
+            if partition not in CONNECTION_PARTITIONS:
+                raise ConfigError(
+                    "Unknown connection partition %r: must be one of %s"
+                    % (partition, ", ".join(CONNECTION_PARTITIONS)),
+                    ("database", "connection_partitions"),
+                )
+
+            max_connections = (partition_config or {}).get("max_connections")
+            if (
+                not isinstance(max_connections, int)
+                or isinstance(max_connections, bool)
+                or max_connections < 1
+            ):
+                raise ConfigError(
+                    "'max_connections' must be a positive integer",
+                    ("database", "connection_partitions", partition),
+                )
+
+            self.connection_partitions[partition] = min(max_connections, cp_max)
+
+        adaptive_config = db_config.get("adaptive_connection_partitions") or {}
+        if not isinstance(adaptive_config, dict):
+            raise ConfigError(
+                "'adaptive_connection_partitions' must be a dictionary",
+                ("database", "adaptive_connection_partitions"),
+            )
+
+        self.adaptive_connection_partitions = bool(
+            adaptive_config.get("enabled", False)
+        )
+
+        # How long requests may wait for a connection, in seconds, before the
+        # other partitions are shrunk to make room for them.
+        self.adaptive_target_queue_time = (
+            Config.parse_duration(adaptive_config.get("target_queue_time", 50)) / 1000
+        )
+
 
 class DatabaseConfig(Config):
     section = "database"
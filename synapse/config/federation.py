@@ -13,7 +13,7 @@
 # limitations under the License.
 from typing import Any, Optional
 
-from synapse.config._base import Config
+from synapse.config._base import Config, ConfigError
 from synapse.config._util import validate_config
 from synapse.types import JsonDict
 
@@ -49,5 +49,33 @@ class FederationConfig(Config):
             "allow_device_name_lookup_over_federation", False
         )
 
+        self.federation_client_max_idle_connections_per_host = config.get(
+            "federation_client_max_idle_connections_per_host", 5
+        )
+        if (
+            not isinstance(self.federation_client_max_idle_connections_per_host, int)
+            or isinstance(self.federation_client_max_idle_connections_per_host, bool)
+            or self.federation_client_max_idle_connections_per_host < 0
+        ):
+            raise ConfigError(
+                "federation_client_max_idle_connections_per_host must be a "
+                "non-negative integer",
+                ("federation_client_max_idle_connections_per_host",),
+            )
+
+        self.federation_client_idle_connection_timeout_ms = self.parse_duration(
+            config.get("federation_client_idle_connection_timeout", "2m")
+        )
+        # The connection pool only deals in whole seconds.
+        if self.federation_client_idle_connection_timeout_ms < 1000:
+            raise ConfigError(
+                "federation_client_idle_connection_timeout must be at least 1s",
+                ("federation_client_idle_connection_timeout",),
+            )
+
+        self.federation_adaptive_transaction_batching = config.get(
+            "federation_adaptive_transaction_batching", False
+        )
+
 
 _METRICS_FOR_DOMAINS_SCHEMA = {"type": "array", "items": {"type": "string"}}
@@ -14,7 +14,7 @@
 
 import logging
 import os
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from urllib.request import getproxies_environment  # type: ignore
 
 import attr
@@ -136,6 +136,9 @@ class ContentRepositoryConfig(Config):
 
         self.max_upload_size = self.parse_size(config.get("max_upload_size", "50M"))
         self.max_image_pixels = self.parse_size(config.get("max_image_pixels", "32M"))
+        self.media_use_sendfile = config.get("media_use_sendfile", False)
+        if not isinstance(self.media_use_sendfile, bool):
+            raise ConfigError("Must be a boolean", ("media_use_sendfile",))
         self.max_spider_size = self.parse_size(config.get("max_spider_size", "10M"))
 
         self.media_store_path = self.ensure_directory(
@@ -199,7 +202,34 @@ class ContentRepositoryConfig(Config):
                 (provider_class, parsed_config, wrapper_config)
             )
 
+        # The maximum total size of the files in the local media store which are
+        # also held by a storage provider, beyond which the least recently used
+        # are removed from local disk.
+        self.media_local_cache_size: Optional[int] = None
+        if config.get("media_local_cache_size") is not None:
+            self.media_local_cache_size = self.parse_size(
+                config["media_local_cache_size"]
+            )
+            if not any(
+                wrapper_config.store_synchronous
+                for _, _, wrapper_config in self.media_storage_providers
+            ):
+                raise ConfigError(
+                    "Requires a storage provider with 'store_synchronous' enabled",
+                    ("media_local_cache_size",),
+                )
+
         self.dynamic_thumbnails = config.get("dynamic_thumbnails", False)
+        self.thumbnail_worker_processes = config.get("thumbnail_worker_processes", 0)
+        if (
+            not isinstance(self.thumbnail_worker_processes, int)
+            or isinstance(self.thumbnail_worker_processes, bool)
+            or self.thumbnail_worker_processes < 0
+        ):
+            raise ConfigError(
+                "Must be a non-negative integer",
+                ("thumbnail_worker_processes",),
+            )
         self.thumbnail_requirements = parse_thumbnail_requirements(
             config.get("thumbnail_sizes", DEFAULT_THUMBNAIL_SIZES)
         )
@@ -723,6 +723,24 @@ class ServerConfig(Config):
         else:
             self.delete_stale_devices_after = None
 
+        # How long to coalesce notifications for before waking up clients that
+        # are waiting for new events, and the maximum number of such clients to
+        # wake up per reactor iteration.
+        self.notifier_wakeup_batch_window_ms = self.parse_duration(
+            config.get("notifier_wakeup_batch_window", 0)
+        )
+        self.notifier_max_wakeups_per_iteration: int = config.get(
+            "notifier_max_wakeups_per_iteration", 1000
+        )
+        if (
+            not isinstance(self.notifier_max_wakeups_per_iteration, int)
+            or isinstance(self.notifier_max_wakeups_per_iteration, bool)
+            or self.notifier_max_wakeups_per_iteration < 1
+        ):
+            raise ConfigError(
+                "Must be a positive integer", ("notifier_max_wakeups_per_iteration",)
+            )
+
     def has_tls_listener(self) -> bool:
         return any(listener.tls for listener in self.listeners)
 
@@ -23,6 +23,7 @@ from typing import (
     Dict,
     Generic,
     Iterable,
+    Iterator,
     List,
     Optional,
     Sequence,
@@ -30,18 +31,21 @@ from typing import (
     Type,
     TypeVar,
     Union,
+    cast,
     overload,
 )
 
 import attr
+from canonicaljson import encode_canonical_json
 from typing_extensions import Literal
 from unpaddedbase64 import encode_base64
 
 from synapse.api.constants import RelationTypes
 from synapse.api.room_versions import EventFormatVersions, RoomVersion, RoomVersions
 from synapse.types import JsonDict, RoomStreamToken, StrCollection
-from synapse.util.caches import intern_dict
-from synapse.util.frozenutils import freeze
+from synapse.util import json_decoder
+from synapse.util.caches import intern_dict, intern_string
+from synapse.util.frozenutils import freeze, unfreeze
 from synapse.util.stringutils import strtobool
 
 if TYPE_CHECKING:
@@ -295,6 +299,18 @@ class _EventInternalMetadata:
 
 
 class EventBase(metaclass=abc.ABCMeta):
+    # Declared so that subclasses which define their own `__slots__` (like
+    # `CompactEvent`) don't also get a per-instance `__dict__`.
+    __slots__ = [
+        "room_version",
+        "signatures",
+        "unsigned",
+        "rejected_reason",
+        "_dict",
+        "internal_metadata",
+        "__weakref__",
+    ]
+
     @property
     @abc.abstractmethod
     def format_version(self) -> int:
@@ -587,6 +603,213 @@ class FrozenEventV3(FrozenEventV2):
         return self._event_id
 
 
+# The fields of a `CompactEvent` which are kept decoded, as they are used far
+# more often than the rest of the event.
+_COMPACT_EVENT_HEADER_KEYS = (
+    "event_id",
+    "type",
+    "room_id",
+    "sender",
+    "state_key",
+    "depth",
+    "origin_server_ts",
+    "redacts",
+    "prev_events",
+    "auth_events",
+)
+_COMPACT_EVENT_HEADER_INDICES = {
+    key: index for index, key in enumerate(_COMPACT_EVENT_HEADER_KEYS)
+}
+_COMPACT_EVENT_INTERNED_KEYS = {"event_id", "type", "room_id", "sender", "state_key"}
+
+# Marks a header field which is not in the event.
+_ABSENT = object()
+
+
+class _CompactEventDict(collections.abc.Mapping):
+    """A read-only event dict, which is stored as canonical JSON along with the
+    header fields in `_COMPACT_EVENT_HEADER_KEYS`.
+
+    The JSON is only decoded when one of the other fields is first accessed. The
+    decoded (and frozen) dict then replaces the JSON, as whatever needed one of
+    those fields is likely to look at it, or others, again.
+    """
+
+    __slots__ = ["_body", "_header"]
+
+    def __init__(self, event_dict: JsonDict):
+        self._body: Union[bytes, JsonDict] = encode_canonical_json(event_dict)
+
+        header = []
+        for key in _COMPACT_EVENT_HEADER_KEYS:
+            value = event_dict.get(key, _ABSENT)
+            if key in _COMPACT_EVENT_INTERNED_KEYS and isinstance(value, str):
+                value = intern_string(value)
+            elif value is not _ABSENT:
+                # e.g. the prev and auth events, which mustn't be modifiable
+                # through the event.
+                value = freeze(value)
+            header.append(value)
+        self._header = tuple(header)
+
+    def _decoded(self) -> JsonDict:
+        if isinstance(self._body, bytes):
+            body: JsonDict = freeze(json_decoder.decode(self._body.decode("utf-8")))
+            self._body = body
+            return body
+        return self._body
+
+    def __getitem__(self, key: str) -> Any:
+        index = _COMPACT_EVENT_HEADER_INDICES.get(key)
+        if index is None:
+            return self._decoded()[key]
+
+        value = self._header[index]
+        if value is _ABSENT:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+
+        index = _COMPACT_EVENT_HEADER_INDICES.get(key)
+        if index is None:
+            return key in self._decoded()
+        return self._header[index] is not _ABSENT
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._decoded())
+
+    def __len__(self) -> int:
+        return len(self._decoded())
+
+    def to_dict(self) -> JsonDict:
+        """Returns a copy of the event dict.
+
+        Unlike iterating over the mapping, this doesn't keep the decoded JSON,
+        so serialising the event (e.g. to check its event ID) leaves it compact.
+        """
+        if isinstance(self._body, bytes):
+            return json_decoder.decode(self._body.decode("utf-8"))
+        return unfreeze(self)
+
+
+class CompactEvent(EventBase):
+    """An event which uses much less memory than the `FrozenEvent` classes, at
+    the cost of slower access to most of its fields. Useful for events which
+    are kept in a cache for a long time, but are rarely looked at in detail.
+
+    The event is stored as canonical JSON, with the fields which are used most
+    often (the type, state key, sender, prev events, etc.) kept decoded. The
+    rest of the event, including the content, is only decoded once one of its
+    fields is accessed. Like a frozen event, the event dict can't be modified.
+
+    Works with any event format version.
+    """
+
+    __slots__ = ["_event_id", "_signatures"]
+
+    def __init__(
+        self,
+        event_dict: JsonDict,
+        room_version: RoomVersion,
+        internal_metadata_dict: Optional[JsonDict] = None,
+        rejected_reason: Optional[str] = None,
+    ):
+        event_dict = dict(event_dict)
+        signatures = event_dict.pop("signatures", {})
+        unsigned = dict(event_dict.pop("unsigned", {}))
+
+        self.room_version = room_version
+        self.unsigned = unsigned
+        self.rejected_reason = rejected_reason
+        self.internal_metadata = _EventInternalMetadata(internal_metadata_dict or {})
+
+        # The dict is a read-only mapping, much like the frozendict of a frozen
+        # event.
+        self._dict = cast(JsonDict, _CompactEventDict(event_dict))
+
+        self._event_id: Optional[str] = None
+        if self.format_version == EventFormatVersions.ROOM_V1_V2:
+            self._event_id = self._dict["event_id"]
+        else:
+            assert "event_id" not in event_dict
+
+        # The signatures are only needed when sending the event over federation,
+        # so we keep them encoded until then.
+        self._signatures: Union[
+            bytes, Dict[str, Dict[str, str]]
+        ] = encode_canonical_json(signatures)
+
+    @property
+    def format_version(self) -> int:
+        return self.room_version.event_format
+
+    @property
+    def signatures(self) -> Dict[str, Dict[str, str]]:
+        if isinstance(self._signatures, bytes):
+            signatures: Dict[str, Dict[str, str]] = json_decoder.decode(
+                self._signatures.decode("utf-8")
+            )
+            self._signatures = signatures
+            return signatures
+        return self._signatures
+
+    @signatures.setter
+    def signatures(self, signatures: Dict[str, Dict[str, str]]) -> None:
+        self._signatures = signatures
+
+    @property
+    def event_id(self) -> str:
+        if self._event_id:
+            return self._event_id
+
+        # We have to import this here as otherwise we get an import loop which
+        # is hard to break.
+        from synapse.crypto.event_signing import compute_event_reference_hash
+
+        self._event_id = "$" + encode_base64(
+            compute_event_reference_hash(self)[1],
+            urlsafe=self.format_version == EventFormatVersions.ROOM_V4_PLUS,
+        )
+        return self._event_id
+
+    def get_dict(self) -> JsonDict:
+        # Serialising the event (e.g. to calculate its event ID) shouldn't leave
+        # the signatures decoded, so we don't use the `signatures` property here.
+        signatures = self._signatures
+        if isinstance(signatures, bytes):
+            signatures = json_decoder.decode(signatures.decode("utf-8"))
+
+        d = cast(_CompactEventDict, self._dict).to_dict()
+        d.update({"signatures": signatures, "unsigned": dict(self.unsigned)})
+
+        return d
+
+    def get_templated_pdu_json(self) -> JsonDict:
+        # The header fields are frozen, so build the template from a plain copy
+        # of the event dict.
+        template_json = cast(_CompactEventDict, self._dict).to_dict()
+        template_json.pop("hashes")
+
+        return template_json
+
+    def prev_event_ids(self) -> Sequence[str]:
+        if self.format_version == EventFormatVersions.ROOM_V1_V2:
+            return super().prev_event_ids()
+        return self._dict["prev_events"]
+
+    def auth_event_ids(self) -> StrCollection:
+        if self.format_version == EventFormatVersions.ROOM_V1_V2:
+            return super().auth_event_ids()
+        return self._dict["auth_events"]
+
+    def freeze(self) -> None:
+        # The event dict is already read-only.
+        pass
+
+
 def _event_type_from_format_version(
     format_version: int,
 ) -> Type[Union[FrozenEvent, FrozenEventV2, FrozenEventV3]]:
@@ -270,6 +270,15 @@ class FederationSender(AbstractFederationSender):
             ),
         )
 
+        LaterGauge(
+            "synapse_federation_transaction_queue_catching_up_destinations",
+            "",
+            [],
+            lambda: sum(
+                1 for d in self._per_destination_queues.values() if d.is_catching_up()
+            ),
+        )
+
         LaterGauge(
             "synapse_federation_transaction_queue_pending_pdus",
             "",
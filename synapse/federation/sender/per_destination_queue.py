@@ -19,7 +19,9 @@ from types import TracebackType
 from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, Optional, Tuple, Type
 
 import attr
-from prometheus_client import Counter
+from prometheus_client import Counter, Gauge
+
+from twisted.internet import defer
 
 from synapse.api.constants import EduTypes
 from synapse.api.errors import (
@@ -32,6 +34,7 @@ from synapse.events import EventBase
 from synapse.federation.units import Edu
 from synapse.handlers.presence import format_user_presence_state
 from synapse.logging import issue9533_logger
+from synapse.logging.context import make_deferred_yieldable, run_in_background
 from synapse.logging.opentracing import SynapseTags, set_tag
 from synapse.metrics import sent_transactions_counter
 from synapse.metrics.background_process_metrics import run_as_background_process
@@ -42,9 +45,19 @@ from synapse.visibility import filter_events_for_server
 if TYPE_CHECKING:
     import synapse.server
 
-# This is defined in the Matrix spec and enforced by the receiver.
+# These are defined in the Matrix spec and enforced by the receiver.
+MAX_PDUS_PER_TRANSACTION = 50
 MAX_EDUS_PER_TRANSACTION = 100
 
+# With adaptive batching, the fewest PDUs we will limit a transaction to.
+MIN_ADAPTIVE_PDUS_PER_TRANSACTION = 5
+
+# With adaptive batching, the fraction of the destination's round trip time to
+# wait for more PDUs before sending a transaction which isn't full, and the
+# longest we will wait.
+LINGER_RTT_FRACTION = 0.25
+MAX_LINGER_SECS = 0.5
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,6 +71,80 @@ sent_edus_by_type = Counter(
     ["type"],
 )
 
+catch_up_rooms_counter = Counter(
+    "synapse_federation_client_catch_up_rooms",
+    "Number of rooms caught up on for destinations which missed PDUs",
+)
+
+catch_up_backlog_gauge = Gauge(
+    "synapse_federation_client_catch_up_backlog_rooms",
+    "The number of rooms the given domain still needs to be caught up on",
+    labelnames=("server_name",),
+)
+
+
+@attr.s(slots=True, auto_attribs=True)
+class _AdaptiveBatchingState:
+    """Tracks how a destination responds to our transactions, to decide how many
+    PDUs to put in each transaction and how long to wait for more PDUs to be
+    queued before sending a transaction which isn't full.
+
+    Transactions to a destination which times out or fails are made smaller,
+    and grow back as they succeed. Waiting a fraction of the round trip time
+    before sending lets PDUs build up into fewer, larger transactions for slow
+    destinations, while fast destinations barely wait at all.
+    """
+
+    # The smoothed round trip time of successful transactions, in seconds.
+    rtt: Optional[float] = None
+
+    # The maximum number of PDUs to send in the next transaction.
+    pdu_limit: int = MAX_PDUS_PER_TRANSACTION
+
+    # Extra time to wait before sending, after the destination rate limited us.
+    rate_limit_backoff: float = 0.0
+
+    def on_success(self, rtt: float) -> None:
+        if self.rtt is None:
+            self.rtt = rtt
+        else:
+            self.rtt = 0.8 * self.rtt + 0.2 * rtt
+
+        self.pdu_limit = min(self.pdu_limit + 5, MAX_PDUS_PER_TRANSACTION)
+        self.rate_limit_backoff /= 2
+
+    def on_failure(self) -> None:
+        self.pdu_limit = max(self.pdu_limit // 2, MIN_ADAPTIVE_PDUS_PER_TRANSACTION)
+
+    def on_rate_limited(self) -> None:
+        self.rate_limit_backoff = min(
+            max(self.rate_limit_backoff * 2, 0.05), MAX_LINGER_SECS
+        )
+
+    def linger_secs(self) -> float:
+        """How long to wait for more PDUs before sending a transaction."""
+        linger = self.rate_limit_backoff
+        if self.rtt is not None:
+            linger += self.rtt * LINGER_RTT_FRACTION
+        return min(linger, MAX_LINGER_SECS)
+
+    def delay_secs(self, pending_pdus: int, back_to_back: bool) -> float:
+        """How long to wait before sending the next transaction.
+
+        Args:
+            pending_pdus: The number of PDUs queued for the destination.
+            back_to_back: Whether we have just sent a transaction to the
+                destination.
+        """
+        if back_to_back and 0 < pending_pdus < self.pdu_limit:
+            # Give a few more PDUs a chance to be queued up before sending.
+            return self.linger_secs()
+
+        # Otherwise there is no point waiting for more PDUs, but we still back
+        # off if the destination has rate limited us. This matters most when
+        # the queue is full.
+        return self.rate_limit_backoff
+
 
 class PerDestinationQueue:
     """
@@ -150,12 +237,31 @@ class PerDestinationQueue:
         # stream_id of last successfully sent device list update.
         self._last_device_list_stream_id = 0
 
+        # Whether to report how far behind catch-up is for this destination.
+        self._report_catch_up_backlog = (
+            destination in hs.config.federation.federation_metrics_domains
+        )
+
+        self._adaptive_batching: Optional[_AdaptiveBatchingState] = None
+        if hs.config.federation.federation_adaptive_transaction_batching:
+            self._adaptive_batching = _AdaptiveBatchingState()
+
     def __str__(self) -> str:
         return "PerDestinationQueue[%s]" % self._destination
 
     def pending_pdu_count(self) -> int:
         return len(self._pending_pdus)
 
+    def is_catching_up(self) -> bool:
+        """Whether we are currently sending PDUs the destination missed."""
+        return self._catching_up
+
+    def pdu_limit(self) -> int:
+        """The maximum number of PDUs to send in the next transaction."""
+        if self._adaptive_batching:
+            return self._adaptive_batching.pdu_limit
+        return MAX_PDUS_PER_TRANSACTION
+
     def pending_edu_count(self) -> int:
         return (
             len(self._pending_edus)
@@ -324,7 +430,15 @@ class PerDestinationQueue:
                     return
 
             pending_pdus = []
+            sent_transaction = False
             while True:
+                if self._adaptive_batching:
+                    delay = self._adaptive_batching.delay_secs(
+                        len(self._pending_pdus), back_to_back=sent_transaction
+                    )
+                    if delay:
+                        await self._clock.sleep(delay)
+
                 self._new_data_to_send = False
 
                 async with _TransactionQueueManager(self) as (
@@ -351,9 +465,13 @@ class PerDestinationQueue:
                             len(pending_pdus),
                         )
 
+                    start = self._clock.time()
                     await self._transaction_manager.send_new_transaction(
                         self._destination, pending_pdus, pending_edus
                     )
+                    if self._adaptive_batching:
+                        self._adaptive_batching.on_success(self._clock.time() - start)
+                    sent_transaction = True
 
                     sent_transactions_counter.inc()
                     sent_edus_counter.inc(len(pending_edus))
@@ -408,6 +526,13 @@ class PerDestinationQueue:
                 "TX [%s] Failed to send transaction: %s", self._destination, e
             )
 
+            if self._adaptive_batching:
+                inner = e.inner_exception
+                if isinstance(inner, HttpResponseException) and inner.code == 429:
+                    self._adaptive_batching.on_rate_limited()
+                else:
+                    self._adaptive_batching.on_failure()
+
             for p in pending_pdus:
                 logger.info(
                     "Failed to send event %s to %s", p.event_id, self._destination
@@ -446,141 +571,214 @@ class PerDestinationQueue:
 
         last_successful_stream_ordering: int = _tmp_last_successful_stream_ordering
 
-        # get at most 50 catchup room/PDUs
-        while True:
-            event_ids = await self._store.get_catch_up_room_event_ids(
-                self._destination, last_successful_stream_ordering
-            )
-
-            if not event_ids:
-                # No more events to catch up on, but we can't ignore the chance
-                # of a race condition, so we check that no new events have been
-                # skipped due to us being in catch-up mode
-
-                if self._catchup_last_skipped > last_successful_stream_ordering:
-                    # another event has been skipped because we were in catch-up mode
-                    continue
-
-                # we are done catching up!
-                self._catching_up = False
-                break
+        # We stream through the rooms to catch up on in pages of at most 50,
+        # ordered by stream ordering. To keep the destination busy, the next
+        # page is fetched while we send the current one, and the PDUs for the
+        # next room are worked out while we send the transaction for the
+        # current room.
+        next_page: "Optional[defer.Deferred[List[str]]]" = None
+        next_room: "Optional[defer.Deferred[List[EventBase]]]" = None
+        try:
+            while True:
+                if next_page is None:
+                    event_ids = await self._store.get_catch_up_room_event_ids(
+                        self._destination, last_successful_stream_ordering
+                    )
+                else:
+                    event_ids = await make_deferred_yieldable(next_page)
+                    next_page = None
+
+                if not event_ids:
+                    # No more events to catch up on, but we can't ignore the chance
+                    # of a race condition, so we check that no new events have been
+                    # skipped due to us being in catch-up mode
+
+                    if self._catchup_last_skipped > last_successful_stream_ordering:
+                        # another event has been skipped because we were in
+                        # catch-up mode
+                        continue
+
+                    # we are done catching up!
+                    self._catching_up = False
+                    if self._report_catch_up_backlog:
+                        catch_up_backlog_gauge.labels(
+                            server_name=self._destination
+                        ).set(0)
+                    break
+
+                if first_catch_up_check:
+                    # as this is our check for needing catch-up, we may have PDUs in
+                    # the queue from before we *knew* we had to do catch-up, so
+                    # clear those out now.
+                    self._start_catching_up()
+
+                if self._report_catch_up_backlog:
+                    backlog = await self._store.count_catch_up_rooms(
+                        self._destination, last_successful_stream_ordering
+                    )
+                    catch_up_backlog_gauge.labels(server_name=self._destination).set(
+                        backlog
+                    )
 
-            if first_catch_up_check:
-                # as this is our check for needing catch-up, we may have PDUs in
-                # the queue from before we *knew* we had to do catch-up, so
-                # clear those out now.
-                self._start_catching_up()
+                # fetch the relevant events from the event store
+                # - redacted behaviour of REDACT is fine, since we only send metadata
+                #   of redacted events to the destination.
+                # - don't need to worry about rejected events as we do not actively
+                #   forward received events over federation.
+                catchup_pdus = await self._store.get_events_as_list(event_ids)
+                if not catchup_pdus:
+                    raise AssertionError(
+                        "No events retrieved when we asked for %r. "
+                        "This should not happen." % event_ids
+                    )
 
-            # fetch the relevant events from the event store
-            # - redacted behaviour of REDACT is fine, since we only send metadata
-            #   of redacted events to the destination.
-            # - don't need to worry about rejected events as we do not actively
-            #   forward received events over federation.
-            catchup_pdus = await self._store.get_events_as_list(event_ids)
-            if not catchup_pdus:
-                raise AssertionError(
-                    "No events retrieved when we asked for %r. "
-                    "This should not happen." % event_ids
+                logger.info(
+                    "Catching up destination %s with %d PDUs",
+                    self._destination,
+                    len(catchup_pdus),
                 )
 
-            logger.info(
-                "Catching up destination %s with %d PDUs",
-                self._destination,
-                len(catchup_pdus),
-            )
+                # Start fetching the next page, which starts after the last room
+                # in this one.
+                page_end = catchup_pdus[-1].internal_metadata.stream_ordering
+                assert page_end
+                next_page = run_in_background(
+                    self._store.get_catch_up_room_event_ids,
+                    self._destination,
+                    page_end,
+                )
 
-            # We send transactions with events from one room only, as its likely
-            # that the remote will have to do additional processing, which may
-            # take some time. It's better to give it small amounts of work
-            # rather than risk the request timing out and repeatedly being
-            # retried, and not making any progress.
-            #
-            # Note: `catchup_pdus` will have exactly one PDU per room.
-            for pdu in catchup_pdus:
-                # The PDU from the DB will be the last PDU in the room from
-                # *this server* that wasn't sent to the remote. However, other
-                # servers may have sent lots of events since then, and we want
-                # to try and tell the remote only about the *latest* events in
-                # the room. This is so that it doesn't get inundated by events
-                # from various parts of the DAG, which all need to be processed.
+                # We send transactions with events from one room only, as its likely
+                # that the remote will have to do additional processing, which may
+                # take some time. It's better to give it small amounts of work
+                # rather than risk the request timing out and repeatedly being
+                # retried, and not making any progress.
                 #
-                # Note: this does mean that in large rooms a server coming back
-                # online will get sent the same events from all the different
-                # servers, but the remote will correctly deduplicate them and
-                # handle it only once.
-
-                # Step 1, fetch the current extremities
-                extrems = await self._store.get_prev_events_for_room(pdu.room_id)
-
-                if pdu.event_id in extrems:
-                    # If the event is in the extremities, then great! We can just
-                    # use that without having to do further checks.
-                    room_catchup_pdus = [pdu]
-                else:
-                    # If not, fetch the extremities and figure out which we can
-                    # send.
-                    extrem_events = await self._store.get_events_as_list(extrems)
-
-                    new_pdus = []
-                    for p in extrem_events:
-                        # We pulled this from the DB, so it'll be non-null
-                        assert p.internal_metadata.stream_ordering
-
-                        # Filter out events that happened before the remote went
-                        # offline
-                        if (
-                            p.internal_metadata.stream_ordering
-                            < last_successful_stream_ordering
-                        ):
-                            continue
+                # Note: `catchup_pdus` will have exactly one PDU per room.
+                next_room = run_in_background(
+                    self._get_catch_up_pdus_for_room,
+                    catchup_pdus[0],
+                    last_successful_stream_ordering,
+                )
+                for index, pdu in enumerate(catchup_pdus):
+                    assert next_room is not None
+                    room_catchup_pdus = await make_deferred_yieldable(next_room)
+                    next_room = None
+
+                    if index + 1 < len(catchup_pdus):
+                        next_room = run_in_background(
+                            self._get_catch_up_pdus_for_room,
+                            catchup_pdus[index + 1],
+                            last_successful_stream_ordering,
+                        )
 
-                        new_pdus.append(p)
-
-                    # Filter out events where the server is not in the room,
-                    # e.g. it may have left/been kicked. *Ideally* we'd pull
-                    # out the kick and send that, but it's a rare edge case
-                    # so we don't bother for now (the server that sent the
-                    # kick should send it out if its online).
-                    new_pdus = await filter_events_for_server(
-                        self._storage_controllers,
-                        self._destination,
-                        self._server_name,
-                        new_pdus,
-                        redact=False,
+                    logger.info(
+                        "Catching up rooms to %s: %r", self._destination, pdu.room_id
                     )
 
-                    # If we've filtered out all the extremities, fall back to
-                    # sending the original event. This should ensure that the
-                    # server gets at least some of missed events (especially if
-                    # the other sending servers are up).
-                    if new_pdus:
-                        room_catchup_pdus = new_pdus
-                    else:
-                        room_catchup_pdus = [pdu]
+                    await self._transaction_manager.send_new_transaction(
+                        self._destination, room_catchup_pdus, []
+                    )
 
-                logger.info(
-                    "Catching up rooms to %s: %r", self._destination, pdu.room_id
-                )
+                    sent_transactions_counter.inc()
+                    catch_up_rooms_counter.inc()
 
-                await self._transaction_manager.send_new_transaction(
-                    self._destination, room_catchup_pdus, []
-                )
+                    # We pulled this from the DB, so it'll be non-null
+                    assert pdu.internal_metadata.stream_ordering
+
+                    # Note that we mark the last successful stream ordering as that
+                    # from the *original* PDU, rather than the PDU(s) we actually
+                    # send. This is because we use it to mark our position in the
+                    # queue of missed PDUs to process.
+                    last_successful_stream_ordering = (
+                        pdu.internal_metadata.stream_ordering
+                    )
 
-                sent_transactions_counter.inc()
+                    self._last_successful_stream_ordering = (
+                        last_successful_stream_ordering
+                    )
+                    await self._store.set_destination_last_successful_stream_ordering(
+                        self._destination, last_successful_stream_ordering
+                    )
+        finally:
+            # If we stopped part way through (e.g. because the destination is
+            # unreachable), nothing is waiting on the prefetches any more, so
+            # make sure their failures aren't reported as unhandled.
+            for prefetch in (next_page, next_room):
+                if prefetch is not None:
+                    prefetch.addErrback(lambda _: None)
+
+    async def _get_catch_up_pdus_for_room(
+        self, pdu: EventBase, last_successful_stream_ordering: int
+    ) -> List[EventBase]:
+        """Work out which PDUs to send to catch the destination up on a room.
 
-                # We pulled this from the DB, so it'll be non-null
-                assert pdu.internal_metadata.stream_ordering
+        Args:
+            pdu: the last PDU in the room from this server which wasn't sent to
+                the destination.
+            last_successful_stream_ordering: the stream ordering of the last PDU
+                which was successfully sent to the destination before it went
+                offline.
+
+        Returns:
+            The PDUs to send.
+        """
+        # The PDU from the DB will be the last PDU in the room from
+        # *this server* that wasn't sent to the remote. However, other
+        # servers may have sent lots of events since then, and we want
+        # to try and tell the remote only about the *latest* events in
+        # the room. This is so that it doesn't get inundated by events
+        # from various parts of the DAG, which all need to be processed.
+        #
+        # Note: this does mean that in large rooms a server coming back
+        # online will get sent the same events from all the different
+        # servers, but the remote will correctly deduplicate them and
+        # handle it only once.
+
+        # Step 1, fetch the current extremities
+        extrems = await self._store.get_prev_events_for_room(pdu.room_id)
+
+        if pdu.event_id in extrems:
+            # If the event is in the extremities, then great! We can just
+            # use that without having to do further checks.
+            return [pdu]
+
+        # If not, fetch the extremities and figure out which we can
+        # send.
+        extrem_events = await self._store.get_events_as_list(extrems)
+
+        new_pdus = []
+        for p in extrem_events:
+            # We pulled this from the DB, so it'll be non-null
+            assert p.internal_metadata.stream_ordering
+
+            # Filter out events that happened before the remote went
+            # offline
+            if p.internal_metadata.stream_ordering < last_successful_stream_ordering:
+                continue
 
-                # Note that we mark the last successful stream ordering as that
-                # from the *original* PDU, rather than the PDU(s) we actually
-                # send. This is because we use it to mark our position in the
-                # queue of missed PDUs to process.
-                last_successful_stream_ordering = pdu.internal_metadata.stream_ordering
+            new_pdus.append(p)
+
+        # Filter out events where the server is not in the room,
+        # e.g. it may have left/been kicked. *Ideally* we'd pull
+        # out the kick and send that, but it's a rare edge case
+        # so we don't bother for now (the server that sent the
+        # kick should send it out if its online).
+        new_pdus = await filter_events_for_server(
+            self._storage_controllers,
+            self._destination,
+            self._server_name,
+            new_pdus,
+            redact=False,
+        )
 
-                self._last_successful_stream_ordering = last_successful_stream_ordering
-                await self._store.set_destination_last_successful_stream_ordering(
-                    self._destination, last_successful_stream_ordering
-                )
+        # If we've filtered out all the extremities, fall back to
+        # sending the original event. This should ensure that the
+        # server gets at least some of missed events (especially if
+        # the other sending servers are up).
+        if new_pdus:
+            return new_pdus
+        return [pdu]
 
     def _get_receipt_edus(self, force_flush: bool, limit: int) -> Iterable[Edu]:
         if not self._pending_receipt_edus:
@@ -763,9 +961,9 @@ class _TransactionQueueManager:
             pending_edus.append(val)
             edu_limit -= 1
 
-        # Now we look for any PDUs to send, by getting up to 50 PDUs from the
-        # queue
-        self._pdus = self.queue._pending_pdus[:50]
+        # Now we look for any PDUs to send, by getting up to 50 PDUs (or fewer,
+        # with adaptive batching) from the queue
+        self._pdus = self.queue._pending_pdus[: self.queue.pdu_limit()]
 
         if not self._pdus and not pending_edus:
             return [], []
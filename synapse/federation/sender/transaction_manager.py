@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, List, Tuple
 
+import attr
+from canonicaljson import encode_canonical_json
 from prometheus_client import Gauge
 
 from synapse.api.constants import EduTypes
@@ -30,6 +32,7 @@ from synapse.logging.opentracing import (
 )
 from synapse.types import JsonDict
 from synapse.util import json_decoder
+from synapse.util.caches.lrucache import LruCache
 from synapse.util.metrics import measure_func
 
 if TYPE_CHECKING:
@@ -44,6 +47,34 @@ last_pdu_ts_metric = Gauge(
     labelnames=("server_name",),
 )
 
+# The number of PDUs to keep the JSON of, for sending to other destinations.
+PDU_JSON_CACHE_SIZE = 1000
+
+
+@attr.s(slots=True, frozen=True, auto_attribs=True)
+class _PduJson:
+    """The JSON of a PDU to send, which is shared between all destinations."""
+
+    json: JsonDict
+    # `json` encoded as canonical JSON.
+    encoded: bytes
+
+
+def _encode_transaction(transaction: Transaction, encoded_pdus: List[bytes]) -> bytes:
+    """Encode a transaction as canonical JSON, reusing the already encoded PDUs.
+
+    Args:
+        transaction: The transaction to encode.
+        encoded_pdus: The PDUs of the transaction, encoded as canonical JSON.
+    """
+    data = transaction.get_dict()
+    del data["pdus"]
+
+    # "pdus" sorts after all the other keys, so we can splice the PDUs onto the
+    # end rather than encoding them again.
+    encoded = encode_canonical_json(data)
+    return b"".join((encoded[:-1], b',"pdus":[', b",".join(encoded_pdus), b"]}"))
+
 
 class TransactionManager:
     """Helper class which handles building and sending transactions
@@ -65,6 +96,23 @@ class TransactionManager:
         # HACK to get unique tx id
         self._next_txn_id = int(self.clock.time_msec())
 
+        # A PDU is usually sent to many destinations, so we only build and encode
+        # its JSON once. Keyed by event ID and whether the event is redacted, as
+        # the JSON changes if the event is redacted while it is being sent.
+        self._pdu_json_cache: LruCache[Tuple[str, bool], _PduJson] = LruCache(
+            cache_name="federation_pdu_json", max_size=PDU_JSON_CACHE_SIZE
+        )
+
+    def _get_pdu_json(self, pdu: EventBase) -> _PduJson:
+        """Get the JSON of a PDU to send, from the cache if possible."""
+        key = (pdu.event_id, pdu.internal_metadata.is_redacted())
+        pdu_json = self._pdu_json_cache.get(key)
+        if pdu_json is None:
+            json = pdu.get_pdu_json()
+            pdu_json = _PduJson(json=json, encoded=encode_canonical_json(json))
+            self._pdu_json_cache.set(key, pdu_json)
+        return pdu_json
+
     @measure_func("_send_new_transaction")
     async def send_new_transaction(
         self,
@@ -107,12 +155,14 @@ class TransactionManager:
                 len(edus),
             )
 
+            pdu_jsons = [self._get_pdu_json(p) for p in pdus]
+
             transaction = Transaction(
                 origin_server_ts=int(self.clock.time_msec()),
                 transaction_id=txn_id,
                 origin=self._server_name,
                 destination=destination,
-                pdus=[p.get_pdu_json() for p in pdus],
+                pdus=[p.json for p in pdu_jsons],
                 edus=[edu.get_dict() for edu in edus],
             )
 
@@ -143,25 +193,19 @@ class TransactionManager:
 
             # Actually send the transaction
 
-            # FIXME (erikj): This is a bit of a hack to make the Pdu age
-            # keys work
-            # FIXME (richardv): I also believe it no longer works. We (now?) store
-            #  "age_ts" in "unsigned" rather than at the top level. See
-            #  https://github.com/matrix-org/synapse/issues/8429.
+            # Note that the PDUs are sent with their "age_ts" in "unsigned" rather
+            # than an "age". See https://github.com/matrix-org/synapse/issues/8429.
             def json_data_cb() -> JsonDict:
-                data = transaction.get_dict()
-                now = int(self.clock.time_msec())
-                if "pdus" in data:
-                    for p in data["pdus"]:
-                        if "age_ts" in p:
-                            unsigned = p.setdefault("unsigned", {})
-                            unsigned["age"] = now - int(p["age_ts"])
-                            del p["age_ts"]
-                return data
+                return transaction.get_dict()
+
+            def encoded_json_data_cb() -> bytes:
+                return _encode_transaction(transaction, [p.encoded for p in pdu_jsons])
 
             try:
                 response = await self._transport_layer.send_transaction(
-                    transaction, json_data_cb
+                    transaction,
+                    json_data_cb,
+                    encoded_json_data_callback=encoded_json_data_cb,
                 )
             except HttpResponseException as e:
                 code = e.code
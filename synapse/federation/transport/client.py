@@ -206,11 +206,16 @@ class TransportLayerClient:
         self,
         transaction: Transaction,
         json_data_callback: Optional[Callable[[], JsonDict]] = None,
+        encoded_json_data_callback: Optional[Callable[[], bytes]] = None,
     ) -> JsonDict:
         """Sends the given Transaction to its destination
 
         Args:
             transaction
+            json_data_callback: A callable returning the transaction JSON to send.
+            encoded_json_data_callback: A callable returning the transaction
+                already encoded as canonical JSON. Takes precedence over
+                `json_data_callback`.
 
         Returns:
             Succeeds when we get a 2xx HTTP response. The result
@@ -245,6 +250,7 @@ class TransportLayerClient:
             path=path,
             data=json_data,
             json_data_callback=json_data_callback,
+            encoded_json_data_callback=encoded_json_data_callback,
             long_retries=True,
             backoff_on_404=True,  # If we get a 404 the other side has gone
             try_trailing_slash_on_400=True,
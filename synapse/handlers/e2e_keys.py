@@ -463,10 +463,9 @@ class E2eKeysHandler:
             A map from user_id -> device_id -> device details
         """
         set_tag("local_query", str(query))
-        local_query: List[Tuple[str, Optional[str]]] = []
 
         result_dict: Dict[str, Dict[str, dict]] = {}
-        for user_id, device_ids in query.items():
+        for user_id in query:
             # we use UserID.from_string to catch invalid user ids
             if not self.is_mine(UserID.from_string(user_id)):
                 logger.warning("Request for keys for non-local user %s", user_id)
@@ -480,25 +479,32 @@ class E2eKeysHandler:
                 set_tag("error", True)
                 raise SynapseError(400, "Not a user here")
 
-            if not device_ids:
-                local_query.append((user_id, None))
-            else:
-                for device_id in device_ids:
-                    local_query.append((user_id, device_id))
+        # We look up all the devices of the queried users in one go, as the
+        # results are cached per user.
+        results = await self.store.get_e2e_device_keys_for_users_cs_api(query.keys())
 
+        # Build the result structure
+        for user_id, device_ids in query.items():
             # make sure that each queried user appears in the result dict
-            result_dict[user_id] = {}
-
-        results = await self.store.get_e2e_device_keys_for_cs_api(
-            local_query, include_displaynames
-        )
+            user_result: Dict[str, dict] = {}
+            result_dict[user_id] = user_result
+
+            device_keys = results.get(user_id) or {}
+            if device_ids:
+                device_keys = {
+                    device_id: device_keys[device_id]
+                    for device_id in device_ids
+                    if device_id in device_keys
+                }
 
-        # Build the result structure
-        for user_id, device_keys in results.items():
             for device_id, device_info in device_keys.items():
-                result_dict[user_id][device_id] = device_info
+                if not include_displaynames and device_info["unsigned"]:
+                    # The cached results include the display names, so
+                    # make a copy without them.
+                    device_info = {**device_info, "unsigned": {}}
+                user_result[device_id] = device_info
 
-        log_kv(results)
+        log_kv(result_dict)
         return result_dict
 
     async def on_federation_query_client_keys(
@@ -24,8 +24,11 @@ The methods that define policy are:
 import abc
 import contextlib
 import logging
+import operator
+from array import array
 from bisect import bisect
 from contextlib import contextmanager
+from itertools import chain, compress, repeat
 from types import TracebackType
 from typing import (
     TYPE_CHECKING,
@@ -36,7 +39,9 @@ from typing import (
     Dict,
     Generator,
     Iterable,
+    Iterator,
     List,
+    MutableMapping,
     Optional,
     Set,
     Tuple,
@@ -129,6 +134,286 @@ UPDATE_SYNCING_USERS_MS = 10 * 1000
 
 assert LAST_ACTIVE_GRANULARITY < IDLE_TIMER
 
+# The range of timestamps that can be stored in a `PresenceStateTable`. This
+# leaves room to add the timeout intervals to them without overflowing.
+_MIN_TS = -(2**62)
+_MAX_TS = 2**62
+
+# The maximum number of distinct presence states a `PresenceStateTable` will
+# assign codes to. Remote servers can send us arbitrary states, so any beyond
+# this are stored as irregular states rather than growing the table unboundedly.
+_MAX_STATE_CODES = 256
+
+# `PresenceStateTable.get_possibly_timed_out` scans the whole table, rather than
+# picking out the rows of the users it is asked about, if asked about at least
+# 1 / _FULL_SCAN_RATIO of the rows.
+_FULL_SCAN_RATIO = 4
+
+
+class PresenceStateTable(MutableMapping[str, UserPresenceState]):
+    """A map from user ID to the user's current `UserPresenceState`.
+
+    Rather than keeping an object per user, the fields of the states are stored
+    in compact columns indexed by a row per user. Besides using much less memory
+    when tracking large numbers of users, this allows the periodic timeout sweep
+    to check many users in a single pass over a column (see
+    `get_possibly_timed_out`), without materialising their states.
+
+    `UserPresenceState` objects are created on access, so mutating them does not
+    update the table: the new state must be written back.
+
+    States with fields that don't fit in the columns (which can only come from
+    badly behaved remote servers) are kept as objects, as is.
+    """
+
+    def __init__(
+        self,
+        is_mine_fn: Callable[[str], bool],
+        states: Iterable[UserPresenceState] = (),
+    ):
+        self._is_mine_fn = is_mine_fn
+
+        self._user_to_row: Dict[str, int] = {}
+        # Rows of users that have been removed, which can be reused.
+        self._free_rows: List[int] = []
+
+        # The presence states that have been seen, indexed by their code in the
+        # `_state` column.
+        self._state_names: List[str] = []
+        self._state_codes: Dict[str, int] = {}
+
+        # The columns, indexed by row.
+        self._user_ids: List[Optional[str]] = []
+        self._state = array("B")
+        self._last_active_ts = array("q")
+        self._last_federation_update_ts = array("q")
+        self._last_user_sync_ts = array("q")
+        self._currently_active = array("b")
+        self._status_msg: List[Optional[str]] = []
+        # The time after which one of the timers checked by `handle_timeout` will
+        # have elapsed for the row, derived from the other columns.
+        self._timeout_at = array("q")
+
+        # States that don't fit in the columns.
+        self._irregular: Dict[str, UserPresenceState] = {}
+
+        for state in states:
+            self[state.user_id] = state
+
+    def __len__(self) -> int:
+        return len(self._user_to_row) + len(self._irregular)
+
+    def __iter__(self) -> Iterator[str]:
+        return chain(self._user_to_row, self._irregular)
+
+    def __contains__(self, user_id: object) -> bool:
+        return user_id in self._user_to_row or user_id in self._irregular
+
+    def __getitem__(self, user_id: str) -> UserPresenceState:
+        row = self._user_to_row.get(user_id)
+        if row is None:
+            return self._irregular[user_id]
+
+        return UserPresenceState(
+            user_id=user_id,
+            state=self._state_names[self._state[row]],
+            last_active_ts=self._last_active_ts[row],
+            last_federation_update_ts=self._last_federation_update_ts[row],
+            last_user_sync_ts=self._last_user_sync_ts[row],
+            status_msg=self._status_msg[row],
+            currently_active=bool(self._currently_active[row]),
+        )
+
+    def __setitem__(self, user_id: str, state: UserPresenceState) -> None:
+        state_code = self._get_state_code(state.state)
+        if state_code is None or not self._fits_columns(state):
+            self._remove_row(user_id)
+            self._irregular[user_id] = state
+            return
+
+        self._irregular.pop(user_id, None)
+
+        row = self._user_to_row.get(user_id)
+        if row is None:
+            if self._free_rows:
+                row = self._free_rows.pop()
+            else:
+                # Grow the columns by a row, which is filled in below.
+                row = len(self._user_ids)
+                self._user_ids.append(None)
+                self._state.append(0)
+                self._last_active_ts.append(0)
+                self._last_federation_update_ts.append(0)
+                self._last_user_sync_ts.append(0)
+                self._currently_active.append(0)
+                self._status_msg.append(None)
+                self._timeout_at.append(0)
+
+            self._user_to_row[user_id] = row
+            self._user_ids[row] = user_id
+
+        self._state[row] = state_code
+        self._last_active_ts[row] = state.last_active_ts
+        self._last_federation_update_ts[row] = state.last_federation_update_ts
+        self._last_user_sync_ts[row] = state.last_user_sync_ts
+        self._currently_active[row] = state.currently_active
+        self._status_msg[row] = state.status_msg
+        self._timeout_at[row] = self._get_timeout_at(state, self._is_mine_fn(user_id))
+
+    def __delitem__(self, user_id: str) -> None:
+        if user_id in self._irregular:
+            del self._irregular[user_id]
+        elif not self._remove_row(user_id):
+            raise KeyError(user_id)
+
+    def _remove_row(self, user_id: str) -> bool:
+        """Frees the row of the given user, if they have one.
+
+        Returns:
+            Whether the user had a row.
+        """
+        row = self._user_to_row.pop(user_id, None)
+        if row is None:
+            return False
+
+        self._user_ids[row] = None
+        self._status_msg[row] = None
+        self._timeout_at[row] = _MAX_TS
+        self._free_rows.append(row)
+        return True
+
+    def _get_state_code(self, state: str) -> Optional[int]:
+        """Get the code used to store the given presence state in the `_state`
+        column, or None if it can't be stored there.
+        """
+        code = self._state_codes.get(state)
+        if code is not None:
+            return code
+
+        if not isinstance(state, str) or len(self._state_names) >= _MAX_STATE_CODES:
+            return None
+
+        code = len(self._state_names)
+        self._state_names.append(state)
+        self._state_codes[state] = code
+        return code
+
+    @staticmethod
+    def _fits_columns(state: UserPresenceState) -> bool:
+        """Whether the fields of the given state can be stored in the columns."""
+        return type(state.currently_active) is bool and all(
+            type(ts) is int and _MIN_TS <= ts <= _MAX_TS
+            for ts in (
+                state.last_active_ts,
+                state.last_federation_update_ts,
+                state.last_user_sync_ts,
+            )
+        )
+
+    @staticmethod
+    def _get_timeout_at(state: UserPresenceState, is_mine: bool) -> int:
+        """Get the time after which one of the timers checked by `handle_timeout`
+        will have elapsed for the given state, i.e. the earliest time at which it
+        may return an update for it.
+        """
+        if state.state == PresenceState.OFFLINE:
+            # No timeouts are associated with offline states.
+            return _MAX_TS
+
+        if not is_mine:
+            return state.last_federation_update_ts + FEDERATION_TIMEOUT
+
+        timeout_at = min(
+            state.last_federation_update_ts + FEDERATION_PING_INTERVAL,
+            max(state.last_user_sync_ts, state.last_active_ts) + SYNC_ONLINE_TIMEOUT,
+        )
+        if state.state == PresenceState.ONLINE:
+            # Going idle happens after the user stops being "currently active".
+            timeout_at = min(timeout_at, state.last_active_ts + LAST_ACTIVE_GRANULARITY)
+        return timeout_at
+
+    def get_possibly_timed_out(self, user_ids: Collection[str], now: int) -> List[str]:
+        """Returns the users out of the given ones for whom one of the presence
+        timers checked by `handle_timeout` may have elapsed.
+
+        This is a superset of the users for whom `handle_timeout` would return an
+        update: it does not take currently syncing users into account, for
+        example. Users without any presence state are never returned, as their
+        state is offline.
+
+        The check is a single comparison per user against the `_timeout_at`
+        column, so that the users who need no further attention (usually the vast
+        majority) never have their state materialised. When asked about a large
+        proportion of the users, the whole column is compared at once with
+        builtins which loop in C.
+        """
+        results: List[str] = []
+        if self._irregular:
+            results = [user_id for user_id in user_ids if user_id in self._irregular]
+
+        if len(user_ids) * _FULL_SCAN_RATIO >= len(self._user_ids):
+            # It's cheaper to scan the whole column than to pick out the rows of
+            # the given users.
+            timed_out = compress(
+                self._user_ids, map(operator.lt, self._timeout_at, repeat(now))
+            )
+            # Freed rows never time out, so every row found here has a user ID.
+            results.extend(
+                user_id
+                for user_id in timed_out
+                if user_id is not None and user_id in user_ids
+            )
+            return results
+
+        user_to_row = self._user_to_row
+        timeout_at = self._timeout_at
+        results.extend(
+            user_id
+            for user_id in user_ids
+            if user_id in user_to_row and timeout_at[user_to_row[user_id]] < now
+        )
+        return results
+
+    def get_states(self, user_ids: Iterable[str]) -> List[UserPresenceState]:
+        """Get the states of the given users, e.g. to persist them to the
+        database.
+
+        This reads the rows straight out of the columns, which is much quicker
+        than looking up each user in turn when snapshotting many users.
+
+        Raises:
+            KeyError if one of the users has no state.
+        """
+        user_to_row = self._user_to_row
+        irregular = self._irregular
+        state_names = self._state_names
+        state_col = self._state
+        last_active_ts = self._last_active_ts
+        last_federation_update_ts = self._last_federation_update_ts
+        last_user_sync_ts = self._last_user_sync_ts
+        status_msg = self._status_msg
+        currently_active = self._currently_active
+
+        states = []
+        for user_id in user_ids:
+            row = user_to_row.get(user_id)
+            if row is None:
+                states.append(irregular[user_id])
+                continue
+
+            states.append(
+                UserPresenceState(
+                    user_id=user_id,
+                    state=state_names[state_col[row]],
+                    last_active_ts=last_active_ts[row],
+                    last_federation_update_ts=last_federation_update_ts[row],
+                    last_user_sync_ts=last_user_sync_ts[row],
+                    status_msg=status_msg[row],
+                    currently_active=bool(currently_active[row]),
+                )
+            )
+        return states
+
 
 class BasePresenceHandler(abc.ABC):
     """Parts of the PresenceHandler that are shared between workers and presence
@@ -151,7 +436,9 @@ class BasePresenceHandler(abc.ABC):
         self._busy_presence_enabled = hs.config.experimental.msc3026_enabled
 
         active_presence = self.store.take_presence_startup_info()
-        self.user_to_current_state = {state.user_id: state for state in active_presence}
+        self.user_to_current_state = PresenceStateTable(
+            self.is_mine_id, active_presence
+        )
 
     @abc.abstractmethod
     async def user_syncing(
@@ -779,10 +1066,7 @@ class PresenceHandler(BasePresenceHandler):
         if self.unpersisted_users_changes:
 
             await self.store.update_presence(
-                [
-                    self.user_to_current_state[user_id]
-                    for user_id in self.unpersisted_users_changes
-                ]
+                self.user_to_current_state.get_states(self.unpersisted_users_changes)
             )
         logger.info("Finished _on_shutdown")
 
@@ -796,7 +1080,7 @@ class PresenceHandler(BasePresenceHandler):
         if unpersisted:
             logger.info("Persisting %d unpersisted presence updates", len(unpersisted))
             await self.store.update_presence(
-                [self.user_to_current_state[user_id] for user_id in unpersisted]
+                self.user_to_current_state.get_states(unpersisted)
             )
 
     async def _update_states(
@@ -930,13 +1214,18 @@ class PresenceHandler(BasePresenceHandler):
             )
             self.external_process_last_updated_ms.pop(process_id)
 
+        timers_fired_counter.inc(len(users_to_check))
+
+        # Only materialise the states of users for whom a timer has actually
+        # elapsed: the timers of most users will have been superseded by more
+        # recent activity.
         states = [
-            self.user_to_current_state.get(user_id, UserPresenceState.default(user_id))
-            for user_id in users_to_check
+            self.user_to_current_state[user_id]
+            for user_id in self.user_to_current_state.get_possibly_timed_out(
+                users_to_check, now
+            )
         ]
 
-        timers_fired_counter.inc(len(states))
-
         syncing_user_ids = {
             user_id
             for user_id, count in self.user_to_num_current_syncs.items()
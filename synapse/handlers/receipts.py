@@ -24,6 +24,7 @@ from synapse.types import (
     UserID,
     get_domain_from_id,
 )
+from synapse.util.batching_queue import BatchingQueue
 
 if TYPE_CHECKING:
     from synapse.server import HomeServer
@@ -63,6 +64,16 @@ class ReceiptsHandler:
         self.clock = self.hs.get_clock()
         self.state = hs.get_state_handler()
 
+        # Receipts are persisted in batches, so that bursts of receipts (which
+        # often supersede each other) are written in a single transaction.
+        self._receipts_persistence_queue: BatchingQueue[
+            List[ReadReceipt], List[ReadReceipt]
+        ] = BatchingQueue(
+            "persist_receipts",
+            self.clock,
+            self._persist_receipts_batch,
+        )
+
     async def _received_remote_receipt(self, origin: str, content: JsonDict) -> None:
         """Called when we receive an EDU of type m.receipt from a remote HS."""
         receipts = []
@@ -112,37 +123,37 @@ class ReceiptsHandler:
         await self._handle_new_receipts(receipts)
 
     async def _handle_new_receipts(self, receipts: List[ReadReceipt]) -> bool:
-        """Takes a list of receipts, stores them and informs the notifier."""
-        min_batch_id: Optional[int] = None
-        max_batch_id: Optional[int] = None
-
-        for receipt in receipts:
-            res = await self.store.insert_receipt(
-                receipt.room_id,
-                receipt.receipt_type,
-                receipt.user_id,
-                receipt.event_ids,
-                receipt.thread_id,
-                receipt.data,
-            )
+        """Takes a list of receipts, stores them and informs the notifier.
 
-            if not res:
-                # res will be None if this receipt is 'old'
-                continue
+        Returns:
+            True if any of the given receipts were new, and so were persisted.
+        """
+        if not receipts:
+            return False
+
+        persisted = await self._receipts_persistence_queue.add_to_queue(receipts)
 
-            stream_id, max_persisted_id = res
+        return any(receipt in persisted for receipt in receipts)
 
-            if min_batch_id is None or stream_id < min_batch_id:
-                min_batch_id = stream_id
-            if max_batch_id is None or max_persisted_id > max_batch_id:
-                max_batch_id = max_persisted_id
+    async def _persist_receipts_batch(
+        self, batch: List[List[ReadReceipt]]
+    ) -> List[ReadReceipt]:
+        """Stores a batch of receipts and informs the notifier.
 
-        # Either both of these should be None or neither.
-        if min_batch_id is None or max_batch_id is None:
+        Returns:
+            The receipts which were persisted. Receipts which were older than
+            the stored ones, or which were superseded by a later receipt in the
+            batch, are not included.
+        """
+        persisted, max_batch_id = await self.store.insert_receipts(
+            [receipt for receipts in batch for receipt in receipts]
+        )
+        if not persisted:
             # no new receipts
-            return False
+            return []
 
-        affected_room_ids = list({r.room_id for r in receipts})
+        min_batch_id = min(stream_id for _, stream_id in persisted)
+        affected_room_ids = list({receipt.room_id for receipt, _ in persisted})
 
         self.notifier.on_new_event(
             StreamKeyType.RECEIPT, max_batch_id, rooms=affected_room_ids
@@ -152,7 +163,7 @@ class ReceiptsHandler:
             min_batch_id, max_batch_id, affected_room_ids
         )
 
-        return True
+        return [receipt for receipt, _ in persisted]
 
     async def received_client_receipt(
         self,
@@ -99,6 +99,18 @@ LAZY_LOADED_MEMBERS_CACHE_MAX_AGE = 30 * 60 * 1000
 # avoiding redundantly sending the same lazy-loaded members to the client
 LAZY_LOADED_MEMBERS_CACHE_MAX_SIZE = 100
 
+# Keep the per-room results of a device's last incremental sync for no more than
+# 5 minutes. Clients which are still polling will have come back well within that.
+INCREMENTAL_SYNC_CACHE_MAX_AGE = 5 * 60 * 1000
+
+# Counts the number of joined room entries which were taken from the incremental
+# sync cache rather than being recalculated.
+reused_room_entries_counter = Counter(
+    "synapse_handlers_sync_reused_room_entries_total",
+    "Count of joined room entries in incremental sync responses that were reused "
+    "from a previous calculation for the same since token.",
+)
+
 
 SyncRequestKey = Tuple[Any, ...]
 
@@ -159,6 +171,27 @@ class JoinedSyncResult:
         )
 
 
+@attr.s(slots=True, frozen=True, auto_attribs=True)
+class _IncrementalSyncCacheEntry:
+    """The joined room results of the last incremental sync calculated for a
+    device.
+
+    Attributes:
+        since_token: The since token the results were calculated from.
+        filter_json: The filter the results were calculated with.
+        ignored_users: The users the syncing user was ignoring at the time.
+        room_stream_ordering: The room stream position the results were
+            calculated up to.
+        joined: The calculated JoinedSyncResult for each room, by room ID.
+    """
+
+    since_token: StreamToken
+    filter_json: JsonDict
+    ignored_users: FrozenSet[str]
+    room_stream_ordering: int
+    joined: Mapping[str, JoinedSyncResult]
+
+
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class ArchivedSyncResult:
     room_id: str
@@ -292,6 +325,21 @@ class SyncHandler:
             expiry_ms=LAZY_LOADED_MEMBERS_CACHE_MAX_AGE,
         )
 
+        # ExpiringCache((User, Device)) -> _IncrementalSyncCacheEntry
+        #
+        # Used to avoid recalculating the joined rooms which haven't changed when
+        # a device repeats an incremental sync with the same since token (e.g. a
+        # long-poll which was woken up without anything to return, or a client
+        # retrying with a different timeout).
+        self._incremental_sync_cache: ExpiringCache[
+            Tuple[str, Optional[str]], _IncrementalSyncCacheEntry
+        ] = ExpiringCache(
+            "incremental_sync_cache",
+            self.clock,
+            max_len=0,
+            expiry_ms=INCREMENTAL_SYNC_CACHE_MAX_AGE,
+        )
+
         self.rooms_to_exclude_globally = hs.config.server.rooms_to_exclude_from_sync
 
     async def wait_for_sync_for_user(
@@ -1939,8 +1987,29 @@ class SyncHandler:
         newly_left_rooms = room_changes.newly_left_rooms
 
         # 4. We need to apply further processing to `room_entries` (rooms considered
-        # joined or archived).
+        # joined or archived). If we have already calculated the entry for a joined
+        # room for this since token, and nothing has happened in it since, we can
+        # reuse that.
+        reusable_rooms = self._get_reusable_joined_rooms(
+            sync_result_builder, ignored_users
+        )
+
         async def handle_room_entries(room_entry: "RoomSyncResultBuilder") -> None:
+            room_id = room_entry.room_id
+            reusable_room = reusable_rooms.get(room_id)
+            if (
+                reusable_room is not None
+                and room_entry.rtype == "joined"
+                and not room_entry.newly_joined
+                and not ephemeral_by_room.get(room_id)
+                and not account_data_by_room.get(room_id)
+                and tags_by_room.get(room_id) is None
+            ):
+                logger.debug("Reusing room entry for %s", room_id)
+                reused_room_entries_counter.inc()
+                sync_result_builder.joined.append(reusable_room)
+                return
+
             logger.debug("Generating room entry for %s", room_entry.room_id)
             # Note that this mutates sync_result_builder.{joined,archived}.
             await self._generate_room_entry(
@@ -1959,8 +2028,64 @@ class SyncHandler:
         sync_result_builder.invited.extend(invited)
         sync_result_builder.knocked.extend(knocked)
 
+        if since_token and not sync_result_builder.full_state:
+            sync_config = sync_result_builder.sync_config
+            self._incremental_sync_cache[
+                (user_id, sync_config.device_id)
+            ] = _IncrementalSyncCacheEntry(
+                since_token=since_token,
+                filter_json=sync_config.filter_collection.get_filter_json(),
+                ignored_users=ignored_users,
+                room_stream_ordering=sync_result_builder.now_token.room_key.stream,
+                joined={room.room_id: room for room in sync_result_builder.joined},
+            )
+
         return set(newly_joined_rooms), set(newly_left_rooms)
 
+    def _get_reusable_joined_rooms(
+        self,
+        sync_result_builder: "SyncResultBuilder",
+        ignored_users: FrozenSet[str],
+    ) -> Mapping[str, JoinedSyncResult]:
+        """Returns the joined room results from the device's previous incremental
+        sync which are still valid for this sync.
+
+        A previous result can only be reused if it was calculated from the same
+        since token with the same filter, and the room has not changed since it
+        was calculated. Callers must additionally check that there is no new
+        ephemeral data, account data or tags for the room.
+
+        Does not modify the `sync_result_builder`.
+        """
+        since_token = sync_result_builder.since_token
+        if not since_token or sync_result_builder.full_state:
+            return {}
+
+        sync_config = sync_result_builder.sync_config
+        cache_key = (sync_config.user.to_string(), sync_config.device_id)
+        entry = self._incremental_sync_cache.get(cache_key)
+        if entry is None:
+            return {}
+
+        if (
+            entry.since_token != since_token
+            or entry.filter_json != sync_config.filter_collection.get_filter_json()
+            or entry.ignored_users != ignored_users
+        ):
+            # The client has moved on (or changed what it asks for), so the
+            # previous results are of no further use.
+            self._incremental_sync_cache.pop(cache_key, None)
+            return {}
+
+        return {
+            room_id: room_sync
+            for room_id, room_sync in entry.joined.items()
+            if room_id not in sync_result_builder.forced_newly_joined_room_ids
+            and not self.store.has_room_changed_since(
+                room_id, entry.room_stream_ordering
+            )
+        }
+
     async def _have_rooms_changed(
         self, sync_result_builder: "SyncResultBuilder"
     ) -> bool:
@@ -51,6 +51,10 @@ FEDERATION_TIMEOUT = 60 * 1000
 # How often to resend typing across federation.
 FEDERATION_PING_INTERVAL = 40 * 1000
 
+# How long to collect changes in typing in a room before sending them across
+# federation.
+FEDERATION_AGGREGATION_INTERVAL = 100
+
 
 class FollowerTypingHandler:
     """A typing handler on a different process than the writer that is updated
@@ -83,6 +87,10 @@ class FollowerTypingHandler:
         self.wheel_timer: WheelTimer[RoomMember] = WheelTimer(bucket_size=5000)
         self._latest_room_serial = 0
 
+        # map room IDs to the typing state of local users which is waiting to be
+        # sent to the other servers in the room.
+        self._pending_remote_typing: Dict[str, Dict[str, bool]] = {}
+
         self.clock.looping_call(self._handle_timeouts, 5000)
 
     def _reset(self) -> None:
@@ -131,29 +139,63 @@ class FollowerTypingHandler:
         if not self.federation:
             return
 
-        try:
-            self._member_last_federation_poke[member] = self.clock.time_msec()
+        self._member_last_federation_poke[member] = self.clock.time_msec()
 
-            now = self.clock.time_msec()
-            self.wheel_timer.insert(
-                now=now, obj=member, then=now + FEDERATION_PING_INTERVAL
+        now = self.clock.time_msec()
+        self.wheel_timer.insert(
+            now=now, obj=member, then=now + FEDERATION_PING_INTERVAL
+        )
+
+        # Rather than sending every change straight to every server in the room,
+        # we collect the changes in the room for a short while and then send
+        # them all at once. Only the latest state of each user is sent, so a
+        # user who starts and then stops typing within the interval results in a
+        # single EDU per server.
+        pending = self._pending_remote_typing.get(member.room_id)
+        if pending is None:
+            pending = self._pending_remote_typing[member.room_id] = {}
+            self.clock.call_later(
+                FEDERATION_AGGREGATION_INTERVAL / 1000,
+                run_as_background_process,
+                "typing._send_pending_remote",
+                self._send_pending_remote,
+                member.room_id,
             )
 
+        pending[member.user_id] = typing
+
+    async def _send_pending_remote(self, room_id: str) -> None:
+        """Send the collected changes in typing in the given room to the other
+        servers in the room.
+        """
+        pending = self._pending_remote_typing.pop(room_id, None)
+        if not pending or not self.federation:
+            return
+
+        try:
             hosts = await self._storage_controllers.state.get_current_hosts_in_room(
-                member.room_id
+                room_id
             )
             for domain in hosts:
-                if domain != self.server_name:
-                    logger.debug("sending typing update to %s", domain)
+                if domain == self.server_name:
+                    continue
+
+                logger.debug(
+                    "sending %d typing updates in %s to %s",
+                    len(pending),
+                    room_id,
+                    domain,
+                )
+                for user_id, typing in pending.items():
                     self.federation.build_and_send_edu(
                         destination=domain,
                         edu_type=EduTypes.TYPING,
                         content={
-                            "room_id": member.room_id,
-                            "user_id": member.user_id,
+                            "room_id": room_id,
+                            "user_id": user_id,
                             "typing": typing,
                         },
-                        key=member,
+                        key=RoomMember(room_id, user_id),
                     )
         except Exception:
             logger.exception("Error pushing typing notif to remotes")
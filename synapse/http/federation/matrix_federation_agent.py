@@ -18,8 +18,10 @@ from urllib.request import (  # type: ignore[attr-defined]
     getproxies_environment,
     proxy_bypass_environment,
 )
+from weakref import WeakSet
 
 from netaddr import AddrFormatError, IPAddress, IPSet
+from prometheus_client import Counter, Histogram
 from zope.interface import implementer
 
 from twisted.internet import defer
@@ -42,11 +44,84 @@ from synapse.http.federation.srv_resolver import Server, SrvResolver
 from synapse.http.federation.well_known_resolver import WellKnownResolver
 from synapse.http.proxyagent import ProxyAgent
 from synapse.logging.context import make_deferred_yieldable, run_in_background
+from synapse.metrics import LaterGauge
 from synapse.types import ISynapseReactor
 from synapse.util import Clock
 
 logger = logging.getLogger(__name__)
 
+pool_connection_requests_counter = Counter(
+    "synapse_http_federation_pool_connection_requests",
+    "Number of connections requested from the federation client connection pool",
+)
+
+pool_new_connections_counter = Counter(
+    "synapse_http_federation_pool_new_connections",
+    "Number of new connections made by the federation client connection pool, "
+    "because there was no idle connection to reuse",
+)
+
+pool_dropped_connections_counter = Counter(
+    "synapse_http_federation_pool_dropped_connections",
+    "Number of idle connections closed by the federation client connection pool "
+    "because it already had the maximum number of idle connections to the server",
+)
+
+pool_connect_time = Histogram(
+    "synapse_http_federation_pool_connect_seconds",
+    "Time taken to make new connections to remote servers, including DNS lookups",
+)
+
+
+class _InstrumentedConnectionPool(HTTPConnectionPool):
+    """An `HTTPConnectionPool` which reports metrics on how often connections are
+    reused.
+    """
+
+    def __init__(self, reactor: IReactorCore, persistent: bool = True):
+        super().__init__(reactor, persistent)
+        _connection_pools.add(self)
+
+    def getConnection(
+        self, key: Any, endpoint: IStreamClientEndpoint
+    ) -> defer.Deferred:
+        pool_connection_requests_counter.inc()
+        return super().getConnection(key, endpoint)
+
+    def _newConnection(
+        self, key: Any, endpoint: IStreamClientEndpoint
+    ) -> defer.Deferred:
+        pool_new_connections_counter.inc()
+        start = self._reactor.seconds()
+        d = super()._newConnection(key, endpoint)
+
+        def _observe(result: Any) -> Any:
+            pool_connect_time.observe(self._reactor.seconds() - start)
+            return result
+
+        d.addCallback(_observe)
+        return d
+
+    def _putConnection(self, key: Any, connection: Any) -> None:
+        if len(self._connections.get(key, ())) >= self.maxPersistentPerHost:
+            pool_dropped_connections_counter.inc()
+        super()._putConnection(key, connection)
+
+    def count_idle_connections(self) -> int:
+        return sum(len(connections) for connections in self._connections.values())
+
+
+# All the federation client connection pools, so that the idle connections gauge
+# covers every `MatrixFederationAgent` in the process.
+_connection_pools: "WeakSet[_InstrumentedConnectionPool]" = WeakSet()
+
+LaterGauge(
+    "synapse_http_federation_pool_idle_connections",
+    "Number of idle connections in the federation client connection pools",
+    [],
+    lambda: sum(pool.count_idle_connections() for pool in list(_connection_pools)),
+)
+
 
 @implementer(IAgent)
 class MatrixFederationAgent:
@@ -69,6 +144,12 @@ class MatrixFederationAgent:
 
         ip_blacklist: Disallowed IP addresses.
 
+        max_idle_connections_per_host: The maximum number of idle connections to
+            keep open to each server.
+
+        idle_connection_timeout_ms: How long to keep idle connections open for.
+            Rounded down to whole seconds.
+
         proxy_reactor: twisted reactor to use for connections to the proxy server
            reactor might have some blacklisting applied (i.e. for DNS queries),
            but we need unblocked access to the proxy.
@@ -89,6 +170,8 @@ class MatrixFederationAgent:
         user_agent: bytes,
         ip_whitelist: IPSet,
         ip_blacklist: IPSet,
+        max_idle_connections_per_host: int = 5,
+        idle_connection_timeout_ms: int = 2 * 60 * 1000,
         _srv_resolver: Optional[SrvResolver] = None,
         _well_known_resolver: Optional[WellKnownResolver] = None,
     ):
@@ -100,10 +183,10 @@ class MatrixFederationAgent:
         reactor = BlacklistingReactorWrapper(reactor, ip_whitelist, ip_blacklist)
 
         self._clock = Clock(reactor)
-        self._pool = HTTPConnectionPool(reactor)
+        self._pool = _InstrumentedConnectionPool(reactor)
         self._pool.retryAutomatically = False
-        self._pool.maxPersistentPerHost = 5
-        self._pool.cachedConnectionTimeout = 2 * 60
+        self._pool.maxPersistentPerHost = max_idle_connections_per_host
+        self._pool.cachedConnectionTimeout = idle_connection_timeout_ms // 1000
 
         self._agent = Agent.usingEndpointFactory(
             reactor,
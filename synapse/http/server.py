@@ -59,7 +59,12 @@ from synapse.api.errors import (
 )
 from synapse.config.homeserver import HomeServerConfig
 from synapse.http.site import SynapseRequest
-from synapse.logging.context import defer_to_thread, preserve_fn, run_in_background
+from synapse.logging.context import (
+    defer_to_thread,
+    make_deferred_yieldable,
+    preserve_fn,
+    run_in_background,
+)
 from synapse.logging.opentracing import active_span, start_active_span, trace_servlet
 from synapse.util import json_encoder
 from synapse.util.caches import intern_dict
@@ -808,6 +813,175 @@ def respond_with_json_bytes(
     return NOT_DONE_YET
 
 
+def respond_with_json_chunks(
+    request: SynapseRequest,
+    code: int,
+    json_chunks: Iterator[bytes],
+    send_cors: bool = False,
+) -> Optional[int]:
+    """Sends a JSON response whose body is produced as a series of chunks.
+
+    This is for responses which are too large to comfortably build up in memory in
+    one go: the chunks are written to the client as they are produced, only as
+    fast as the client reads them. Like `respond_with_json`, they are produced on
+    a thread, so that encoding doesn't block the reactor.
+
+    Args:
+        request: The http request to respond to.
+        code: The HTTP response code.
+        json_chunks: An iterator of bytes which together make up the encoded JSON
+            response body. This is consumed on a thread, under a child of the
+            request's logging context.
+        send_cors: Whether to send Cross-Origin Resource Sharing headers
+            https://fetch.spec.whatwg.org/#http-cors-protocol
+
+    Returns:
+        twisted.web.server.NOT_DONE_YET if the request is still active.
+    """
+    # The response code must always be set, for logging purposes.
+    request.setResponseCode(code)
+
+    if request._disconnected:
+        logger.warning(
+            "Not sending response to request %s, already disconnected.", request
+        )
+        return None
+
+    request.setHeader(b"Content-Type", b"application/json")
+    request.setHeader(b"Cache-Control", b"no-cache, no-store, must-revalidate")
+
+    if send_cors:
+        set_cors_headers(request)
+
+    run_in_background(_JsonChunksProducer(request, json_chunks).run)
+    return NOT_DONE_YET
+
+
+@implementer(interfaces.IPushProducer)
+class _JsonChunksProducer:
+    """Writes a JSON response body to the request as it is produced from an
+    iterator of encoded chunks.
+
+    The chunks are pulled from the iterator on a thread, so that encoding them
+    doesn't block the reactor, and each batch is written to the request as soon
+    as it is ready. We stop pulling chunks while the client isn't keeping up.
+    """
+
+    # The minimum number of bytes to pull from the iterator before writing them
+    # to the request. Note that the last write will usually be smaller than this.
+    min_chunk_size = 64 * 1024
+
+    def __init__(self, request: SynapseRequest, json_chunks: Iterator[bytes]):
+        self._request: Optional[SynapseRequest] = request
+        self._json_chunks = json_chunks
+        self._paused = False
+        # Fired when we are resumed or stopped, if we're waiting for that.
+        self._unpaused: Optional["defer.Deferred[None]"] = None
+
+    async def run(self) -> None:
+        """Writes the response, returning once it has been finished."""
+        request = self._request
+        assert request is not None
+
+        try:
+            request.registerProducer(self, True)
+        except AttributeError as e:
+            # See `_ByteProducer`: the connection has been lost.
+            logger.info("Connection disconnected before response was written: %r", e)
+            self._request = None
+            return
+
+        started_writing = False
+        with start_active_span("encode_json_response"):
+            while self._request is not None:
+                if self._paused:
+                    self._unpaused = defer.Deferred()
+                    await make_deferred_yieldable(self._unpaused)
+                    continue
+
+                try:
+                    data = await defer_to_thread(request.reactor, self._next_chunk)
+                except Exception:
+                    f = failure.Failure()
+                    if self._request is not None and not request._disconnected:
+                        self._fail(f, started_writing)
+                    return
+
+                if self._request is None or request._disconnected:
+                    # The client went away while we were encoding.
+                    self._request = None
+                    return
+
+                if data is None:
+                    request.unregisterProducer()
+                    request.finish()
+                    self._request = None
+                    return
+
+                request.write(data)
+                started_writing = True
+
+    def _next_chunk(self) -> Optional[bytes]:
+        """Pull at least `min_chunk_size` bytes from the iterator, unless it runs
+        out. Called on a thread.
+
+        Returns:
+            The bytes, or None if the iterator is exhausted.
+        """
+        buffer = []
+        buffered_bytes = 0
+        for data in self._json_chunks:
+            buffer.append(data)
+            buffered_bytes += len(data)
+            if buffered_bytes >= self.min_chunk_size:
+                break
+
+        if not buffer:
+            return None
+        return b"".join(buffer)
+
+    def _fail(self, f: failure.Failure, started_writing: bool) -> None:
+        """Handle failing to produce the response."""
+        request = self._request
+        assert request is not None
+        self._request = None
+        request.unregisterProducer()
+
+        if not started_writing:
+            return_json_error(f, request, None)
+            return
+
+        # The response code (and some of the body) has already been sent, so
+        # it's too late to send an error. Dropping the connection at least
+        # means the client sees a truncated response, rather than one that
+        # looks complete.
+        logger.error(
+            "Failed to produce response to %r",
+            request,
+            exc_info=(f.type, f.value, f.getTracebackObject()),  # type: ignore[arg-type]
+        )
+        if request.transport is not None:
+            request.transport.abortConnection()
+
+    def pauseProducing(self) -> None:
+        self._paused = True
+
+    def resumeProducing(self) -> None:
+        self._paused = False
+        self._fire_unpaused()
+
+    def stopProducing(self) -> None:
+        # Clear a circular reference.
+        self._request = None
+        self._fire_unpaused()
+
+    def _fire_unpaused(self) -> None:
+        if self._unpaused is not None:
+            d = self._unpaused
+            self._unpaused = None
+            d.callback(None)
+
+
 async def _async_write_json_to_request_in_thread(
     request: SynapseRequest,
     json_encoder: Callable[[Any], bytes],
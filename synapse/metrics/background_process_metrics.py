@@ -324,6 +324,11 @@ class BackgroundProcessLoggingContext(LoggingContext):
         super().__init__("%s-%s" % (name, instance_id))
         self._proc = _BackgroundProcess(name, self)
 
+    @property
+    def process_name(self) -> str:
+        """The name of the background process, without the instance id."""
+        return self._proc.desc
+
     def start(self, rusage: "Optional[resource.struct_rusage]") -> None:
         """Log context has started running (again)."""
 
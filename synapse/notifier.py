@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import logging
 from typing import (
     TYPE_CHECKING,
@@ -29,9 +30,10 @@ from typing import (
 )
 
 import attr
-from prometheus_client import Counter
+from prometheus_client import Counter, Histogram
 
 from twisted.internet import defer
+from twisted.internet.interfaces import IDelayedCall
 
 from synapse.api.constants import EduTypes, EventTypes, HistoryVisibility, Membership
 from synapse.api.errors import AuthError
@@ -66,6 +68,18 @@ users_woken_by_stream_counter = Counter(
     "synapse_notifier_users_woken_by_stream", "", ["stream"]
 )
 
+notifier_fanout_histogram = Histogram(
+    "synapse_notifier_fanout",
+    "Number of user streams with listeners that are woken up by a notification",
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+
+notifier_wakeup_batch_histogram = Histogram(
+    "synapse_notifier_wakeup_batch_size",
+    "Number of user streams woken up in a single reactor iteration",
+    buckets=(1, 5, 10, 50, 100, 500, 1000, 5000, 10000),
+)
+
 T = TypeVar("T")
 
 
@@ -132,6 +146,24 @@ class _NotifierUserStream:
     ) -> None:
         """Notify any listeners for this user of a new event from an
         event source.
+        Args:
+            stream_key: The stream the event came from.
+            stream_id: The new id for the stream the event came from.
+            time_now_ms: The current time in milliseconds.
+        """
+        self.advance(stream_key, stream_id, time_now_ms)
+        self.wake()
+
+    def advance(
+        self,
+        stream_key: str,
+        stream_id: Union[int, RoomStreamToken],
+        time_now_ms: int,
+    ) -> None:
+        """Record a new event from an event source, without waking up any
+        listeners. New listeners that are behind the new token will return
+        immediately, existing ones will return when `wake` is called.
+
         Args:
             stream_key: The stream the event came from.
             stream_id: The new id for the stream the event came from.
@@ -140,7 +172,6 @@ class _NotifierUserStream:
         self.current_token = self.current_token.copy_and_advance(stream_key, stream_id)
         self.last_notified_token = self.current_token
         self.last_notified_ms = time_now_ms
-        notify_deferred = self.notify_deferred
 
         log_kv(
             {
@@ -153,6 +184,10 @@ class _NotifierUserStream:
 
         users_woken_by_stream_counter.labels(stream_key).inc()
 
+    def wake(self) -> None:
+        """Wake up any listeners for this user with the current token."""
+        notify_deferred = self.notify_deferred
+
         with PreserveLoggingContext():
             self.notify_deferred = ObservableDeferred(defer.Deferred())
             notify_deferred.callback(self.current_token)
@@ -244,6 +279,21 @@ class Notifier:
 
         self.state_handler = hs.get_state_handler()
 
+        # User streams which have been notified of new events, but whose
+        # listeners have yet to be woken up. Waking up a listener resumes the
+        # request that is waiting on it, so rather than waking up every member of
+        # a large room in one go we wake them up in batches, spread over several
+        # reactor iterations. Notifications that arrive while streams are
+        # waiting to be woken up are coalesced.
+        self._pending_wakeups: Dict[_NotifierUserStream, None] = {}
+        self._wakeup_call: Optional[IDelayedCall] = None
+        self._wakeup_batch_window_secs = (
+            hs.config.server.notifier_wakeup_batch_window_ms / 1000
+        )
+        self._max_wakeups_per_iteration = (
+            hs.config.server.notifier_max_wakeups_per_iteration
+        )
+
         self.clock.looping_call(
             self.remove_expired_streams, self.UNUSED_STREAM_EXPIRY_MS
         )
@@ -272,6 +322,12 @@ class Notifier:
         LaterGauge(
             "synapse_notifier_users", "", [], lambda: len(self.user_to_user_stream)
         )
+        LaterGauge(
+            "synapse_notifier_pending_wakeups",
+            "",
+            [],
+            lambda: len(self._pending_wakeups),
+        )
 
     def add_replication_callback(self, cb: Callable[[], None]) -> None:
         """Add a callback that will be called when some new data is available.
@@ -331,12 +387,14 @@ class Notifier:
         time_now_ms = self.clock.time_msec()
         for user_stream in user_streams:
             try:
-                user_stream.notify(
+                user_stream.advance(
                     StreamKeyType.UN_PARTIAL_STATED_ROOMS, new_token, time_now_ms
                 )
             except Exception:
                 logger.exception("Failed to notify listener")
 
+        self._wake_user_streams(user_streams)
+
         # Poke the replication so that other workers also see the write to
         # the un-partial-stated rooms stream.
         self.notify_replication()
@@ -498,10 +556,12 @@ class Notifier:
             time_now_ms = self.clock.time_msec()
             for user_stream in user_streams:
                 try:
-                    user_stream.notify(stream_key, new_token, time_now_ms)
+                    user_stream.advance(stream_key, new_token, time_now_ms)
                 except Exception:
                     logger.exception("Failed to notify listener")
 
+            self._wake_user_streams(user_streams)
+
             self.notify_replication()
 
             # Notify appservices.
@@ -516,6 +576,64 @@ class Notifier:
                     "Error notifying application services of ephemeral events"
                 )
 
+    def _wake_user_streams(self, user_streams: Iterable[_NotifierUserStream]) -> None:
+        """Wake up the listeners of the given user streams, which have already
+        been advanced to the new token.
+
+        If there are too many streams to wake up in one go, or a batch window
+        is configured, the streams are queued up to be woken up later.
+        """
+        # There's no need to wake up streams which aren't being listened to.
+        to_wake = [s for s in user_streams if s.count_listeners()]
+        notifier_fanout_histogram.observe(len(to_wake))
+
+        if not to_wake:
+            return
+
+        if not self._pending_wakeups and not self._wakeup_batch_window_secs:
+            # Nothing to coalesce with, so we can wake up the first batch
+            # straight away.
+            self._wake_batch(to_wake[: self._max_wakeups_per_iteration])
+            to_wake = to_wake[self._max_wakeups_per_iteration :]
+            if not to_wake:
+                return
+
+        self._pending_wakeups.update(dict.fromkeys(to_wake))
+
+        if self._wakeup_call is None:
+            self._wakeup_call = self.clock.call_later(
+                self._wakeup_batch_window_secs, self._wake_pending_user_streams
+            )
+
+    def _wake_pending_user_streams(self) -> None:
+        """Wake up the next batch of queued user streams, and schedule waking
+        up any remaining ones on the next reactor iteration.
+        """
+        self._wakeup_call = None
+
+        batch = list(
+            itertools.islice(self._pending_wakeups, self._max_wakeups_per_iteration)
+        )
+        for user_stream in batch:
+            del self._pending_wakeups[user_stream]
+
+        self._wake_batch(batch)
+
+        if self._pending_wakeups:
+            # Let the reactor process other work before waking up the rest.
+            self._wakeup_call = self.clock.call_later(
+                0, self._wake_pending_user_streams
+            )
+
+    def _wake_batch(self, user_streams: Collection[_NotifierUserStream]) -> None:
+        notifier_wakeup_batch_histogram.observe(len(user_streams))
+
+        for user_stream in user_streams:
+            try:
+                user_stream.wake()
+            except Exception:
+                logger.exception("Failed to notify listener")
+
     def on_new_replication_data(self) -> None:
         """Used to inform replication listeners that something has happened
         without waking up any of the normal user event streams"""
@@ -13,12 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import itertools
 import logging
 from typing import (
     TYPE_CHECKING,
     Any,
     Collection,
     Dict,
+    Iterable,
     List,
     Mapping,
     Optional,
@@ -43,10 +45,15 @@ from synapse.events import EventBase, relation_from_event
 from synapse.events.snapshot import EventContext
 from synapse.state import POWER_KEY
 from synapse.storage.databases.main.roommember import EventIdMembership
-from synapse.synapse_rust.push import FilteredPushRules, PushRuleEvaluator
-from synapse.types import JsonValue
+from synapse.synapse_rust.push import (
+    CompiledPushRules,
+    FilteredPushRules,
+    PushRuleEvaluator,
+)
+from synapse.types import JsonValue, UserID
 from synapse.types.state import StateFilter
 from synapse.util.caches import register_cache
+from synapse.util.caches.lrucache import LruCache
 from synapse.util.metrics import measure_func
 from synapse.visibility import filter_event_for_clients_with_state
 
@@ -61,6 +68,15 @@ push_rules_invalidation_counter = Counter(
 push_rules_state_size_counter = Counter(
     "synapse_push_bulk_push_rule_evaluator_push_rules_state_size_counter", ""
 )
+push_rules_evaluations_counter = Counter(
+    "synapse_push_bulk_push_rule_evaluator_evaluations",
+    "Number of times a user's push rules were run against an event",
+)
+push_rules_reused_evaluations_counter = Counter(
+    "synapse_push_bulk_push_rule_evaluator_reused_evaluations",
+    "Number of users whose push actions for an event were taken from the "
+    "evaluation of an identical set of push rules for another user",
+)
 
 
 STATE_EVENT_TYPES_TO_MARK_UNREAD = {
@@ -132,6 +148,26 @@ class BulkPushRuleEvaluator:
             resizable=False,
         )
 
+        # The compiled form of each distinct set of push rules, keyed by the
+        # `id` of the `FilteredPushRules`. We keep a reference to the
+        # `FilteredPushRules` so that its `id` can't be reused by another set
+        # of rules while it is in the cache.
+        self._compiled_push_rules: LruCache[
+            int, Tuple[FilteredPushRules, CompiledPushRules]
+        ] = LruCache(cache_name="compiled_push_rules", max_size=1000)
+
+    def _get_compiled_push_rules(self, rules: FilteredPushRules) -> CompiledPushRules:
+        """Get the compiled form of the given push rules, compiling them if
+        needed.
+        """
+        entry = self._compiled_push_rules.get(id(rules))
+        if entry is not None and entry[0] is rules:
+            return entry[1]
+
+        compiled = CompiledPushRules(rules)
+        self._compiled_push_rules[id(rules)] = (rules, compiled)
+        return compiled
+
     async def _get_rules_for_event(
         self,
         event: EventBase,
@@ -410,11 +446,12 @@ class BulkPushRuleEvaluator:
                     filter(lambda item: isinstance(item, str), user_mentions_raw)
                 )
 
+        flattened_event = _flatten_dict(
+            event,
+            msc3783_escape_event_match_key=self.hs.config.experimental.msc3783_escape_event_match_key,
+        )
         evaluator = PushRuleEvaluator(
-            _flatten_dict(
-                event,
-                msc3783_escape_event_match_key=self.hs.config.experimental.msc3783_escape_event_match_key,
-            ),
+            flattened_event,
             has_mentions,
             user_mentions,
             room_member_count,
@@ -433,6 +470,17 @@ class BulkPushRuleEvaluator:
             event.room_id, users
         )
 
+        # Users with identical push rules (which is most of them, as most users
+        # stick with the defaults) share the same `FilteredPushRules` instance.
+        # Unless a user's ID or display name could be matched by the event, the
+        # outcome for them doesn't depend on who they are, so we only need to
+        # evaluate each distinct set of rules once. These are keyed by the `id`
+        # of the `FilteredPushRules`.
+        user_independent_actions: Dict[int, Collection[Union[Mapping, str]]] = {}
+        user_match_haystack = _get_user_match_haystack(
+            flattened_event, related_events.values()
+        )
+
         for uid, rules in rules_by_user.items():
             if event.sender == uid:
                 continue
@@ -457,7 +505,24 @@ class BulkPushRuleEvaluator:
                 # current user, it'll be added to the dict later.
                 actions_by_user[uid] = []
 
-            actions = evaluator.run(rules, uid, display_name)
+            if _could_match_user(user_match_haystack, user_mentions, uid, display_name):
+                compiled_rules = self._get_compiled_push_rules(rules)
+                actions = compiled_rules.run(evaluator, uid, display_name)
+                push_rules_evaluations_counter.inc()
+            else:
+                cached_actions = user_independent_actions.get(id(rules))
+                if cached_actions is None:
+                    # Passing no user ID or display name means that the
+                    # conditions which depend on them don't match, as would be
+                    # the case if they were passed in.
+                    compiled_rules = self._get_compiled_push_rules(rules)
+                    actions = compiled_rules.run(evaluator, None, None)
+                    user_independent_actions[id(rules)] = actions
+                    push_rules_evaluations_counter.inc()
+                else:
+                    actions = cached_actions
+                    push_rules_reused_evaluations_counter.inc()
+
             if "notify" in actions:
                 # Push rules say we should notify the user of this event
                 actions_by_user[uid] = actions
@@ -499,6 +564,66 @@ RulesByUser = Dict[str, List[Rule]]
 StateGroup = Union[object, int]
 
 
+# Characters which have a special meaning in push rule glob patterns.
+_GLOB_CHARACTERS = frozenset("*?")
+
+
+def _get_user_match_haystack(
+    flattened_event: Mapping[str, JsonValue],
+    flattened_related_events: Iterable[Mapping[str, JsonValue]],
+) -> str:
+    """Get all the string values in an event, and its related events, which push
+    rule conditions could match against, for use with `_could_match_user`.
+    """
+    values: List[str] = []
+    for flattened in itertools.chain((flattened_event,), flattened_related_events):
+        for value in flattened.values():
+            if isinstance(value, str):
+                values.append(value)
+            elif isinstance(value, list):
+                values.extend(v for v in value if isinstance(v, str))
+
+    return "\n".join(values).casefold()
+
+
+def _could_match_user(
+    haystack: str,
+    user_mentions: Collection[str],
+    user_id: str,
+    display_name: Optional[str],
+) -> bool:
+    """Whether any of the push rule conditions which depend on who the user is
+    (their user ID, localpart or display name) could match an event.
+
+    Matching those conditions requires the user ID or display name to appear
+    in the event (case insensitively), unless they contain glob characters, in
+    which case we conservatively assume they could match.
+
+    Args:
+        haystack: The event's values, from `_get_user_match_haystack`.
+        user_mentions: The users mentioned by the event.
+        user_id: The user.
+        display_name: The user's display name, if any.
+    """
+    if user_id in user_mentions:
+        return True
+
+    # The localpart is part of the user ID, so if it doesn't appear in the event
+    # then neither does the user ID.
+    localpart = UserID.from_string(user_id).localpart or user_id
+    for value in (localpart, display_name):
+        if not value:
+            continue
+
+        if not _GLOB_CHARACTERS.isdisjoint(value):
+            return True
+
+        if value.casefold() in haystack:
+            return True
+
+    return False
+
+
 def _is_simple_value(value: Any) -> bool:
     return isinstance(value, (bool, str)) or type(value) is int or value is None
 
@@ -186,11 +186,11 @@ class ReplicationDataHandler:
                     StreamKeyType.TO_DEVICE, token, users=entities
                 )
         elif stream_name == DeviceListsStream.NAME:
-            all_room_ids: Set[str] = set()
-            for row in rows:
-                if row.entity.startswith("@") and not row.is_signature:
-                    room_ids = await self.store.get_rooms_for_user(row.entity)
-                    all_room_ids.update(room_ids)
+            # The stream includes the rooms in which members have changed their
+            # devices, so we don't need to look up the rooms of each user.
+            all_room_ids: Set[str] = {
+                row.entity for row in rows if row.entity.startswith("!")
+            }
             self.notifier.on_new_event(
                 StreamKeyType.DEVICE_LIST, token, rooms=all_room_ids
             )
@@ -458,12 +458,13 @@ class FederationSenderHandler:
         # ... as well as device updates and messages
         elif stream_name == DeviceListsStream.NAME:
             # The entities are either user IDs (starting with '@') whose devices
-            # have changed, or remote servers that we need to tell about
-            # changes.
+            # have changed, room IDs (starting with '!') in which members have
+            # changed their devices, or remote servers that we need to tell
+            # about changes.
             hosts = {
                 row.entity
                 for row in rows
-                if not row.entity.startswith("@") and not row.is_signature
+                if not row.entity.startswith(("@", "!")) and not row.is_signature
             }
             for host in hosts:
                 self.federation_sender.send_device_messages(host, immediate=False)
@@ -13,10 +13,12 @@
 # limitations under the License.
 
 import logging
-from typing import TYPE_CHECKING, Any, Optional
+from typing import TYPE_CHECKING, Any, Collection, Dict, Mapping, Optional
 
 from prometheus_client import Counter, Histogram
 
+from twisted.internet import defer
+
 from synapse.logging import opentracing
 from synapse.logging.context import make_deferred_yieldable
 from synapse.util import json_decoder, json_encoder
@@ -107,6 +109,54 @@ class ExternalCache:
                     )
                 )
 
+    async def set_many(
+        self, cache_name: str, values: Mapping[str, Any], expiry_ms: int
+    ) -> None:
+        """Add the key/values to the named cache, with the expiry time given.
+
+        The requests are pipelined, rather than waiting for each to complete in
+        turn.
+        """
+
+        if self._redis_connection is None or not values:
+            return
+
+        set_counter.labels(cache_name).inc(len(values))
+
+        with opentracing.start_active_span(
+            "ExternalCache.set_many",
+            tags={opentracing.SynapseTags.CACHE_NAME: cache_name},
+        ):
+            with response_timer.labels("set_many").time():
+                await make_deferred_yieldable(
+                    defer.gatherResults(
+                        [
+                            self._redis_connection.set(
+                                self._get_redis_key(cache_name, key),
+                                json_encoder.encode(value),
+                                pexpire=expiry_ms,
+                            )
+                            for key, value in values.items()
+                        ],
+                        consumeErrors=True,
+                    )
+                )
+
+    async def delete(self, cache_name: str, key: str) -> None:
+        """Remove the key from the named cache."""
+
+        if self._redis_connection is None:
+            return
+
+        with opentracing.start_active_span(
+            "ExternalCache.delete",
+            tags={opentracing.SynapseTags.CACHE_NAME: cache_name},
+        ):
+            with response_timer.labels("delete").time():
+                await make_deferred_yieldable(
+                    self._redis_connection.delete(self._get_redis_key(cache_name, key))
+                )
+
     async def get(self, cache_name: str, key: str) -> Optional[Any]:
         """Look up a key/value in the named cache."""
 
@@ -134,3 +184,50 @@ class ExternalCache:
             return result
 
         return json_decoder.decode(result)
+
+    async def get_many(
+        self, cache_name: str, keys: Collection[str], update_metrics: bool = True
+    ) -> Dict[str, Any]:
+        """Look up multiple keys in the named cache, with a single request.
+
+        Args:
+            cache_name: The name of the cache.
+            keys: The keys to look up.
+            update_metrics: Whether to count the hits and misses.
+
+        Returns:
+            A map from key to value, for the keys which were found.
+        """
+
+        if self._redis_connection is None or not keys:
+            return {}
+
+        # Fix the order of the keys so that we can match them up with the results.
+        keys = list(keys)
+
+        with opentracing.start_active_span(
+            "ExternalCache.get_many",
+            tags={opentracing.SynapseTags.CACHE_NAME: cache_name},
+        ):
+            with response_timer.labels("get_many").time():
+                results = await make_deferred_yieldable(
+                    self._redis_connection.mget(
+                        [self._get_redis_key(cache_name, key) for key in keys]
+                    )
+                )
+
+        values = {}
+        for key, result in zip(keys, results):
+            if update_metrics:
+                get_counter.labels(cache_name, result is not None).inc()
+
+            if not result:
+                continue
+
+            # For some reason the integers get magically converted back to integers
+            if isinstance(result, int):
+                values[key] = result
+            else:
+                values[key] = json_decoder.decode(result)
+
+        return values
@@ -456,8 +456,8 @@ class CachesStream(Stream):
 
 
 class DeviceListsStream(Stream):
-    """Either a user has updated their devices or a remote server needs to be
-    told about a device update.
+    """Either a user has updated their devices, or members of a room have, or a
+    remote server needs to be told about a device update.
     """
 
     @attr.s(slots=True, frozen=True, auto_attribs=True)
@@ -506,6 +506,18 @@ class DeviceListsStream(Stream):
         if signatures_limited:
             upper_limit_token = min(upper_limit_token, signatures_to_token)
 
+        # The rooms in which members have changed their devices. A single device
+        # change can be in many rooms, so these are limited too.
+        (
+            room_changes,
+            rooms_to_token,
+            rooms_limited,
+        ) = await self.store.get_all_device_list_room_changes(
+            from_token, upper_limit_token, target_row_count
+        )
+        if rooms_limited:
+            upper_limit_token = min(upper_limit_token, rooms_to_token)
+
         device_updates = [
             (stream_id, (entity, False))
             for stream_id, (entity,) in device_updates
@@ -518,11 +530,24 @@ class DeviceListsStream(Stream):
             if stream_id <= upper_limit_token
         ]
 
+        room_updates = [
+            (stream_id, (room_id, False)) for stream_id, room_id in room_changes
+        ]
+
         updates = list(
-            heapq.merge(device_updates, signatures_updates, key=lambda row: row[0])
+            heapq.merge(
+                device_updates,
+                signatures_updates,
+                room_updates,
+                key=lambda row: row[0],
+            )
         )
 
-        return updates, upper_limit_token, devices_limited or signatures_limited
+        return (
+            updates,
+            upper_limit_token,
+            devices_limited or signatures_limited or rooms_limited,
+        )
 
 
 class ToDeviceStream(Stream):
@@ -14,7 +14,17 @@
 import itertools
 import logging
 from collections import defaultdict
-from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 from synapse.api.constants import EduTypes, Membership, PresenceState
 from synapse.api.errors import Codes, StoreError, SynapseError
@@ -34,12 +44,12 @@ from synapse.handlers.sync import (
     SyncConfig,
     SyncResult,
 )
-from synapse.http.server import HttpServer
+from synapse.http.server import HttpServer, respond_with_json_chunks
 from synapse.http.servlet import RestServlet, parse_boolean, parse_integer, parse_string
 from synapse.http.site import SynapseRequest
 from synapse.logging.opentracing import trace_with_opname
 from synapse.types import JsonDict, StreamToken
-from synapse.util import json_decoder
+from synapse.util import json_decoder, json_encoder
 
 from ._base import client_patterns, set_timeline_upper_limit
 
@@ -102,7 +112,7 @@ class SyncRestServlet(RestServlet):
         self._msc2654_enabled = hs.config.experimental.msc2654_enabled
         self._msc3773_enabled = hs.config.experimental.msc3773_enabled
 
-    async def on_GET(self, request: SynapseRequest) -> Tuple[int, JsonDict]:
+    async def on_GET(self, request: SynapseRequest) -> Optional[Tuple[int, JsonDict]]:
         # This will always be set by the time Twisted calls us.
         assert request.args is not None
 
@@ -204,12 +214,16 @@ class SyncRestServlet(RestServlet):
         time_now = self.clock.time_msec()
         # We know that the the requester has an access token since appservices
         # cannot use sync.
-        response_content = await self.encode_response(
+        response_chunks = await self.encode_response(
             time_now, sync_result, requester.access_token_id, filter_collection
         )
 
-        logger.debug("Event formatting complete")
-        return 200, response_content
+        # The response can be very large (e.g. an initial sync for a user in many
+        # rooms), so we encode it a room at a time rather than building it all up
+        # in memory first. This happens on a thread, so that it doesn't block the
+        # reactor.
+        respond_with_json_chunks(request, 200, response_chunks, send_cors=True)
+        return None
 
     @trace_with_opname("sync.encode_response")
     async def encode_response(
@@ -218,7 +232,15 @@ class SyncRestServlet(RestServlet):
         sync_result: SyncResult,
         access_token_id: Optional[int],
         filter: FilterCollection,
-    ) -> JsonDict:
+    ) -> Iterator[bytes]:
+        """Encode a sync result into our response format.
+
+        The joined and archived rooms, which make up the bulk of the response,
+        are only encoded as the returned iterator is consumed.
+
+        Returns:
+            An iterator of the bytes of the JSON encoded response.
+        """
         logger.debug("Formatting events in sync response")
         if filter.event_format == "client":
             event_formatter = format_event_for_client_v2_without_room_id
@@ -290,16 +312,17 @@ class SyncRestServlet(RestServlet):
             "device_unused_fallback_key_types"
         ] = sync_result.device_unused_fallback_key_types
 
-        if joined:
-            response["rooms"][Membership.JOIN] = joined
+        rooms: Dict[str, Iterable[Tuple[str, JsonDict]]] = {}
+        if sync_result.joined:
+            rooms[Membership.JOIN] = joined
         if invited:
-            response["rooms"][Membership.INVITE] = invited
+            rooms[Membership.INVITE] = invited.items()
         if knocked:
-            response["rooms"][Membership.KNOCK] = knocked
-        if archived:
-            response["rooms"][Membership.LEAVE] = archived
+            rooms[Membership.KNOCK] = knocked.items()
+        if sync_result.archived:
+            rooms[Membership.LEAVE] = archived
 
-        return response
+        return _iterencode_sync_response(response, rooms)
 
     @staticmethod
     def encode_presence(events: List[UserPresenceState], time_now: int) -> JsonDict:
@@ -322,24 +345,34 @@ class SyncRestServlet(RestServlet):
         rooms: List[JoinedSyncResult],
         time_now: int,
         serialize_options: SerializeEventConfig,
-    ) -> JsonDict:
+    ) -> Iterator[Tuple[str, JsonDict]]:
         """
         Encode the joined rooms in a sync result
 
+        Each room is only encoded as the returned iterator is consumed.
+
         Args:
             rooms: list of sync results for rooms this user is joined to
             time_now: current time - used as a baseline for age calculations
             serialize_options: Event serializer options
         Returns:
-            The joined rooms list, in our response format
+            An iterator of room ID and the room in our response format, for each
+            joined room.
         """
-        joined = {}
-        for room in rooms:
-            joined[room.room_id] = await self.encode_room(
-                room, time_now, joined=True, serialize_options=serialize_options
+        prev_batches = await self._get_prev_batch_tokens(rooms)
+        return (
+            (
+                room.room_id,
+                self.encode_room(
+                    room,
+                    time_now,
+                    prev_batch,
+                    joined=True,
+                    serialize_options=serialize_options,
+                ),
             )
-
-        return joined
+            for room, prev_batch in zip(rooms, prev_batches)
+        )
 
     @trace_with_opname("sync.encode_invited")
     async def encode_invited(
@@ -427,29 +460,50 @@ class SyncRestServlet(RestServlet):
         rooms: List[ArchivedSyncResult],
         time_now: int,
         serialize_options: SerializeEventConfig,
-    ) -> JsonDict:
+    ) -> Iterator[Tuple[str, JsonDict]]:
         """
         Encode the archived rooms in a sync result
 
+        Each room is only encoded as the returned iterator is consumed.
+
         Args:
             rooms: list of sync results for rooms this user is joined to
             time_now: current time - used as a baseline for age calculations
             serialize_options: Event serializer options
         Returns:
-            The archived rooms list, in our response format
+            An iterator of room ID and the room in our response format, for each
+            archived room.
         """
-        joined = {}
-        for room in rooms:
-            joined[room.room_id] = await self.encode_room(
-                room, time_now, joined=False, serialize_options=serialize_options
+        prev_batches = await self._get_prev_batch_tokens(rooms)
+        return (
+            (
+                room.room_id,
+                self.encode_room(
+                    room,
+                    time_now,
+                    prev_batch,
+                    joined=False,
+                    serialize_options=serialize_options,
+                ),
             )
+            for room, prev_batch in zip(rooms, prev_batches)
+        )
 
-        return joined
+    async def _get_prev_batch_tokens(
+        self, rooms: Iterable[Union[JoinedSyncResult, ArchivedSyncResult]]
+    ) -> List[str]:
+        """Serialize the timeline prev_batch tokens of the given rooms, in order.
 
-    async def encode_room(
+        This is the only part of encoding a room which needs to wait on the
+        database, so is done up front.
+        """
+        return [await room.timeline.prev_batch.to_string(self.store) for room in rooms]
+
+    def encode_room(
         self,
         room: Union[JoinedSyncResult, ArchivedSyncResult],
         time_now: int,
+        prev_batch: str,
         joined: bool,
         serialize_options: SerializeEventConfig,
     ) -> JsonDict:
@@ -457,6 +511,7 @@ class SyncRestServlet(RestServlet):
         Args:
             room: sync result for a single room
             time_now: current time - used as a baseline for age calculations
+            prev_batch: the serialized prev_batch token of the room's timeline
             token_id: ID of the user's auth token - used for namespacing
                 of transaction IDs
             joined: True if the user is joined to this room - will mean
@@ -498,7 +553,7 @@ class SyncRestServlet(RestServlet):
         result: JsonDict = {
             "timeline": {
                 "events": serialized_timeline,
-                "prev_batch": await room.timeline.prev_batch.to_string(self.store),
+                "prev_batch": prev_batch,
                 "limited": room.timeline.limited,
             },
             "state": {"events": serialized_state},
@@ -523,5 +578,50 @@ class SyncRestServlet(RestServlet):
         return result
 
 
+def _iterencode_sync_response(
+    response: JsonDict, rooms: Dict[str, Iterable[Tuple[str, JsonDict]]]
+) -> Iterator[bytes]:
+    """JSON encode a sync response, one room at a time.
+
+    Args:
+        response: The sync response, excluding the rooms.
+        rooms: Map from membership to the rooms (by room ID) with that
+            membership. Each room is only encoded when it is reached.
+
+    Returns:
+        An iterator of the bytes of the JSON encoded response.
+    """
+    encoded_response = json_encoder.encode(response)
+    if not rooms:
+        yield encoded_response.encode("utf-8")
+        return
+
+    # Splice the rooms in as the last key of the response.
+    assert encoded_response.endswith("}")
+    if encoded_response == "{}":
+        yield b'{"rooms":{'
+    else:
+        yield encoded_response[:-1].encode("utf-8") + b',"rooms":{'
+
+    for membership_index, (membership, rooms_with_membership) in enumerate(
+        rooms.items()
+    ):
+        if membership_index:
+            yield b","
+        yield json_encoder.encode(membership).encode("utf-8") + b":{"
+
+        for room_index, (room_id, room) in enumerate(rooms_with_membership):
+            encoded_room = "%s%s:%s" % (
+                "," if room_index else "",
+                json_encoder.encode(room_id),
+                json_encoder.encode(room),
+            )
+            yield encoded_room.encode("utf-8")
+
+        yield b"}"
+
+    yield b"}}"
+
+
 def register_servlets(hs: "HomeServer", http_server: HttpServer) -> None:
     SyncRestServlet(hs).register(http_server)
@@ -15,6 +15,7 @@
 
 import logging
 import os
+import re
 import urllib
 from abc import ABC, abstractmethod
 from types import TracebackType
@@ -268,10 +269,36 @@ async def respond_with_responder(
             return
 
         logger.debug("Responding to media request with responder %s", responder)
-        add_file_headers(request, media_type, file_size, upload_name)
-        try:
 
-            await responder.write_to_consumer(request)
+        byte_range = None
+        if responder.supports_ranges and file_size is not None:
+            request.setHeader(b"Accept-Ranges", b"bytes")
+            try:
+                byte_range = _parse_range_header(request, file_size)
+            except _RangeNotSatisfiable:
+                request.setHeader(b"Content-Range", b"bytes */%d" % (file_size,))
+                respond_with_json(
+                    request,
+                    416,
+                    cs_error("Requested range not satisfiable", code=Codes.UNKNOWN),
+                    send_cors=True,
+                )
+                return
+
+        try:
+            if byte_range is None:
+                add_file_headers(request, media_type, file_size, upload_name)
+                await responder.write_to_consumer(request)
+            else:
+                assert file_size is not None
+                start, length = byte_range
+                request.setResponseCode(206)
+                add_file_headers(request, media_type, length, upload_name)
+                request.setHeader(
+                    b"Content-Range",
+                    b"bytes %d-%d/%d" % (start, start + length - 1, file_size),
+                )
+                await responder.write_range_to_consumer(request, start, length)
         except Exception as e:
             # The majority of the time this will be due to the client having gone
             # away. Unfortunately, Twisted simply throws a generic exception at us
@@ -285,6 +312,62 @@ async def respond_with_responder(
     finish_request(request)
 
 
+# Matches a `Range` header requesting a single range of bytes.
+_SINGLE_BYTE_RANGE_RE = re.compile(rb"\s*bytes\s*=\s*(\d+)?\s*-\s*(\d+)?\s*", re.I)
+
+
+class _RangeNotSatisfiable(Exception):
+    """The `Range` header of a request doesn't overlap the requested file."""
+
+
+def _parse_range_header(request: Request, file_size: int) -> Optional[Tuple[int, int]]:
+    """Parses the `Range` header of a media download request.
+
+    Only a single byte range is supported; requests for multiple ranges, or
+    conditional range requests (with an `If-Range` header, which we don't
+    evaluate), get the whole file instead, as the HTTP spec allows.
+
+    Args:
+        request: The download request.
+        file_size: The size of the requested file in bytes.
+
+    Returns:
+        The start and length of the requested range, or None if the whole file
+        should be sent.
+
+    Raises:
+        _RangeNotSatisfiable: if the requested range doesn't overlap the file.
+    """
+    range_header = request.getHeader(b"Range")
+    if range_header is None or request.getHeader(b"If-Range") is not None:
+        return None
+
+    match = _SINGLE_BYTE_RANGE_RE.fullmatch(range_header)
+    if match is None:
+        # Multiple ranges, other units and invalid headers are all ignored.
+        return None
+
+    first, last = match.groups()
+    if first is None:
+        # A suffix range, i.e. the last N bytes of the file.
+        if last is None:
+            return None
+        suffix_length = int(last)
+        if suffix_length == 0 or file_size == 0:
+            raise _RangeNotSatisfiable()
+        start = max(file_size - suffix_length, 0)
+        return start, file_size - start
+
+    start = int(first)
+    if last is not None and int(last) < start:
+        return None
+    if start >= file_size:
+        raise _RangeNotSatisfiable()
+
+    end = file_size - 1 if last is None else min(int(last), file_size - 1)
+    return start, end - start + 1
+
+
 class Responder(ABC):
     """Represents a response that can be streamed to the requester.
 
@@ -292,6 +375,10 @@ class Responder(ABC):
     held can be cleaned up.
     """
 
+    # Whether `write_range_to_consumer` is implemented, and so range requests
+    # can be served with this responder.
+    supports_ranges = False
+
     @abstractmethod
     def write_to_consumer(self, consumer: IConsumer) -> Awaitable:
         """Stream response into consumer
@@ -304,6 +391,22 @@ class Responder(ABC):
         """
         raise NotImplementedError()
 
+    def write_range_to_consumer(
+        self, consumer: IConsumer, start: int, length: int
+    ) -> Awaitable:
+        """Stream part of the response into consumer. Only called if
+        `supports_ranges` is True.
+
+        Args:
+            consumer: The consumer to stream into.
+            start: The offset of the first byte to write.
+            length: The number of bytes to write.
+
+        Returns:
+            Resolves once the range has finished being written
+        """
+        raise NotImplementedError()
+
     def __enter__(self) -> None:  # noqa: B027
         pass
 
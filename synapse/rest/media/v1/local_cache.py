@@ -0,0 +1,175 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import logging
+import os
+from typing import TYPE_CHECKING, List, Set
+
+from prometheus_client import Counter, Gauge
+
+from twisted.internet.defer import Deferred
+
+from synapse.metrics.background_process_metrics import run_as_background_process
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+local_cache_hits = Counter(
+    "synapse_media_local_cache_hits",
+    "Number of media files fetched from the local media store",
+)
+
+local_cache_misses = Counter(
+    "synapse_media_local_cache_misses",
+    "Number of media files which had to be fetched from a storage provider",
+)
+
+local_cache_evicted_files = Counter(
+    "synapse_media_local_cache_evicted_files",
+    "Number of media files removed from the local media cache",
+)
+
+local_cache_evicted_bytes = Counter(
+    "synapse_media_local_cache_evicted_bytes",
+    "Total size of the media files removed from the local media cache",
+)
+
+local_cache_size_bytes = Gauge(
+    "synapse_media_local_cache_size_bytes",
+    "Total size of the media files in the local media cache, as of the last eviction run",
+)
+
+# How often to write the access times of files in the cache to the database.
+UPDATE_RECENTLY_ACCESSED_MS = 60 * 1000  # 1 minute
+
+# How often to check whether the cache is over its size limit.
+EVICTION_CHECK_PERIOD_MS = 5 * 60 * 1000  # 5 minutes
+
+# How many files to fetch from the database at once when evicting.
+EVICTION_BATCH_SIZE = 500
+
+
+class LocalMediaCache:
+    """Tracks the files in the local media store which are also held by a storage
+    provider, and removes the least recently accessed of them from local disk when
+    they take up more than the configured size. They can then be fetched back
+    from a storage provider when needed.
+
+    Args:
+        hs
+        local_media_directory: Base path where we store media on disk
+        max_size: The maximum total size in bytes of the files in the cache
+    """
+
+    def __init__(self, hs: "HomeServer", local_media_directory: str, max_size: int):
+        self.clock = hs.get_clock()
+        self.store = hs.get_datastores().main
+        self.local_media_directory = local_media_directory
+        self.max_size = max_size
+
+        # Relative paths of the files accessed since we last updated the database.
+        self._recently_accessed: Set[str] = set()
+
+        self.clock.looping_call(
+            self._start_update_recently_accessed, UPDATE_RECENTLY_ACCESSED_MS
+        )
+
+        # As the media store may be shared between instances, we only evict files
+        # from the instance that runs the media background jobs.
+        instance_running_jobs = hs.config.media.media_instance_running_background_jobs
+        if instance_running_jobs is None or (
+            instance_running_jobs == hs.get_instance_name()
+        ):
+            self.clock.looping_call(self._start_evict, EVICTION_CHECK_PERIOD_MS)
+
+    def _start_update_recently_accessed(self) -> Deferred:
+        return run_as_background_process(
+            "update_recently_accessed_local_cache_media",
+            self._update_recently_accessed,
+        )
+
+    def _start_evict(self) -> Deferred:
+        return run_as_background_process("evict_local_cache_media", self.evict)
+
+    async def add(self, path: str) -> None:
+        """Record that the given file in the local media store is also held by a
+        storage provider.
+
+        Args:
+            path: The path of the file, relative to the media store.
+        """
+        size = os.path.getsize(os.path.join(self.local_media_directory, path))
+        await self.store.add_media_to_local_cache(path, size, self.clock.time_msec())
+
+    def mark_accessed(self, path: str) -> None:
+        """Mark the given file in the local media store as recently accessed.
+
+        Args:
+            path: The path of the file, relative to the media store.
+        """
+        self._recently_accessed.add(path)
+
+    async def _update_recently_accessed(self) -> None:
+        paths = self._recently_accessed
+        self._recently_accessed = set()
+
+        await self.store.update_local_cache_last_access_time(
+            paths, self.clock.time_msec()
+        )
+
+    async def evict(self) -> None:
+        """Remove the least recently accessed files from local disk until the
+        cache is within its size limit.
+        """
+        total_size = await self.store.get_local_cache_size()
+
+        while total_size > self.max_size:
+            candidates = await self.store.get_least_recently_used_local_cache_media(
+                EVICTION_BATCH_SIZE
+            )
+
+            evicted: List[str] = []
+            for path, size in candidates:
+                if total_size <= self.max_size:
+                    break
+
+                if path in self._recently_accessed:
+                    # The access time in the database is out of date.
+                    continue
+
+                full_path = os.path.join(self.local_media_directory, path)
+                try:
+                    os.remove(full_path)
+                except FileNotFoundError:
+                    # It has already been deleted, e.g. by the media retention
+                    # rules, so we just need to forget about it.
+                    pass
+                except OSError as e:
+                    logger.warning("Failed to remove file: %r: %s", full_path, e)
+                    continue
+
+                evicted.append(path)
+                total_size -= size
+                local_cache_evicted_files.inc()
+                local_cache_evicted_bytes.inc(size)
+
+            if not evicted:
+                # Everything left is in use or can't be removed.
+                break
+
+            await self.store.remove_media_from_local_cache(evicted)
+
+        logger.debug("Local media cache is using %d bytes", total_size)
+        local_cache_size_bytes.set(total_size)
@@ -36,7 +36,6 @@ from synapse.config._base import ConfigError
 from synapse.config.repository import ThumbnailRequirement
 from synapse.http.server import UnrecognizedRequestResource
 from synapse.http.site import SynapseRequest
-from synapse.logging.context import defer_to_thread
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.types import UserID
 from synapse.util.async_helpers import Linearizer
@@ -54,11 +53,11 @@ from ._base import (
 from .config_resource import MediaConfigResource
 from .download_resource import DownloadResource
 from .filepath import MediaFilePaths
-from .media_storage import MediaStorage
+from .media_storage import FileResponder, MediaStorage
 from .preview_url_resource import PreviewUrlResource
 from .storage_provider import StorageProviderWrapper
 from .thumbnail_resource import ThumbnailResource
-from .thumbnailer import Thumbnailer, ThumbnailError
+from .thumbnailer import Thumbnailer, ThumbnailError, ThumbnailPool
 from .upload_resource import UploadResource
 
 if TYPE_CHECKING:
@@ -86,12 +85,14 @@ class MediaRepository:
         self.max_image_pixels = hs.config.media.max_image_pixels
 
         Thumbnailer.set_limits(self.max_image_pixels)
+        FileResponder.set_use_sendfile(hs.config.media.media_use_sendfile)
 
         self.primary_base_path: str = hs.config.media.media_store_path
         self.filepaths: MediaFilePaths = MediaFilePaths(self.primary_base_path)
 
         self.dynamic_thumbnails = hs.config.media.dynamic_thumbnails
         self.thumbnail_requirements = hs.config.media.thumbnail_requirements
+        self._thumbnail_pool = ThumbnailPool(hs)
 
         self.remote_media_linearizer = Linearizer(name="media_remote")
 
@@ -530,38 +531,37 @@ class MediaRepository:
             media_type = media_type[:scpos]
         return self.thumbnail_requirements.get(media_type, ())
 
-    def _generate_thumbnail(
+    async def _generate_exact_thumbnail(
         self,
-        thumbnailer: Thumbnailer,
+        input_path: str,
         t_width: int,
         t_height: int,
         t_method: str,
         t_type: str,
     ) -> Optional[BytesIO]:
-        m_width = thumbnailer.width
-        m_height = thumbnailer.height
+        """Generate a single thumbnail of the image at the given path.
 
-        if m_width * m_height >= self.max_image_pixels:
-            logger.info(
-                "Image too large to thumbnail %r x %r > %r",
-                m_width,
-                m_height,
-                self.max_image_pixels,
-            )
-            return None
-
-        if thumbnailer.transpose_method is not None:
-            m_width, m_height = thumbnailer.transpose()
+        Returns:
+            The bytes of the thumbnail, or None if one could not be generated.
 
-        if t_method == "crop":
-            return thumbnailer.crop(t_width, t_height, t_type)
-        elif t_method == "scale":
-            t_width, t_height = thumbnailer.aspect(t_width, t_height)
-            t_width = min(m_width, t_width)
-            t_height = min(m_height, t_height)
-            return thumbnailer.scale(t_width, t_height, t_type)
+        Raises:
+            ThumbnailError if the image could not be opened.
+        """
+        generated = await self._thumbnail_pool.generate_thumbnails(
+            input_path,
+            [
+                ThumbnailRequirement(
+                    width=t_width, height=t_height, method=t_method, media_type=t_type
+                )
+            ],
+        )
+        if not generated or not generated.thumbnails:
+            return None
 
-        return None
+        # The dimensions of a scaled thumbnail may not match those requested, but
+        # it is stored (and served) as the requested ones.
+        ((_, thumbnail_bytes),) = generated.thumbnails.values()
+        return BytesIO(thumbnail_bytes)
 
     async def generate_local_exact_thumbnail(
         self,
@@ -577,7 +577,9 @@ class MediaRepository:
         )
 
         try:
-            thumbnailer = Thumbnailer(input_path)
+            t_byte_source = await self._generate_exact_thumbnail(
+                input_path, t_width, t_height, t_method, t_type
+            )
         except ThumbnailError as e:
             logger.warning(
                 "Unable to generate a thumbnail for local media %s using a method of %s and type of %s: %s",
@@ -588,17 +590,6 @@ class MediaRepository:
             )
             return None
 
-        with thumbnailer:
-            t_byte_source = await defer_to_thread(
-                self.hs.get_reactor(),
-                self._generate_thumbnail,
-                thumbnailer,
-                t_width,
-                t_height,
-                t_method,
-                t_type,
-            )
-
         if t_byte_source:
             try:
                 file_info = FileInfo(
@@ -647,7 +638,9 @@ class MediaRepository:
         )
 
         try:
-            thumbnailer = Thumbnailer(input_path)
+            t_byte_source = await self._generate_exact_thumbnail(
+                input_path, t_width, t_height, t_method, t_type
+            )
         except ThumbnailError as e:
             logger.warning(
                 "Unable to generate a thumbnail for remote media %s from %s using a method of %s and type of %s: %s",
@@ -659,17 +652,6 @@ class MediaRepository:
             )
             return None
 
-        with thumbnailer:
-            t_byte_source = await defer_to_thread(
-                self.hs.get_reactor(),
-                self._generate_thumbnail,
-                thumbnailer,
-                t_width,
-                t_height,
-                t_method,
-                t_type,
-            )
-
         if t_byte_source:
             try:
                 file_info = FileInfo(
@@ -741,7 +723,9 @@ class MediaRepository:
         )
 
         try:
-            thumbnailer = Thumbnailer(input_path)
+            generated = await self._thumbnail_pool.generate_thumbnails(
+                input_path, requirements
+            )
         except ThumbnailError as e:
             logger.warning(
                 "Unable to generate thumbnails for remote media %s from %s of type %s: %s",
@@ -752,136 +736,79 @@ class MediaRepository:
             )
             return None
 
-        with thumbnailer:
-            m_width = thumbnailer.width
-            m_height = thumbnailer.height
-
-            if m_width * m_height >= self.max_image_pixels:
-                logger.info(
-                    "Image too large to thumbnail %r x %r > %r",
-                    m_width,
-                    m_height,
-                    self.max_image_pixels,
-                )
-                return None
-
-            if thumbnailer.transpose_method is not None:
-                m_width, m_height = await defer_to_thread(
-                    self.hs.get_reactor(), thumbnailer.transpose
-                )
-
-            # We deduplicate the thumbnail sizes by ignoring the cropped versions if
-            # they have the same dimensions of a scaled one.
-            thumbnails: Dict[Tuple[int, int, str], str] = {}
-            for requirement in requirements:
-                if requirement.method == "crop":
-                    thumbnails.setdefault(
-                        (requirement.width, requirement.height, requirement.media_type),
-                        requirement.method,
-                    )
-                elif requirement.method == "scale":
-                    t_width, t_height = thumbnailer.aspect(
-                        requirement.width, requirement.height
-                    )
-                    t_width = min(m_width, t_width)
-                    t_height = min(m_height, t_height)
-                    thumbnails[
-                        (t_width, t_height, requirement.media_type)
-                    ] = requirement.method
-
-            # Now we generate the thumbnails for each dimension, store it
-            for (t_width, t_height, t_type), t_method in thumbnails.items():
-                # Generate the thumbnail
-                if t_method == "crop":
-                    t_byte_source = await defer_to_thread(
-                        self.hs.get_reactor(),
-                        thumbnailer.crop,
-                        t_width,
-                        t_height,
-                        t_type,
-                    )
-                elif t_method == "scale":
-                    t_byte_source = await defer_to_thread(
-                        self.hs.get_reactor(),
-                        thumbnailer.scale,
-                        t_width,
-                        t_height,
-                        t_type,
-                    )
-                else:
-                    logger.error("Unrecognized method: %r", t_method)
-                    continue
-
-                if not t_byte_source:
-                    continue
+        if generated is None:
+            return None
 
-                file_info = FileInfo(
-                    server_name=server_name,
-                    file_id=file_id,
-                    url_cache=url_cache,
-                    thumbnail=ThumbnailInfo(
-                        width=t_width,
-                        height=t_height,
-                        method=t_method,
-                        type=t_type,
-                    ),
-                )
+        # Now we store each of the generated thumbnails.
+        for key, (t_method, thumbnail_bytes) in generated.thumbnails.items():
+            t_width, t_height, t_type = key
+            t_byte_source = BytesIO(thumbnail_bytes)
+
+            file_info = FileInfo(
+                server_name=server_name,
+                file_id=file_id,
+                url_cache=url_cache,
+                thumbnail=ThumbnailInfo(
+                    width=t_width,
+                    height=t_height,
+                    method=t_method,
+                    type=t_type,
+                ),
+            )
 
-                with self.media_storage.store_into_file(file_info) as (
-                    f,
-                    fname,
-                    finish,
-                ):
+            with self.media_storage.store_into_file(file_info) as (
+                f,
+                fname,
+                finish,
+            ):
+                try:
+                    await self.media_storage.write_to_file(t_byte_source, f)
+                    await finish()
+                finally:
+                    t_byte_source.close()
+
+                t_len = os.path.getsize(fname)
+
+                # Write to database
+                if server_name:
+                    # Multiple remote media download requests can race (when
+                    # using multiple media repos), so this may throw a violation
+                    # constraint exception. If it does we'll delete the newly
+                    # generated thumbnail from disk (as we're in the ctx
+                    # manager).
+                    #
+                    # However: we've already called `finish()` so we may have
+                    # also written to the storage providers. This is preferable
+                    # to the alternative where we call `finish()` *after* this,
+                    # where we could end up having an entry in the DB but fail
+                    # to write the files to the storage providers.
                     try:
-                        await self.media_storage.write_to_file(t_byte_source, f)
-                        await finish()
-                    finally:
-                        t_byte_source.close()
-
-                    t_len = os.path.getsize(fname)
-
-                    # Write to database
-                    if server_name:
-                        # Multiple remote media download requests can race (when
-                        # using multiple media repos), so this may throw a violation
-                        # constraint exception. If it does we'll delete the newly
-                        # generated thumbnail from disk (as we're in the ctx
-                        # manager).
-                        #
-                        # However: we've already called `finish()` so we may have
-                        # also written to the storage providers. This is preferable
-                        # to the alternative where we call `finish()` *after* this,
-                        # where we could end up having an entry in the DB but fail
-                        # to write the files to the storage providers.
-                        try:
-                            await self.store.store_remote_media_thumbnail(
-                                server_name,
-                                media_id,
-                                file_id,
-                                t_width,
-                                t_height,
-                                t_type,
-                                t_method,
-                                t_len,
-                            )
-                        except Exception as e:
-                            thumbnail_exists = (
-                                await self.store.get_remote_media_thumbnail(
-                                    server_name,
-                                    media_id,
-                                    t_width,
-                                    t_height,
-                                    t_type,
-                                )
-                            )
-                            if not thumbnail_exists:
-                                raise e
-                    else:
-                        await self.store.store_local_thumbnail(
-                            media_id, t_width, t_height, t_type, t_method, t_len
+                        await self.store.store_remote_media_thumbnail(
+                            server_name,
+                            media_id,
+                            file_id,
+                            t_width,
+                            t_height,
+                            t_type,
+                            t_method,
+                            t_len,
                         )
+                    except Exception as e:
+                        thumbnail_exists = await self.store.get_remote_media_thumbnail(
+                            server_name,
+                            media_id,
+                            t_width,
+                            t_height,
+                            t_type,
+                        )
+                        if not thumbnail_exists:
+                            raise e
+                else:
+                    await self.store.store_local_thumbnail(
+                        media_id, t_width, t_height, t_type, t_method, t_len
+                    )
 
-        return {"width": m_width, "height": m_height}
+        return {"width": generated.width, "height": generated.height}
 
     async def _apply_media_retention_rules(self) -> None:
         """
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import contextlib
+import io
 import logging
 import os
 import shutil
@@ -38,12 +39,16 @@ from twisted.protocols.basic import FileSender
 
 import synapse
 from synapse.api.errors import NotFoundError
+from synapse.http.site import SynapseRequest
 from synapse.logging.context import defer_to_thread, make_deferred_yieldable
 from synapse.util import Clock
 from synapse.util.file_consumer import BackgroundFileConsumer
+from synapse.util.stringutils import random_string
 
 from ._base import FileInfo, Responder
 from .filepath import MediaFilePaths
+from .local_cache import LocalMediaCache, local_cache_hits, local_cache_misses
+from .sendfile import can_sendfile, sendfile_to_request
 
 if TYPE_CHECKING:
     from synapse.rest.media.v1.storage_provider import StorageProvider
@@ -77,6 +82,12 @@ class MediaStorage:
         self.spam_checker = hs.get_spam_checker()
         self.clock = hs.get_clock()
 
+        self.local_cache: Optional[LocalMediaCache] = None
+        if hs.config.media.media_local_cache_size is not None:
+            self.local_cache = LocalMediaCache(
+                hs, local_media_directory, hs.config.media.media_local_cache_size
+            )
+
     async def store_file(self, source: IO, file_info: FileInfo) -> str:
         """Write `source` to the on disk media store, and also any other
         configured storage providers
@@ -160,6 +171,14 @@ class MediaStorage:
                     for provider in self.storage_providers:
                         await provider.store_file(path, file_info)
 
+                    # Once a provider definitely has the file, it can be evicted
+                    # from local disk.
+                    if self.local_cache and any(
+                        provider.stores_synchronously(file_info)
+                        for provider in self.storage_providers
+                    ):
+                        await self.local_cache.add(path)
+
                     finished_called[0] = True
 
                 yield f, fname, finish
@@ -200,15 +219,39 @@ class MediaStorage:
 
         for path in paths:
             local_path = os.path.join(self.local_media_directory, path)
-            if os.path.exists(local_path):
-                logger.debug("responding with local file %s", local_path)
-                return FileResponder(open(local_path, "rb"))
-            logger.debug("local file %s did not exist", local_path)
+            try:
+                # We don't check whether the file exists first, as it could be
+                # evicted from the local cache before we open it.
+                open_file = open(local_path, "rb")
+            except FileNotFoundError:
+                logger.debug("local file %s did not exist", local_path)
+                continue
+
+            logger.debug("responding with local file %s", local_path)
+            self._mark_local_hit(path)
+            return FileResponder(open_file)
+
+        if self.storage_providers:
+            local_cache_misses.inc()
 
         for provider in self.storage_providers:
             for path in paths:
                 res: Any = await provider.fetch(path, file_info)
                 if res:
+                    if self.local_cache:
+                        # Keep a copy on local disk, so that the media is
+                        # quicker to fetch while it is being accessed.
+                        local_path = os.path.join(self.local_media_directory, path)
+                        await self._copy_to_local_cache(res, path, local_path)
+                        try:
+                            return FileResponder(open(local_path, "rb"))
+                        except FileNotFoundError:
+                            # It has been evicted again already, so stream it
+                            # from the storage provider after all.
+                            res = await provider.fetch(path, file_info)
+                            if not res:
+                                continue
+
                     logger.debug("Streaming %s from %s", path, provider)
                     return res
                 logger.debug("%s not found on %s", path, provider)
@@ -228,6 +271,7 @@ class MediaStorage:
         path = self._file_info_to_path(file_info)
         local_path = os.path.join(self.local_media_directory, path)
         if os.path.exists(local_path):
+            self._mark_local_hit(path)
             return local_path
 
         # Fallback for paths without method names
@@ -242,24 +286,57 @@ class MediaStorage:
             )
             legacy_local_path = os.path.join(self.local_media_directory, legacy_path)
             if os.path.exists(legacy_local_path):
+                self._mark_local_hit(legacy_path)
                 return legacy_local_path
 
-        dirname = os.path.dirname(local_path)
-        os.makedirs(dirname, exist_ok=True)
+        if self.storage_providers:
+            local_cache_misses.inc()
 
         for provider in self.storage_providers:
             res: Any = await provider.fetch(path, file_info)
             if res:
-                with res:
-                    consumer = BackgroundFileConsumer(
-                        open(local_path, "wb"), self.reactor
-                    )
-                    await res.write_to_consumer(consumer)
-                    await consumer.wait()
+                await self._copy_to_local_cache(res, path, local_path)
                 return local_path
 
         raise NotFoundError()
 
+    def _mark_local_hit(self, path: str) -> None:
+        """Called when a file is found in the local media store."""
+        local_cache_hits.inc()
+        if self.local_cache:
+            self.local_cache.mark_accessed(path)
+
+    async def _copy_to_local_cache(
+        self, responder: Responder, path: str, local_path: str
+    ) -> None:
+        """Writes a file fetched from a storage provider to the local media store.
+
+        Args:
+            responder: The responder returned by the storage provider.
+            path: The path of the file, relative to the media store.
+            local_path: The full path to write the file to.
+        """
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+
+        # Write to a temporary file first, so that a failed download doesn't
+        # leave a truncated file in the media store.
+        temp_path = "%s.%s.tmp" % (local_path, random_string(8))
+        try:
+            with responder:
+                consumer = BackgroundFileConsumer(open(temp_path, "wb"), self.reactor)
+                await responder.write_to_consumer(consumer)
+                await consumer.wait()
+            os.replace(temp_path, local_path)
+        except Exception:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+        if self.local_cache:
+            await self.local_cache.add(path)
+
     def _file_info_to_path(self, file_info: FileInfo) -> str:
         """Converts file_info into a relative path.
 
@@ -322,14 +399,73 @@ class FileResponder(Responder):
             is closed when finished streaming.
     """
 
+    supports_ranges = True
+
+    # Whether large files may be sent with `os.sendfile`. Set from the config by
+    # the `MediaRepository`.
+    _use_sendfile = False
+
+    @classmethod
+    def set_use_sendfile(cls, use_sendfile: bool) -> None:
+        cls._use_sendfile = use_sendfile
+
     def __init__(self, open_file: IO):
         self.open_file = open_file
 
     def write_to_consumer(self, consumer: IConsumer) -> Deferred:
+        if isinstance(consumer, SynapseRequest) and self._can_sendfile(
+            consumer, 0, None
+        ):
+            return self._sendfile(consumer, 0, None)
+
         return make_deferred_yieldable(
             FileSender().beginFileTransfer(self.open_file, consumer)
         )
 
+    def write_range_to_consumer(
+        self, consumer: IConsumer, start: int, length: int
+    ) -> Deferred:
+        if isinstance(consumer, SynapseRequest) and self._can_sendfile(
+            consumer, start, length
+        ):
+            return self._sendfile(consumer, start, length)
+
+        self.open_file.seek(start)
+        return make_deferred_yieldable(
+            FileSender().beginFileTransfer(
+                _BoundedReader(self.open_file, length), consumer
+            )
+        )
+
+    def _can_sendfile(
+        self, request: SynapseRequest, start: int, length: Optional[int]
+    ) -> bool:
+        if not self._use_sendfile:
+            return False
+
+        try:
+            file_size = os.fstat(self.open_file.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            # Not a real file.
+            return False
+
+        if length is None:
+            length = file_size - start
+        elif start + length > file_size:
+            return False
+
+        return can_sendfile(request, length)
+
+    def _sendfile(
+        self, request: SynapseRequest, start: int, length: Optional[int]
+    ) -> Deferred:
+        if length is None:
+            length = os.fstat(self.open_file.fileno()).st_size - start
+
+        return make_deferred_yieldable(
+            sendfile_to_request(request, self.open_file.fileno(), start, length)
+        )
+
     def __exit__(
         self,
         exc_type: Optional[Type[BaseException]],
@@ -372,3 +508,20 @@ class ReadableFileWrapper:
 
                 # We yield to the reactor by sleeping for 0 seconds.
                 await self.clock.sleep(0)
+
+
+class _BoundedReader:
+    """Wraps a file like object so that at most `length` bytes can be read from
+    it.
+    """
+
+    def __init__(self, open_file: IO, length: int):
+        self._open_file = open_file
+        self._remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._open_file.read(size)
+        self._remaining -= len(data)
+        return data
@@ -15,13 +15,14 @@
 import datetime
 import errno
 import fnmatch
+import hashlib
 import logging
 import os
 import re
 import shutil
 import sys
 import traceback
-from typing import TYPE_CHECKING, BinaryIO, Iterable, Optional, Tuple
+from typing import TYPE_CHECKING, BinaryIO, Iterable, Optional, Tuple, Union, cast
 from urllib.parse import urljoin, urlparse, urlsplit
 from urllib.request import urlopen
 
@@ -29,6 +30,7 @@ import attr
 
 from twisted.internet.defer import Deferred
 from twisted.internet.error import DNSLookupError
+from twisted.python.failure import Failure
 
 from synapse.api.errors import Codes, SynapseError
 from synapse.http.client import SimpleHttpClient
@@ -39,7 +41,11 @@ from synapse.http.server import (
 )
 from synapse.http.servlet import parse_integer, parse_string
 from synapse.http.site import SynapseRequest
-from synapse.logging.context import make_deferred_yieldable, run_in_background
+from synapse.logging.context import (
+    defer_to_thread,
+    make_deferred_yieldable,
+    run_in_background,
+)
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.rest.media.v1._base import get_filename_from_headers
 from synapse.rest.media.v1.media_storage import MediaStorage
@@ -141,17 +147,21 @@ class PreviewUrlResource(DirectServeJsonResource):
           1. Generates thumbnails.
           2. Generates an Open Graph response based on image properties.
        5. If the media is HTML:
-          1. Decodes the HTML via the stored file.
+          1. Decodes the HTML via the stored file, in a separate thread.
           2. Generates an Open Graph response from the HTML.
           3. If a JSON oEmbed URL was found in the HTML via autodiscovery:
-             1. Downloads the URL and stores it into a file via the media storage provider
+             1. Starts downloading the image from the HTML's Open Graph response (if
+                any) in the background.
+             2. Downloads the URL and stores it into a file via the media storage provider
                 and saves the local media metadata.
-             2. Convert the oEmbed response to an Open Graph response.
-             3. Override any Open Graph data from the HTML with data from oEmbed.
+             3. Convert the oEmbed response to an Open Graph response.
+             4. Override any Open Graph data from the HTML with data from oEmbed.
           4. If an image exists in the Open Graph response:
              1. Downloads the URL and stores it into a file via the media storage
-                provider and saves the local media metadata.
-             2. Generates thumbnails.
+                provider and saves the local media metadata, unless the same image URL
+                is already being downloaded.
+             2. If an image with the same contents was recently downloaded, uses that
+                instead. Otherwise, generates thumbnails.
              3. Updates the Open Graph response based on image properties.
        6. If the media is JSON and an oEmbed URL was found:
           1. Convert the oEmbed response to an Open Graph response.
@@ -160,10 +170,11 @@ class PreviewUrlResource(DirectServeJsonResource):
                 provider and saves the local media metadata.
              2. Generates thumbnails.
              3. Updates the Open Graph response based on image properties.
-       7. Stores the result in the database cache.
+       7. Stores the result in the database cache, under both the requested URL and
+          the URL which was redirected to (if any).
     4. Returns the result.
 
-    The in-memory cache expires after 1 hour.
+    The in-memory caches expire after 1 hour.
 
     Expired entries in the database cache (and their associated media files) are
     deleted every 10 seconds. The default expiration time is 1 hour from download.
@@ -181,6 +192,7 @@ class PreviewUrlResource(DirectServeJsonResource):
 
         self.auth = hs.get_auth()
         self.clock = hs.get_clock()
+        self._reactor = hs.get_reactor()
         self.filepaths = media_repo.filepaths
         self.max_spider_size = hs.config.media.max_spider_size
         self.server_name = hs.hostname
@@ -219,6 +231,22 @@ class PreviewUrlResource(DirectServeJsonResource):
             expiry_ms=ONE_HOUR,
         )
 
+        # memory cache mapping absolute image URLs to an ObservableDeferred
+        # returning the Open Graph image information
+        self._image_cache: ExpiringCache[str, ObservableDeferred] = ExpiringCache(
+            cache_name="url_preview_images",
+            clock=self.clock,
+            expiry_ms=ONE_HOUR,
+        )
+
+        # memory cache mapping the SHA-256 hashes of images downloaded for
+        # previews to their Open Graph image information
+        self._image_hash_cache: ExpiringCache[str, JsonDict] = ExpiringCache(
+            cache_name="url_preview_image_hashes",
+            clock=self.clock,
+            expiry_ms=ONE_HOUR,
+        )
+
         if self._worker_run_media_background_jobs:
             self._cleaner_loop = self.clock.looping_call(
                 self._start_expire_url_cache_data, 10 * 1000
@@ -354,16 +382,27 @@ class PreviewUrlResource(DirectServeJsonResource):
         elif _is_html(media_info.media_type):
             # TODO: somehow stop a big HTML tree from exploding synapse's RAM
 
-            with open(media_info.filename, "rb") as file:
-                body = file.read()
-
-            tree = decode_body(body, media_info.uri, media_info.media_type)
-            if tree is not None:
+            # Parsing the document can take a while, so we do it off the reactor.
+            parsed_html = await defer_to_thread(
+                self._reactor,
+                _parse_html_file,
+                self._oembed,
+                media_info.filename,
+                media_info.uri,
+                media_info.media_type,
+            )
+            if parsed_html is not None:
                 # Check if this HTML document points to oEmbed information and
                 # defer to that.
-                oembed_url = self._oembed.autodiscover_from_html(tree)
+                oembed_url, og_from_html = parsed_html
                 og_from_oembed: JsonDict = {}
                 if oembed_url:
+                    # Start downloading the image from the HTML whilst we fetch
+                    # the oEmbed information, as the oEmbed response usually
+                    # has the same image (if any).
+                    if og_from_html.get("og:image"):
+                        self._get_image(user, media_info, og_from_html["og:image"])
+
                     oembed_info = await self._handle_url(
                         oembed_url, user, allow_data_urls=True
                     )
@@ -375,10 +414,6 @@ class PreviewUrlResource(DirectServeJsonResource):
                         url, oembed_info, expiration_ms
                     )
 
-                # Parse Open Graph information from the HTML in case the oEmbed
-                # response failed or is incomplete.
-                og_from_html = parse_html_to_open_graph(tree)
-
                 # Compile the Open Graph response by using the scraped
                 # information from the HTML and overlaying any information
                 # from the oEmbed response.
@@ -424,15 +459,24 @@ class PreviewUrlResource(DirectServeJsonResource):
         expiration_ms = min(expiration_ms, ONE_DAY)
 
         # store OG in history-aware DB cache
-        await self.store.store_url_cache(
-            url,
-            media_info.response_code,
-            media_info.etag,
-            media_info.created_ts_ms + expiration_ms,
-            jsonog,
-            media_info.filesystem_id,
-            media_info.created_ts_ms,
-        )
+        urls_to_cache = [url]
+        if media_info.uri != url and not oembed_url and "og:url" not in og:
+            # We were redirected, so also store the preview under the final URL:
+            # links to the same page often differ only by their redirects (e.g.
+            # link shorteners or tracking parameters). We don't do this for
+            # oEmbed previews, as they include the URL which was requested.
+            urls_to_cache.append(media_info.uri)
+
+        for url_to_cache in urls_to_cache:
+            await self.store.store_url_cache(
+                url_to_cache,
+                media_info.response_code,
+                media_info.etag,
+                media_info.created_ts_ms + expiration_ms,
+                jsonog,
+                media_info.filesystem_id,
+                media_info.created_ts_ms,
+            )
 
         return jsonog.encode("utf8")
 
@@ -648,12 +692,72 @@ class PreviewUrlResource(DirectServeJsonResource):
         if not image_url:
             return
 
+        image_og = await make_deferred_yieldable(
+            self._get_image(user, media_info, image_url).observe()
+        )
+        og.update(image_og)
+
+    def _get_image(
+        self, user: UserID, media_info: MediaInfo, image_url: str
+    ) -> ObservableDeferred[JsonDict]:
+        """
+        Start downloading the given image for a preview, unless it is already being
+        (or has recently been) downloaded.
+
+        Args:
+            user: The user requesting the preview.
+            media_info: The media being previewed.
+            image_url: The URL of the image, which may be relative to the media.
+
+        Returns:
+            An ObservableDeferred which resolves to the Open Graph image
+            information, or an empty dict if the image couldn't be downloaded.
+        """
         # The image URL from the HTML might be relative to the previewed page,
         # convert it to an URL which can be requested directly.
         url_parts = urlparse(image_url)
         if url_parts.scheme != "data":
             image_url = urljoin(media_info.uri, image_url)
 
+        # Pages on the same site often share an image, and previews of the same
+        # page may be requested at the same time, so we share the downloads.
+        observable = self._image_cache.get(image_url)
+        if observable is None:
+            # The download may outlive the request which started it (e.g. if the
+            # oEmbed response has a different image), so it gets its own
+            # logcontext.
+            download = cast(
+                "Deferred[JsonDict]",
+                run_as_background_process(
+                    "url_preview_download_image", self._download_image, user, image_url
+                ),
+            )
+            observable = ObservableDeferred(download, consumeErrors=True)
+            self._image_cache[image_url] = observable
+
+            # Unlike the previews themselves, we don't hold on to failed
+            # downloads, so that the image can be tried again by a later preview.
+            def _uncache_failed_download(image_og: Union[JsonDict, Failure]) -> None:
+                if isinstance(image_og, Failure) or not image_og:
+                    if self._image_cache.get(image_url) is observable:
+                        self._image_cache.pop(image_url, None)
+
+            observable.observe().addBoth(_uncache_failed_download)
+
+        return observable
+
+    async def _download_image(self, user: UserID, image_url: str) -> JsonDict:
+        """
+        Download an image for a preview, and generate its thumbnails.
+
+        Args:
+            user: The user requesting the preview.
+            image_url: The URL of the image.
+
+        Returns:
+            The Open Graph image information, or an empty dict if the image
+            couldn't be downloaded.
+        """
         # FIXME: it might be cleaner to use the same flow as the main /preview_url
         # request itself and benefit from the same caching etc.  But for now we
         # just rely on the caching on the master request to speed things up.
@@ -666,23 +770,53 @@ class PreviewUrlResource(DirectServeJsonResource):
                 image_url,
                 e,
             )
-            return
+            return {}
 
-        if _is_media(image_info.media_type):
-            # TODO: make sure we don't choke on white-on-transparent images
-            file_id = image_info.filesystem_id
-            dims = await self.media_repo._generate_thumbnails(
-                None, file_id, file_id, image_info.media_type, url_cache=True
+        if not _is_media(image_info.media_type):
+            return {}
+
+        # The same image is often served from different URLs (e.g. with different
+        # query parameters), in which case we reuse the copy we already have.
+        content_hash = await defer_to_thread(
+            self._reactor, _hash_file, image_info.filename
+        )
+        image_og = self._image_hash_cache.get(content_hash)
+        if image_og is not None:
+            logger.debug("Image at %s is a duplicate of %s", image_url, image_og)
+            await self._delete_url_cache_media(image_info.filesystem_id)
+            return image_og
+
+        # TODO: make sure we don't choke on white-on-transparent images
+        file_id = image_info.filesystem_id
+        dims = await self.media_repo._generate_thumbnails(
+            None, file_id, file_id, image_info.media_type, url_cache=True
+        )
+
+        image_og = {}
+        if dims:
+            image_og["og:image:width"] = dims["width"]
+            image_og["og:image:height"] = dims["height"]
+        else:
+            logger.warning("Couldn't get dims for %s", image_url)
+
+        image_og["og:image"] = f"mxc://{self.server_name}/{image_info.filesystem_id}"
+        image_og["og:image:type"] = image_info.media_type
+        image_og["matrix:image:size"] = image_info.media_length
+
+        self._image_hash_cache[content_hash] = image_og
+        return image_og
+
+    async def _delete_url_cache_media(self, media_id: str) -> None:
+        """Delete a file downloaded for a preview which turned out not to be needed."""
+        try:
+            os.remove(self.filepaths.url_cache_filepath(media_id))
+        except OSError as e:
+            logger.warning(
+                "Failed to remove duplicate preview media: %r: %s", media_id, e
             )
-            if dims:
-                og["og:image:width"] = dims["width"]
-                og["og:image:height"] = dims["height"]
-            else:
-                logger.warning("Couldn't get dims for %s", image_url)
+            return
 
-            og["og:image"] = f"mxc://{self.server_name}/{image_info.filesystem_id}"
-            og["og:image:type"] = image_info.media_type
-            og["matrix:image:size"] = image_info.media_length
+        await self.store.delete_url_cache_media((media_id,))
 
     async def _handle_oembed_response(
         self, url: str, media_info: MediaInfo, expiration_ms: int
@@ -856,3 +990,38 @@ def _is_previewable(content_type: str) -> bool:
     otherwise."""
 
     return _is_html(content_type) or _is_media(content_type) or _is_json(content_type)
+
+
+def _parse_html_file(
+    oembed: OEmbedProvider, filename: str, uri: str, media_type: str
+) -> Optional[Tuple[Optional[str], JsonDict]]:
+    """Parse a downloaded HTML document. This is run in a thread.
+
+    Args:
+        oembed: Used to look for oEmbed autodiscovery information.
+        filename: The file the document was downloaded to.
+        uri: The URI the document was downloaded from.
+        media_type: The Content-Type of the document.
+
+    Returns:
+        None if the document couldn't be parsed, otherwise a tuple of:
+            The oEmbed URL found in the document, if any.
+            The Open Graph information from the document.
+    """
+    with open(filename, "rb") as file:
+        body = file.read()
+
+    tree = decode_body(body, uri, media_type)
+    if tree is None:
+        return None
+
+    return oembed.autodiscover_from_html(tree), parse_html_to_open_graph(tree)
+
+
+def _hash_file(filename: str) -> str:
+    """Returns the hex-encoded SHA-256 hash of the given file."""
+    hasher = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(65536), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
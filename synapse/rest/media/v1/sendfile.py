@@ -0,0 +1,160 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Sending files to HTTP clients with `os.sendfile`, so that the file contents are
+copied to the socket by the kernel rather than read into Python and written out
+again.
+"""
+
+import logging
+import os
+from typing import Optional
+
+from twisted.internet import tcp
+from twisted.internet.defer import Deferred
+from twisted.python.failure import Failure
+from twisted.web.http import HTTPChannel
+
+from synapse.http.site import SynapseRequest
+
+logger = logging.getLogger(__name__)
+
+# Files smaller than this are sent by reading them in Python as normal, as the
+# saving isn't worth the extra setup.
+SENDFILE_MIN_SIZE = 256 * 1024
+
+# The maximum number of bytes to send in a single call to `os.sendfile`, so that
+# one download can't hog the reactor.
+SENDFILE_CHUNK_SIZE = 1024 * 1024
+
+
+def can_sendfile(request: SynapseRequest, length: int) -> bool:
+    """Whether `length` bytes of the body of the response to the given request
+    can be sent with `sendfile_to_request`.
+
+    This is only possible for requests received over plain (non-TLS) HTTP/1.x
+    connections, whose response headers haven't been sent yet and include the
+    given `Content-Length`.
+    """
+    if not hasattr(os, "sendfile") or length < SENDFILE_MIN_SIZE:
+        return False
+
+    if request.method == b"HEAD" or request.startedWriting or request._disconnected:
+        return False
+
+    content_length = request.responseHeaders.getRawHeaders(b"Content-Length")
+    if content_length != [b"%d" % (length,)]:
+        return False
+
+    channel = request.channel
+    return isinstance(channel, HTTPChannel) and isinstance(
+        channel.transport, tcp.Connection
+    )
+
+
+def sendfile_to_request(
+    request: SynapseRequest, fd: int, offset: int, length: int
+) -> "Deferred[None]":
+    """Write the response headers of the given request, followed by `length` bytes
+    of the given file descriptor starting at `offset`, using `os.sendfile`.
+
+    `can_sendfile` must have returned True for the request.
+
+    Returns:
+        A Deferred which resolves once all the bytes have been sent, or fails if
+        the connection is lost first. It does not follow the logcontext rules.
+    """
+    return _SendfileSender(request, fd, offset, length).start()
+
+
+class _SendfileSender:
+    """Sends part of a file to the socket of a TCP transport with `os.sendfile`.
+
+    Twisted doesn't provide a way to write to a transport other than passing it
+    the bytes to write, so whilst sending we hook the transport's `doWrite`,
+    which the reactor calls when the socket is writable. Anything already
+    buffered by the transport (i.e. the response headers) is flushed before the
+    file is sent.
+    """
+
+    def __init__(self, request: SynapseRequest, fd: int, offset: int, length: int):
+        self._request = request
+        self._channel = request.channel
+        self._transport: tcp.Connection = request.channel.transport
+        self._fd = fd
+        self._offset = offset
+        self._remaining = length
+        self._deferred: "Deferred[None]" = Deferred()
+
+    def start(self) -> "Deferred[None]":
+        # Queue up the response headers on the transport.
+        self._request.write(b"")
+
+        self._request.notifyFinish().addErrback(self._on_connection_lost)
+
+        self._transport.doWrite = self._do_write  # type: ignore[assignment]
+        self._transport.startWriting()
+        return self._deferred
+
+    def _do_write(self) -> Optional[BaseException]:
+        """Called by the reactor when the socket is writable."""
+        transport = self._transport
+        if transport.dataBuffer or transport._tempDataBuffer:
+            # Flush whatever the transport has buffered first. This stops
+            # writing once the buffer is empty, so we resume it.
+            result = type(transport).doWrite(transport)
+            if result is not None:
+                return result
+            transport.startWriting()
+            return None
+
+        try:
+            sent = os.sendfile(
+                transport.fileno(),
+                self._fd,
+                self._offset,
+                min(self._remaining, SENDFILE_CHUNK_SIZE),
+            )
+        except BlockingIOError:
+            return None
+        except OSError as e:
+            # Returning the error makes the reactor drop the connection, which
+            # fails the request (and so `self._deferred`).
+            return e
+
+        if sent == 0:
+            # The file is shorter than we expected. We can't send the rest of
+            # the response, so we drop the connection.
+            return OSError("Unexpected end of file after %d bytes" % (self._offset,))
+
+        self._offset += sent
+        self._remaining -= sent
+        self._request.sentLength += sent
+        self._channel.resetTimeout()
+
+        if self._remaining == 0:
+            self._stop()
+            transport.stopWriting()
+            self._deferred.callback(None)
+
+        return None
+
+    def _on_connection_lost(self, failure: Failure) -> None:
+        self._stop()
+        if not self._deferred.called:
+            self._deferred.errback(failure)
+
+    def _stop(self) -> None:
+        """Stop hooking the transport's `doWrite`."""
+        self._transport.__dict__.pop("doWrite", None)
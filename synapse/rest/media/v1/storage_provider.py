@@ -59,6 +59,12 @@ class StorageProvider(metaclass=abc.ABCMeta):
             Returns a Responder if the provider has the file, otherwise returns None.
         """
 
+    def stores_synchronously(self, file_info: FileInfo) -> bool:
+        """Whether `store_file` only returns once the file described by file_info
+        has been stored, so that it can be fetched back later.
+        """
+        return False
+
 
 class StorageProviderWrapper(StorageProvider):
     """Wraps a storage provider and provides various config options
@@ -114,6 +120,15 @@ class StorageProviderWrapper(StorageProvider):
 
             run_in_background(store)
 
+    def stores_synchronously(self, file_info: FileInfo) -> bool:
+        if file_info.url_cache or not self.store_synchronous:
+            return False
+
+        if file_info.server_name:
+            return self.store_remote
+
+        return self.store_local
+
     async def fetch(self, path: str, file_info: FileInfo) -> Optional[Responder]:
         if file_info.url_cache:
             # Files in the URL preview cache definitely aren't stored here,
@@ -13,14 +13,38 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import logging
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from http import HTTPStatus
 from io import BytesIO
 from types import TracebackType
-from typing import Optional, Tuple, Type
+from typing import TYPE_CHECKING, Dict, Iterable, Optional, Tuple, Type
 
+import attr
 from PIL import Image
+from prometheus_client import Gauge, Histogram
+
+from twisted.internet.defer import Deferred
+
+from synapse.api.errors import SynapseError
+from synapse.config.repository import ThumbnailRequirement
+from synapse.logging.context import defer_to_thread, make_deferred_yieldable
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
 
 logger = logging.getLogger(__name__)
 
+thumbnail_jobs_pending = Gauge(
+    "synapse_media_thumbnail_jobs_pending",
+    "Number of thumbnailing jobs queued or running",
+)
+thumbnail_job_duration = Histogram(
+    "synapse_media_thumbnail_job_duration_seconds",
+    "Time taken by thumbnailing jobs, including the time spent queued",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, "+Inf"),
+)
+
 EXIF_ORIENTATION_TAG = 0x0112
 EXIF_TRANSPOSE_MAPPINGS = {
     2: Image.FLIP_LEFT_RIGHT,
@@ -31,6 +55,35 @@ EXIF_TRANSPOSE_MAPPINGS = {
     7: Image.TRANSVERSE,
     8: Image.ROTATE_90,
 }
+# The transpositions which swap the width and height of an image.
+_AXES_SWAPPING_TRANSPOSES = (
+    Image.TRANSPOSE,
+    Image.TRANSVERSE,
+    Image.ROTATE_90,
+    Image.ROTATE_270,
+)
+
+
+def _aspect(
+    width: int, height: int, max_width: int, max_height: int
+) -> Tuple[int, int]:
+    """See `Thumbnailer.aspect`."""
+    if max_width * height < max_height * width:
+        return max_width, max((max_width * height) // width, 1)
+    else:
+        return max((max_height * width) // height, 1), max_height
+
+
+def _crop_scaled_size(
+    width: int, height: int, crop_width: int, crop_height: int
+) -> Tuple[int, int]:
+    """The size an image of the given dimensions is scaled to before being
+    cropped to `crop_width` x `crop_height` by `Thumbnailer.crop`.
+    """
+    if crop_width * height > crop_height * width:
+        return crop_width, (crop_width * height) // width
+    else:
+        return (crop_height * width) // height, crop_height
 
 
 class ThumbnailError(Exception):
@@ -101,6 +154,21 @@ class Thumbnailer:
             self.image.info["exif"] = None
         return self.image.size
 
+    def draft(self, min_width: int, min_height: int) -> None:
+        """Configure the decoder to decode the image at a reduced size, so long as
+        it is at least the given dimensions (after transposing the image).
+
+        This only has an effect on JPEG images, whose decoder can downscale by a
+        power of two much more cheaply than decoding the full image and resizing
+        it. It must be called before anything else reads the image data.
+        """
+        if self.transpose_method in _AXES_SWAPPING_TRANSPOSES:
+            # The image will be rotated, so its width will become its height.
+            min_width, min_height = min_height, min_width
+
+        self.image.draft(self.image.mode, (min_width, min_height))
+        self.width, self.height = self.image.size
+
     def aspect(self, max_width: int, max_height: int) -> Tuple[int, int]:
         """Calculate the largest size that preserves aspect ratio which
         fits within the given rectangle::
@@ -114,10 +182,7 @@ class Thumbnailer:
             max_height: The largest possible height.
         """
 
-        if max_width * self.height < max_height * self.width:
-            return max_width, max((max_width * self.height) // self.width, 1)
-        else:
-            return max((max_height * self.width) // self.height, 1), max_height
+        return _aspect(self.width, self.height, max_width, max_height)
 
     def _resize(self, width: int, height: int) -> Image.Image:
         # 1-bit or 8-bit color palette images need converting to RGB
@@ -132,7 +197,7 @@ class Thumbnailer:
             else:
                 with self.image:
                     self.image = self.image.convert("RGB")
-        return self.image.resize((width, height), Image.ANTIALIAS)
+        return self.image.resize((width, height), Image.LANCZOS)
 
     def scale(self, width: int, height: int, output_type: str) -> BytesIO:
         """Rescales the image to the given dimensions.
@@ -157,15 +222,14 @@ class Thumbnailer:
         Returns:
             The bytes of the encoded image ready to be written to disk
         """
+        scaled_width, scaled_height = _crop_scaled_size(
+            self.width, self.height, width, height
+        )
         if width * self.height > height * self.width:
-            scaled_width = width
-            scaled_height = (width * self.height) // self.width
             crop_top = (scaled_height - height) // 2
             crop_bottom = height + crop_top
             crop = (0, crop_top, width, crop_bottom)
         else:
-            scaled_width = (height * self.width) // self.height
-            scaled_height = height
             crop_left = (scaled_width - width) // 2
             crop_right = width + crop_left
             crop = (crop_left, 0, crop_right, height)
@@ -220,3 +284,189 @@ class Thumbnailer:
     def __del__(self) -> None:
         # Make sure we actually do close the image, rather than leak data.
         self.close()
+
+
+@attr.s(slots=True, frozen=True, auto_attribs=True)
+class GeneratedThumbnails:
+    """The thumbnails generated for an image by `generate_thumbnails`."""
+
+    # The dimensions of the (transposed) source image.
+    width: int
+    height: int
+    # Map from the (width, height, media type) of each thumbnail to the method
+    # used to generate it and its encoded bytes.
+    thumbnails: Dict[Tuple[int, int, str], Tuple[str, bytes]]
+
+
+def generate_thumbnails(
+    input_path: str,
+    max_image_pixels: int,
+    requirements: Iterable[ThumbnailRequirement],
+) -> Optional[GeneratedThumbnails]:
+    """Generate thumbnails of the image at the given path for all the given
+    requirements, decoding the image only once.
+
+    Scaled thumbnails are generated at the largest size that fits the required
+    dimensions while preserving the aspect ratio. Cropped thumbnails are not
+    generated if a scaled thumbnail has the same dimensions.
+
+    This runs in a thumbnailing worker process (or thread), see `ThumbnailPool`.
+
+    Returns:
+        The generated thumbnails, or None if the image has too many pixels to be
+        thumbnailed.
+
+    Raises:
+        ThumbnailError if the image could not be opened.
+    """
+    with Thumbnailer(input_path) as thumbnailer:
+        m_width = thumbnailer.width
+        m_height = thumbnailer.height
+
+        if m_width * m_height >= max_image_pixels:
+            logger.info(
+                "Image too large to thumbnail %r x %r > %r",
+                m_width,
+                m_height,
+                max_image_pixels,
+            )
+            return None
+
+        if thumbnailer.transpose_method in _AXES_SWAPPING_TRANSPOSES:
+            m_width, m_height = m_height, m_width
+
+        # We deduplicate the thumbnail sizes by ignoring the cropped versions if
+        # they have the same dimensions of a scaled one.
+        targets: Dict[Tuple[int, int, str], str] = {}
+        for requirement in requirements:
+            if requirement.method == "crop":
+                targets.setdefault(
+                    (requirement.width, requirement.height, requirement.media_type),
+                    requirement.method,
+                )
+            elif requirement.method == "scale":
+                t_width, t_height = _aspect(
+                    m_width, m_height, requirement.width, requirement.height
+                )
+                t_width = min(m_width, t_width)
+                t_height = min(m_height, t_height)
+                targets[
+                    (t_width, t_height, requirement.media_type)
+                ] = requirement.method
+            else:
+                logger.error("Unrecognized method: %r", requirement.method)
+
+        if not targets:
+            return GeneratedThumbnails(m_width, m_height, {})
+
+        # Only decode as much of the image as the largest thumbnail needs.
+        sizes = [
+            _crop_scaled_size(m_width, m_height, t_width, t_height)
+            if t_method == "crop"
+            else (t_width, t_height)
+            for (t_width, t_height, _), t_method in targets.items()
+        ]
+        thumbnailer.draft(max(w for w, _ in sizes), max(h for _, h in sizes))
+
+        if thumbnailer.transpose_method is not None:
+            thumbnailer.transpose()
+
+        thumbnails: Dict[Tuple[int, int, str], Tuple[str, bytes]] = {}
+        for (t_width, t_height, t_type), t_method in targets.items():
+            if t_method == "crop":
+                t_byte_source = thumbnailer.crop(t_width, t_height, t_type)
+            else:
+                t_byte_source = thumbnailer.scale(t_width, t_height, t_type)
+
+            with t_byte_source:
+                thumbnails[(t_width, t_height, t_type)] = (
+                    t_method,
+                    t_byte_source.getvalue(),
+                )
+
+    return GeneratedThumbnails(m_width, m_height, thumbnails)
+
+
+class ThumbnailPool:
+    """Runs `generate_thumbnails` jobs.
+
+    If `thumbnail_worker_processes` is configured the jobs are run in a pool of
+    that many worker processes, so that decoding and resizing large images
+    neither holds the GIL of the media repository nor ties up the threads of the
+    reactor's threadpool (which are also used for database queries). Otherwise
+    they are run on the reactor's threadpool.
+    """
+
+    def __init__(self, hs: "HomeServer"):
+        self._reactor = hs.get_reactor()
+        self._clock = hs.get_clock()
+        self._max_image_pixels = hs.config.media.max_image_pixels
+
+        self._executor: Optional[ProcessPoolExecutor] = None
+        num_processes = hs.config.media.thumbnail_worker_processes
+        if num_processes:
+            # Use "spawn" rather than forking this process, which has threads
+            # (and open database connections) of its own.
+            self._executor = ProcessPoolExecutor(
+                max_workers=num_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=Thumbnailer.set_limits,
+                initargs=(self._max_image_pixels,),
+            )
+            self._reactor.addSystemEventTrigger(
+                "during", "shutdown", self._executor.shutdown, wait=False
+            )
+
+    async def generate_thumbnails(
+        self, input_path: str, requirements: Iterable[ThumbnailRequirement]
+    ) -> Optional[GeneratedThumbnails]:
+        """Generate thumbnails of the image at the given path, see
+        `generate_thumbnails`.
+        """
+        requirements = list(requirements)
+
+        thumbnail_jobs_pending.inc()
+        start = self._clock.time()
+        try:
+            if self._executor is None:
+                return await defer_to_thread(
+                    self._reactor,
+                    generate_thumbnails,
+                    input_path,
+                    self._max_image_pixels,
+                    requirements,
+                )
+
+            d: "Deferred[Optional[GeneratedThumbnails]]" = Deferred()
+
+            def _on_done(future: "Future[Optional[GeneratedThumbnails]]") -> None:
+                # This is called on one of the executor's threads.
+                if future.cancelled():
+                    # The pool has been shut down. We still need to fire `d`, or
+                    # whatever is waiting for the thumbnails would hang.
+                    self._reactor.callFromThread(
+                        d.errback,
+                        SynapseError(
+                            HTTPStatus.SERVICE_UNAVAILABLE,
+                            "Thumbnail generation was cancelled",
+                        ),
+                    )
+                    return
+
+                exception = future.exception()
+                if exception is not None:
+                    self._reactor.callFromThread(d.errback, exception)
+                else:
+                    self._reactor.callFromThread(d.callback, future.result())
+
+            self._executor.submit(
+                generate_thumbnails,
+                input_path,
+                self._max_image_pixels,
+                requirements,
+            ).add_done_callback(_on_done)
+
+            return await make_deferred_yieldable(d)
+        finally:
+            thumbnail_jobs_pending.dec()
+            thumbnail_job_duration.observe(self._clock.time() - start)
@@ -0,0 +1,306 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Divides the connections of a database pool between different workloads.
+
+Every database call is assigned to a partition based on the logging context it
+is made from: client requests are "interactive", long-running maintenance jobs
+(background updates, purges, ...) are "background" and requests from other
+workers are "replication". Each partition may only hold a limited number of the
+pool's connections at once, with further calls queueing until a connection in
+their partition is released.
+"""
+
+import logging
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, Optional
+
+from prometheus_client import Gauge, Histogram
+
+from twisted.internet import defer
+from twisted.internet.defer import CancelledError
+
+from synapse.config.database import (
+    BACKGROUND_PARTITION,
+    CONNECTION_PARTITIONS,
+    INTERACTIVE_PARTITION,
+    REPLICATION_PARTITION,
+    DatabaseConnectionConfig,
+)
+from synapse.logging.context import (
+    LoggingContext,
+    LoggingContextOrSentinel,
+    PreserveLoggingContext,
+    make_deferred_yieldable,
+)
+from synapse.metrics.background_process_metrics import (
+    BackgroundProcessLoggingContext,
+    run_as_background_process,
+)
+
+if TYPE_CHECKING:
+    from synapse.server import HomeServer
+
+logger = logging.getLogger(__name__)
+
+partition_queue_timer = Histogram(
+    "synapse_storage_partition_schedule_time",
+    "Time spent waiting for a database connection, by partition",
+    ["database", "partition"],
+)
+
+partition_in_use_gauge = Gauge(
+    "synapse_storage_partition_connections_in_use",
+    "Number of database connections held by each partition",
+    ["database", "partition"],
+)
+
+partition_waiting_gauge = Gauge(
+    "synapse_storage_partition_connections_waiting",
+    "Number of database calls queued for a connection in each partition",
+    ["database", "partition"],
+)
+
+partition_limit_gauge = Gauge(
+    "synapse_storage_partition_connections_limit",
+    "The current limit on the connections each partition may hold",
+    ["database", "partition"],
+)
+
+# Background processes whose database work is bulk maintenance, and so should not
+# be allowed to take connections away from requests.
+BACKGROUND_PROCESSES = frozenset(
+    {
+        "background_updates",
+        "purge_history",
+        "_purge_history",
+        "purge_history_for_rooms_in_range",
+        "shutdown_and_purge_room",
+        "_censor_redactions",
+        "prune_old_user_ips",
+        "prune_old_outbound_device_pokes",
+        "delete_old_forward_extrem_cache",
+        "generate_user_daily_visits",
+        "apply_media_retention_rules",
+        "expire_url_cache_data",
+        "evict_local_cache_media",
+    }
+)
+
+# Background processes that serve updates to other workers.
+REPLICATION_PROCESSES = frozenset({"replication_notifier"})
+
+# This matches `synapse.replication.http.REPLICATION_PREFIX`, which we can't
+# import here without creating an import cycle.
+_REPLICATION_PATH_PREFIX = "/_synapse/replication/"
+
+# How often we reconsider the partition limits when adaptive sizing is enabled.
+_ADAPT_INTERVAL_MS = 10 * 1000
+
+
+def get_partition_for_context(context: LoggingContextOrSentinel) -> str:
+    """Work out which connection partition a database call made from the given
+    logging context belongs to.
+    """
+    ctx: Optional[LoggingContextOrSentinel] = context
+    while isinstance(ctx, LoggingContext):
+        if ctx.request is not None:
+            if ctx.request.url.startswith(_REPLICATION_PATH_PREFIX):
+                return REPLICATION_PARTITION
+            return INTERACTIVE_PARTITION
+
+        if isinstance(ctx, BackgroundProcessLoggingContext):
+            if ctx.process_name in BACKGROUND_PROCESSES:
+                return BACKGROUND_PARTITION
+            if ctx.process_name in REPLICATION_PROCESSES:
+                return REPLICATION_PARTITION
+            return INTERACTIVE_PARTITION
+
+        ctx = ctx.parent_context
+
+    return INTERACTIVE_PARTITION
+
+
+class ConnectionPartition:
+    """Limits the number of connections that a single workload may hold.
+
+    Args:
+        database: The name of the database, used for metrics.
+        name: The name of the partition.
+        max_connections: The most connections this partition may ever hold.
+    """
+
+    def __init__(self, database: str, name: str, max_connections: int):
+        self.name = name
+        self.max_connections = max_connections
+
+        # The current limit, which may be lower than `max_connections` if
+        # adaptive sizing has shrunk this partition.
+        self.limit = max_connections
+
+        self.in_use = 0
+        self._waiters: Deque["defer.Deferred[None]"] = deque()
+
+        # Accumulated queue times since the limits were last adapted.
+        self.queue_time_sum = 0.0
+        self.queue_count = 0
+
+        self._in_use_gauge = partition_in_use_gauge.labels(database, name)
+        self._waiting_gauge = partition_waiting_gauge.labels(database, name)
+        self._limit_gauge = partition_limit_gauge.labels(database, name)
+        self._queue_timer = partition_queue_timer.labels(database, name)
+
+        self._limit_gauge.set(self.limit)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Wait until this partition may use another connection."""
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            self._in_use_gauge.set(self.in_use)
+            return
+
+        new_defer: "defer.Deferred[None]" = defer.Deferred()
+        self._waiters.append(new_defer)
+        self._waiting_gauge.set(len(self._waiters))
+
+        try:
+            await make_deferred_yieldable(new_defer)
+        except CancelledError:
+            # If we had already been handed a connection then pass it on,
+            # otherwise just take ourselves out of the queue.
+            if new_defer in self._waiters:
+                self._waiters.remove(new_defer)
+                self._waiting_gauge.set(len(self._waiters))
+            else:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """Give back a connection acquired with `acquire`."""
+        self.in_use -= 1
+        self._wake_waiters()
+        self._in_use_gauge.set(self.in_use)
+
+    def set_limit(self, limit: int) -> None:
+        """Change the number of connections this partition may hold.
+
+        Lowering the limit doesn't interrupt calls that are already running, but
+        no more will start until the partition is back under its limit.
+        """
+        self.limit = max(1, min(limit, self.max_connections))
+        self._limit_gauge.set(self.limit)
+        self._wake_waiters()
+        self._in_use_gauge.set(self.in_use)
+
+    def record_queue_time(self, duration_sec: float) -> None:
+        """Record how long a call waited before it started running on a
+        connection.
+
+        This is called from the database threads, so the running totals used
+        for adaptive sizing are only approximate.
+        """
+        self._queue_timer.observe(duration_sec)
+        self.queue_time_sum += duration_sec
+        self.queue_count += 1
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_use < self.limit:
+            next_defer = self._waiters.popleft()
+            self.in_use += 1
+
+            # we need to run the next thing in the sentinel context.
+            with PreserveLoggingContext():
+                next_defer.callback(None)
+
+        self._waiting_gauge.set(len(self._waiters))
+
+
+class ConnectionPartitions:
+    """The connection partitions for a single database pool.
+
+    If adaptive sizing is enabled then every few seconds we check how long
+    interactive calls have been queueing for a connection. If that is above the
+    configured target then the other partitions have their limits halved,
+    otherwise they are allowed to grow back (one connection at a time) towards
+    their configured maximum.
+    """
+
+    def __init__(self, hs: "HomeServer", database_config: DatabaseConnectionConfig):
+        self._clock = hs.get_clock()
+        self._target_queue_time = database_config.adaptive_target_queue_time
+
+        self.partitions: Dict[str, ConnectionPartition] = {
+            name: ConnectionPartition(
+                database_config.name,
+                name,
+                database_config.connection_partitions[name],
+            )
+            for name in CONNECTION_PARTITIONS
+        }
+
+        if database_config.adaptive_connection_partitions:
+            self._clock.looping_call(
+                run_as_background_process,
+                _ADAPT_INTERVAL_MS,
+                "adapt_connection_partitions",
+                self._adapt_limits,
+            )
+
+    def get_partition(self, context: LoggingContextOrSentinel) -> ConnectionPartition:
+        """Get the partition that a database call from the given logging context
+        should be run in.
+        """
+        return self.partitions[get_partition_for_context(context)]
+
+    async def _adapt_limits(self) -> None:
+        self.adapt_limits()
+
+    def adapt_limits(self) -> None:
+        """Resize the non-interactive partitions based on how long interactive
+        calls have recently been waiting for connections.
+        """
+        interactive = self.partitions[INTERACTIVE_PARTITION]
+
+        mean_queue_time = 0.0
+        if interactive.queue_count:
+            mean_queue_time = interactive.queue_time_sum / interactive.queue_count
+
+        for partition in self.partitions.values():
+            partition.queue_time_sum = 0.0
+            partition.queue_count = 0
+
+        congested = mean_queue_time > self._target_queue_time
+
+        for partition in self.partitions.values():
+            if partition is interactive:
+                continue
+
+            if congested:
+                new_limit = partition.limit // 2
+            else:
+                new_limit = partition.limit + 1
+
+            new_limit = max(1, min(new_limit, partition.max_connections))
+            if new_limit != partition.limit:
+                logger.debug(
+                    "Changing limit of connection partition %s from %d to %d",
+                    partition.name,
+                    partition.limit,
+                    new_limit,
+                )
+                partition.set_limit(new_limit)
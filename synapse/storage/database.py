@@ -56,6 +56,7 @@ from synapse.logging.context import (
 from synapse.metrics import register_threadpool
 from synapse.metrics.background_process_metrics import run_as_background_process
 from synapse.storage.background_updates import BackgroundUpdater
+from synapse.storage.connection_partitions import ConnectionPartitions
 from synapse.storage.engines import BaseDatabaseEngine, PostgresEngine, Sqlite3Engine
 from synapse.storage.types import Connection, Cursor
 from synapse.util.async_helpers import delay_cancellation
@@ -513,6 +514,10 @@ class DatabasePool:
         self._database_config = database_config
         self._db_pool = make_pool(hs.get_reactor(), database_config, engine)
 
+        # Limits how many of the pool's connections each kind of workload may use,
+        # so that e.g. background jobs can't starve client requests.
+        self._partitions = ConnectionPartitions(hs, database_config)
+
         self.updates = BackgroundUpdater(hs, self)
 
         self._previous_txn_total_time = 0.0
@@ -916,6 +921,8 @@ class DatabasePool:
             assert isinstance(curr_context, LoggingContext)
             parent_context = curr_context
 
+        partition = self._partitions.get_partition(curr_context)
+
         start_time = monotonic_time()
 
         def inner_func(conn, *args, **kwargs):
@@ -934,6 +941,7 @@ class DatabasePool:
                 ):
                     sched_duration_sec = monotonic_time() - start_time
                     sql_scheduling_timer.observe(sched_duration_sec)
+                    partition.record_queue_time(sched_duration_sec)
                     context.add_database_scheduled(sched_duration_sec)
 
                     if self._txn_limit > 0:
@@ -975,9 +983,17 @@ class DatabasePool:
                         if isolation_level:
                             self.engine.attempt_to_set_isolation_level(conn, None)
 
-        return await make_deferred_yieldable(
-            self._db_pool.runWithConnection(inner_func, *args, **kwargs)
-        )
+        def _release_connection(res: R) -> R:
+            partition.release()
+            return res
+
+        await partition.acquire()
+
+        # We release the connection back to the partition once the database is
+        # done with it, rather than when we stop waiting for it.
+        d = self._db_pool.runWithConnection(inner_func, *args, **kwargs)
+        d.addBoth(_release_connection)
+        return await make_deferred_yieldable(d)
 
     @staticmethod
     def cursor_to_dict(cursor: Cursor) -> List[Dict[str, Any]]:
@@ -1428,6 +1444,7 @@ class DatabasePool:
         key_values: Collection[Iterable[Any]],
         value_names: Collection[str],
         value_values: Iterable[Iterable[Any]],
+        where_clause: Optional[str] = None,
     ) -> None:
         """
         Upsert, many times.
@@ -1439,10 +1456,17 @@ class DatabasePool:
             value_names: The value column names
             value_values: A list of each row's value column values.
                 Ignored if value_names is empty.
+            where_clause: An index predicate to apply to the upsert.
         """
         if table not in self._unsafe_to_upsert_tables:
             return self.simple_upsert_many_txn_native_upsert(
-                txn, table, key_names, key_values, value_names, value_values
+                txn,
+                table,
+                key_names,
+                key_values,
+                value_names,
+                value_values,
+                where_clause=where_clause,
             )
         else:
             return self.simple_upsert_many_txn_emulated(
@@ -1452,6 +1476,7 @@ class DatabasePool:
                 key_values,
                 value_names,
                 value_values,
+                where_clause=where_clause,
             )
 
     def simple_upsert_many_txn_emulated(
@@ -1462,6 +1487,7 @@ class DatabasePool:
         key_values: Collection[Iterable[Any]],
         value_names: Collection[str],
         value_values: Iterable[Iterable[Any]],
+        where_clause: Optional[str] = None,
     ) -> None:
         """
         Upsert, many times, but without native UPSERT support or batching.
@@ -1473,6 +1499,7 @@ class DatabasePool:
             value_names: The value column names
             value_values: A list of each row's value column values.
                 Ignored if value_names is empty.
+            where_clause: An index predicate to apply to the upsert.
         """
         # No value columns, therefore make a blank list so that the following
         # zip() works correctly.
@@ -1482,13 +1509,15 @@ class DatabasePool:
         # Lock the table just once, to prevent it being done once per row.
         # Note that, according to Postgres' documentation, once obtained,
         # the lock is held for the remainder of the current transaction.
-        self.engine.lock_table(txn, "user_ips")
+        self.engine.lock_table(txn, table)
 
         for keyv, valv in zip(key_values, value_values):
             _keys = {x: y for x, y in zip(key_names, keyv)}
             _vals = {x: y for x, y in zip(value_names, valv)}
 
-            self.simple_upsert_txn_emulated(txn, table, _keys, _vals, lock=False)
+            self.simple_upsert_txn_emulated(
+                txn, table, _keys, _vals, lock=False, where_clause=where_clause
+            )
 
     def simple_upsert_many_txn_native_upsert(
         self,
@@ -1498,6 +1527,7 @@ class DatabasePool:
         key_values: Collection[Iterable[Any]],
         value_names: Collection[str],
         value_values: Iterable[Iterable[Any]],
+        where_clause: Optional[str] = None,
     ) -> None:
         """
         Upsert, many times, using batching where possible.
@@ -1509,6 +1539,7 @@ class DatabasePool:
             value_names: The value column names
             value_values: A list of each row's value column values.
                 Ignored if value_names is empty.
+            where_clause: An index predicate to apply to the upsert.
         """
         allnames: List[str] = []
         allnames.extend(key_names)
@@ -1532,21 +1563,23 @@ class DatabasePool:
         if isinstance(txn.database_engine, PostgresEngine):
             # We use `execute_values` as it can be a lot faster than `execute_batch`,
             # but it's only available on postgres.
-            sql = "INSERT INTO %s (%s) VALUES ? ON CONFLICT (%s) DO %s" % (
+            sql = "INSERT INTO %s (%s) VALUES ? ON CONFLICT (%s) %s DO %s" % (
                 table,
                 ", ".join(k for k in allnames),
                 ", ".join(key_names),
+                f"WHERE {where_clause}" if where_clause else "",
                 latter,
             )
 
             txn.execute_values(sql, args, fetch=False)
 
         else:
-            sql = "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) DO %s" % (
+            sql = "INSERT INTO %s (%s) VALUES (%s) ON CONFLICT (%s) %s DO %s" % (
                 table,
                 ", ".join(k for k in allnames),
                 ", ".join("?" for _ in allnames),
                 ", ".join(key_names),
+                f"WHERE {where_clause}" if where_clause else "",
                 latter,
             )
 
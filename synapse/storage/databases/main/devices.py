@@ -123,6 +123,26 @@ class DeviceWorkerStore(RoomMemberWorkerStore, EndToEndKeyWorkerStore):
             prefilled_cache=device_list_prefill,
         )
 
+        # Tracks which rooms have had members update their devices, so that we
+        # can skip querying `device_lists_changes_in_room` for rooms which
+        # haven't.
+        (
+            device_list_room_prefill,
+            min_device_list_room_id,
+        ) = self.db_pool.get_cache_dict(
+            db_conn,
+            "device_lists_changes_in_room",
+            entity_column="room_id",
+            stream_column="stream_id",
+            max_value=device_list_max,
+            limit=10000,
+        )
+        self._device_list_room_stream_cache = StreamChangeCache(
+            "DeviceListRoomStreamChangeCache",
+            min_device_list_room_id,
+            prefilled_cache=device_list_room_prefill,
+        )
+
         (
             user_signature_stream_prefill,
             user_signature_stream_list_id,
@@ -187,13 +207,20 @@ class DeviceWorkerStore(RoomMemberWorkerStore, EndToEndKeyWorkerStore):
                 continue
 
             # The entities are either user IDs (starting with '@') whose devices
-            # have changed, or remote servers that we need to tell about
-            # changes.
+            # have changed, room IDs (starting with '!') in which members have
+            # changed their devices, or remote servers that we need to tell
+            # about changes.
             if row.entity.startswith("@"):
                 self._device_list_stream_cache.entity_has_changed(row.entity, token)
                 self.get_cached_devices_for_user.invalidate((row.entity,))
                 self._get_cached_user_device.invalidate((row.entity,))
                 self.get_device_list_last_stream_id_for_remote.invalidate((row.entity,))
+                self._get_e2e_device_keys_for_user_cs_api.invalidate((row.entity,))
+
+            elif row.entity.startswith("!"):
+                self._device_list_room_stream_cache.entity_has_changed(
+                    row.entity, token
+                )
 
             else:
                 self._device_list_federation_stream_cache.entity_has_changed(
@@ -1017,6 +1044,70 @@ class DeviceWorkerStore(RoomMemberWorkerStore, EndToEndKeyWorkerStore):
             _get_all_device_list_changes_for_remotes,
         )
 
+    async def get_all_device_list_room_changes(
+        self, last_id: int, current_id: int, limit: int
+    ) -> Tuple[List[Tuple[int, str]], int, bool]:
+        """Get the rooms in which members have updated their devices, for the
+        device lists replication stream.
+
+        Args:
+            last_id: The token to fetch updates from. Exclusive.
+            current_id: The token to fetch updates up to. Inclusive.
+            limit: The requested limit for the number of rows to return. The
+                function may return more rows, if a single device change was
+                in more rooms than that.
+
+        Returns:
+            A tuple consisting of: a list of stream ID and room ID pairs ordered
+            by stream ID, a token to use to fetch subsequent updates, and whether
+            we returned fewer rows than exists between the requested tokens due
+            to the limit.
+        """
+
+        if last_id == current_id:
+            return [], current_id, False
+
+        def _get_all_device_list_room_changes_txn(
+            txn: LoggingTransaction,
+        ) -> Tuple[List[Tuple[int, str]], int, bool]:
+            sql = """
+                SELECT stream_id, room_id FROM device_lists_changes_in_room
+                WHERE ? < stream_id AND stream_id <= ?
+                ORDER BY stream_id ASC
+                LIMIT ?
+            """
+            txn.execute(sql, (last_id, current_id, limit))
+            updates = cast(List[Tuple[int, str]], txn.fetchall())
+            if len(updates) < limit:
+                return updates, current_id, False
+
+            # A device change has a row for each room the user is in, all with
+            # the same stream ID, and those can't be split between batches. The
+            # limit may have cut off some of the rows of the last stream ID, so
+            # we stop just before it...
+            upto_token = updates[-1][0]
+            if updates[0][0] != upto_token:
+                upto_token -= 1
+                updates = [update for update in updates if update[0] <= upto_token]
+                return updates, upto_token, True
+
+            # ... unless it's the only one, in which case we have to return all
+            # of its rows.
+            txn.execute(
+                """
+                SELECT stream_id, room_id FROM device_lists_changes_in_room
+                WHERE stream_id = ?
+                """,
+                (upto_token,),
+            )
+            updates = cast(List[Tuple[int, str]], txn.fetchall())
+            return updates, upto_token, upto_token < current_id
+
+        return await self.db_pool.runInteraction(
+            "get_all_device_list_room_changes",
+            _get_all_device_list_room_changes_txn,
+        )
+
     @cached(max_entries=10000)
     async def get_device_list_last_stream_id_for_remote(
         self, user_id: str
@@ -1407,6 +1498,14 @@ class DeviceWorkerStore(RoomMemberWorkerStore, EndToEndKeyWorkerStore):
         if min_stream_id > from_id:
             return None
 
+        # Only query the rooms which may have changed. (Note the query below
+        # includes changes *at* `from_id`.)
+        room_ids = self._device_list_room_stream_cache.get_entities_changed(
+            room_ids, from_id - 1
+        )
+        if not room_ids:
+            return set()
+
         sql = """
             SELECT DISTINCT user_id FROM device_lists_changes_in_room
             WHERE {clause} AND stream_id >= ?
@@ -1946,6 +2045,7 @@ class DeviceStore(DeviceWorkerStore, DeviceBackgroundUpdateStore):
             user_id,
             stream_ids[-1],
         )
+        txn.call_after(self._get_e2e_device_keys_for_user_cs_api.invalidate, (user_id,))
 
         min_stream_id = stream_ids[0]
 
@@ -2042,6 +2142,13 @@ class DeviceStore(DeviceWorkerStore, DeviceBackgroundUpdateStore):
     ) -> None:
         """Record the user in the room has updated their device."""
 
+        for room_id in room_ids:
+            txn.call_after(
+                self._device_list_room_stream_cache.entity_has_changed,
+                room_id,
+                stream_ids[-1],
+            )
+
         encoded_context = json_encoder.encode(context)
 
         # The `device_lists_changes_in_room.stream_id` column matches the
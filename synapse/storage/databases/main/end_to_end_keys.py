@@ -23,6 +23,7 @@ from typing import (
     Mapping,
     Optional,
     Sequence,
+    Set,
     Tuple,
     Union,
     cast,
@@ -60,6 +61,10 @@ if TYPE_CHECKING:
     from synapse.handlers.e2e_keys import SignatureListItem
     from synapse.server import HomeServer
 
+# The maximum number of devices to claim one time keys for in a single statement.
+# Each device takes two query parameters.
+_CLAIM_E2E_KEYS_BATCH_SIZE = 400
+
 
 @attr.s(slots=True, auto_attribs=True)
 class DeviceKeyLookupResult:
@@ -182,6 +187,40 @@ class EndToEndKeyWorkerStore(EndToEndKeyBackgroundStore, CacheInvalidationWorker
 
         return rv
 
+    @cached(iterable=True)
+    def _get_e2e_device_keys_for_user_cs_api(
+        self, user_id: str
+    ) -> Mapping[str, JsonDict]:
+        """Dummy function.  Only used to make a cache for
+        get_e2e_device_keys_for_users_cs_api.
+        """
+        raise NotImplementedError()
+
+    @cachedList(
+        cached_method_name="_get_e2e_device_keys_for_user_cs_api",
+        list_name="user_ids",
+    )
+    async def get_e2e_device_keys_for_users_cs_api(
+        self, user_ids: Collection[str]
+    ) -> Mapping[str, Mapping[str, JsonDict]]:
+        """Fetch the keys of all the devices of the given users, formatted
+        suitably for the C/S API (including device display names).
+
+        The results are cached per user, and the cache is invalidated whenever
+        the user's device list changes. They must not be modified.
+
+        Args:
+            user_ids: the users whose device keys are being requested
+
+        Returns:
+            A mapping from user ID to device ID to key data. The key data is in
+            the same format as returned by `get_e2e_device_keys_for_cs_api`.
+        """
+        results = await self.get_e2e_device_keys_for_cs_api(
+            [(user_id, None) for user_id in user_ids]
+        )
+        return {user_id: results.get(user_id, {}) for user_id in user_ids}
+
     @overload
     async def get_e2e_device_keys_and_signatures(
         self,
@@ -1023,157 +1062,235 @@ class EndToEndKeyWorkerStore(EndToEndKeyBackgroundStore, CacheInvalidationWorker
     ) -> Dict[str, Dict[str, Dict[str, str]]]:
         """Take a list of one time keys out of the database.
 
+        Keys are claimed in bulk: one statement per algorithm (and per chunk of
+        devices) claims a key for every requested device, rather than running a
+        transaction for each device. Devices without any one time keys left are
+        given their fallback key, if they have one.
+
         Args:
             query_list: An iterable of tuples of (user ID, device ID, algorithm).
 
         Returns:
             A map of user ID -> a map device ID -> a map of key ID -> JSON bytes.
         """
+        devices_by_algorithm: Dict[str, Set[Tuple[str, str]]] = {}
+        for user_id, device_id, algorithm in query_list:
+            devices_by_algorithm.setdefault(algorithm, set()).add((user_id, device_id))
 
-        @trace
-        def _claim_e2e_one_time_key_simple(
-            txn: LoggingTransaction, user_id: str, device_id: str, algorithm: str
-        ) -> Optional[Tuple[str, str]]:
-            """Claim OTK for device for DBs that don't support RETURNING.
+        results: Dict[str, Dict[str, Dict[str, str]]] = {}
+        missing: Dict[str, List[Tuple[str, str]]] = {}
+        for algorithm, devices in devices_by_algorithm.items():
+            for chunk in batch_iter(devices, _CLAIM_E2E_KEYS_BATCH_SIZE):
+                if self.database_engine.supports_returning:
+                    # A single DELETE ... RETURNING, so we can use autocommit
+                    # mode.
+                    claim_txn = self._claim_e2e_one_time_keys_returning_txn
+                    db_autocommit = True
+                else:
+                    claim_txn = self._claim_e2e_one_time_keys_simple_txn
+                    db_autocommit = False
+
+                claimed = await self.db_pool.runInteraction(
+                    "claim_e2e_one_time_keys",
+                    claim_txn,
+                    algorithm,
+                    chunk,
+                    db_autocommit=db_autocommit,
+                )
+                claimed_devices: Set[Tuple[str, str]] = set()
+                for user_id, device_id, key_id, key_json in claimed:
+                    device_results = results.setdefault(user_id, {}).setdefault(
+                        device_id, {}
+                    )
+                    device_results[f"{algorithm}:{key_id}"] = key_json
+                    claimed_devices.add((user_id, device_id))
 
-            Returns:
-                A tuple of key name (algorithm + key ID) and key JSON, if an
-                OTK was found.
-            """
+                missing.setdefault(algorithm, []).extend(
+                    device for device in chunk if device not in claimed_devices
+                )
 
-            sql = """
-                SELECT key_id, key_json FROM e2e_one_time_keys_json
-                WHERE user_id = ? AND device_id = ? AND algorithm = ?
-                LIMIT 1
-            """
+        # No one-time key available for these devices, so see if there's a
+        # fallback key.
+        for algorithm, missing_devices in missing.items():
+            for chunk in batch_iter(missing_devices, _CLAIM_E2E_KEYS_BATCH_SIZE):
+                fallback_keys = await self.db_pool.runInteraction(
+                    "claim_e2e_fallback_keys",
+                    self._claim_e2e_fallback_keys_txn,
+                    algorithm,
+                    chunk,
+                )
+                for user_id, device_id, key_id, key_json in fallback_keys:
+                    device_results = results.setdefault(user_id, {}).setdefault(
+                        device_id, {}
+                    )
+                    device_results[f"{algorithm}:{key_id}"] = key_json
 
-            txn.execute(sql, (user_id, device_id, algorithm))
-            otk_row = txn.fetchone()
-            if otk_row is None:
-                return None
+        return results
 
-            key_id, key_json = otk_row
+    @trace
+    def _claim_e2e_one_time_keys_returning_txn(
+        self,
+        txn: LoggingTransaction,
+        algorithm: str,
+        devices: Collection[Tuple[str, str]],
+    ) -> List[Tuple[str, str, str, str]]:
+        """Claim an OTK for each of the given devices, for DBs that support
+        RETURNING.
 
-            self.db_pool.simple_delete_one_txn(
-                txn,
-                table="e2e_one_time_keys_json",
-                keyvalues={
-                    "user_id": user_id,
-                    "device_id": device_id,
-                    "algorithm": algorithm,
-                    "key_id": key_id,
-                },
+        Returns:
+            A list of (user ID, device ID, key ID, key JSON) tuples, for each
+            device that had an OTK.
+        """
+        sql = """
+            DELETE FROM e2e_one_time_keys_json
+            WHERE algorithm = ? AND (user_id, device_id, key_id) IN (
+                %s
             )
+            RETURNING user_id, device_id, key_id, key_json
+        """ % (
+            self._select_e2e_one_time_key_to_claim_sql(len(devices)),
+        )
+
+        args: List[str] = [algorithm, algorithm]
+        for user_id, device_id in devices:
+            args.extend((user_id, device_id))
+
+        txn.execute(sql, args)
+        claimed = cast(List[Tuple[str, str, str, str]], txn.fetchall())
+
+        for user_id, device_id, _, _ in claimed:
             self._invalidate_cache_and_stream(
                 txn, self.count_e2e_one_time_keys, (user_id, device_id)
             )
 
-            return f"{algorithm}:{key_id}", key_json
+        return claimed
 
-        @trace
-        def _claim_e2e_one_time_key_returning(
-            txn: LoggingTransaction, user_id: str, device_id: str, algorithm: str
-        ) -> Optional[Tuple[str, str]]:
-            """Claim OTK for device for DBs that support RETURNING.
+    @trace
+    def _claim_e2e_one_time_keys_simple_txn(
+        self,
+        txn: LoggingTransaction,
+        algorithm: str,
+        devices: Collection[Tuple[str, str]],
+    ) -> List[Tuple[str, str, str, str]]:
+        """Claim an OTK for each of the given devices, for DBs that don't support
+        RETURNING.
 
-            Returns:
-                A tuple of key name (algorithm + key ID) and key JSON, if an
-                OTK was found.
-            """
+        Returns:
+            A list of (user ID, device ID, key ID, key JSON) tuples, for each
+            device that had an OTK.
+        """
+        sql = """
+            SELECT user_id, device_id, key_id, key_json
+            FROM e2e_one_time_keys_json
+            WHERE algorithm = ? AND (user_id, device_id, key_id) IN (
+                %s
+            )
+        """ % (
+            self._select_e2e_one_time_key_to_claim_sql(len(devices)),
+        )
 
-            # We can use RETURNING to do the fetch and DELETE in once step.
-            sql = """
-                DELETE FROM e2e_one_time_keys_json
-                WHERE user_id = ? AND device_id = ? AND algorithm = ?
-                    AND key_id IN (
-                        SELECT key_id FROM e2e_one_time_keys_json
-                        WHERE user_id = ? AND device_id = ? AND algorithm = ?
-                        LIMIT 1
-                    )
-                RETURNING key_id, key_json
-            """
+        args: List[str] = [algorithm, algorithm]
+        for user_id, device_id in devices:
+            args.extend((user_id, device_id))
 
-            txn.execute(
-                sql, (user_id, device_id, algorithm, user_id, device_id, algorithm)
-            )
-            otk_row = txn.fetchone()
-            if otk_row is None:
-                return None
+        txn.execute(sql, args)
+        claimed = cast(List[Tuple[str, str, str, str]], txn.fetchall())
+
+        txn.execute_batch(
+            """
+            DELETE FROM e2e_one_time_keys_json
+            WHERE user_id = ? AND device_id = ? AND algorithm = ? AND key_id = ?
+            """,
+            [
+                (user_id, device_id, algorithm, key_id)
+                for user_id, device_id, key_id, _ in claimed
+            ],
+        )
 
+        for user_id, device_id, _, _ in claimed:
             self._invalidate_cache_and_stream(
                 txn, self.count_e2e_one_time_keys, (user_id, device_id)
             )
 
-            key_id, key_json = otk_row
-            return f"{algorithm}:{key_id}", key_json
+        return claimed
 
-        results: Dict[str, Dict[str, Dict[str, str]]] = {}
-        for user_id, device_id, algorithm in query_list:
-            if self.database_engine.supports_returning:
-                # If we support RETURNING clause we can use a single query that
-                # allows us to use autocommit mode.
-                _claim_e2e_one_time_key = _claim_e2e_one_time_key_returning
-                db_autocommit = True
-            else:
-                _claim_e2e_one_time_key = _claim_e2e_one_time_key_simple
-                db_autocommit = False
+    @staticmethod
+    def _select_e2e_one_time_key_to_claim_sql(num_devices: int) -> str:
+        """Returns a query which selects the (user ID, device ID, key ID) of a
+        single OTK for each of `num_devices` devices.
 
-            claim_row = await self.db_pool.runInteraction(
-                "claim_e2e_one_time_keys",
-                _claim_e2e_one_time_key,
-                user_id,
-                device_id,
-                algorithm,
-                db_autocommit=db_autocommit,
-            )
-            if claim_row:
-                device_results = results.setdefault(user_id, {}).setdefault(
-                    device_id, {}
-                )
-                device_results[claim_row[0]] = claim_row[1]
-                continue
+        The query takes the algorithm, followed by a user ID and device ID for
+        each device, as parameters.
+        """
+        return """
+            SELECT user_id, device_id, key_id FROM (
+                SELECT
+                    user_id, device_id, key_id,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY user_id, device_id ORDER BY key_id
+                    ) AS claim_rank
+                FROM e2e_one_time_keys_json
+                WHERE algorithm = ? AND (user_id, device_id) IN (VALUES %s)
+            ) AS ranked_keys
+            WHERE claim_rank = 1
+        """ % (
+            ", ".join("(?, ?)" for _ in range(num_devices)),
+        )
 
-            # No one-time key available, so see if there's a fallback
-            # key
-            row = await self.db_pool.simple_select_one(
-                table="e2e_fallback_keys_json",
-                keyvalues={
-                    "user_id": user_id,
-                    "device_id": device_id,
-                    "algorithm": algorithm,
-                },
-                retcols=("key_id", "key_json", "used"),
-                desc="_get_fallback_key",
-                allow_none=True,
-            )
-            if row is None:
-                continue
+    @trace
+    def _claim_e2e_fallback_keys_txn(
+        self,
+        txn: LoggingTransaction,
+        algorithm: str,
+        devices: Collection[Tuple[str, str]],
+    ) -> List[Tuple[str, str, str, str]]:
+        """Fetch the fallback key of each of the given devices, marking them as
+        used if they weren't already.
 
-            key_id = row["key_id"]
-            key_json = row["key_json"]
-            used = row["used"]
+        Returns:
+            A list of (user ID, device ID, key ID, key JSON) tuples, for each
+            device that had a fallback key.
+        """
+        sql = """
+            SELECT user_id, device_id, key_id, key_json, used
+            FROM e2e_fallback_keys_json
+            WHERE algorithm = ? AND (user_id, device_id) IN (VALUES %s)
+        """ % (
+            ", ".join("(?, ?)" for _ in devices),
+        )
 
-            # Mark fallback key as used if not already.
-            if not used:
-                await self.db_pool.simple_update_one(
-                    table="e2e_fallback_keys_json",
-                    keyvalues={
-                        "user_id": user_id,
-                        "device_id": device_id,
-                        "algorithm": algorithm,
-                        "key_id": key_id,
-                    },
-                    updatevalues={"used": True},
-                    desc="_get_fallback_key_set_used",
-                )
-                await self.invalidate_cache_and_stream(
-                    "get_e2e_unused_fallback_key_types", (user_id, device_id)
-                )
+        args: List[str] = [algorithm]
+        for user_id, device_id in devices:
+            args.extend((user_id, device_id))
 
-            device_results = results.setdefault(user_id, {}).setdefault(device_id, {})
-            device_results[f"{algorithm}:{key_id}"] = key_json
+        txn.execute(sql, args)
+        rows = cast(List[Tuple[str, str, str, str, bool]], txn.fetchall())
 
-        return results
+        # Mark fallback keys as used if not already.
+        newly_used = [
+            (user_id, device_id, key_id)
+            for user_id, device_id, key_id, _, used in rows
+            if not used
+        ]
+        txn.execute_batch(
+            """
+            UPDATE e2e_fallback_keys_json SET used = ?
+            WHERE user_id = ? AND device_id = ? AND algorithm = ? AND key_id = ?
+            """,
+            [
+                (True, user_id, device_id, algorithm, key_id)
+                for user_id, device_id, key_id in newly_used
+            ],
+        )
+        for user_id, device_id, _ in newly_used:
+            self._invalidate_cache_and_stream(
+                txn, self.get_e2e_unused_fallback_key_types, (user_id, device_id)
+            )
+
+        return [
+            (user_id, device_id, key_id, key_json)
+            for user_id, device_id, key_id, key_json, _ in rows
+        ]
 
 
 class EndToEndKeyStore(EndToEndKeyWorkerStore, SQLBaseStore):
@@ -1227,6 +1344,9 @@ class EndToEndKeyStore(EndToEndKeyWorkerStore, SQLBaseStore):
                 keyvalues={"user_id": user_id, "device_id": device_id},
                 values={"ts_added_ms": time_now, "key_json": new_key_json},
             )
+            txn.call_after(
+                self._get_e2e_device_keys_for_user_cs_api.invalidate, (user_id,)
+            )
             log_kv({"message": "Device keys stored."})
             return True
 
@@ -1248,6 +1368,9 @@ class EndToEndKeyStore(EndToEndKeyWorkerStore, SQLBaseStore):
                 table="e2e_device_keys_json",
                 keyvalues={"user_id": user_id, "device_id": device_id},
             )
+            txn.call_after(
+                self._get_e2e_device_keys_for_user_cs_api.invalidate, (user_id,)
+            )
             self.db_pool.simple_delete_txn(
                 txn,
                 table="e2e_one_time_keys_json",
@@ -1395,3 +1518,6 @@ class EndToEndKeyStore(EndToEndKeyWorkerStore, SQLBaseStore):
             ],
             desc="add_e2e_signing_key",
         )
+
+        # Signatures made by the owner of a device are included in its keys.
+        self._get_e2e_device_keys_for_user_cs_api.invalidate((user_id,))
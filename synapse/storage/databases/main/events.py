@@ -45,7 +45,10 @@ from synapse.storage.database import (
     LoggingDatabaseConnection,
     LoggingTransaction,
 )
-from synapse.storage.databases.main.events_worker import EventCacheEntry
+from synapse.storage.databases.main.events_worker import (
+    EventCacheEntry,
+    SharedEventCache,
+)
 from synapse.storage.databases.main.search import SearchEntry
 from synapse.storage.engines import PostgresEngine
 from synapse.storage.util.id_generators import AbstractStreamIdGenerator
@@ -1684,10 +1687,15 @@ class PersistEventsStore:
                 to_prefill.append(EventCacheEntry(event=event, redacted_event=None))
 
         async def prefill() -> None:
-            for cache_entry in to_prefill:
-                await self.store._get_event_cache.set(
-                    (cache_entry.event.event_id,), cache_entry
-                )
+            entries = [
+                ((cache_entry.event.event_id,), cache_entry)
+                for cache_entry in to_prefill
+            ]
+            event_cache = self.store._get_event_cache
+            if isinstance(event_cache, SharedEventCache):
+                await event_cache.share_many(entries)
+            else:
+                await event_cache.set_many(entries)
 
         txn.async_call_after(prefill)
 
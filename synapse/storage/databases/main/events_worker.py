@@ -14,13 +14,17 @@
 
 import logging
 import threading
+import time
 import weakref
+from collections import deque
 from enum import Enum, auto
 from itertools import chain
 from typing import (
     TYPE_CHECKING,
     Any,
+    Callable,
     Collection,
+    Deque,
     Dict,
     Iterable,
     List,
@@ -28,12 +32,13 @@ from typing import (
     Optional,
     Set,
     Tuple,
+    TypeVar,
     cast,
     overload,
 )
 
 import attr
-from prometheus_client import Gauge
+from prometheus_client import Gauge, Histogram
 from typing_extensions import Literal
 
 from twisted.internet import defer
@@ -46,7 +51,7 @@ from synapse.api.room_versions import (
     RoomVersion,
     RoomVersions,
 )
-from synapse.events import EventBase, make_event_from_dict
+from synapse.events import CompactEvent, EventBase, make_event_from_dict
 from synapse.events.snapshot import EventContext
 from synapse.events.utils import prune_event
 from synapse.logging.context import (
@@ -89,10 +94,13 @@ from synapse.util.iterutils import batch_iter
 from synapse.util.metrics import Measure
 
 if TYPE_CHECKING:
+    from synapse.replication.tcp.external_cache import ExternalCache
     from synapse.server import HomeServer
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 # These values are used in the `enqueue_event` and `_fetch_loop` methods to
 # control how we batch/bulk fetch events from the database.
@@ -103,12 +111,51 @@ EVENT_QUEUE_THREADS = 3  # Max number of threads that will fetch events
 EVENT_QUEUE_ITERATIONS = 3  # No. times we block waiting for requests for events
 EVENT_QUEUE_TIMEOUT_S = 0.1  # Timeout when waiting for requests for events
 
+# Requests for at most this many events are put in the "small" lane, which is
+# serviced before the "large" lane. Requests from clients are typically small,
+# whereas backfill and federation tend to request many events at once, so this
+# stops the latter from holding up the former.
+EVENT_FETCH_SMALL_REQUEST_SIZE = 20
+# Requests in the "large" lane which have been waiting this long are serviced
+# ahead of the "small" lane, so that they can't be starved.
+EVENT_FETCH_MAX_LARGE_WAIT_S = 1.0
+
+# The number of events fetched in one go is tuned so that each fetch takes
+# about this long, based on how long previous fetches took per event, within
+# the given bounds. A single request is never split up, so may exceed the bound.
+EVENT_FETCH_TARGET_BATCH_DURATION_S = 0.1
+EVENT_FETCH_MIN_BATCH_SIZE = 100
+EVENT_FETCH_MAX_BATCH_SIZE = 2000
+
 
 event_fetch_ongoing_gauge = Gauge(
     "synapse_event_fetch_ongoing",
     "The number of event fetchers that are running",
 )
 
+event_fetch_queue_depth = Histogram(
+    "synapse_event_fetch_queue_depth",
+    "The number of requests for events waiting to be fetched, each time a fetcher "
+    "takes a batch of requests",
+    labelnames=["lane"],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+event_fetch_batch_size = Histogram(
+    "synapse_event_fetch_batch_size",
+    "The number of events requested from each lane in each batch fetched from the "
+    "database",
+    labelnames=["lane"],
+    buckets=(1, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000),
+)
+
+event_fetch_wait_time = Histogram(
+    "synapse_event_fetch_wait_seconds",
+    "Time requests for events spent waiting to be fetched from the database",
+    labelnames=["lane"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
 
 class InvalidEventError(Exception):
     """The event retrieved from the database is invalid and cannot be used."""
@@ -120,6 +167,177 @@ class EventCacheEntry:
     redacted_event: Optional[EventBase]
 
 
+# The name of the external cache that events are shared between workers in.
+EXTERNAL_EVENT_CACHE_NAME = "get_event"
+
+# Keys of the internal metadata which are only ever set in memory, and so should
+# not be shared with other workers.
+_NON_SHARED_INTERNAL_METADATA_KEYS = ("before", "after", "order")
+
+
+def _event_cache_entry_to_json(entry: EventCacheEntry) -> Optional[JsonDict]:
+    """Serialise an event cache entry so that it can be shared with other workers.
+
+    Returns:
+        The serialised entry, or None if the entry can't be shared (because the
+        event has been redacted).
+    """
+    if entry.redacted_event is not None:
+        return None
+
+    event = entry.event
+    internal_metadata = event.internal_metadata.get_dict()
+    for key in _NON_SHARED_INTERNAL_METADATA_KEYS:
+        internal_metadata.pop(key, None)
+
+    return {
+        "room_version": event.room_version.identifier,
+        "event": event.get_dict(),
+        "internal_metadata": internal_metadata,
+        "rejected_reason": event.rejected_reason,
+        "stream_ordering": event.internal_metadata.stream_ordering,
+        "outlier": event.internal_metadata.outlier,
+    }
+
+
+def _event_cache_entry_from_json(
+    entry_json: JsonDict, compact: bool = False
+) -> Optional[EventCacheEntry]:
+    """Deserialise an event cache entry shared by another worker.
+
+    Args:
+        entry_json: The serialised cache entry.
+        compact: Whether to build a `CompactEvent`.
+
+    Returns:
+        The cache entry, or None if the room version of the event is unknown to
+        this worker.
+    """
+    room_version = KNOWN_ROOM_VERSIONS.get(entry_json["room_version"])
+    if room_version is None:
+        return None
+
+    make_event: Callable[..., EventBase] = make_event_from_dict
+    if compact:
+        make_event = CompactEvent
+    event = make_event(
+        event_dict=entry_json["event"],
+        room_version=room_version,
+        internal_metadata_dict=entry_json["internal_metadata"],
+        rejected_reason=entry_json["rejected_reason"],
+    )
+    event.internal_metadata.stream_ordering = entry_json["stream_ordering"]
+    event.internal_metadata.outlier = entry_json["outlier"]
+
+    return EventCacheEntry(event=event, redacted_event=None)
+
+
+class SharedEventCache(AsyncLruCache[Tuple[str], EventCacheEntry]):
+    """An event cache which is shared between workers via the external cache
+    (Redis), in front of the usual in-memory cache.
+
+    Only unredacted events are shared, as redacted events need the redaction
+    event to be rebuilt. Entries are only ever added to the external cache by the
+    event persister, via `share_many`, as the events are persisted: events loaded
+    from the database are only cached locally. Otherwise a worker which loaded an
+    event before it was redacted could write it back to the external cache after
+    the redaction had removed it. The persister handles an event and any
+    redactions of it in order, so the redaction always removes the entry after
+    it has been added.
+
+    Entries expire from the external cache after `expiry_ms`. If `compact_events`
+    is true, events fetched from the external cache are built as `CompactEvent`s.
+    """
+
+    def __init__(
+        self,
+        external_cache: "ExternalCache",
+        expiry_ms: int,
+        cache_name: str,
+        max_size: int,
+        compact_events: bool = False,
+    ):
+        super().__init__(cache_name=cache_name, max_size=max_size)
+        self._external_cache = external_cache
+        self._expiry_ms = expiry_ms
+        self._compact_events = compact_events
+
+    async def get(
+        self, key: Tuple[str], default: Optional[T] = None, update_metrics: bool = True
+    ) -> Optional[EventCacheEntry]:
+        entry = self.get_local(key, update_metrics=update_metrics)
+        if entry is None:
+            entry = await self.get_external(key, update_metrics=update_metrics)
+        return entry
+
+    async def get_external(
+        self,
+        key: Tuple[str],
+        default: Optional[T] = None,
+        update_metrics: bool = True,
+    ) -> Optional[EventCacheEntry]:
+        entries = await self.get_many_external([key], update_metrics=update_metrics)
+        return entries.get(key)
+
+    async def get_many_external(
+        self, keys: Collection[Tuple[str]], update_metrics: bool = True
+    ) -> Dict[Tuple[str], EventCacheEntry]:
+        results = await self._external_cache.get_many(
+            EXTERNAL_EVENT_CACHE_NAME,
+            [event_id for (event_id,) in keys],
+            update_metrics=update_metrics,
+        )
+
+        entries = {}
+        for event_id, entry_json in results.items():
+            entry = _event_cache_entry_from_json(entry_json, self._compact_events)
+            if entry is None:
+                continue
+
+            # Keep a local copy, so that we don't have to go back to the external
+            # cache next time.
+            self.set_local((event_id,), entry)
+            entries[(event_id,)] = entry
+
+        return entries
+
+    async def set(self, key: Tuple[str], value: EventCacheEntry) -> None:
+        # Events loaded from the database are only cached locally: see the class
+        # docstring.
+        self.set_local(key, value)
+
+    async def set_many(
+        self, values: Iterable[Tuple[Tuple[str], EventCacheEntry]]
+    ) -> None:
+        for key, value in values:
+            self.set_local(key, value)
+
+    async def share_many(
+        self, values: Iterable[Tuple[Tuple[str], EventCacheEntry]]
+    ) -> None:
+        """Add newly persisted events to both the local and external caches.
+
+        This must only be called by the event persister, as the events are
+        persisted.
+        """
+        to_share = {}
+        for (event_id,), entry in values:
+            self.set_local((event_id,), entry)
+
+            entry_json = _event_cache_entry_to_json(entry)
+            if entry_json is not None:
+                to_share[event_id] = entry_json
+
+        await self._external_cache.set_many(
+            EXTERNAL_EVENT_CACHE_NAME, to_share, self._expiry_ms
+        )
+
+    async def invalidate(self, key: Tuple[str]) -> None:
+        (event_id,) = key
+        await self._external_cache.delete(EXTERNAL_EVENT_CACHE_NAME, event_id)
+        self.invalidate_local(key)
+
+
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class _EventRow:
     """
@@ -161,6 +379,29 @@ class _EventRow:
     outlier: bool
 
 
+@attr.s(slots=True, auto_attribs=True)
+class _EventFetchRequest:
+    """A request for events queued to be fetched by an event fetcher.
+
+    Properties:
+        event_ids: The events to fetch.
+
+        deferred: Completed with a map from event ID to row data once the events
+            have been fetched. Note that the map may contain events which were
+            not requested.
+
+        lane: "small" or "large", depending on the number of events requested.
+
+        enqueued_at: When the request was queued, in seconds, as returned by
+            `time.monotonic`.
+    """
+
+    event_ids: Collection[str]
+    deferred: "defer.Deferred[Dict[str, _EventRow]]"
+    lane: str
+    enqueued_at: float
+
+
 class EventRedactBehaviour(Enum):
     """
     What to do when retrieving a redacted event from the database.
@@ -260,12 +501,24 @@ class EventsWorkerStore(SQLBaseStore):
                 5 * 60 * 1000,
             )
 
-        self._get_event_cache: AsyncLruCache[
-            Tuple[str], EventCacheEntry
-        ] = AsyncLruCache(
-            cache_name="*getEvent*",
-            max_size=hs.config.caches.event_cache_size,
-        )
+        self._get_event_cache: AsyncLruCache[Tuple[str], EventCacheEntry]
+        external_cache = hs.get_external_cache()
+        if (
+            hs.config.caches.external_event_cache_duration
+            and external_cache.is_enabled()
+        ):
+            self._get_event_cache = SharedEventCache(
+                external_cache=external_cache,
+                expiry_ms=hs.config.caches.external_event_cache_duration,
+                cache_name="*getEvent*",
+                max_size=hs.config.caches.event_cache_size,
+                compact_events=hs.config.caches.compact_event_cache,
+            )
+        else:
+            self._get_event_cache = AsyncLruCache(
+                cache_name="*getEvent*",
+                max_size=hs.config.caches.event_cache_size,
+            )
 
         # Map from event ID to a deferred that will result in a map from event
         # ID to cache entry. Note that the returned dict may not have the
@@ -281,9 +534,17 @@ class EventsWorkerStore(SQLBaseStore):
         self._event_ref: MutableMapping[str, EventBase] = weakref.WeakValueDictionary()
 
         self._event_fetch_lock = threading.Condition()
-        self._event_fetch_list: List[
-            Tuple[Iterable[str], "defer.Deferred[Dict[str, _EventRow]]"]
-        ] = []
+        # The queued requests for events, for each lane. See
+        # `EVENT_FETCH_SMALL_REQUEST_SIZE`.
+        self._event_fetch_queues: Dict[str, Deque[_EventFetchRequest]] = {
+            "small": deque(),
+            "large": deque(),
+        }
+        # An estimate of how long it takes to fetch a single event, in seconds,
+        # used to decide how many events to fetch at once.
+        self._event_fetch_time_per_event_s = (
+            EVENT_FETCH_TARGET_BATCH_DURATION_S / EVENT_FETCH_MIN_BATCH_SIZE
+        )
         self._event_fetch_ongoing = 0
         event_fetch_ongoing_gauge.set(self._event_fetch_ongoing)
 
@@ -787,9 +1048,6 @@ class EventsWorkerStore(SQLBaseStore):
                 Also creates entries in `self._current_event_fetches` to allow
                 concurrent `_get_events_from_cache_or_db` calls to reuse the same fetch.
                 """
-                log_ctx = current_context()
-                log_ctx.record_event_fetch(len(missing_events_ids))
-
                 # Add entries to `self._current_event_fetches` for each event we're
                 # going to pull from the DB. We use a single deferred that resolves
                 # to all the events we pulled from the DB (this will result in this
@@ -814,8 +1072,11 @@ class EventsWorkerStore(SQLBaseStore):
                         missing_events_ids,
                     )
                     # Now actually fetch any remaining events from the DB
+                    db_missing_events_ids = missing_events_ids - missing_events.keys()
+                    if db_missing_events_ids:
+                        current_context().record_event_fetch(len(db_missing_events_ids))
                     db_missing_events = await self._get_events_from_db(
-                        missing_events_ids - missing_events.keys(),
+                        db_missing_events_ids,
                     )
                     missing_events.update(db_missing_events)
                 except Exception as e:
@@ -944,16 +1205,11 @@ class EventsWorkerStore(SQLBaseStore):
             events: list of event_ids to fetch
             update_metrics: Whether to update the cache hit ratio metrics
         """
-        event_map = {}
-
-        for event_id in events:
-            ret = await self._get_event_cache.get_external(
-                (event_id,), None, update_metrics=update_metrics
-            )
-            if ret:
-                event_map[event_id] = ret
+        entries = await self._get_event_cache.get_many_external(
+            [(event_id,) for event_id in events], update_metrics=update_metrics
+        )
 
-        return event_map
+        return {event_id: entry for (event_id,), entry in entries.items()}
 
     def _get_events_from_local_cache(
         self, events: Iterable[str], update_metrics: bool = True
@@ -1051,11 +1307,79 @@ class EventsWorkerStore(SQLBaseStore):
             for e in state_to_include.values()
         ]
 
+    def _has_queued_event_fetches(self) -> bool:
+        """Whether there are any requests for events waiting to be fetched.
+
+        Must be called with `_event_fetch_lock` held.
+        """
+        return any(self._event_fetch_queues.values())
+
+    def _pop_all_event_fetches(self) -> List[_EventFetchRequest]:
+        """Remove and return all the requests for events waiting to be fetched.
+
+        Must be called with `_event_fetch_lock` held.
+        """
+        requests: List[_EventFetchRequest] = []
+        for queue in self._event_fetch_queues.values():
+            requests.extend(queue)
+            queue.clear()
+        return requests
+
+    def _pop_event_fetch_batch(self) -> List[_EventFetchRequest]:
+        """Remove and return the next batch of requests for events to fetch.
+
+        Requests in the "small" lane are taken before those in the "large" lane,
+        unless the oldest "large" request has been waiting for too long. Requests
+        are added to the batch until it would exceed the target batch size, but
+        the batch always includes at least one request (if there are any).
+
+        Must be called with `_event_fetch_lock` held.
+        """
+        small_queue = self._event_fetch_queues["small"]
+        large_queue = self._event_fetch_queues["large"]
+
+        if not small_queue and not large_queue:
+            return []
+
+        event_fetch_queue_depth.labels("small").observe(len(small_queue))
+        event_fetch_queue_depth.labels("large").observe(len(large_queue))
+
+        queues = [small_queue, large_queue]
+        if (
+            large_queue
+            and time.monotonic() - large_queue[0].enqueued_at
+            > EVENT_FETCH_MAX_LARGE_WAIT_S
+        ):
+            queues.reverse()
+
+        max_batch_size = min(
+            EVENT_FETCH_MAX_BATCH_SIZE,
+            max(
+                EVENT_FETCH_MIN_BATCH_SIZE,
+                int(
+                    EVENT_FETCH_TARGET_BATCH_DURATION_S
+                    / self._event_fetch_time_per_event_s
+                ),
+            ),
+        )
+
+        batch: List[_EventFetchRequest] = []
+        batch_size = 0
+        for queue in queues:
+            while queue and (
+                not batch or batch_size + len(queue[0].event_ids) <= max_batch_size
+            ):
+                request = queue.popleft()
+                batch.append(request)
+                batch_size += len(request.event_ids)
+
+        return batch
+
     def _maybe_start_fetch_thread(self) -> None:
         """Starts an event fetch thread if we are not yet at the maximum number."""
         with self._event_fetch_lock:
             if (
-                self._event_fetch_list
+                self._has_queued_event_fetches()
                 and self._event_fetch_ongoing < EVENT_QUEUE_THREADS
             ):
                 self._event_fetch_ongoing += 1
@@ -1069,7 +1393,7 @@ class EventsWorkerStore(SQLBaseStore):
             run_as_background_process("fetch_events", self._fetch_thread)
 
     async def _fetch_thread(self) -> None:
-        """Services requests for events from `_event_fetch_list`."""
+        """Services requests for events from `_event_fetch_queues`."""
         exc = None
         try:
             await self.db_pool.runWithConnection(self._fetch_loop)
@@ -1083,10 +1407,10 @@ class EventsWorkerStore(SQLBaseStore):
                 self._event_fetch_ongoing -= 1
                 event_fetch_ongoing_gauge.set(self._event_fetch_ongoing)
 
-                # There may still be work remaining in `_event_fetch_list` if we
+                # There may still be work remaining in `_event_fetch_queues` if we
                 # failed, or it was added in between us deciding to exit and
                 # decrementing `_event_fetch_ongoing`.
-                if self._event_fetch_list:
+                if self._has_queued_event_fetches():
                     if exc is None:
                         # We decided to exit, but then some more work was added
                         # before `_event_fetch_ongoing` was decremented.
@@ -1109,8 +1433,7 @@ class EventsWorkerStore(SQLBaseStore):
                             # We were the last remaining fetcher and failed.
                             # Fail any outstanding fetches since no one else will
                             # handle them.
-                            event_fetches_to_fail = self._event_fetch_list
-                            self._event_fetch_list = []
+                            event_fetches_to_fail = self._pop_all_event_fetches()
                         else:
                             # We weren't the last remaining fetcher, so another
                             # fetcher will pick up the work. This will either happen
@@ -1132,18 +1455,22 @@ class EventsWorkerStore(SQLBaseStore):
                 # Fail any outstanding fetches since no one else will handle them.
                 assert exc is not None
                 with PreserveLoggingContext():
-                    for _, deferred in event_fetches_to_fail:
-                        deferred.errback(exc)
+                    for request in event_fetches_to_fail:
+                        request.deferred.errback(exc)
 
     def _fetch_loop(self, conn: LoggingDatabaseConnection) -> None:
         """Takes a database connection and waits for requests for events from
-        the _event_fetch_list queue.
+        the _event_fetch_queues.
         """
         i = 0
         while True:
             with self._event_fetch_lock:
-                event_list = self._event_fetch_list
-                self._event_fetch_list = []
+                event_list = self._pop_event_fetch_batch()
+
+                if self._has_queued_event_fetches():
+                    # We didn't take everything, so wake up another fetcher (if
+                    # there are any waiting) to help.
+                    self._event_fetch_lock.notify()
 
                 if not event_list:
                     # There are no requests waiting. If we haven't yet reached the
@@ -1167,27 +1494,36 @@ class EventsWorkerStore(SQLBaseStore):
     def _fetch_event_list(
         self,
         conn: LoggingDatabaseConnection,
-        event_list: List[Tuple[Iterable[str], "defer.Deferred[Dict[str, _EventRow]]"]],
+        event_list: List[_EventFetchRequest],
     ) -> None:
-        """Handle a load of requests from the _event_fetch_list queue
+        """Handle a batch of requests from the _event_fetch_queues
 
         Args:
             conn: database connection
 
             event_list:
-                The fetch requests. Each entry consists of a list of event
-                ids to be fetched, and a deferred to be completed once the
-                events have been fetched.
-
-                The deferreds are callbacked with a dictionary mapping from event id
-                to event row. Note that it may well contain additional events that
-                were not part of this request.
+                The fetch requests. The deferred of each request is callbacked
+                with a dictionary mapping from event id to event row. Note that it
+                may well contain additional events that were not part of the
+                request.
         """
         with Measure(self._clock, "_fetch_event_list"):
             try:
-                events_to_fetch = {
-                    event_id for events, _ in event_list for event_id in events
-                }
+                start = time.monotonic()
+                for request in event_list:
+                    event_fetch_wait_time.labels(request.lane).observe(
+                        start - request.enqueued_at
+                    )
+
+                events_by_lane: Dict[str, Set[str]] = {}
+                for request in event_list:
+                    events_by_lane.setdefault(request.lane, set()).update(
+                        request.event_ids
+                    )
+                for lane, lane_events in events_by_lane.items():
+                    event_fetch_batch_size.labels(lane).observe(len(lane_events))
+
+                events_to_fetch = set().union(*events_by_lane.values())
 
                 row_dict = self.db_pool.new_transaction(
                     conn,
@@ -1199,10 +1535,20 @@ class EventsWorkerStore(SQLBaseStore):
                     events_to_fetch,
                 )
 
+                if events_to_fetch:
+                    # Update our estimate of how long it takes to fetch an event,
+                    # giving more weight to recent fetches.
+                    time_per_event_s = (time.monotonic() - start) / len(events_to_fetch)
+                    with self._event_fetch_lock:
+                        self._event_fetch_time_per_event_s = (
+                            0.8 * self._event_fetch_time_per_event_s
+                            + 0.2 * time_per_event_s
+                        )
+
                 # We only want to resolve deferreds from the main thread
                 def fire() -> None:
-                    for _, d in event_list:
-                        d.callback(row_dict)
+                    for request in event_list:
+                        request.deferred.callback(row_dict)
 
                 with PreserveLoggingContext():
                     self.hs.get_reactor().callFromThread(fire)
@@ -1211,8 +1557,8 @@ class EventsWorkerStore(SQLBaseStore):
 
                 # We only want to resolve deferreds from the main thread
                 def fire_errback(exc: Exception) -> None:
-                    for _, d in event_list:
-                        d.errback(exc)
+                    for request in event_list:
+                        request.deferred.errback(exc)
 
                 with PreserveLoggingContext():
                     self.hs.get_reactor().callFromThread(fire_errback, e)
@@ -1362,7 +1708,12 @@ class EventsWorkerStore(SQLBaseStore):
                     )
                     continue
 
-            original_ev = make_event_from_dict(
+            # Events loaded from the database end up in the event cache, so use
+            # the compact representation if it is enabled.
+            make_event: Callable[..., EventBase] = make_event_from_dict
+            if self.hs.config.caches.compact_event_cache:
+                make_event = CompactEvent
+            original_ev = make_event(
                 event_dict=d,
                 room_version=room_version,
                 internal_metadata_dict=internal_metadata,
@@ -1398,17 +1749,20 @@ class EventsWorkerStore(SQLBaseStore):
                 event=original_ev, redacted_event=redacted_event
             )
 
-            await self._get_event_cache.set((event_id,), cache_entry)
             result_map[event_id] = cache_entry
 
             if not redacted_event:
                 # We only cache references to unredacted events.
                 self._event_ref[event_id] = original_ev
 
+        await self._get_event_cache.set_many(
+            ((event_id,), cache_entry) for event_id, cache_entry in result_map.items()
+        )
+
         return result_map
 
     async def _enqueue_events(self, events: Collection[str]) -> Dict[str, _EventRow]:
-        """Fetches events from the database using the _event_fetch_list. This
+        """Fetches events from the database using the _event_fetch_queues. This
         allows batch and bulk fetching of events - it allows us to fetch events
         without having to create a new transaction for each request for events.
 
@@ -1421,8 +1775,16 @@ class EventsWorkerStore(SQLBaseStore):
         """
 
         events_d: "defer.Deferred[Dict[str, _EventRow]]" = defer.Deferred()
+        lane = "small" if len(events) <= EVENT_FETCH_SMALL_REQUEST_SIZE else "large"
         with self._event_fetch_lock:
-            self._event_fetch_list.append((events, events_d))
+            self._event_fetch_queues[lane].append(
+                _EventFetchRequest(
+                    event_ids=events,
+                    deferred=events_d,
+                    lane=lane,
+                    enqueued_at=time.monotonic(),
+                )
+            )
             self._event_fetch_lock.notify()
 
         self._maybe_start_fetch_thread()
@@ -735,3 +735,84 @@ class MediaRepositoryStore(MediaRepositoryBackgroundUpdateStore):
         await self.db_pool.runInteraction(
             "delete_url_cache_media", _delete_url_cache_media_txn
         )
+
+    async def add_media_to_local_cache(self, path: str, size: int, ts: int) -> None:
+        """Record that the given file in the local media store is also held by a
+        storage provider, and so may be evicted from local disk.
+
+        Args:
+            path: The path of the file, relative to the media store.
+            size: The size of the file in bytes.
+            ts: The time the file was stored, in milliseconds.
+        """
+        await self.db_pool.simple_upsert(
+            "media_local_cache",
+            keyvalues={"path": path},
+            values={"size": size, "last_access_ts": ts},
+            desc="add_media_to_local_cache",
+        )
+
+    async def update_local_cache_last_access_time(
+        self, paths: Collection[str], time_ms: int
+    ) -> None:
+        """Updates the last access time of the given files in the local media
+        cache. Files which aren't in the cache are ignored.
+        """
+        if not paths:
+            return
+
+        def _update_local_cache_last_access_time_txn(txn: LoggingTransaction) -> None:
+            sql = "UPDATE media_local_cache SET last_access_ts = ? WHERE path = ?"
+            txn.execute_batch(sql, [(time_ms, path) for path in paths])
+
+        await self.db_pool.runInteraction(
+            "update_local_cache_last_access_time",
+            _update_local_cache_last_access_time_txn,
+        )
+
+    async def get_local_cache_size(self) -> int:
+        """Returns the total size in bytes of the files in the local media cache."""
+
+        def _get_local_cache_size_txn(txn: LoggingTransaction) -> int:
+            txn.execute("SELECT COALESCE(SUM(size), 0) FROM media_local_cache")
+            row = txn.fetchone()
+            assert row is not None
+            return int(row[0])
+
+        return await self.db_pool.runInteraction(
+            "get_local_cache_size", _get_local_cache_size_txn
+        )
+
+    async def get_least_recently_used_local_cache_media(
+        self, limit: int
+    ) -> List[Tuple[str, int]]:
+        """Returns the least recently used files in the local media cache.
+
+        Returns:
+            A list of (path, size) tuples, least recently used first.
+        """
+
+        def _get_least_recently_used_local_cache_media_txn(
+            txn: LoggingTransaction,
+        ) -> List[Tuple[str, int]]:
+            sql = (
+                "SELECT path, size FROM media_local_cache"
+                " ORDER BY last_access_ts ASC"
+                " LIMIT ?"
+            )
+            txn.execute(sql, (limit,))
+            return cast(List[Tuple[str, int]], txn.fetchall())
+
+        return await self.db_pool.runInteraction(
+            "get_least_recently_used_local_cache_media",
+            _get_least_recently_used_local_cache_media_txn,
+        )
+
+    async def remove_media_from_local_cache(self, paths: Collection[str]) -> None:
+        await self.db_pool.simple_delete_many(
+            "media_local_cache",
+            column="path",
+            iterable=paths,
+            keyvalues={},
+            desc="remove_media_from_local_cache",
+        )
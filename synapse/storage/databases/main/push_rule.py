@@ -18,6 +18,7 @@ from typing import (
     Any,
     Collection,
     Dict,
+    FrozenSet,
     Iterable,
     List,
     Mapping,
@@ -54,6 +55,7 @@ from synapse.synapse_rust.push import FilteredPushRules, PushRule, PushRules
 from synapse.types import JsonDict
 from synapse.util import json_encoder
 from synapse.util.caches.descriptors import cached, cachedList
+from synapse.util.caches.lrucache import LruCache
 from synapse.util.caches.stream_change_cache import StreamChangeCache
 
 if TYPE_CHECKING:
@@ -61,6 +63,12 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger(__name__)
 
+# A key identifying a user's set of push rules: their push rules (in priority
+# order) and which rules they have enabled/disabled.
+_PushRulesKey = Tuple[
+    Tuple[Tuple[str, int, str, str], ...], FrozenSet[Tuple[str, bool]]
+]
+
 
 def _load_rules(
     rawrules: List[JsonDict],
@@ -140,6 +148,14 @@ class PushRulesWorkerStore(
             prefilled_cache=push_rules_prefill,
         )
 
+        # Map from the key of a set of push rules to the loaded rules. This means
+        # that users with identical push rules (e.g. the defaults) share the same
+        # `FilteredPushRules`, which lets `BulkPushRuleEvaluator` only evaluate
+        # each distinct set of rules once per event.
+        self._interned_push_rules: LruCache[
+            _PushRulesKey, FilteredPushRules
+        ] = LruCache(cache_name="interned_push_rules", max_size=10000)
+
     def get_max_push_rules_stream_id(self) -> int:
         """Get the position of the push rules stream.
 
@@ -185,7 +201,33 @@ class PushRulesWorkerStore(
 
         enabled_map = await self.get_push_rules_enabled_for_user(user_id)
 
-        return _load_rules(rows, enabled_map, self.hs.config.experimental)
+        return self._load_interned_rules(rows, enabled_map)
+
+    def _load_interned_rules(
+        self, rawrules: List[JsonDict], enabled_map: Dict[str, bool]
+    ) -> FilteredPushRules:
+        """Convert the DB rows of a user's push rules into a `FilteredPushRules`,
+        reusing the existing instance if another user has identical rules.
+        """
+        key: _PushRulesKey = (
+            tuple(
+                (
+                    rawrule["rule_id"],
+                    rawrule["priority_class"],
+                    rawrule["conditions"],
+                    rawrule["actions"],
+                )
+                for rawrule in rawrules
+            ),
+            frozenset(enabled_map.items()),
+        )
+
+        rules = self._interned_push_rules.get(key)
+        if rules is None:
+            rules = _load_rules(rawrules, enabled_map, self.hs.config.experimental)
+            self._interned_push_rules[key] = rules
+
+        return rules
 
     async def get_push_rules_enabled_for_user(self, user_id: str) -> Dict[str, bool]:
         results = await self.db_pool.simple_select_list(
@@ -244,8 +286,8 @@ class PushRulesWorkerStore(
         results: Dict[str, FilteredPushRules] = {}
 
         for user_id, rules in raw_rules.items():
-            results[user_id] = _load_rules(
-                rules, enabled_map_by_user.get(user_id, {}), self.hs.config.experimental
+            results[user_id] = self._load_interned_rules(
+                rules, enabled_map_by_user.get(user_id, {})
             )
 
         return results
@@ -43,7 +43,7 @@ from synapse.storage.util.id_generators import (
     MultiWriterIdGenerator,
     StreamIdGenerator,
 )
-from synapse.types import JsonDict
+from synapse.types import JsonDict, ReadReceipt
 from synapse.util import json_encoder
 from synapse.util.caches.descriptors import cached, cachedList
 from synapse.util.caches.stream_change_cache import StreamChangeCache
@@ -599,105 +599,240 @@ class ReceiptsWorkerStore(SQLBaseStore):
             self._receipts_id_gen.advance(instance_name, token)
         super().process_replication_position(stream_name, instance_name, token)
 
-    def _insert_linearized_receipt_txn(
+    def _get_receipt_event_stream_ordering_txn(
         self,
         txn: LoggingTransaction,
         room_id: str,
         receipt_type: str,
         user_id: str,
-        event_id: str,
         thread_id: Optional[str],
-        data: JsonDict,
-        stream_id: int,
     ) -> Optional[int]:
-        """Inserts a receipt into the database if it's newer than the current one.
+        """Get the stream ordering of the event the current receipt points to.
 
         Returns:
-            None if the receipt is older than the current receipt
-            otherwise, the rx timestamp of the event that the receipt corresponds to
-                (or 0 if the event is unknown)
+            The stream ordering, or None if there is no receipt or the event is
+            unknown.
+        """
+        if thread_id is None:
+            thread_clause = "r.thread_id IS NULL"
+            thread_args: Tuple[str, ...] = ()
+        else:
+            thread_clause = "r.thread_id = ?"
+            thread_args = (thread_id,)
+
+        sql = f"""
+            SELECT stream_ordering FROM events
+            INNER JOIN receipts_linearized AS r USING (event_id, room_id)
+            WHERE r.room_id = ? AND r.receipt_type = ? AND r.user_id = ? AND {thread_clause}
+        """
+        txn.execute(sql, (room_id, receipt_type, user_id) + thread_args)
+        row = txn.fetchone()
+        return int(row[0]) if row else None
+
+    def _insert_receipts_txn(
+        self,
+        txn: LoggingTransaction,
+        receipts: Sequence[ReadReceipt],
+        stream_ids: Sequence[int],
+    ) -> List[Tuple[ReadReceipt, int]]:
+        """Inserts a batch of receipts into the database, skipping any which are
+        older than the current receipt.
+
+        Receipts for the same room, receipt type, user and thread are coalesced:
+        the result is the same as inserting them one at a time, in order, but
+        only the final receipt is written. Receipts whose events can't be
+        linearized are skipped.
+
+        Args:
+            txn: The transaction
+            receipts: The receipts to insert. Each must have at least one event ID.
+            stream_ids: The stream IDs to give the persisted receipts. There must
+                be one for each distinct room, receipt type, user and thread in
+                `receipts`.
+
+        Returns:
+            The receipts which were persisted, along with their stream IDs.
         """
         assert self._can_write_to_receipts
 
-        res = self.db_pool.simple_select_one_txn(
+        # Group the receipts by the receipt they replace, converting each to its
+        # linearized form.
+        receipts_by_key: Dict[
+            Tuple[str, str, str, Optional[str]], List[Tuple[ReadReceipt, str]]
+        ] = {}
+        for receipt in receipts:
+            if len(receipt.event_ids) == 1:
+                linearized_event_id = receipt.event_ids[0]
+            else:
+                # we need to points in graph -> linearized form.
+                try:
+                    linearized_event_id = self._graph_to_linear(
+                        txn, receipt.room_id, receipt.event_ids
+                    )
+                except RuntimeError:
+                    # Don't let one bad receipt stop the rest of the batch from
+                    # being persisted.
+                    logger.warning(
+                        "Ignoring receipt %s in %s for %s for unrecognized events %r",
+                        receipt.receipt_type,
+                        receipt.room_id,
+                        receipt.user_id,
+                        receipt.event_ids,
+                    )
+                    continue
+
+            key = (
+                receipt.room_id,
+                receipt.receipt_type,
+                receipt.user_id,
+                receipt.thread_id,
+            )
+            receipts_by_key.setdefault(key, []).append((receipt, linearized_event_id))
+
+        rows = self.db_pool.simple_select_many_txn(
             txn,
             table="events",
-            retcols=["stream_ordering", "received_ts"],
-            keyvalues={"event_id": event_id},
-            allow_none=True,
+            column="event_id",
+            iterable={
+                event_id
+                for key_receipts in receipts_by_key.values()
+                for _, event_id in key_receipts
+            },
+            keyvalues={},
+            retcols=("event_id", "stream_ordering", "received_ts"),
         )
+        events = {
+            row["event_id"]: (int(row["stream_ordering"]), row["received_ts"])
+            for row in rows
+        }
 
-        stream_ordering = int(res["stream_ordering"]) if res else None
-        rx_ts = res["received_ts"] if res else 0
-
-        # We don't want to clobber receipts for more recent events, so we
-        # have to compare orderings of existing receipts
-        if stream_ordering is not None:
-            if thread_id is None:
-                thread_clause = "r.thread_id IS NULL"
-                thread_args: Tuple[str, ...] = ()
-            else:
-                thread_clause = "r.thread_id = ?"
-                thread_args = (thread_id,)
+        now = self._clock.time_msec()
 
-            sql = f"""
-            SELECT stream_ordering, event_id FROM events
-            INNER JOIN receipts_linearized AS r USING (event_id, room_id)
-            WHERE r.room_id = ? AND r.receipt_type = ? AND r.user_id = ? AND {thread_clause}
-            """
-            txn.execute(
-                sql,
-                (
-                    room_id,
-                    receipt_type,
-                    user_id,
+        # The receipts to write, along with their linearized event ID and its
+        # stream ordering (if known).
+        to_write: List[Tuple[ReadReceipt, str, Optional[int]]] = []
+        for key, key_receipts in receipts_by_key.items():
+            # We don't want to clobber receipts for more recent events, so we
+            # have to compare orderings of existing receipts. If the current
+            # receipt is for an unknown event then any new receipt replaces it.
+            current_ordering = None
+            if any(event_id in events for _, event_id in key_receipts):
+                current_ordering = self._get_receipt_event_stream_ordering_txn(
+                    txn, *key
                 )
-                + thread_args,
-            )
 
-            for so, eid in txn:
-                if int(so) >= stream_ordering:
+            latest: Optional[Tuple[ReadReceipt, str, Optional[int]]] = None
+            for receipt, event_id in key_receipts:
+                stream_ordering, rx_ts = events.get(event_id, (None, 0))
+                if (
+                    stream_ordering is not None
+                    and current_ordering is not None
+                    and current_ordering >= stream_ordering
+                ):
                     logger.debug(
                         "Ignoring new receipt for %s in favour of existing "
-                        "one for later event %s",
+                        "one for a later event",
                         event_id,
-                        eid,
                     )
-                    return None
+                    continue
+
+                logger.debug(
+                    "Receipt %s for event %s in %s (%i ms old)",
+                    receipt.receipt_type,
+                    event_id,
+                    receipt.room_id,
+                    now - rx_ts,
+                )
+                latest = (receipt, event_id, stream_ordering)
+                current_ordering = stream_ordering
+
+            if latest is not None:
+                to_write.append(latest)
+
+        persisted = [
+            (receipt, stream_id)
+            for (receipt, _, _), stream_id in zip(to_write, stream_ids)
+        ]
+
+        for receipt, stream_id in persisted:
+            txn.call_after(
+                self.invalidate_caches_for_receipt,
+                receipt.room_id,
+                receipt.receipt_type,
+                receipt.user_id,
+            )
+            txn.call_after(
+                self._receipts_stream_cache.entity_has_changed,
+                receipt.room_id,
+                stream_id,
+            )
+            txn.call_after(
+                self._get_receipts_for_user_with_orderings.invalidate,
+                (receipt.user_id, receipt.receipt_type),
+            )
+            # FIXME: This shouldn't invalidate the whole cache
+            txn.call_after(
+                self._get_linearized_receipts_for_room.invalidate, (receipt.room_id,)
+            )
 
-        txn.call_after(
-            self.invalidate_caches_for_receipt, room_id, receipt_type, user_id
-        )
+        # Receipts with and without a thread ID are covered by different unique
+        # indexes, so have to be upserted separately.
+        for threaded in (False, True):
+            rows_to_write = [
+                (receipt, event_id, stream_ordering, stream_id)
+                for (receipt, event_id, stream_ordering), stream_id in zip(
+                    to_write, stream_ids
+                )
+                if (receipt.thread_id is not None) == threaded
+            ]
+            if not rows_to_write:
+                continue
+
+            key_names = ["room_id", "receipt_type", "user_id"]
+            if threaded:
+                key_names.append("thread_id")
+                where_clause = None
+            else:
+                where_clause = "thread_id IS NULL"
 
-        txn.call_after(
-            self._receipts_stream_cache.entity_has_changed, room_id, stream_id
-        )
+            key_values = [
+                (receipt.room_id, receipt.receipt_type, receipt.user_id)
+                + ((receipt.thread_id,) if threaded else ())
+                for receipt, _, _, _ in rows_to_write
+            ]
 
-        keyvalues = {
-            "room_id": room_id,
-            "receipt_type": receipt_type,
-            "user_id": user_id,
-        }
-        where_clause = ""
-        if thread_id is None:
-            where_clause = "thread_id IS NULL"
-        else:
-            keyvalues["thread_id"] = thread_id
+            self.db_pool.simple_upsert_many_txn(
+                txn,
+                table="receipts_linearized",
+                key_names=key_names,
+                key_values=key_values,
+                value_names=(
+                    "stream_id",
+                    "event_id",
+                    "event_stream_ordering",
+                    "data",
+                ),
+                value_values=[
+                    (stream_id, event_id, stream_ordering, json_encoder.encode(r.data))
+                    for r, event_id, stream_ordering, stream_id in rows_to_write
+                ],
+                where_clause=where_clause,
+            )
 
-        self.db_pool.simple_upsert_txn(
-            txn,
-            table="receipts_linearized",
-            keyvalues=keyvalues,
-            values={
-                "stream_id": stream_id,
-                "event_id": event_id,
-                "event_stream_ordering": stream_ordering,
-                "data": json_encoder.encode(data),
-            },
-            where_clause=where_clause,
-        )
+            self.db_pool.simple_upsert_many_txn(
+                txn,
+                table="receipts_graph",
+                key_names=key_names,
+                key_values=key_values,
+                value_names=("event_ids", "data"),
+                value_values=[
+                    (json_encoder.encode(r.event_ids), json_encoder.encode(r.data))
+                    for r, _, _, _ in rows_to_write
+                ],
+                where_clause=where_clause,
+            )
 
-        return rx_ts
+        return persisted
 
     def _graph_to_linear(
         self, txn: LoggingTransaction, room_id: str, event_ids: List[str]
@@ -723,8 +858,8 @@ class ReceiptsWorkerStore(SQLBaseStore):
         )
 
         sql = """
-            SELECT event_id WHERE room_id = ? AND stream_ordering IN (
-                SELECT max(stream_ordering) WHERE %s
+            SELECT event_id FROM events WHERE room_id = ? AND stream_ordering IN (
+                SELECT max(stream_ordering) FROM events WHERE %s
             )
         """ % (
             clause,
@@ -737,122 +872,84 @@ class ReceiptsWorkerStore(SQLBaseStore):
         else:
             raise RuntimeError("Unrecognized event_ids: %r" % (event_ids,))
 
-    async def insert_receipt(
-        self,
-        room_id: str,
-        receipt_type: str,
-        user_id: str,
-        event_ids: List[str],
-        thread_id: Optional[str],
-        data: dict,
-    ) -> Optional[Tuple[int, int]]:
-        """Insert a receipt, either from local client or remote server.
+    async def insert_receipts(
+        self, receipts: Sequence[ReadReceipt]
+    ) -> Tuple[List[Tuple[ReadReceipt, int]], int]:
+        """Insert a batch of receipts, from local clients or remote servers.
 
         Automatically does conversion between linearized and graph
-        representations.
+        representations. Receipts which replace one another are coalesced, so
+        only the latest receipt for each room, receipt type, user and thread is
+        written.
 
         Returns:
-            The new receipts stream ID and token, if the receipt is newer than
-            what was previously persisted. None, otherwise.
+            The receipts which were newer than what was previously persisted,
+            along with their new receipts stream IDs, and the current receipts
+            stream token.
         """
         assert self._can_write_to_receipts
 
-        if not event_ids:
-            return None
+        receipts = [receipt for receipt in receipts if receipt.event_ids]
+        if not receipts:
+            return [], self._receipts_id_gen.get_current_token()
 
-        if len(event_ids) == 1:
-            linearized_event_id = event_ids[0]
-        else:
-            # we need to points in graph -> linearized form.
-            linearized_event_id = await self.db_pool.runInteraction(
-                "insert_receipt_conv", self._graph_to_linear, room_id, event_ids
-            )
+        num_keys = len(
+            {(r.room_id, r.receipt_type, r.user_id, r.thread_id) for r in receipts}
+        )
 
-        async with self._receipts_id_gen.get_next() as stream_id:  # type: ignore[attr-defined]
-            event_ts = await self.db_pool.runInteraction(
-                "insert_linearized_receipt",
-                self._insert_linearized_receipt_txn,
-                room_id,
-                receipt_type,
-                user_id,
-                linearized_event_id,
-                thread_id,
-                data,
-                stream_id=stream_id,
+        async with self._receipts_id_gen.get_next_mult(num_keys) as stream_ids:  # type: ignore[attr-defined]
+            persisted = await self.db_pool.runInteraction(
+                "insert_receipts",
+                self._insert_receipts_txn,
+                receipts,
+                stream_ids,
                 # Read committed is actually beneficial here because we check for a receipt with
                 # greater stream order, and checking the very latest data at select time is better
                 # than the data at transaction start time.
                 isolation_level=IsolationLevel.READ_COMMITTED,
             )
 
-        # If the receipt was older than the currently persisted one, nothing to do.
-        if event_ts is None:
-            return None
-
-        now = self._clock.time_msec()
-        logger.debug(
-            "Receipt %s for event %s in %s (%i ms old)",
-            receipt_type,
-            linearized_event_id,
-            room_id,
-            now - event_ts,
-        )
-
-        await self.db_pool.runInteraction(
-            "insert_graph_receipt",
-            self._insert_graph_receipt_txn,
-            room_id,
-            receipt_type,
-            user_id,
-            event_ids,
-            thread_id,
-            data,
-        )
-
         max_persisted_id = self._receipts_id_gen.get_current_token()
 
-        return stream_id, max_persisted_id
+        return persisted, max_persisted_id
 
-    def _insert_graph_receipt_txn(
+    async def insert_receipt(
         self,
-        txn: LoggingTransaction,
         room_id: str,
         receipt_type: str,
         user_id: str,
         event_ids: List[str],
         thread_id: Optional[str],
-        data: JsonDict,
-    ) -> None:
-        assert self._can_write_to_receipts
+        data: dict,
+    ) -> Optional[Tuple[int, int]]:
+        """Insert a receipt, either from local client or remote server.
+
+        Automatically does conversion between linearized and graph
+        representations.
 
-        txn.call_after(
-            self._get_receipts_for_user_with_orderings.invalidate,
-            (user_id, receipt_type),
+        Returns:
+            The new receipts stream ID and token, if the receipt is newer than
+            what was previously persisted. None, otherwise.
+        """
+        persisted, max_persisted_id = await self.insert_receipts(
+            [
+                ReadReceipt(
+                    room_id=room_id,
+                    receipt_type=receipt_type,
+                    user_id=user_id,
+                    event_ids=event_ids,
+                    thread_id=thread_id,
+                    data=data,
+                )
+            ]
         )
-        # FIXME: This shouldn't invalidate the whole cache
-        txn.call_after(self._get_linearized_receipts_for_room.invalidate, (room_id,))
 
-        keyvalues = {
-            "room_id": room_id,
-            "receipt_type": receipt_type,
-            "user_id": user_id,
-        }
-        where_clause = ""
-        if thread_id is None:
-            where_clause = "thread_id IS NULL"
-        else:
-            keyvalues["thread_id"] = thread_id
+        # If the receipt was older than the currently persisted one, nothing to do.
+        if not persisted:
+            return None
 
-        self.db_pool.simple_upsert_txn(
-            txn,
-            table="receipts_graph",
-            keyvalues=keyvalues,
-            values={
-                "event_ids": json_encoder.encode(event_ids),
-                "data": json_encoder.encode(data),
-            },
-            where_clause=where_clause,
-        )
+        _, stream_id = persisted[0]
+        return stream_id, max_persisted_id
 
 
 class ReceiptsBackgroundUpdateStore(SQLBaseStore):
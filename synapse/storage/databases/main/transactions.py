@@ -76,6 +76,13 @@ class TransactionWorkerStore(CacheInvalidationWorkerStore):
         if hs.config.worker.run_background_tasks:
             self._clock.looping_call(self._cleanup_transactions, 30 * 60 * 1000)
 
+        self.db_pool.updates.register_background_index_update(
+            "destination_rooms_destination_stream_ordering_idx",
+            index_name="destination_rooms_destination_stream_ordering_idx",
+            table="destination_rooms",
+            columns=["destination", "stream_ordering"],
+        )
+
     @wrap_as_background_process("cleanup_transactions")
     async def _cleanup_transactions(self) -> None:
         now = self._clock.time_msec()
@@ -436,6 +443,35 @@ class TransactionWorkerStore(CacheInvalidationWorkerStore):
         event_ids = [row[0] for row in txn]
         return event_ids
 
+    async def count_catch_up_rooms(
+        self, destination: str, last_successful_stream_ordering: int
+    ) -> int:
+        """Count the rooms with events which have not yet been sent to the
+        destination.
+
+        Args:
+            destination: the destination in question
+            last_successful_stream_ordering: the stream_ordering of the
+                most-recently successfully-transmitted event to the destination
+
+        Returns:
+            the number of rooms which need catching up
+        """
+
+        def count_catch_up_rooms_txn(txn: LoggingTransaction) -> int:
+            txn.execute(
+                """
+                SELECT COUNT(*) FROM destination_rooms
+                WHERE destination = ? AND stream_ordering > ?
+                """,
+                (destination, last_successful_stream_ordering),
+            )
+            return cast(Tuple[int], txn.fetchone())[0]
+
+        return await self.db_pool.runInteraction(
+            "count_catch_up_rooms", count_catch_up_rooms_txn
+        )
+
     async def get_catch_up_outstanding_destinations(
         self, after_destination: Optional[str]
     ) -> List[str]:
@@ -13,11 +13,23 @@
 # limitations under the License.
 
 import logging
-from typing import TYPE_CHECKING, Collection, Dict, Iterable, List, Optional, Set, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    cast,
+)
 
 import attr
+from prometheus_client import Counter
 
 from synapse.api.constants import EventTypes
+from synapse.metrics.background_process_metrics import wrap_as_background_process
 from synapse.storage._base import SQLBaseStore
 from synapse.storage.database import (
     DatabasePool,
@@ -41,6 +53,23 @@ logger = logging.getLogger(__name__)
 
 MAX_STATE_DELTA_HOPS = 100
 
+# Delta chains which reach this many hops are cut short in the background by
+# turning the state group at the end of the chain into a full snapshot, so that
+# looking up the state of later state groups needs fewer hops. Unlike hitting
+# `MAX_STATE_DELTA_HOPS`, this doesn't slow down persisting the state group.
+STATE_GROUP_SNAPSHOT_HOPS = 50
+
+# How often to turn state groups queued by `STATE_GROUP_SNAPSHOT_HOPS` into
+# snapshots, and how many to do at a time.
+MATERIALIZE_STATE_GROUPS_INTERVAL_MS = 10 * 1000
+MATERIALIZE_STATE_GROUPS_BATCH_SIZE = 20
+
+materialized_state_groups_counter = Counter(
+    "synapse_storage_state_groups_materialized_total",
+    "Number of delta state groups which have been turned into full snapshots to "
+    "shorten delta chains",
+)
+
 
 @attr.s(slots=True, frozen=True, auto_attribs=True)
 class _GetStateGroupDelta:
@@ -120,6 +149,16 @@ class StateGroupDataStore(StateBackgroundUpdateStore, SQLBaseStore):
             id_column="id",
         )
 
+        # State groups persisted at the end of a long delta chain are queued in
+        # the `state_groups_pending_snapshot` table by whichever process
+        # persisted them, and turned into full snapshots by the process which
+        # runs background tasks.
+        if hs.config.worker.run_background_tasks:
+            self._clock.looping_call(
+                self._materialize_queued_state_groups,
+                MATERIALIZE_STATE_GROUPS_INTERVAL_MS,
+            )
+
     @cached(max_entries=10000, iterable=True)
     async def get_state_group_delta(self, state_group: int) -> _GetStateGroupDelta:
         """Given a state group try to return a previous group and a delta between
@@ -469,6 +508,13 @@ class StateGroupDataStore(StateBackgroundUpdateStore, SQLBaseStore):
 
             state_group = self._state_group_seq_gen.get_next_id_txn(txn)
 
+            if potential_hops + 1 >= STATE_GROUP_SNAPSHOT_HOPS:
+                self.db_pool.simple_insert_txn(
+                    txn,
+                    table="state_groups_pending_snapshot",
+                    values={"state_group": state_group, "room_id": room_id},
+                )
+
             self.db_pool.simple_insert_txn(
                 txn,
                 table="state_groups",
@@ -625,37 +671,131 @@ class StateGroupDataStore(StateBackgroundUpdateStore, SQLBaseStore):
         # groups to non delta versions.
         for sg in remaining_state_groups:
             logger.info("[purge] de-delta-ing remaining state group %s", sg)
-            curr_state_by_group = self._get_state_groups_from_groups_txn(txn, [sg])
-            curr_state = curr_state_by_group[sg]
-
-            self.db_pool.simple_delete_txn(
-                txn, table="state_groups_state", keyvalues={"state_group": sg}
-            )
-
-            self.db_pool.simple_delete_txn(
-                txn, table="state_group_edges", keyvalues={"state_group": sg}
-            )
-
-            self.db_pool.simple_insert_many_txn(
-                txn,
-                table="state_groups_state",
-                keys=("state_group", "room_id", "type", "state_key", "event_id"),
-                values=[
-                    (sg, room_id, key[0], key[1], state_id)
-                    for key, state_id in curr_state.items()
-                ],
-            )
+            self._materialize_state_group_txn(txn, room_id, sg)
 
         logger.info("[purge] removing redundant state groups")
         txn.execute_batch(
             "DELETE FROM state_groups_state WHERE state_group = ?",
             ((sg,) for sg in state_groups_to_delete),
         )
+        txn.execute_batch(
+            "DELETE FROM state_groups_pending_snapshot WHERE state_group = ?",
+            ((sg,) for sg in state_groups_to_delete),
+        )
         txn.execute_batch(
             "DELETE FROM state_groups WHERE id = ?",
             ((sg,) for sg in state_groups_to_delete),
         )
 
+    def _materialize_state_group_txn(
+        self, txn: LoggingTransaction, room_id: str, state_group: int
+    ) -> None:
+        """Replace the delta stored for a state group with its full state.
+
+        The state group then no longer depends on the state group it was a delta
+        from, and looking up its state (or that of any state group which is a
+        delta on top of it) doesn't need to walk any further back.
+        """
+        curr_state_by_group = self._get_state_groups_from_groups_txn(txn, [state_group])
+        curr_state = curr_state_by_group[state_group]
+
+        self.db_pool.simple_delete_txn(
+            txn, table="state_groups_state", keyvalues={"state_group": state_group}
+        )
+
+        self.db_pool.simple_delete_txn(
+            txn, table="state_group_edges", keyvalues={"state_group": state_group}
+        )
+
+        self.db_pool.simple_insert_many_txn(
+            txn,
+            table="state_groups_state",
+            keys=("state_group", "room_id", "type", "state_key", "event_id"),
+            values=[
+                (state_group, room_id, key[0], key[1], state_id)
+                for key, state_id in curr_state.items()
+            ],
+        )
+
+    @wrap_as_background_process("materialize_state_groups")
+    async def _materialize_queued_state_groups(self) -> None:
+        """Turn the state groups queued because they're at the end of long delta
+        chains into full snapshots.
+        """
+        while True:
+            # State groups are handled in the order they were created, so that
+            # cutting a chain short means that the later state groups queued on
+            # the same chain don't need to be.
+            rows = await self.db_pool.runInteraction(
+                "get_state_groups_pending_snapshot",
+                self._get_state_groups_pending_snapshot_txn,
+            )
+            if not rows:
+                return
+
+            for state_group, room_id in rows:
+                materialized = await self.db_pool.runInteraction(
+                    "materialize_state_group",
+                    self._materialize_state_group_if_delta_txn,
+                    room_id,
+                    state_group,
+                )
+                if materialized:
+                    materialized_state_groups_counter.inc()
+
+    def _get_state_groups_pending_snapshot_txn(
+        self, txn: LoggingTransaction
+    ) -> List[Tuple[int, str]]:
+        txn.execute(
+            """
+            SELECT state_group, room_id FROM state_groups_pending_snapshot
+            ORDER BY state_group
+            LIMIT ?
+            """,
+            (MATERIALIZE_STATE_GROUPS_BATCH_SIZE,),
+        )
+        return cast(List[Tuple[int, str]], txn.fetchall())
+
+    def _materialize_state_group_if_delta_txn(
+        self, txn: LoggingTransaction, room_id: str, state_group: int
+    ) -> bool:
+        """Turn the state group into a full snapshot, unless it already is one
+        (or it has been deleted), or its delta chain is no longer long enough to
+        need cutting.
+
+        The latter happens when several state groups on the same chain were
+        queued, and an earlier one has since been turned into a snapshot: we
+        don't want to write a full snapshot for every one of them.
+
+        Either way, the state group is removed from the queue.
+
+        Returns:
+            Whether the state group was changed.
+        """
+        self.db_pool.simple_delete_txn(
+            txn,
+            table="state_groups_pending_snapshot",
+            keyvalues={"state_group": state_group},
+        )
+
+        prev_group = self.db_pool.simple_select_one_onecol_txn(
+            txn,
+            table="state_group_edges",
+            keyvalues={"state_group": state_group},
+            retcol="prev_state_group",
+            allow_none=True,
+        )
+        if prev_group is None:
+            return False
+
+        if self._count_state_group_hops_txn(txn, prev_group) + 1 < (
+            STATE_GROUP_SNAPSHOT_HOPS
+        ):
+            return False
+
+        self._materialize_state_group_txn(txn, room_id, state_group)
+        return True
+
     async def get_previous_state_groups(
         self, state_groups: Iterable[int]
     ) -> Dict[int, int]:
@@ -724,6 +864,15 @@ class StateGroupDataStore(StateBackgroundUpdateStore, SQLBaseStore):
             keyvalues={},
         )
 
+        # ... and any of them which were waiting to become snapshots
+        self.db_pool.simple_delete_many_txn(
+            txn,
+            table="state_groups_pending_snapshot",
+            column="state_group",
+            values=state_groups_to_delete,
+            keyvalues={},
+        )
+
         # ... and the state groups
         logger.info("[purge] removing %s from state_groups", room_id)
 
@@ -0,0 +1,27 @@
+/* Copyright 2023 The Matrix.org Foundation C.I.C
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+-- Files in the local media store which are also held by a storage provider, and
+-- so can be evicted from local disk when `media_local_cache_size` is exceeded.
+CREATE TABLE IF NOT EXISTS media_local_cache (
+    -- The path of the file, relative to the media store.
+    path TEXT NOT NULL PRIMARY KEY,
+    -- The size of the file in bytes.
+    size BIGINT NOT NULL,
+    last_access_ts BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS media_local_cache_last_access_ts
+    ON media_local_cache(last_access_ts);
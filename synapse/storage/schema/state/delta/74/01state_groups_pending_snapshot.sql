@@ -0,0 +1,22 @@
+/* Copyright 2023 The Matrix.org Foundation C.I.C
+ *
+ * Licensed under the Apache License, Version 2.0 (the "License");
+ * you may not use this file except in compliance with the License.
+ * You may obtain a copy of the License at
+ *
+ *    http://www.apache.org/licenses/LICENSE-2.0
+ *
+ * Unless required by applicable law or agreed to in writing, software
+ * distributed under the License is distributed on an "AS IS" BASIS,
+ * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+ * See the License for the specific language governing permissions and
+ * limitations under the License.
+ */
+
+-- State groups which were persisted at the end of a long delta chain, and are
+-- waiting to be turned into full snapshots by the worker which runs background
+-- tasks. See `STATE_GROUP_SNAPSHOT_HOPS`.
+CREATE TABLE IF NOT EXISTS state_groups_pending_snapshot (
+    state_group BIGINT NOT NULL PRIMARY KEY,
+    room_id TEXT NOT NULL
+);
@@ -838,6 +838,12 @@ class AsyncLruCache(Generic[KT, VT]):
         # This method should fetch from any configured external cache, in this case noop.
         return None
 
+    async def get_many_external(
+        self, keys: Collection[KT], update_metrics: bool = True
+    ) -> Dict[KT, VT]:
+        # This method should fetch from any configured external cache, in this case noop.
+        return {}
+
     def get_local(
         self, key: KT, default: Optional[T] = None, update_metrics: bool = True
     ) -> Optional[VT]:
@@ -849,6 +855,12 @@ class AsyncLruCache(Generic[KT, VT]):
     def set_local(self, key: KT, value: VT) -> None:
         self._lru_cache.set(key, value)
 
+    async def set_many(self, values: Iterable[Tuple[KT, VT]]) -> None:
+        # This method should add the entries to any external cache in one go,
+        # and then to the LruCache.
+        for key, value in values:
+            self._lru_cache.set(key, value)
+
     async def invalidate(self, key: KT) -> None:
         # This method should invalidate any external cache and then invalidate the LruCache.
         return self._lru_cache.invalidate(key)
@@ -15,14 +15,22 @@
 import queue
 from typing import BinaryIO, Optional, Union, cast
 
+from zope.interface import implementer
+
 from twisted.internet import threads
 from twisted.internet.defer import Deferred
-from twisted.internet.interfaces import IPullProducer, IPushProducer
+from twisted.internet.interfaces import (
+    IConsumer,
+    IProducer,
+    IPullProducer,
+    IPushProducer,
+)
 
 from synapse.logging.context import make_deferred_yieldable, run_in_background
 from synapse.types import ISynapseReactor
 
 
+@implementer(IConsumer)
 class BackgroundFileConsumer:
     """A consumer that writes to a file like object. Supports both push
     and pull producers
@@ -63,20 +71,18 @@ class BackgroundFileConsumer:
         # If the _writer thread throws an exception it gets stored here.
         self._write_exception: Optional[Exception] = None
 
-    def registerProducer(
-        self, producer: Union[IPushProducer, IPullProducer], streaming: bool
-    ) -> None:
+    def registerProducer(self, producer: IProducer, streaming: bool) -> None:
         """Part of IConsumer interface
 
         Args:
-            producer
+            producer: A push or pull producer.
             streaming: True if push based producer, False if pull
                 based.
         """
         if self._producer:
             raise Exception("registerProducer called twice")
 
-        self._producer = producer
+        self._producer = cast(Union[IPushProducer, IPullProducer], producer)
         self.streaming = streaming
         self._finished_deferred = run_in_background(
             threads.deferToThreadPool,
@@ -13,12 +13,23 @@
 # limitations under the License.
 
 import sys
+from typing import Any, Awaitable, Callable, List, Tuple, TypeVar
 
 try:
     from twisted.internet.epollreactor import EPollReactor as Reactor
 except ImportError:
     from twisted.internet.pollreactor import PollReactor as Reactor
+from twisted.internet.defer import ensureDeferred
 from twisted.internet.main import installReactor
+from twisted.python.failure import Failure
+
+from synapse.config.homeserver import HomeServerConfig
+from synapse.server import HomeServer
+
+from tests.server import ThreadedMemoryReactorClock, get_clock, setup_test_homeserver
+from tests.utils import default_config
+
+T = TypeVar("T")
 
 
 def make_reactor():
@@ -33,3 +44,56 @@ def make_reactor():
     installReactor(reactor)
 
     return reactor
+
+
+def make_homeserver(
+    name: str = "synmark",
+) -> Tuple[HomeServer, ThreadedMemoryReactorClock, List[Callable[[], None]]]:
+    """
+    Create a homeserver backed by the test database (in-memory SQLite, unless
+    SYNAPSE_POSTGRES is set), for suites which need realistic storage fixtures.
+
+    The homeserver runs on its own memory reactor, rather than the reactor the
+    benchmark is being run on, so that database interactions are synchronous.
+    Use `run_to_completion` to drive coroutines against it.
+
+    Returns:
+        The homeserver, its reactor, and a list of cleanup functions to call once
+        the suite is done with it.
+    """
+    reactor, clock = get_clock()
+    cleanups: List[Callable[[], None]] = []
+
+    config = HomeServerConfig()
+    config.parse_config_dict(default_config(name), "", "")
+
+    hs = setup_test_homeserver(
+        cleanups.append, name, config=config, reactor=reactor, clock=clock
+    )
+
+    store = hs.get_datastores().main
+    run_to_completion(reactor, store.db_pool.updates.run_background_updates(False))
+
+    return hs, reactor, cleanups
+
+
+def run_to_completion(reactor: ThreadedMemoryReactorClock, d: Awaitable[T]) -> T:
+    """
+    Pump the given memory reactor until the awaitable has completed, and return its
+    result (or raise its exception).
+    """
+    deferred = ensureDeferred(d)  # type: ignore[arg-type]
+
+    results: List[Any] = []
+    deferred.addBoth(results.append)
+
+    reactor.pump([0.0] * 100)
+
+    if not results:
+        raise RuntimeError("%r did not complete" % (deferred,))
+
+    result = results[0]
+    if isinstance(result, Failure):
+        result.raiseException()
+
+    return result
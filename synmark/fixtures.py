@@ -0,0 +1,134 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Generators for synthetic rooms, used by suites which don't need a database."""
+
+from typing import Dict, List, Optional
+
+from synapse.api.constants import EventTypes, JoinRules, Membership
+from synapse.api.room_versions import RoomVersion, RoomVersions
+from synapse.event_auth import auth_types_for_event
+from synapse.events import EventBase, make_event_from_dict
+from synapse.types import JsonDict, StateMap
+
+SERVER_NAME = "synmark.test"
+
+
+def user_id(i: int) -> str:
+    return "@user%d:%s" % (i, SERVER_NAME)
+
+
+class RoomGenerator:
+    """Builds a room DAG in memory, tracking the state after each event so that
+    every generated event has correct auth and prev events.
+
+    Branches of the DAG are identified by their state: call `fork` to get a copy
+    of the generator which shares history with this one, then add events to each
+    independently.
+    """
+
+    def __init__(self, room_version: RoomVersion = RoomVersions.V10) -> None:
+        self.room_version = room_version
+        self.room_id = "!synmark:%s" % (SERVER_NAME,)
+        self.creator = user_id(0)
+
+        # All events generated by this generator and any of its forks.
+        self.event_map: Dict[str, EventBase] = {}
+        self.state: StateMap[str] = {}
+        self.forward_extremities: List[str] = []
+        self.depth = 0
+        self.ts = 0
+
+    def fork(self) -> "RoomGenerator":
+        fork = RoomGenerator.__new__(RoomGenerator)
+        fork.__dict__.update(self.__dict__)
+        fork.state = dict(self.state)
+        fork.forward_extremities = list(self.forward_extremities)
+        return fork
+
+    def create_room(self, num_members: int) -> None:
+        """Create the room, with `num_members` joined users (including the
+        creator, who has PL100).
+        """
+        self.add_event(EventTypes.Create, "", self.creator, {"creator": self.creator})
+        self.join(self.creator)
+        self.add_event(
+            EventTypes.PowerLevels,
+            "",
+            self.creator,
+            {"users": {self.creator: 100}, "state_default": 50},
+        )
+        self.add_event(
+            EventTypes.JoinRules, "", self.creator, {"join_rule": JoinRules.PUBLIC}
+        )
+        self.add_event(
+            EventTypes.RoomHistoryVisibility,
+            "",
+            self.creator,
+            {"history_visibility": "shared"},
+        )
+        for i in range(1, num_members):
+            self.join(user_id(i))
+
+    def join(self, user: str) -> EventBase:
+        return self.add_event(
+            EventTypes.Member,
+            user,
+            user,
+            {"membership": Membership.JOIN, "displayname": user[1:].split(":")[0]},
+        )
+
+    def add_event(
+        self,
+        event_type: str,
+        state_key: Optional[str],
+        sender: str,
+        content: JsonDict,
+    ) -> EventBase:
+        """Add an event on top of the current forward extremities of this branch."""
+        event_dict: JsonDict = {
+            "room_id": self.room_id,
+            "type": event_type,
+            "sender": sender,
+            "content": content,
+            "origin_server_ts": self.ts,
+            "depth": self.depth + 1,
+            "prev_events": self.forward_extremities,
+            "auth_events": [],
+            "hashes": {"sha256": "aGVsbG8"},
+            "signatures": {},
+        }
+        if state_key is not None:
+            event_dict["state_key"] = state_key
+
+        # Work out the auth events from the types the event needs.
+        unauthed = make_event_from_dict(event_dict, self.room_version)
+        event_dict["auth_events"] = sorted(
+            self.state[key]
+            for key in auth_types_for_event(self.room_version, unauthed)
+            if key in self.state
+        )
+        event = make_event_from_dict(event_dict, self.room_version)
+
+        self.ts += 1
+        self.depth += 1
+        self.event_map[event.event_id] = event
+        self.forward_extremities = [event.event_id]
+        if state_key is not None:
+            self.state[(event_type, state_key)] = event.event_id
+
+        return event
+
+    def current_state_events(self) -> StateMap[EventBase]:
+        return {key: self.event_map[eid] for key, eid in self.state.items()}
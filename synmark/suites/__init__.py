@@ -1,4 +1,16 @@
-from . import logging, lrucache, lrucache_evict
+from . import (
+    canonicaljson_events,
+    claim_one_time_keys,
+    claim_one_time_keys_per_device,
+    dictionary_cache,
+    event_auth,
+    logging,
+    lrucache,
+    lrucache_evict,
+    push_rules,
+    state_res_v2,
+    stream_change_cache,
+)
 
 SUITES = [
     (logging, 1000),
@@ -6,4 +18,12 @@ SUITES = [
     (logging, None),
     (lrucache, None),
     (lrucache_evict, None),
+    (state_res_v2, None),
+    (event_auth, None),
+    (push_rules, None),
+    (canonicaljson_events, None),
+    (stream_change_cache, None),
+    (dictionary_cache, None),
+    (claim_one_time_keys, None),
+    (claim_one_time_keys_per_device, None),
 ]
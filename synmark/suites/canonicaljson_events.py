@@ -0,0 +1,64 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from canonicaljson import encode_canonical_json
+from pyperf import perf_counter
+
+from synapse.api.constants import EventTypes
+from synmark.fixtures import RoomGenerator, user_id
+
+NUM_MEMBERS = 10
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of canonical JSON encodings of PDUs, as done when
+    signing, hashing and sending events over federation.
+    """
+    room = RoomGenerator()
+    room.create_room(NUM_MEMBERS)
+
+    # A spread of events: small messages, messages with formatted bodies and
+    # relations, and a power levels event with many users.
+    events = []
+    for i in range(100):
+        content = {"msgtype": "m.text", "body": "message %d" % (i,) * (1 + i % 10)}
+        if i % 3 == 0:
+            content["format"] = "org.matrix.custom.html"
+            content["formatted_body"] = "<b>%s</b>" % (content["body"],)
+        if i % 4 == 0 and events:
+            content["m.relates_to"] = {
+                "rel_type": "m.thread",
+                "event_id": events[-1].event_id,
+            }
+        events.append(
+            room.add_event(EventTypes.Message, None, user_id(i % NUM_MEMBERS), content)
+        )
+    events.append(
+        room.add_event(
+            EventTypes.PowerLevels,
+            "",
+            room.creator,
+            {"users": {user_id(i): 50 for i in range(500)}},
+        )
+    )
+
+    start = perf_counter()
+
+    for i in range(loops):
+        encode_canonical_json(events[i % len(events)].get_pdu_json(i))
+
+    end = perf_counter() - start
+
+    return end
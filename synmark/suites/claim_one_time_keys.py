@@ -0,0 +1,85 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Optional, Tuple
+
+from pyperf import perf_counter
+
+from synapse.server import HomeServer
+from synmark import make_homeserver, run_to_completion
+
+from tests.server import ThreadedMemoryReactorClock
+
+NUM_DEVICES = 300
+ALGORITHM = "signed_curve25519"
+
+# Setting up the homeserver is far slower than the thing being benchmarked, so it
+# is shared between runs in the same process.
+_fixture: Optional[Tuple[HomeServer, ThreadedMemoryReactorClock]] = None
+
+
+def _get_fixture() -> Tuple[HomeServer, ThreadedMemoryReactorClock]:
+    global _fixture
+    if _fixture is None:
+        hs, reactor, _ = make_homeserver()
+        _fixture = (hs, reactor)
+    return _fixture
+
+
+def run(loops: int, batched: bool) -> float:
+    """
+    Claim a one time key for each of `NUM_DEVICES` devices `loops` times, either
+    with a single call to `claim_e2e_one_time_keys`, or with a call per device (as
+    the keys used to be claimed).
+    """
+    hs, hs_reactor = _get_fixture()
+    store = hs.get_datastores().main
+
+    devices = [
+        ("@user%d:%s" % (i % 10, hs.hostname), "DEVICE%d" % (i,))
+        for i in range(NUM_DEVICES)
+    ]
+
+    # Only the claims are timed: uploading the keys to claim is not.
+    total = 0.0
+    for i in range(loops):
+        for user_id, device_id in devices:
+            run_to_completion(
+                hs_reactor,
+                store.add_e2e_one_time_keys(
+                    user_id,
+                    device_id,
+                    0,
+                    [(ALGORITHM, "key%d" % (i,), '{"key": "%d"}' % (i,))],
+                ),
+            )
+
+        query_list = [(user_id, device_id, ALGORITHM) for user_id, device_id in devices]
+
+        start = perf_counter()
+        if batched:
+            run_to_completion(hs_reactor, store.claim_e2e_one_time_keys(query_list))
+        else:
+            for query in query_list:
+                run_to_completion(hs_reactor, store.claim_e2e_one_time_keys([query]))
+        total += perf_counter() - start
+
+    return total
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of bulk one time key claims for `NUM_DEVICES` devices.
+    """
+    return run(loops, batched=True)
@@ -0,0 +1,23 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from synmark.suites.claim_one_time_keys import run
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` rounds of claiming one time keys for the same devices as the
+    `claim_one_time_keys` suite, one device at a time, for comparison.
+    """
+    return run(loops, batched=False)
@@ -0,0 +1,72 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from pyperf import perf_counter
+
+from synapse.api.constants import EventTypes
+from synapse.util.caches.dictionary_cache import DictionaryCache
+
+NUM_STATE_GROUPS = 100
+NUM_MEMBERS = 1000
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of state lookups against a DictionaryCache laid out
+    like the state group cache: a mix of full state fetches, fetches of a few
+    members, and fetches of the non-member state.
+    """
+    rng = random.Random(0)
+    cache: DictionaryCache = DictionaryCache("synmark", max_entries=500000)
+
+    non_member_keys = [
+        (EventTypes.Create, ""),
+        (EventTypes.PowerLevels, ""),
+        (EventTypes.JoinRules, ""),
+        (EventTypes.RoomHistoryVisibility, ""),
+        (EventTypes.Name, ""),
+        (EventTypes.Topic, ""),
+    ]
+    member_keys = [
+        (EventTypes.Member, "@user%d:synmark.test" % (i,)) for i in range(NUM_MEMBERS)
+    ]
+
+    for state_group in range(NUM_STATE_GROUPS):
+        state = {
+            key: "$%d_%d" % (state_group, i)
+            for i, key in enumerate(non_member_keys + member_keys)
+        }
+        cache.update(cache.sequence, state_group, state)
+
+    lookups = []
+    for i in range(1000):
+        if i % 10 == 0:
+            dict_keys = None
+        elif i % 2 == 0:
+            dict_keys = non_member_keys
+        else:
+            dict_keys = rng.sample(member_keys, 10)
+        lookups.append((rng.randrange(NUM_STATE_GROUPS), dict_keys))
+
+    start = perf_counter()
+
+    for i in range(loops):
+        state_group, dict_keys = lookups[i % len(lookups)]
+        cache.get(state_group, dict_keys)
+
+    end = perf_counter() - start
+
+    return end
@@ -0,0 +1,83 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyperf import perf_counter
+
+from synapse.api.constants import EventTypes, Membership
+from synapse.event_auth import auth_types_for_event, check_state_dependent_auth_rules
+from synmark.fixtures import RoomGenerator, user_id
+
+NUM_MEMBERS = 1000
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of state dependent auth checks, cycling through a
+    message, a join, a kick and a power levels change in a room with
+    `NUM_MEMBERS` members.
+    """
+    room = RoomGenerator()
+    room.create_room(NUM_MEMBERS)
+    # Give everyone an explicit power level, to make the power levels event large.
+    room.add_event(
+        EventTypes.PowerLevels,
+        "",
+        room.creator,
+        {
+            "users": {
+                user_id(i): 100 if i == 0 else i % 50 for i in range(NUM_MEMBERS)
+            },
+            "state_default": 50,
+        },
+    )
+
+    candidates = [
+        room.fork().add_event(EventTypes.Message, None, user_id(1), {"body": "hi"}),
+        room.fork().join(user_id(NUM_MEMBERS)),
+        room.fork().add_event(
+            EventTypes.Member,
+            user_id(2),
+            room.creator,
+            {"membership": Membership.LEAVE},
+        ),
+        room.fork().add_event(
+            EventTypes.PowerLevels,
+            "",
+            room.creator,
+            {"users": {room.creator: 100}, "state_default": 50},
+        ),
+    ]
+
+    state = room.current_state_events()
+    checks = [
+        (
+            event,
+            [
+                state[key]
+                for key in auth_types_for_event(room.room_version, event)
+                if key in state
+            ],
+        )
+        for event in candidates
+    ]
+
+    start = perf_counter()
+
+    for i in range(loops):
+        event, auth_events = checks[i % len(checks)]
+        check_state_dependent_auth_rules(event, auth_events)
+
+    end = perf_counter() - start
+
+    return end
@@ -0,0 +1,116 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Optional, Tuple
+
+from pyperf import perf_counter
+
+from synapse.push.bulk_push_rule_evaluator import BulkPushRuleEvaluator
+from synapse.server import HomeServer
+from synapse.types import UserID, create_requester
+from synmark import make_homeserver, run_to_completion
+
+from tests.server import ThreadedMemoryReactorClock
+
+NUM_MEMBERS = 2000
+
+# Creating the room is far slower than the thing being benchmarked, so it is
+# shared between runs in the same process.
+_fixture: Optional[Tuple[HomeServer, ThreadedMemoryReactorClock, str]] = None
+
+
+def _get_fixture() -> Tuple[HomeServer, ThreadedMemoryReactorClock, str]:
+    """Create a room with `NUM_MEMBERS` local users joined to it, all with the
+    default push rules.
+    """
+    global _fixture
+    if _fixture is not None:
+        return _fixture
+
+    hs, reactor, _ = make_homeserver()
+    store = hs.get_datastores().main
+    member_handler = hs.get_room_member_handler()
+
+    users = ["@user%d:%s" % (i, hs.hostname) for i in range(NUM_MEMBERS)]
+    for user in users:
+        run_to_completion(
+            reactor,
+            store.register_user(
+                user,
+                create_profile_with_displayname=UserID.from_string(user).localpart,
+            ),
+        )
+
+    room_id = run_to_completion(
+        reactor,
+        hs.get_room_creation_handler().create_room(
+            create_requester(users[0]), {"preset": "public_chat"}, ratelimit=False
+        ),
+    )[0]["room_id"]
+
+    for user in users[1:]:
+        run_to_completion(
+            reactor,
+            member_handler.update_membership(
+                create_requester(user),
+                UserID.from_string(user),
+                room_id,
+                "join",
+                ratelimit=False,
+            ),
+        )
+
+    _fixture = (hs, reactor, room_id)
+    return _fixture
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of push rule evaluations for messages sent into a
+    room with `NUM_MEMBERS` members.
+    """
+    hs, hs_reactor, room_id = _get_fixture()
+    store = hs.get_datastores().main
+    event_creation_handler = hs.get_event_creation_handler()
+    bulk_evaluator = BulkPushRuleEvaluator(hs)
+    sender = "@user1:%s" % (hs.hostname,)
+
+    # Only the evaluation is timed: creating the event, and cleaning up the
+    # staged push actions afterwards, are not.
+    total = 0.0
+    for i in range(loops):
+        event, context = run_to_completion(
+            hs_reactor,
+            event_creation_handler.create_event(
+                create_requester(sender),
+                {
+                    "type": "m.room.message",
+                    "room_id": room_id,
+                    "sender": sender,
+                    "content": {"msgtype": "m.text", "body": "hello user%d" % (i,)},
+                },
+            ),
+        )
+
+        start = perf_counter()
+        run_to_completion(
+            hs_reactor, bulk_evaluator.action_for_events_by_user([(event, context)])
+        )
+        total += perf_counter() - start
+
+        run_to_completion(
+            hs_reactor, store.remove_push_actions_from_staging(event.event_id)
+        )
+
+    return total
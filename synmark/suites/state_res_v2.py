@@ -0,0 +1,93 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from pyperf import perf_counter
+
+from synapse.api.constants import EventTypes, Membership
+from synapse.state.v2 import resolve_events_with_store
+from synapse.util import Clock
+from synmark.fixtures import RoomGenerator, user_id
+
+from tests.state.test_v2 import TestStateResolutionStore
+
+# The number of users joined to the room before it forks.
+NUM_MEMBERS = 500
+
+# The number of events sent on each side of the fork.
+BRANCH_LENGTH = 50
+
+
+def _build_branch(room: RoomGenerator, offset: int) -> None:
+    """Send a mix of power level, topic and membership changes, which will
+    conflict with the same changes on another branch.
+    """
+    users = {room.creator: 100}
+    for i in range(BRANCH_LENGTH):
+        target = user_id(1 + (i + offset) % (NUM_MEMBERS - 1))
+        if i % 5 == 0:
+            users[target] = 50
+            room.add_event(
+                EventTypes.PowerLevels,
+                "",
+                room.creator,
+                {"users": dict(users), "state_default": 50},
+            )
+        elif i % 5 == 1:
+            room.add_event(
+                EventTypes.Topic, "", room.creator, {"topic": "%d-%d" % (offset, i)}
+            )
+        elif i % 5 == 2:
+            room.add_event(
+                EventTypes.Member, target, target, {"membership": Membership.LEAVE}
+            )
+        elif i % 5 == 3:
+            room.add_event(
+                EventTypes.Member, target, room.creator, {"membership": Membership.BAN}
+            )
+        else:
+            room.add_event(EventTypes.Message, None, target, {"body": str(i)})
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of state resolutions (v2) of a forked room, where
+    both sides of the fork have conflicting state changes.
+    """
+    room = RoomGenerator()
+    room.create_room(NUM_MEMBERS)
+
+    left = room.fork()
+    right = room.fork()
+    _build_branch(left, 0)
+    _build_branch(right, BRANCH_LENGTH // 2)
+
+    clock = Clock(reactor)
+    store = TestStateResolutionStore(room.event_map)
+    state_sets = [left.state, right.state]
+
+    start = perf_counter()
+
+    for _ in range(loops):
+        await resolve_events_with_store(
+            clock,
+            room.room_id,
+            room.room_version,
+            state_sets,
+            event_map=None,
+            state_res_store=store,
+        )
+
+    end = perf_counter() - start
+
+    return end
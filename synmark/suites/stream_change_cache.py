@@ -0,0 +1,54 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+
+from pyperf import perf_counter
+
+from synapse.util.caches.stream_change_cache import StreamChangeCache
+
+NUM_ENTITIES = 10000
+NUM_CHANGES = 50000
+
+
+async def main(reactor, loops):
+    """
+    Benchmark `loops` number of lookups against a full StreamChangeCache, mixing
+    single entity checks with the bulk lookups done by e.g. sync for a user's
+    rooms.
+    """
+    rng = random.Random(0)
+    cache = StreamChangeCache("synmark", 0, max_size=NUM_ENTITIES)
+    for stream_pos in range(1, NUM_CHANGES + 1):
+        cache.entity_has_changed(
+            "entity%d" % (rng.randrange(NUM_ENTITIES * 2),), stream_pos
+        )
+
+    # Query positions spread across (and before) the range the cache knows about.
+    positions = [rng.randrange(NUM_CHANGES) for _ in range(1000)]
+    entities = ["entity%d" % (rng.randrange(NUM_ENTITIES * 2),) for _ in range(1000)]
+    entity_sets = [rng.sample(entities, 100) for _ in range(10)]
+
+    start = perf_counter()
+
+    for i in range(loops):
+        pos = positions[i % len(positions)]
+        if i % 10 == 0:
+            cache.get_entities_changed(entity_sets[i % len(entity_sets)], pos)
+        else:
+            cache.has_entity_changed(entities[i % len(entities)], pos)
+
+    end = perf_counter() - start
+
+    return end
@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from synapse.config import ConfigError
 from synapse.config.cache import CacheConfig, add_resizable_cache
 from synapse.types import JsonDict
 from synapse.util.caches.lrucache import LruCache
@@ -165,3 +166,13 @@ class CacheConfigTests(TestCase):
         add_resizable_cache("event_cache", cache_resize_callback=cache.set_cache_factor)
 
         self.assertEqual(cache.max_size, 10240)
+
+    def test_compact_event_cache(self) -> None:
+        """The compact event cache option must be a boolean."""
+        config: JsonDict = {"caches": {"compact_event_cache": True}}
+        self.config.read_config(config, config_dir_path="", data_dir_path="")
+        self.assertTrue(self.config.compact_event_cache)
+
+        config = {"caches": {"compact_event_cache": "false"}}
+        with self.assertRaises(ConfigError):
+            self.config.read_config(config, config_dir_path="", data_dir_path="")
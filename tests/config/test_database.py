@@ -14,7 +14,8 @@
 
 import yaml
 
-from synapse.config.database import DatabaseConfig
+from synapse.config import ConfigError
+from synapse.config.database import DatabaseConfig, DatabaseConnectionConfig
 
 from tests import unittest
 
@@ -31,3 +32,59 @@ class DatabaseConfigTestCase(unittest.TestCase):
         }
 
         self.assertEqual(conf["database"], expected_database_conf)
+
+    def test_connection_partitions(self) -> None:
+        """Test the defaults and validation of connection partitions."""
+        db_config = DatabaseConnectionConfig(
+            "master", {"name": "psycopg2", "args": {"cp_max": 10}}
+        )
+        self.assertEqual(
+            db_config.connection_partitions,
+            {"interactive": 10, "background": 5, "replication": 10},
+        )
+        self.assertFalse(db_config.adaptive_connection_partitions)
+        self.assertEqual(db_config.adaptive_target_queue_time, 0.05)
+
+        db_config = DatabaseConnectionConfig(
+            "master",
+            {
+                "name": "psycopg2",
+                "args": {"cp_max": 10},
+                "connection_partitions": {
+                    "background": {"max_connections": 2},
+                    "replication": {"max_connections": 20},
+                },
+                "adaptive_connection_partitions": {
+                    "enabled": True,
+                    "target_queue_time": "1s",
+                },
+            },
+        )
+        self.assertEqual(
+            db_config.connection_partitions,
+            {"interactive": 10, "background": 2, "replication": 10},
+        )
+        self.assertTrue(db_config.adaptive_connection_partitions)
+        self.assertEqual(db_config.adaptive_target_queue_time, 1)
+
+        # SQLite only has a single connection to share.
+        db_config = DatabaseConnectionConfig("master", {"name": "sqlite3"})
+        self.assertEqual(
+            db_config.connection_partitions,
+            {"interactive": 1, "background": 1, "replication": 1},
+        )
+
+        with self.assertRaises(ConfigError):
+            DatabaseConnectionConfig(
+                "master",
+                {"name": "psycopg2", "connection_partitions": {"purges": {}}},
+            )
+
+        with self.assertRaises(ConfigError):
+            DatabaseConnectionConfig(
+                "master",
+                {
+                    "name": "psycopg2",
+                    "connection_partitions": {"background": {"max_connections": 0}},
+                },
+            )
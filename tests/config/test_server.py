@@ -15,9 +15,11 @@
 import yaml
 
 from synapse.config._base import ConfigError
+from synapse.config.homeserver import HomeServerConfig
 from synapse.config.server import ServerConfig, generate_ip_set, is_threepid_reserved
 
 from tests import unittest
+from tests.utils import default_config
 
 
 class ServerConfigTestCase(unittest.TestCase):
@@ -129,6 +131,25 @@ class ServerConfigTestCase(unittest.TestCase):
 
         self.assertEqual(conf["listeners"], expected_listeners)
 
+    def test_notifier_max_wakeups_per_iteration(self) -> None:
+        config_dict = default_config("test")
+
+        config = HomeServerConfig()
+        config.parse_config_dict(
+            {"notifier_max_wakeups_per_iteration": 10, **config_dict}, "", ""
+        )
+        self.assertEqual(config.server.notifier_max_wakeups_per_iteration, 10)
+
+        # Anything other than a positive integer would stop the notifier from
+        # making progress, or isn't a number of wakeups at all.
+        for value in (0, -1, 1.5, "10", True):
+            with self.assertRaises(ConfigError):
+                HomeServerConfig().parse_config_dict(
+                    {"notifier_max_wakeups_per_iteration": value, **config_dict},
+                    "",
+                    "",
+                )
+
 
 class GenerateIpSetTestCase(unittest.TestCase):
     def test_empty(self) -> None:
@@ -0,0 +1,132 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import unittest as stdlib_unittest
+
+from signedjson.key import generate_signing_key
+
+from synapse.api.room_versions import RoomVersion, RoomVersions
+from synapse.crypto.event_signing import add_hashes_and_signatures
+from synapse.events import CompactEvent, EventBase, make_event_from_dict
+from synapse.types import JsonDict
+
+
+class CompactEventTestCase(stdlib_unittest.TestCase):
+    def _make_event_dict(self, room_version: RoomVersion) -> JsonDict:
+        event_dict: JsonDict = {
+            "type": "m.room.member",
+            "room_id": "!room:test",
+            "sender": "@alice:test",
+            "state_key": "@alice:test",
+            "depth": 5,
+            "origin": "test",
+            "origin_server_ts": 1000,
+            "content": {"membership": "join", "displayname": "Alice"},
+            "unsigned": {"age_ts": 1000},
+        }
+        if room_version.event_format == RoomVersions.V1.event_format:
+            event_dict["event_id"] = "$event:test"
+            event_dict["prev_events"] = [["$prev:test", {}]]
+            event_dict["auth_events"] = [["$create:test", {}]]
+        else:
+            event_dict["prev_events"] = ["$prev"]
+            event_dict["auth_events"] = ["$create"]
+
+        add_hashes_and_signatures(
+            room_version, event_dict, "test", generate_signing_key("1")
+        )
+        return event_dict
+
+    def _assert_events_equal(self, compact: EventBase, frozen: EventBase) -> None:
+        self.assertEqual(compact.event_id, frozen.event_id)
+        self.assertEqual(compact.type, frozen.type)
+        self.assertEqual(compact.state_key, frozen.state_key)
+        self.assertEqual(compact.sender, frozen.sender)
+        self.assertEqual(compact.depth, frozen.depth)
+        self.assertEqual(compact.content, frozen.content)
+        self.assertEqual(compact.membership, frozen.membership)
+        self.assertEqual(compact.redacts, frozen.redacts)
+        self.assertEqual(compact.signatures, frozen.signatures)
+        self.assertEqual(list(compact.prev_event_ids()), list(frozen.prev_event_ids()))
+        self.assertEqual(list(compact.auth_event_ids()), list(frozen.auth_event_ids()))
+        self.assertEqual(compact.get_dict(), frozen.get_dict())
+        self.assertEqual(compact.get_pdu_json(2000), frozen.get_pdu_json(2000))
+        self.assertEqual(
+            compact.get_templated_pdu_json(), frozen.get_templated_pdu_json()
+        )
+        self.assertEqual(sorted(compact.keys()), sorted(frozen.keys()))
+        self.assertTrue("content" in compact)
+        self.assertFalse("redacts" in compact)
+        self.assertIsNone(compact.get("redacts"))
+        self.assertFalse(hasattr(compact, "redacts_foo"))
+
+    def test_v1(self) -> None:
+        event_dict = self._make_event_dict(RoomVersions.V1)
+        self._assert_events_equal(
+            CompactEvent(event_dict, RoomVersions.V1),
+            make_event_from_dict(event_dict, RoomVersions.V1),
+        )
+
+    def test_v3(self) -> None:
+        event_dict = self._make_event_dict(RoomVersions.V3)
+        self._assert_events_equal(
+            CompactEvent(event_dict, RoomVersions.V3),
+            make_event_from_dict(event_dict, RoomVersions.V3),
+        )
+
+    def test_v10(self) -> None:
+        event_dict = self._make_event_dict(RoomVersions.V10)
+        self._assert_events_equal(
+            CompactEvent(event_dict, RoomVersions.V10),
+            make_event_from_dict(event_dict, RoomVersions.V10),
+        )
+
+    def test_read_only(self) -> None:
+        """The event dict of a compact event can't be modified."""
+        event = CompactEvent(self._make_event_dict(RoomVersions.V10), RoomVersions.V10)
+        with self.assertRaises(TypeError):
+            event.content = {}
+
+        # The unsigned data can still be updated.
+        event.unsigned["foo"] = "bar"
+        self.assertEqual(event.get_dict()["unsigned"]["foo"], "bar")
+
+    def test_body_decoded_once(self) -> None:
+        """Once the rest of the event has been decoded, it is kept."""
+        event = CompactEvent(self._make_event_dict(RoomVersions.V10), RoomVersions.V10)
+
+        content = event.content
+        self.assertEqual(content, {"membership": "join", "displayname": "Alice"})
+        self.assertIs(event.content, content)
+        self.assertEqual(event.membership, "join")
+
+    def test_prev_and_auth_events_read_only(self) -> None:
+        """The prev and auth event IDs of a compact event can't be modified."""
+        event = CompactEvent(self._make_event_dict(RoomVersions.V10), RoomVersions.V10)
+
+        prev_event_ids = event.prev_event_ids()
+        with self.assertRaises(AttributeError):
+            prev_event_ids.append("$other")  # type: ignore[attr-defined]
+        auth_event_ids = event.auth_event_ids()
+        with self.assertRaises(AttributeError):
+            auth_event_ids.append("$other")  # type: ignore[union-attr]
+
+        self.assertEqual(list(event.prev_event_ids()), ["$prev"])
+        self.assertEqual(list(event.auth_event_ids()), ["$create"])
+
+        # The event dict is still plain JSON once serialised, whether or not the
+        # rest of the event has been decoded.
+        self.assertEqual(event.get_dict()["prev_events"], ["$prev"])
+        self.assertEqual(event.content["membership"], "join")
+        self.assertEqual(event.get_dict()["prev_events"], ["$prev"])
@@ -71,7 +71,10 @@ class FederationCatchUpTestCases(FederatingHomeserverTestCase):
         return config
 
     async def record_transaction(
-        self, txn: Transaction, json_cb: Optional[Callable[[], JsonDict]]
+        self,
+        txn: Transaction,
+        json_cb: Optional[Callable[[], JsonDict]],
+        encoded_json_data_callback: Optional[Callable[[], bytes]] = None,
     ) -> JsonDict:
         if json_cb is None:
             # The tests seem to expect that this method raises in this situation.
@@ -338,6 +341,16 @@ class FederationCatchUpTestCases(FederatingHomeserverTestCase):
             )
         )
 
+        # rooms 2 and 3 both need catching up
+        self.assertEqual(
+            self.get_success(
+                self.hs.get_datastores().main.count_catch_up_rooms(
+                    "host2", event_2.internal_metadata.stream_ordering
+                )
+            ),
+            2,
+        )
+
         # ACT
         self.get_success(per_dest_queue._catch_up_transmission_loop())
 
@@ -353,6 +366,15 @@ class FederationCatchUpTestCases(FederatingHomeserverTestCase):
             per_dest_queue._last_successful_stream_ordering,
             event_5.internal_metadata.stream_ordering,
         )
+        assert event_5.internal_metadata.stream_ordering is not None
+        self.assertEqual(
+            self.get_success(
+                self.hs.get_datastores().main.count_catch_up_rooms(
+                    "host2", event_5.internal_metadata.stream_ordering
+                )
+            ),
+            0,
+        )
 
     def test_catch_up_on_synapse_startup(self) -> None:
         """
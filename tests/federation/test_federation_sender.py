@@ -11,9 +11,11 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import unittest as stdlib_unittest
 from typing import Callable, FrozenSet, List, Optional, Set
 from unittest.mock import Mock
 
+from canonicaljson import encode_canonical_json
 from signedjson import key, sign
 from signedjson.types import BaseKey, SigningKey
 
@@ -21,7 +23,16 @@ from twisted.internet import defer
 from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.api.constants import EduTypes, RoomEncryptionAlgorithms
-from synapse.federation.units import Transaction
+from synapse.events import make_event_from_dict
+from synapse.federation.sender.per_destination_queue import (
+    LINGER_RTT_FRACTION,
+    MAX_LINGER_SECS,
+    MAX_PDUS_PER_TRANSACTION,
+    MIN_ADAPTIVE_PDUS_PER_TRANSACTION,
+    _AdaptiveBatchingState,
+)
+from synapse.federation.sender.transaction_manager import TransactionManager
+from synapse.federation.units import Edu, Transaction
 from synapse.handlers.device import DeviceHandler
 from synapse.rest import admin
 from synapse.rest.client import login
@@ -318,7 +329,10 @@ class FederationSenderDevicesTestCases(HomeserverTestCase):
         )
 
     def record_transaction(
-        self, txn: Transaction, json_cb: Optional[Callable[[], JsonDict]] = None
+        self,
+        txn: Transaction,
+        json_cb: Optional[Callable[[], JsonDict]] = None,
+        encoded_json_data_callback: Optional[Callable[[], bytes]] = None,
     ) -> "defer.Deferred[JsonDict]":
         assert json_cb is not None
         data = json_cb()
@@ -756,3 +770,120 @@ def build_device_dict(user_id: str, device_id: str, sk: SigningKey) -> JsonDict:
             key_id(sk): encode_pubkey(sk),
         },
     }
+
+
+class TransactionManagerTestCase(HomeserverTestCase):
+    def make_homeserver(self, reactor: MemoryReactor, clock: Clock) -> HomeServer:
+        self.federation_transport_client = Mock(spec=["send_transaction"])
+        self.federation_transport_client.send_transaction.side_effect = (
+            lambda *args, **kwargs: make_awaitable({})
+        )
+        return self.setup_test_homeserver(
+            federation_transport_client=self.federation_transport_client,
+        )
+
+    def test_pdus_encoded_once(self) -> None:
+        """A PDU sent to several destinations is only encoded once, and the
+        encoded transactions match their JSON.
+        """
+        event = make_event_from_dict(
+            {
+                "event_id": "$event:test",
+                "type": "m.room.message",
+                "room_id": "!room:test",
+                "sender": "@user:test",
+                "content": {"body": "hello ☕"},
+                "unsigned": {"age_ts": 1000},
+            }
+        )
+        get_pdu_json = Mock(side_effect=event.get_pdu_json)
+        event.get_pdu_json = get_pdu_json  # type: ignore[assignment]
+
+        transaction_manager = TransactionManager(self.hs)
+        edu = Edu(
+            origin="test",
+            destination="host2",
+            edu_type=EduTypes.TYPING,
+            content={"typing": True},
+        )
+        self.get_success(
+            transaction_manager.send_new_transaction("host2", [event], [edu])
+        )
+        self.get_success(transaction_manager.send_new_transaction("host3", [event], []))
+
+        get_pdu_json.assert_called_once()
+
+        mock_send_transaction = self.federation_transport_client.send_transaction
+        self.assertEqual(mock_send_transaction.call_count, 2)
+        for call in mock_send_transaction.call_args_list:
+            json_cb = call[0][1]
+            encoded_json_cb = call[1]["encoded_json_data_callback"]
+            self.assertEqual(encoded_json_cb(), encode_canonical_json(json_cb()))
+            self.assertEqual(json_cb()["pdus"], [event.get_pdu_json()])
+
+
+class AdaptiveBatchingStateTestCase(stdlib_unittest.TestCase):
+    def test_linger_follows_rtt(self) -> None:
+        state = _AdaptiveBatchingState()
+        self.assertEqual(state.linger_secs(), 0)
+
+        state.on_success(0.2)
+        self.assertAlmostEqual(state.linger_secs(), 0.2 * LINGER_RTT_FRACTION)
+
+        # Very slow destinations are capped.
+        for _ in range(20):
+            state.on_success(30)
+        self.assertEqual(state.linger_secs(), MAX_LINGER_SECS)
+
+    def test_pdu_limit(self) -> None:
+        """Failures shrink the transactions, which grow back after successes."""
+        state = _AdaptiveBatchingState()
+        self.assertEqual(state.pdu_limit, MAX_PDUS_PER_TRANSACTION)
+
+        for _ in range(10):
+            state.on_failure()
+        self.assertEqual(state.pdu_limit, MIN_ADAPTIVE_PDUS_PER_TRANSACTION)
+
+        state.on_success(0.1)
+        self.assertEqual(state.pdu_limit, MIN_ADAPTIVE_PDUS_PER_TRANSACTION + 5)
+
+        for _ in range(10):
+            state.on_success(0.1)
+        self.assertEqual(state.pdu_limit, MAX_PDUS_PER_TRANSACTION)
+
+    def test_rate_limited(self) -> None:
+        """Being rate limited makes us wait longer, until we succeed again."""
+        state = _AdaptiveBatchingState()
+        state.on_rate_limited()
+        state.on_rate_limited()
+        self.assertAlmostEqual(state.linger_secs(), 0.1)
+        self.assertEqual(state.pdu_limit, MAX_PDUS_PER_TRANSACTION)
+
+        state.on_success(0)
+        self.assertAlmostEqual(state.linger_secs(), 0.05)
+
+    def test_delay(self) -> None:
+        """We only wait for more PDUs when sending back to back and the queue isn't
+        full, but always back off after being rate limited.
+        """
+        state = _AdaptiveBatchingState()
+        state.on_success(0.2)
+        linger = 0.2 * LINGER_RTT_FRACTION
+        self.assertAlmostEqual(state.delay_secs(1, back_to_back=True), linger)
+        self.assertEqual(state.delay_secs(1, back_to_back=False), 0)
+        self.assertEqual(state.delay_secs(0, back_to_back=True), 0)
+        self.assertEqual(
+            state.delay_secs(MAX_PDUS_PER_TRANSACTION, back_to_back=True), 0
+        )
+
+    def test_rate_limited_full_queue(self) -> None:
+        """After being rate limited, we back off even if the queue is full."""
+        state = _AdaptiveBatchingState()
+        state.on_rate_limited()
+
+        self.assertAlmostEqual(
+            state.delay_secs(MAX_PDUS_PER_TRANSACTION, back_to_back=True), 0.05
+        )
+        self.assertAlmostEqual(
+            state.delay_secs(MAX_PDUS_PER_TRANSACTION, back_to_back=False), 0.05
+        )
@@ -46,6 +46,63 @@ class E2eKeysHandlerTestCase(unittest.HomeserverTestCase):
         res = self.get_success(self.handler.query_local_devices({local_user: None}))
         self.assertDictEqual(res, {local_user: {}})
 
+    def test_query_local_devices_cached(self) -> None:
+        """Local device keys are cached until the user's devices change."""
+        local_user = "@boris:" + self.hs.hostname
+        device_id = "xyz"
+        device_key: JsonDict = {
+            "user_id": local_user,
+            "device_id": device_id,
+            "algorithms": ["m.olm.curve25519-aes-sha2"],
+            "keys": {"curve25519:xyz": "curve25519+key1"},
+        }
+
+        self.get_success(self.store.store_device(local_user, device_id, "display name"))
+        self.get_success(
+            self.handler.upload_keys_for_user(
+                local_user, device_id, {"device_keys": device_key}
+            )
+        )
+
+        res = self.get_success(self.handler.query_local_devices({local_user: None}))
+        self.assertEqual(
+            res,
+            {
+                local_user: {
+                    device_id: {
+                        **device_key,
+                        "unsigned": {"device_display_name": "display name"},
+                    }
+                }
+            },
+        )
+
+        # Querying again is served from the cache, with or without the display
+        # names.
+        with mock.patch.object(
+            self.store,
+            "get_e2e_device_keys_for_cs_api",
+            side_effect=AssertionError("cache miss"),
+        ):
+            res = self.get_success(
+                self.handler.query_local_devices(
+                    {local_user: [device_id, "unknown"]}, include_displaynames=False
+                )
+            )
+        self.assertEqual(res, {local_user: {device_id: {**device_key, "unsigned": {}}}})
+
+        # Uploading new keys invalidates the cache.
+        device_key["keys"] = {"curve25519:xyz": "curve25519+key2"}
+        self.get_success(
+            self.handler.upload_keys_for_user(
+                local_user, device_id, {"device_keys": device_key}
+            )
+        )
+        res = self.get_success(self.handler.query_local_devices({local_user: None}))
+        self.assertEqual(
+            res[local_user][device_id]["keys"], {"curve25519:xyz": "curve25519+key2"}
+        )
+
     def test_reupload_one_time_keys(self) -> None:
         """we should be able to re-upload the same keys"""
         local_user = "@boris:" + self.hs.hostname
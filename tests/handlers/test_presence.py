@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import random
 from typing import Optional, cast
 from unittest.mock import Mock, call
 
@@ -32,6 +33,7 @@ from synapse.handlers.presence import (
     IDLE_TIMER,
     LAST_ACTIVE_GRANULARITY,
     SYNC_ONLINE_TIMEOUT,
+    PresenceStateTable,
     handle_timeout,
     handle_update,
 )
@@ -513,6 +515,126 @@ class PresenceTimeoutTestCase(unittest.TestCase):
         self.assertEqual(state, new_state)
 
 
+class PresenceStateTableTestCase(unittest.TestCase):
+    def _is_mine(self, user_id: str) -> bool:
+        return get_domain_from_id(user_id) == "test"
+
+    def test_get_and_set(self) -> None:
+        table = PresenceStateTable(self._is_mine)
+
+        alice = UserPresenceState.default("@alice:test").copy_and_replace(
+            state=PresenceState.ONLINE,
+            last_active_ts=1000,
+            last_user_sync_ts=2000,
+            last_federation_update_ts=3000,
+            status_msg="Hello",
+            currently_active=True,
+        )
+        # A state with fields that can't be stored in the columns.
+        bob = UserPresenceState.default("@bob:remote").copy_and_replace(
+            state="weird", last_active_ts=1.5, currently_active="yes"
+        )
+        table["@alice:test"] = alice
+        table["@bob:remote"] = bob
+
+        self.assertEqual(len(table), 2)
+        self.assertEqual(table["@alice:test"], alice)
+        self.assertEqual(table["@bob:remote"], bob)
+        self.assertIsNone(table.get("@carol:test"))
+        self.assertEqual(set(table), {"@alice:test", "@bob:remote"})
+
+        # Updating and removing states works, and rows are reused.
+        alice = alice.copy_and_replace(state=PresenceState.OFFLINE, status_msg=None)
+        table["@alice:test"] = alice
+        self.assertEqual(table["@alice:test"], alice)
+
+        del table["@alice:test"]
+        self.assertNotIn("@alice:test", table)
+        carol = UserPresenceState.default("@carol:test")
+        table["@carol:test"] = carol
+        self.assertEqual(table["@carol:test"], carol)
+        self.assertEqual(len(table._user_ids), 1)
+
+        # A state can move between the columns and the irregular states.
+        bob = bob.copy_and_replace(last_active_ts=2, currently_active=False)
+        table["@bob:remote"] = bob
+        self.assertEqual(table["@bob:remote"], bob)
+        self.assertEqual(table._irregular, {})
+
+    def test_get_possibly_timed_out(self) -> None:
+        """`get_possibly_timed_out` returns every user that `handle_timeout` would
+        return an update for.
+        """
+        rng = random.Random(0)
+        now = 100 * FEDERATION_TIMEOUT
+        intervals = [
+            0,
+            LAST_ACTIVE_GRANULARITY,
+            SYNC_ONLINE_TIMEOUT,
+            IDLE_TIMER,
+            FEDERATION_PING_INTERVAL,
+            FEDERATION_TIMEOUT,
+        ]
+
+        table = PresenceStateTable(self._is_mine)
+        for i in range(2000):
+            user_id = "@user%d:%s" % (i, rng.choice(["test", "remote"]))
+            table[user_id] = UserPresenceState.default(user_id).copy_and_replace(
+                state=rng.choice(
+                    [
+                        PresenceState.ONLINE,
+                        PresenceState.UNAVAILABLE,
+                        PresenceState.OFFLINE,
+                        PresenceState.BUSY,
+                    ]
+                ),
+                last_active_ts=now - rng.choice(intervals) + rng.randint(-1, 1),
+                last_user_sync_ts=now - rng.choice(intervals) + rng.randint(-1, 1),
+                last_federation_update_ts=now
+                - rng.choice(intervals)
+                + rng.randint(-1, 1),
+            )
+
+        candidates = table.get_possibly_timed_out(list(table) + ["@unknown:test"], now)
+        self.assertEqual(len(candidates), len(set(candidates)))
+        self.assertNotIn("@unknown:test", candidates)
+
+        timed_out = {
+            user_id
+            for user_id in table
+            if handle_timeout(
+                table[user_id],
+                is_mine=self._is_mine(user_id),
+                syncing_user_ids=set(),
+                now=now,
+            )
+        }
+        self.assertTrue(timed_out)
+        self.assertEqual(set(candidates), timed_out)
+
+        # Asking about only a few users picks out their rows instead.
+        some_users = list(table)[:100] + ["@unknown:test"]
+        self.assertEqual(
+            set(table.get_possibly_timed_out(some_users, now)),
+            timed_out.intersection(some_users),
+        )
+
+    def test_get_states(self) -> None:
+        table = PresenceStateTable(self._is_mine)
+        alice = UserPresenceState.default("@alice:test").copy_and_replace(
+            state=PresenceState.ONLINE, last_active_ts=1000, status_msg="Hello"
+        )
+        bob = UserPresenceState.default("@bob:remote").copy_and_replace(
+            state="weird", currently_active="yes"
+        )
+        table["@alice:test"] = alice
+        table["@bob:remote"] = bob
+
+        self.assertEqual(table.get_states(["@bob:remote", "@alice:test"]), [bob, alice])
+        with self.assertRaises(KeyError):
+            table.get_states(["@carol:test"])
+
+
 class PresenceHandlerTestCase(BaseMultiWorkerStreamTestCase):
     def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
         self.presence_handler = hs.get_presence_handler()
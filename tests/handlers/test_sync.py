@@ -165,6 +165,7 @@ class SyncTestCase(tests.unittest.HomeserverTestCase):
         self.store.get_rooms_for_user.invalidate_all()
         self.get_success(self.store._get_event_cache.clear())
         self.store._event_ref.clear()
+        self.sync_handler._incremental_sync_cache.pop((user, "dev"), None)
 
         # The rooms should be excluded from the sync response.
         # Get a new request key.
@@ -280,6 +281,76 @@ class SyncTestCase(tests.unittest.HomeserverTestCase):
         )
         self.assertEqual(eve_initial_sync_after_join.joined, [])
 
+    def test_incremental_sync_reuses_unchanged_rooms(self) -> None:
+        """Repeating an incremental sync with the same since token should reuse
+        the entries for rooms which haven't changed, and recalculate the ones
+        which have.
+        """
+        user = self.register_user("user", "pass")
+        tok = self.login(user, "pass")
+        requester = create_requester(user)
+
+        quiet_room = self.helper.create_room_as(user, tok=tok)
+        busy_room = self.helper.create_room_as(user, tok=tok)
+
+        initial_result: SyncResult = self.get_success(
+            self.sync_handler.wait_for_sync_for_user(
+                requester, sync_config=generate_sync_config(user)
+            )
+        )
+
+        self.helper.send(quiet_room, "quiet", tok=tok)
+        self.helper.send(busy_room, "busy 1", tok=tok)
+
+        first_result: SyncResult = self.get_success(
+            self.sync_handler.wait_for_sync_for_user(
+                requester,
+                sync_config=generate_sync_config(user),
+                since_token=initial_result.next_batch,
+            )
+        )
+        first_rooms = {room.room_id: room for room in first_result.joined}
+        self.assertEqual(set(first_rooms), {quiet_room, busy_room})
+
+        self.helper.send(busy_room, "busy 2", tok=tok)
+
+        # Sync again from the same point, with a new request key so that we
+        # don't hit the response cache.
+        second_result: SyncResult = self.get_success(
+            self.sync_handler.wait_for_sync_for_user(
+                requester,
+                sync_config=generate_sync_config(user),
+                since_token=initial_result.next_batch,
+            )
+        )
+        second_rooms = {room.room_id: room for room in second_result.joined}
+        self.assertEqual(set(second_rooms), {quiet_room, busy_room})
+
+        # The quiet room hasn't changed, so its entry should have been reused.
+        self.assertIs(second_rooms[quiet_room], first_rooms[quiet_room])
+
+        # The busy room has a new event, so should have been recalculated.
+        self.assertIsNot(second_rooms[busy_room], first_rooms[busy_room])
+        self.assertEqual(
+            [e.content.get("body") for e in second_rooms[busy_room].timeline.events],
+            ["busy 1", "busy 2"],
+        )
+
+        # Syncing from a different since token should not reuse anything.
+        third_result: SyncResult = self.get_success(
+            self.sync_handler.wait_for_sync_for_user(
+                requester,
+                sync_config=generate_sync_config(user),
+                since_token=first_result.next_batch,
+            )
+        )
+        third_rooms = {room.room_id: room for room in third_result.joined}
+        self.assertEqual(set(third_rooms), {busy_room})
+        self.assertEqual(
+            [e.content.get("body") for e in third_rooms[busy_room].timeline.events],
+            ["busy 2"],
+        )
+
 
 _request_key = 0
 
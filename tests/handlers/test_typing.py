@@ -23,7 +23,7 @@ from twisted.web.resource import Resource
 from synapse.api.constants import EduTypes
 from synapse.api.errors import AuthError
 from synapse.federation.transport.server import TransportLayerServer
-from synapse.handlers.typing import TypingWriterHandler
+from synapse.handlers.typing import FEDERATION_AGGREGATION_INTERVAL, TypingWriterHandler
 from synapse.server import HomeServer
 from synapse.types import JsonDict, Requester, UserID, create_requester
 from synapse.util import Clock
@@ -48,11 +48,14 @@ OTHER_ROOM_ID = "another-room"
 
 
 def _expect_edu_transaction(
-    edu_type: str, content: JsonDict, origin: str = "test"
+    edu_type: str,
+    content: JsonDict,
+    origin: str = "test",
+    origin_server_ts: int = 1000000,
 ) -> JsonDict:
     return {
         "origin": origin,
-        "origin_server_ts": 1000000,
+        "origin_server_ts": origin_server_ts,
         "pdus": [],
         "edus": [{"edu_type": edu_type, "content": content}],
     }
@@ -233,6 +236,10 @@ class TypingNotificationsTestCase(unittest.HomeserverTestCase):
             )
         )
 
+        # the update is sent once the aggregation interval has passed
+        self.mock_federation_client.put_json.assert_not_called()
+        self.reactor.advance(FEDERATION_AGGREGATION_INTERVAL / 1000)
+
         self.mock_federation_client.put_json.assert_called_once_with(
             "farm",
             path="/_matrix/federation/v1/send/1000000",
@@ -243,13 +250,69 @@ class TypingNotificationsTestCase(unittest.HomeserverTestCase):
                     "user_id": U_APPLE.to_string(),
                     "typing": True,
                 },
+                origin_server_ts=1000000 + FEDERATION_AGGREGATION_INTERVAL,
             ),
             json_data_callback=ANY,
+            encoded_json_data_callback=ANY,
             long_retries=True,
             backoff_on_404=True,
             try_trailing_slash_on_400=True,
         )
 
+    # Enable federation sending on the main process.
+    @override_config({"federation_sender_instances": None})
+    def test_typing_remote_send_aggregated(self) -> None:
+        """Only the latest state of each user is sent for changes in typing within
+        the aggregation interval.
+        """
+        self.room_members = [U_APPLE, U_BANANA, U_ONION]
+
+        for user in (U_APPLE, U_BANANA):
+            self.get_success(
+                self.handler.started_typing(
+                    target_user=user,
+                    requester=create_requester(user),
+                    room_id=ROOM_ID,
+                    timeout=20000,
+                )
+            )
+        self.get_success(
+            self.handler.stopped_typing(
+                target_user=U_APPLE,
+                requester=create_requester(U_APPLE),
+                room_id=ROOM_ID,
+            )
+        )
+
+        self.reactor.advance(FEDERATION_AGGREGATION_INTERVAL / 1000)
+
+        sent_edus = [
+            edu
+            for call_args in self.mock_federation_client.put_json.call_args_list
+            for edu in call_args[1]["data"]["edus"]
+        ]
+        self.assertEqual(
+            sent_edus,
+            [
+                {
+                    "edu_type": EduTypes.TYPING,
+                    "content": {
+                        "room_id": ROOM_ID,
+                        "user_id": U_APPLE.to_string(),
+                        "typing": False,
+                    },
+                },
+                {
+                    "edu_type": EduTypes.TYPING,
+                    "content": {
+                        "room_id": ROOM_ID,
+                        "user_id": U_BANANA.to_string(),
+                        "typing": True,
+                    },
+                },
+            ],
+        )
+
     def test_started_typing_remote_recv(self) -> None:
         self.room_members = [U_APPLE, U_ONION]
 
@@ -348,6 +411,8 @@ class TypingNotificationsTestCase(unittest.HomeserverTestCase):
 
         self.on_new_event.assert_has_calls([call("typing_key", 1, rooms=[ROOM_ID])])
 
+        self.reactor.advance(FEDERATION_AGGREGATION_INTERVAL / 1000)
+
         self.mock_federation_client.put_json.assert_called_once_with(
             "farm",
             path="/_matrix/federation/v1/send/1000000",
@@ -358,8 +423,10 @@ class TypingNotificationsTestCase(unittest.HomeserverTestCase):
                     "user_id": U_APPLE.to_string(),
                     "typing": False,
                 },
+                origin_server_ts=1000000 + FEDERATION_AGGREGATION_INTERVAL,
             ),
             json_data_callback=ANY,
+            encoded_json_data_callback=ANY,
             long_retries=True,
             backoff_on_404=True,
             try_trailing_slash_on_400=True,
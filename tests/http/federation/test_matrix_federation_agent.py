@@ -40,7 +40,12 @@ from twisted.web.iweb import IPolicyForHTTPS, IResponse
 
 from synapse.config.homeserver import HomeServerConfig
 from synapse.crypto.context_factory import FederationPolicyForHTTPS
-from synapse.http.federation.matrix_federation_agent import MatrixFederationAgent
+from synapse.http.federation.matrix_federation_agent import (
+    MatrixFederationAgent,
+    _connection_pools,
+    pool_connection_requests_counter,
+    pool_new_connections_counter,
+)
 from synapse.http.federation.srv_resolver import Server
 from synapse.http.federation.well_known_resolver import (
     WELL_KNOWN_MAX_SIZE,
@@ -279,6 +284,33 @@ class MatrixFederationAgentTests(unittest.TestCase):
         """happy-path test of a GET request with an explicit port"""
         self._do_get()
 
+    def test_connection_reused(self) -> None:
+        """A second request to the same server reuses the idle connection."""
+        self._do_get()
+
+        requests_before = pool_connection_requests_counter._value.get()
+        new_before = pool_new_connections_counter._value.get()
+        self.assertEqual(self.agent._pool.count_idle_connections(), 1)
+
+        test_d = self._make_get_request(b"matrix://testserv:8448/foo/bar")
+        self.assertNoResult(test_d)
+
+        # No new connection should have been made.
+        self.assertEqual(len(self.reactor.tcpClients), 1)
+        self.assertEqual(
+            pool_connection_requests_counter._value.get(), requests_before + 1
+        )
+        self.assertEqual(pool_new_connections_counter._value.get(), new_before)
+        self.assertEqual(self.agent._pool.count_idle_connections(), 0)
+
+    def test_idle_connections_gauge_covers_all_agents(self) -> None:
+        """The idle connections gauge counts the connections of every agent."""
+        self._do_get()
+
+        other_agent = self._make_agent()
+        self.assertIn(self.agent._pool, _connection_pools)
+        self.assertIn(other_agent._pool, _connection_pools)
+
     @patch.dict(
         os.environ,
         {"https_proxy": "proxy.com", "no_proxy": "testserv"},
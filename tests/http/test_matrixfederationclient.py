@@ -14,8 +14,10 @@
 from typing import Generator
 from unittest.mock import Mock
 
+from canonicaljson import encode_canonical_json
 from netaddr import IPSet
 from parameterized import parameterized
+from signedjson.sign import sign_json
 
 from twisted.internet import defer
 from twisted.internet.defer import Deferred, TimeoutError
@@ -627,6 +629,46 @@ class FederationClientTests(HomeserverTestCase):
 
         self.assertTrue(transport.disconnecting)
 
+    @parameterized.expand([(False,), (True,)])
+    def test_build_auth_headers(self, encoded: bool) -> None:
+        """The auth headers sign the request, whether or not the content is
+        already encoded.
+        """
+        content = {"pdus": [{"body": "☕"}], "origin": "test"}
+        if encoded:
+            auth_headers = self.cl.build_auth_headers(
+                b"remote",
+                b"PUT",
+                b"/_matrix/federation/v1/send/1",
+                encoded_content=encode_canonical_json(content),
+            )
+        else:
+            auth_headers = self.cl.build_auth_headers(
+                b"remote", b"PUT", b"/_matrix/federation/v1/send/1", content
+            )
+
+        expected = sign_json(
+            {
+                "method": "PUT",
+                "uri": "/_matrix/federation/v1/send/1",
+                "origin": "test",
+                "destination": "remote",
+                "content": content,
+            },
+            "test",
+            self.hs.signing_key,
+        )
+        key_id, sig = list(expected["signatures"]["test"].items())[0]
+        self.assertEqual(
+            auth_headers,
+            [
+                (
+                    'X-Matrix origin="test",key="%s",sig="%s",destination="remote"'
+                    % (key_id, sig)
+                ).encode("ascii")
+            ],
+        )
+
     def test_build_auth_headers_rejects_falsey_destinations(self) -> None:
         with self.assertRaises(ValueError):
             self.cl.build_auth_headers(None, b"GET", b"https://example.com")
@@ -424,3 +424,52 @@ class TestBulkPushRuleEvaluator(HomeserverTestCase):
                 },
             )
         )
+
+    def test_users_with_identical_rules(self) -> None:
+        """Users with identical push rules share their evaluation, unless the event
+        could match their user ID or display name.
+        """
+        users = [self.register_user("user%d" % (i,), "pass") for i in range(3)]
+        for user in users:
+            self.helper.join(self.room_id, user, tok=self.login(user, "pass"))
+
+        # Users with the same push rules get the same instance of them.
+        rules_by_user = self.get_success(
+            self.hs.get_datastores().main.bulk_get_push_rules(users)
+        )
+        self.assertIs(rules_by_user[users[0]], rules_by_user[users[1]])
+        self.assertIs(rules_by_user[users[0]], rules_by_user[users[2]])
+
+        event, context = self.get_success(
+            self.event_creation_handler.create_event(
+                self.requester,
+                {
+                    "type": "m.room.message",
+                    "room_id": self.room_id,
+                    "content": {"msgtype": "m.text", "body": "hello USER1"},
+                    "sender": self.alice,
+                },
+            )
+        )
+
+        bulk_evaluator = BulkPushRuleEvaluator(self.hs)
+        self.get_success(bulk_evaluator.action_for_events_by_user([(event, context)]))
+
+        # Only the user whose display name was in the message should be
+        # highlighted, but everyone should be notified.
+        actions = self.get_success(
+            self.hs.get_datastores().main.db_pool.simple_select_list(
+                table="event_push_actions_staging",
+                keyvalues={"event_id": event.event_id},
+                retcols=("user_id", "highlight"),
+                desc="get_event_push_actions_staging",
+            )
+        )
+        self.assertCountEqual(
+            actions,
+            [
+                {"user_id": users[0], "highlight": 0},
+                {"user_id": users[1], "highlight": 1},
+                {"user_id": users[2], "highlight": 0},
+            ],
+        )
@@ -0,0 +1,64 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from unittest.mock import Mock
+
+from synapse.replication.tcp.streams._base import DeviceListsStream
+
+from tests.replication._base import BaseStreamTestCase
+
+USER_ID = "@feeling:blue"
+
+
+class DeviceListsStreamTestCase(BaseStreamTestCase):
+    def _build_replication_data_handler(self) -> Mock:
+        self.mock_handler = Mock(wraps=super()._build_replication_data_handler())
+        return self.mock_handler
+
+    def test_device_list_change(self) -> None:
+        self.reconnect()
+
+        store = self.hs.get_datastores().main
+        stream_id = self.get_success(
+            store.add_device_change_to_streams(
+                USER_ID, ["DEVICE"], ["!room1:blue", "!room2:blue"]
+            )
+        )
+        assert stream_id is not None
+        self.replicate()
+
+        # there should be one RDATA command, with a row for the user and for
+        # each of the rooms they are in.
+        self.mock_handler.on_rdata.assert_called_once()
+        stream_name, _, token, rdata_rows = self.mock_handler.on_rdata.call_args[0]
+        self.assertEqual(stream_name, DeviceListsStream.NAME)
+        self.assertEqual(token, stream_id)
+        self.assertCountEqual(
+            [(row.entity, row.is_signature) for row in rdata_rows],
+            [(USER_ID, False), ("!room1:blue", False), ("!room2:blue", False)],
+        )
+
+        # The worker keeps track of which rooms have changed.
+        self.get_success(
+            store.add_device_change_to_streams(USER_ID, ["DEVICE"], ["!room2:blue"])
+        )
+        self.replicate()
+
+        worker_store = self.worker_hs.get_datastores().main
+        self.assertEqual(
+            worker_store._device_list_room_stream_cache.get_entities_changed(
+                ["!room1:blue", "!room2:blue", "!room3:blue"], stream_id
+            ),
+            {"!room2:blue"},
+        )
@@ -16,7 +16,7 @@ from unittest.mock import Mock
 
 from synapse.api.constants import EventTypes, Membership
 from synapse.events.builder import EventBuilderFactory
-from synapse.handlers.typing import TypingWriterHandler
+from synapse.handlers.typing import FEDERATION_AGGREGATION_INTERVAL, TypingWriterHandler
 from synapse.rest.admin import register_servlets_for_client_rest_resource
 from synapse.rest.client import login, room
 from synapse.types import UserID, create_requester
@@ -195,6 +195,7 @@ class FederationSenderTestCase(BaseMultiWorkerStreamTestCase):
             )
 
             self.replicate()
+            self.reactor.advance(FEDERATION_AGGREGATION_INTERVAL / 1000)
 
             if mock_client1.put_json.called:
                 sent_on_1 = True
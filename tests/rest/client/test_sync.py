@@ -31,7 +31,7 @@ from synapse.api.constants import (
 from synapse.rest.client import devices, knock, login, read_marker, receipts, room, sync
 from synapse.server import HomeServer
 from synapse.types import JsonDict
-from synapse.util import Clock
+from synapse.util import Clock, json_encoder
 
 from tests import unittest
 from tests.federation.transport.test_knocking import (
@@ -57,6 +57,54 @@ class FilterTestCase(unittest.HomeserverTestCase):
         self.assertIn("next_batch", channel.json_body)
 
 
+class IterencodeSyncResponseTestCase(unittest.TestCase):
+    """Tests for encoding sync responses a room at a time."""
+
+    @parameterized.expand(
+        [
+            ("empty", {}, {}),
+            ("no_rooms", {"next_batch": "s1", "presence": {"events": []}}, {}),
+            ("empty_response", {}, {"join": {"!a:test": {"timeline": {}}}}),
+            (
+                "many_rooms",
+                {"next_batch": "s1", "account_data": {"events": [{"a": "é"}]}},
+                {
+                    "join": {
+                        "!a:test": {"timeline": {"events": []}},
+                        "!b:test": {"state": {"events": [{"b": 1}]}},
+                    },
+                    "invite": {"!c:test": {"invite_state": {"events": []}}},
+                    "leave": {
+                        "!d:test": {"timeline": {"limited": True}},
+                        "!e:test": {},
+                    },
+                },
+            ),
+        ]
+    )
+    def test_iterencode_sync_response(
+        self, _: str, response: JsonDict, rooms: JsonDict
+    ) -> None:
+        """The incrementally encoded response is the same as encoding the whole
+        response at once.
+        """
+        encoded = b"".join(
+            sync._iterencode_sync_response(
+                dict(response),
+                {
+                    membership: iter(rooms_with_membership.items())
+                    for membership, rooms_with_membership in rooms.items()
+                },
+            )
+        )
+
+        expected = dict(response)
+        if rooms:
+            expected["rooms"] = rooms
+
+        self.assertEqual(encoded, json_encoder.encode(expected).encode("utf-8"))
+
+
 class SyncFilterTestCase(unittest.HomeserverTestCase):
     servlets = [
         synapse.rest.admin.register_servlets_for_client_rest_resource,
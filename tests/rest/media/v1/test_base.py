@@ -12,7 +12,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from synapse.rest.media.v1._base import get_filename_from_headers
+from typing import Dict, Optional, Tuple
+from unittest.mock import Mock
+
+from synapse.rest.media.v1._base import (
+    _parse_range_header,
+    _RangeNotSatisfiable,
+    get_filename_from_headers,
+)
 
 from tests import unittest
 
@@ -36,3 +43,51 @@ class GetFileNameFromHeadersTests(unittest.TestCase):
                 expected,
                 f"expected output for {hdr!r} to be {expected} but was {res}",
             )
+
+
+class ParseRangeHeaderTests(unittest.TestCase):
+    FILE_SIZE = 1000
+
+    def _parse(self, headers: Dict[bytes, bytes]) -> Optional[Tuple[int, int]]:
+        request = Mock()
+        request.getHeader = headers.get
+        return _parse_range_header(request, self.FILE_SIZE)
+
+    def test_no_range(self) -> None:
+        self.assertIsNone(self._parse({}))
+
+    def test_ranges(self) -> None:
+        # input -> expected (start, length)
+        test_cases = {
+            b"bytes=0-499": (0, 500),
+            b"bytes=500-999": (500, 500),
+            b"bytes=500-": (500, 500),
+            b"bytes=500-5000": (500, 500),
+            b"bytes=-100": (900, 100),
+            b"bytes=-5000": (0, 1000),
+            b"BYTES = 1 - 1": (1, 1),
+        }
+        for hdr, expected in test_cases.items():
+            self.assertEqual(self._parse({b"Range": hdr}), expected, hdr)
+
+    def test_ignored_ranges(self) -> None:
+        """Ranges we don't support, or which are invalid, are ignored."""
+        for hdr in (
+            b"bytes=0-10,20-30",
+            b"items=0-10",
+            b"bytes=10-5",
+            b"bytes=-",
+            b"bytes=a-b",
+        ):
+            self.assertIsNone(self._parse({b"Range": hdr}), hdr)
+
+    def test_if_range(self) -> None:
+        """Conditional range requests are ignored."""
+        self.assertIsNone(
+            self._parse({b"Range": b"bytes=0-10", b"If-Range": b'"etag"'})
+        )
+
+    def test_unsatisfiable(self) -> None:
+        for hdr in (b"bytes=1000-", b"bytes=2000-3000", b"bytes=-0"):
+            with self.assertRaises(_RangeNotSatisfiable, msg=hdr):
+                self._parse({b"Range": hdr})
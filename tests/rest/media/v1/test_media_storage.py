@@ -17,7 +17,7 @@ import tempfile
 from binascii import unhexlify
 from io import BytesIO
 from typing import Any, BinaryIO, ClassVar, Dict, List, Optional, Tuple, Union
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 from urllib import parse
 
 import attr
@@ -42,7 +42,7 @@ from synapse.rest.media.v1.filepath import MediaFilePaths
 from synapse.rest.media.v1.media_storage import MediaStorage, ReadableFileWrapper
 from synapse.rest.media.v1.storage_provider import FileStorageProviderBackend
 from synapse.server import HomeServer
-from synapse.types import JsonDict, RoomAlias
+from synapse.types import JsonDict, RoomAlias, UserID
 from synapse.util import Clock
 
 from tests import unittest
@@ -638,6 +638,215 @@ class MediaRepoTests(unittest.HomeserverTestCase):
         )
 
 
+class MediaDownloadRangeTests(unittest.HomeserverTestCase):
+    """Tests for range requests when downloading local media."""
+
+    servlets = [login.register_servlets, admin.register_servlets]
+
+    def make_homeserver(self, reactor: MemoryReactor, clock: Clock) -> HomeServer:
+        config = self.default_config()
+        config["media_store_path"] = self.mktemp()
+        return self.setup_test_homeserver(config=config)
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.download_resource = hs.get_media_repository_resource().children[
+            b"download"
+        ]
+
+        self.content = bytes(range(256)) * 4
+        user_id = self.register_user("alice", "password")
+        mxc_uri = self.get_success(
+            hs.get_media_repository().create_content(
+                media_type="application/octet-stream",
+                upload_name=None,
+                content=BytesIO(self.content),
+                content_length=len(self.content),
+                auth_user=UserID.from_string(user_id),
+            )
+        )
+        self.media_id = f"{mxc_uri.server_name}/{mxc_uri.media_id}"
+
+    def _download(self, *headers: Tuple[str, str]) -> FakeChannel:
+        return make_request(
+            self.reactor,
+            FakeSite(self.download_resource, self.reactor),
+            "GET",
+            self.media_id,
+            shorthand=False,
+            custom_headers=headers,
+        )
+
+    def test_no_range(self) -> None:
+        channel = self._download()
+
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.result["body"], self.content)
+        self.assertEqual(channel.headers.getRawHeaders(b"Accept-Ranges"), [b"bytes"])
+        self.assertIsNone(channel.headers.getRawHeaders(b"Content-Range"))
+
+    def test_range(self) -> None:
+        channel = self._download(("Range", "bytes=100-299"))
+
+        self.assertEqual(channel.code, 206)
+        self.assertEqual(channel.result["body"], self.content[100:300])
+        self.assertEqual(channel.headers.getRawHeaders(b"Content-Length"), [b"200"])
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Range"), [b"bytes 100-299/1024"]
+        )
+
+    def test_suffix_range(self) -> None:
+        channel = self._download(("Range", "bytes=-24"))
+
+        self.assertEqual(channel.code, 206)
+        self.assertEqual(channel.result["body"], self.content[-24:])
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Range"), [b"bytes 1000-1023/1024"]
+        )
+
+    def test_multiple_ranges(self) -> None:
+        """Requests for multiple ranges get the whole file."""
+        channel = self._download(("Range", "bytes=0-9,20-29"))
+
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.result["body"], self.content)
+
+    def test_unsatisfiable_range(self) -> None:
+        channel = self._download(("Range", "bytes=2000-"))
+
+        self.assertEqual(channel.code, 416)
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Range"), [b"bytes */1024"]
+        )
+
+
+class LocalMediaCacheTests(unittest.HomeserverTestCase):
+    """Tests for evicting media held by a storage provider from local disk."""
+
+    # Storing and fetching media uses real threads.
+    needs_threadpool = True
+
+    def make_homeserver(self, reactor: MemoryReactor, clock: Clock) -> HomeServer:
+        self.media_store_path = self.mktemp()
+        self.provider_path = self.mktemp()
+        os.mkdir(self.media_store_path)
+        os.mkdir(self.provider_path)
+
+        config = self.default_config()
+        config["media_store_path"] = self.media_store_path
+        config["media_storage_providers"] = [
+            {
+                "module": "file_system",
+                "store_local": True,
+                "store_remote": True,
+                "store_synchronous": True,
+                "config": {"directory": self.provider_path},
+            }
+        ]
+        config["media_local_cache_size"] = 2500
+        return self.setup_test_homeserver(config=config)
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.media_repo = hs.get_media_repository()
+        self.media_storage = self.media_repo.media_storage
+        self.filepaths = self.media_repo.filepaths
+        self.store = hs.get_datastores().main
+
+    def _upload(self) -> str:
+        content = os.urandom(1000)
+        d = defer.ensureDeferred(
+            self.media_repo.create_content(
+                media_type="application/octet-stream",
+                upload_name=None,
+                content=BytesIO(content),
+                content_length=len(content),
+                auth_user=UserID.from_string("@alice:test"),
+            )
+        )
+        self.wait_on_thread(d)
+        mxc_uri = self.get_success(d)
+        # Make sure the files have distinct access times.
+        self.reactor.advance(1)
+        return mxc_uri.media_id
+
+    def _fetch(self, media_id: str) -> None:
+        d = defer.ensureDeferred(
+            self.media_storage.fetch_media(FileInfo(None, media_id))
+        )
+        self.wait_on_thread(d)
+        responder = self.get_success(d)
+        assert responder is not None
+        with responder:
+            pass
+
+    def _is_local(self, media_id: str) -> bool:
+        return os.path.exists(self.filepaths.local_media_filepath(media_id))
+
+    def _evict(self) -> None:
+        assert self.media_storage.local_cache is not None
+        self.get_success(self.media_storage.local_cache.evict())
+
+    def test_evict_least_recently_used(self) -> None:
+        media_ids = [self._upload() for _ in range(3)]
+        self.assertEqual(self.get_success(self.store.get_local_cache_size()), 3000)
+
+        self._evict()
+
+        # The oldest file should have been removed from local disk, but is still
+        # held by the storage provider.
+        self.assertFalse(self._is_local(media_ids[0]))
+        self.assertTrue(self._is_local(media_ids[1]))
+        self.assertTrue(self._is_local(media_ids[2]))
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    self.provider_path,
+                    self.filepaths.local_media_filepath_rel(media_ids[0]),
+                )
+            )
+        )
+        self.assertEqual(self.get_success(self.store.get_local_cache_size()), 2000)
+
+        # Fetching the evicted file brings it back to local disk.
+        self._fetch(media_ids[0])
+        self.assertTrue(self._is_local(media_ids[0]))
+        self.assertEqual(self.get_success(self.store.get_local_cache_size()), 3000)
+
+    def test_access_updates_eviction_order(self) -> None:
+        media_ids = [self._upload() for _ in range(3)]
+
+        # Access the oldest file, and wait for the access time to be written
+        # to the database.
+        self._fetch(media_ids[0])
+        self.reactor.advance(60)
+
+        self._evict()
+
+        self.assertTrue(self._is_local(media_ids[0]))
+        self.assertFalse(self._is_local(media_ids[1]))
+        self.assertTrue(self._is_local(media_ids[2]))
+
+    def test_evicted_while_fetching(self) -> None:
+        """If a file is evicted again as soon as it has been copied back to local
+        disk, it is streamed from the storage provider instead.
+        """
+        media_ids = [self._upload() for _ in range(3)]
+        self._evict()
+        self.assertFalse(self._is_local(media_ids[0]))
+
+        copy_to_local_cache = self.media_storage._copy_to_local_cache
+
+        async def copy_and_evict(responder: Any, path: str, local_path: str) -> None:
+            await copy_to_local_cache(responder, path, local_path)
+            os.remove(local_path)
+
+        with patch.object(
+            self.media_storage, "_copy_to_local_cache", side_effect=copy_and_evict
+        ):
+            self._fetch(media_ids[0])
+
+        self.assertFalse(self._is_local(media_ids[0]))
+
+
 class TestSpamCheckerLegacy:
     """A spam checker module that rejects all media that includes the bytes
     `evil`.
@@ -0,0 +1,131 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import socket
+import tempfile
+from typing import List, Optional
+
+from twisted.internet import tcp
+from twisted.internet.defer import Deferred
+from twisted.internet.protocol import Protocol
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse.rest.media.v1.sendfile import sendfile_to_request
+
+from tests import unittest
+
+
+class _FakeChannel:
+    def __init__(self, transport: tcp.Connection):
+        self.transport = transport
+        self.timeout_resets = 0
+
+    def resetTimeout(self) -> None:
+        self.timeout_resets += 1
+
+
+class _FakeRequest:
+    """Just enough of a `SynapseRequest` for `sendfile_to_request`."""
+
+    def __init__(self, transport: tcp.Connection):
+        self.channel = _FakeChannel(transport)
+        self.sentLength = 0
+        self.finish_deferreds: List[Deferred] = []
+
+    def write(self, data: bytes) -> None:
+        self.channel.transport.write(b"HEADERS\r\n\r\n" + data)
+
+    def notifyFinish(self) -> Deferred:
+        d: Deferred = Deferred()
+        self.finish_deferreds.append(d)
+        return d
+
+
+@unittest.skip_unless(hasattr(os, "sendfile"), "Requires os.sendfile")
+class SendfileTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.server_sock, self.client_sock = socket.socketpair()
+        self.addCleanup(self.server_sock.close)
+        self.addCleanup(self.client_sock.close)
+
+        self.reactor = MemoryReactor()
+        self.transport = tcp.Connection(self.server_sock, Protocol(), self.reactor)
+        self.transport.connected = True
+        self.request = _FakeRequest(self.transport)
+
+        self.content = os.urandom(3 * 1024 * 1024 + 17)
+        f = tempfile.TemporaryFile()
+        self.addCleanup(f.close)
+        f.write(self.content)
+        f.flush()
+        self.fd = f.fileno()
+
+    def _drive(self, d: "Deferred[None]") -> bytes:
+        """Drive the transport's writes until `d` completes, returning everything
+        received by the client.
+        """
+        self.client_sock.setblocking(False)
+        received = bytearray()
+        result: List[Optional[BaseException]] = []
+        d.addBoth(result.append)
+
+        while not result:
+            self.assertIn(self.transport, self.reactor.writers)
+            self.assertIsNone(self.transport.doWrite())
+            try:
+                received += self.client_sock.recv(4 * 1024 * 1024)
+            except BlockingIOError:
+                pass
+
+        self.assertIsNone(result[0])
+
+        while True:
+            try:
+                data = self.client_sock.recv(4 * 1024 * 1024)
+            except BlockingIOError:
+                break
+            received += data
+
+        return bytes(received)
+
+    def test_send_whole_file(self) -> None:
+        d = sendfile_to_request(self.request, self.fd, 0, len(self.content))  # type: ignore[arg-type]
+        received = self._drive(d)
+
+        self.assertEqual(received, b"HEADERS\r\n\r\n" + self.content)
+        self.assertEqual(self.request.sentLength, len(self.content))
+        self.assertGreater(self.request.channel.timeout_resets, 0)
+
+        # The transport should be back to normal, and no longer writing.
+        self.assertNotIn("doWrite", self.transport.__dict__)
+        self.assertNotIn(self.transport, self.reactor.writers)
+
+    def test_send_range(self) -> None:
+        d = sendfile_to_request(self.request, self.fd, 1000, 2 * 1024 * 1024)  # type: ignore[arg-type]
+        received = self._drive(d)
+
+        self.assertEqual(
+            received, b"HEADERS\r\n\r\n" + self.content[1000 : 1000 + 2 * 1024 * 1024]
+        )
+
+    def test_connection_lost(self) -> None:
+        d = sendfile_to_request(self.request, self.fd, 0, len(self.content))  # type: ignore[arg-type]
+        errors: List[Exception] = []
+        d.addErrback(lambda f: errors.append(f.value))
+
+        self.request.finish_deferreds[0].errback(ConnectionError())
+
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ConnectionError)
+        self.assertNotIn("doWrite", self.transport.__dict__)
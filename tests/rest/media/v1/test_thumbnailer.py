@@ -0,0 +1,173 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from io import BytesIO
+from typing import Optional
+from unittest.mock import patch
+
+from PIL import Image
+
+from twisted.internet.defer import Deferred, ensureDeferred
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse.api.errors import SynapseError
+from synapse.config.repository import ThumbnailRequirement
+from synapse.rest.media.v1.thumbnailer import (
+    EXIF_ORIENTATION_TAG,
+    GeneratedThumbnails,
+    ThumbnailError,
+    ThumbnailPool,
+    generate_thumbnails,
+)
+from synapse.server import HomeServer
+from synapse.util import Clock
+
+from tests import unittest
+
+REQUIREMENTS = [
+    ThumbnailRequirement(32, 32, "crop", "image/jpeg"),
+    ThumbnailRequirement(96, 96, "crop", "image/jpeg"),
+    ThumbnailRequirement(320, 240, "scale", "image/jpeg"),
+    ThumbnailRequirement(640, 480, "scale", "image/png"),
+    # The same dimensions as the scaled 320x240 thumbnail, so not generated.
+    ThumbnailRequirement(320, 160, "crop", "image/jpeg"),
+]
+
+
+class GenerateThumbnailsTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix="synapse-tests-")
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+    def _make_jpeg(self, width: int, height: int, orientation: Optional[int]) -> str:
+        path = os.path.join(self.test_dir, "image.jpg")
+        image = Image.new("RGB", (width, height), (255, 0, 0))
+        exif = Image.Exif()
+        if orientation is not None:
+            exif[EXIF_ORIENTATION_TAG] = orientation
+        image.save(path, "JPEG", exif=exif)
+        return path
+
+    def _assert_thumbnails(self, generated: Optional[GeneratedThumbnails]) -> None:
+        assert generated is not None
+        self.assertEqual(
+            {key: method for key, (method, _) in generated.thumbnails.items()},
+            {
+                (32, 32, "image/jpeg"): "crop",
+                (96, 96, "image/jpeg"): "crop",
+                (320, 160, "image/jpeg"): "scale",
+                (640, 320, "image/png"): "scale",
+            },
+        )
+        for (width, height, _), (_, thumbnail) in generated.thumbnails.items():
+            with Image.open(BytesIO(thumbnail)) as image:
+                self.assertEqual(image.size, (width, height))
+
+    def test_generate_thumbnails(self) -> None:
+        path = self._make_jpeg(2000, 1000, None)
+        generated = generate_thumbnails(path, 32 * 1024 * 1024, REQUIREMENTS)
+
+        assert generated is not None
+        self.assertEqual((generated.width, generated.height), (2000, 1000))
+        self._assert_thumbnails(generated)
+
+    def test_generate_thumbnails_transposed(self) -> None:
+        """Thumbnails are generated from the image rotated according to its EXIF
+        orientation.
+        """
+        # Orientation 6 means the image needs rotating by 90 degrees.
+        path = self._make_jpeg(1000, 2000, 6)
+        generated = generate_thumbnails(path, 32 * 1024 * 1024, REQUIREMENTS)
+
+        assert generated is not None
+        self.assertEqual((generated.width, generated.height), (2000, 1000))
+        self._assert_thumbnails(generated)
+
+    def test_too_large(self) -> None:
+        path = self._make_jpeg(2000, 1000, None)
+        self.assertIsNone(generate_thumbnails(path, 1000 * 1000, REQUIREMENTS))
+
+    def test_invalid_image(self) -> None:
+        path = os.path.join(self.test_dir, "image.jpg")
+        with open(path, "wb") as f:
+            f.write(b"not an image")
+
+        with self.assertRaises(ThumbnailError):
+            generate_thumbnails(path, 32 * 1024 * 1024, REQUIREMENTS)
+
+
+class ThumbnailPoolTestCase(unittest.HomeserverTestCase):
+    def default_config(self) -> dict:
+        config = super().default_config()
+        config["thumbnail_worker_processes"] = 1
+        return config
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.test_dir = tempfile.mkdtemp(prefix="synapse-tests-")
+        self.addCleanup(shutil.rmtree, self.test_dir)
+
+        self.pool = ThumbnailPool(hs)
+        assert self.pool._executor is not None
+        self.addCleanup(self.pool._executor.shutdown)
+
+    def _generate(self, path: str) -> "Deferred[Optional[GeneratedThumbnails]]":
+        d = ensureDeferred(self.pool.generate_thumbnails(path, REQUIREMENTS))
+
+        # The job runs in a separate process, so we have to wait for it for real.
+        deadline = time.monotonic() + 60
+        while not d.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+            self.reactor.advance(0)
+
+        return d
+
+    def test_generate_thumbnails(self) -> None:
+        """Thumbnails can be generated in a worker process."""
+        path = os.path.join(self.test_dir, "image.png")
+        Image.new("RGB", (2000, 1000), (255, 0, 0)).save(path, "PNG")
+
+        generated = self.get_success(self._generate(path))
+
+        assert generated is not None
+        self.assertEqual((generated.width, generated.height), (2000, 1000))
+        self.assertEqual(len(generated.thumbnails), 4)
+
+    def test_invalid_image(self) -> None:
+        """Errors in the worker process are raised to the caller."""
+        path = os.path.join(self.test_dir, "image.png")
+        with open(path, "wb") as f:
+            f.write(b"not an image")
+
+        self.get_failure(self._generate(path), ThumbnailError)
+
+    def test_cancelled(self) -> None:
+        """If a job is cancelled, e.g. because the pool has been shut down, the
+        caller gets an error rather than waiting forever.
+        """
+        future: "Future[Optional[GeneratedThumbnails]]" = Future()
+        assert self.pool._executor is not None
+        with patch.object(self.pool._executor, "submit", return_value=future):
+            d = ensureDeferred(
+                self.pool.generate_thumbnails("/nonexistent", REQUIREMENTS)
+            )
+
+        future.cancel()
+        self.reactor.advance(0)
+
+        f = self.get_failure(d, SynapseError)
+        self.assertEqual(f.value.code, 503)
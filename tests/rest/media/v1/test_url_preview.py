@@ -1197,3 +1197,222 @@ class URLPreviewTests(unittest.HomeserverTestCase):
 
         self.pump()
         self.assertEqual(channel.code, 200)
+
+    def _respond(self, index: int, response: bytes) -> AccumulatingProtocol:
+        """Send the given raw HTTP response on the index'th outgoing connection.
+
+        Returns:
+            The server side of the connection, which records the request.
+        """
+        client = self.reactor.tcpClients[index][2].buildProtocol(None)
+        server = AccumulatingProtocol()
+        server.makeConnection(FakeTransport(client, self.reactor))
+        client.makeConnection(FakeTransport(server, self.reactor))
+        client.dataReceived(response)
+        self.pump()
+        return server
+
+    def _preview_with_image(self, url: str, image_url: str) -> None:
+        """Request a preview of the given URL, and respond with an HTML page
+        using the given image.
+        """
+        end_content = (
+            b'<html><head><meta property="og:image" content="%s" /></head></html>'
+            % (image_url.encode("ascii"),)
+        )
+
+        self.channel = self.make_request(
+            "GET",
+            "preview_url?url=" + url,
+            shorthand=False,
+            await_result=False,
+        )
+        self.pump()
+
+        self._respond(
+            len(self.reactor.tcpClients) - 1,
+            b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\nContent-Type: text/html\r\n\r\n"
+            % (len(end_content),)
+            + end_content,
+        )
+
+    def _respond_with_small_png(self, index: int = -1) -> None:
+        """Respond to the index'th outgoing connection (by default, the latest)
+        with a small PNG image.
+        """
+        if index < 0:
+            index = len(self.reactor.tcpClients) - 1
+
+        self._respond(
+            index,
+            b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\nContent-Type: image/png\r\n\r\n"
+            % (len(SMALL_PNG),)
+            + SMALL_PNG,
+        )
+
+    def test_shared_image_url(self) -> None:
+        """An image shared between pages is only downloaded once."""
+        # Each request is to a different host, as connections are reused.
+        self.lookups["a.matrix.org"] = [(IPv4Address, "10.1.2.3")]
+        self.lookups["b.matrix.org"] = [(IPv4Address, "10.1.2.4")]
+        self.lookups["cdn.matrix.org"] = [(IPv4Address, "10.1.2.5")]
+
+        self._preview_with_image("http://a.matrix.org", "http://cdn.matrix.org/a.png")
+        self._respond_with_small_png()
+        self.assertEqual(self.channel.code, 200)
+        self._assert_small_png(self.channel.json_body)
+        mxc_uri = self.channel.json_body["og:image"]
+
+        # The second page uses the same image, which shouldn't be fetched again.
+        self._preview_with_image("http://b.matrix.org", "http://cdn.matrix.org/a.png")
+        self.assertEqual(len(self.reactor.tcpClients), 3)
+        self.assertEqual(self.channel.code, 200)
+        self.assertEqual(self.channel.json_body["og:image"], mxc_uri)
+
+    def test_duplicate_image_content(self) -> None:
+        """Images with the same contents are only stored once."""
+        # Each request is to a different host, as connections are reused.
+        self.lookups["a.matrix.org"] = [(IPv4Address, "10.1.2.3")]
+        self.lookups["b.matrix.org"] = [(IPv4Address, "10.1.2.4")]
+        self.lookups["cdn1.matrix.org"] = [(IPv4Address, "10.1.2.5")]
+        self.lookups["cdn2.matrix.org"] = [(IPv4Address, "10.1.2.6")]
+
+        self._preview_with_image("http://a.matrix.org", "http://cdn1.matrix.org/a.png")
+        self._respond_with_small_png()
+        self.assertEqual(self.channel.code, 200)
+        mxc_uri = self.channel.json_body["og:image"]
+
+        # The second page's image has a different URL, but is the same image.
+        self._preview_with_image("http://b.matrix.org", "http://cdn2.matrix.org/a.png")
+        self._respond_with_small_png()
+        self.assertEqual(len(self.reactor.tcpClients), 4)
+        self.assertEqual(self.channel.code, 200)
+        self._assert_small_png(self.channel.json_body)
+        self.assertEqual(self.channel.json_body["og:image"], mxc_uri)
+
+        # Only the first copy of the image should have been kept, so there is
+        # one file for each page and one for the image.
+        url_cache_media = self.get_success(
+            self.hs.get_datastores().main.get_url_cache_media_before(
+                self.clock.time_msec() + 1
+            )
+        )
+        self.assertEqual(len(url_cache_media), 3)
+
+    def test_failed_image_download_not_cached(self) -> None:
+        """An image which couldn't be downloaded is tried again by a later preview."""
+        # Each request is to a different host, as connections are reused.
+        self.lookups["a.matrix.org"] = [(IPv4Address, "10.1.2.3")]
+        self.lookups["b.matrix.org"] = [(IPv4Address, "10.1.2.4")]
+        self.lookups["cdn.matrix.org"] = [(IPv4Address, "10.1.2.5")]
+
+        self._preview_with_image("http://a.matrix.org", "http://cdn.matrix.org/a.png")
+        # Close the connection, so that the retry shows up as a new connection
+        # rather than reusing this one.
+        self._respond(
+            len(self.reactor.tcpClients) - 1,
+            b"HTTP/1.0 404 Not Found\r\nContent-Length: 0\r\n"
+            b"Connection: close\r\n\r\n",
+        )
+        self.assertEqual(self.channel.code, 200)
+        self.assertNotIn("og:image", self.channel.json_body)
+
+        # The second page uses the same image, which should be fetched again.
+        self._preview_with_image("http://b.matrix.org", "http://cdn.matrix.org/a.png")
+        self.assertEqual(len(self.reactor.tcpClients), 4)
+        self._respond_with_small_png()
+        self.assertEqual(self.channel.code, 200)
+        self._assert_small_png(self.channel.json_body)
+
+    def test_oembed_autodiscovery_fetches_image_concurrently(self) -> None:
+        """The image from the HTML is fetched whilst fetching the oEmbed information."""
+        self.lookups["www.twitter.com"] = [(IPv4Address, "10.1.2.3")]
+        self.lookups["publish.twitter.com"] = [(IPv4Address, "10.1.2.4")]
+        self.lookups["cdn.twitter.com"] = [(IPv4Address, "10.1.2.5")]
+
+        result = b"""
+        <link rel="alternate" type="application/json+oembed"
+            href="http://publish.twitter.com/oembed?url=http%3A%2F%2Fcdn.twitter.com%2Fmatrixdotorg%2Fstatus%2F12345&format=json"
+            title="matrixdotorg" />
+        <meta property="og:image" content="http://cdn.twitter.com/matrixdotorg" />
+        """
+
+        channel = self.make_request(
+            "GET",
+            "preview_url?url=http://www.twitter.com/matrixdotorg/status/12345",
+            shorthand=False,
+            await_result=False,
+        )
+        self.pump()
+
+        self._respond(
+            0,
+            b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\nContent-Type: text/html\r\n\r\n"
+            % (len(result),)
+            + result,
+        )
+
+        # Both the oEmbed information and the image should be being fetched.
+        self.assertEqual(len(self.reactor.tcpClients), 3)
+        hosts = {client[0] for client in self.reactor.tcpClients[1:]}
+        self.assertEqual(hosts, {"10.1.2.4", "10.1.2.5"})
+        oembed_index, image_index = (
+            (1, 2) if self.reactor.tcpClients[1][0] == "10.1.2.4" else (2, 1)
+        )
+
+        self._respond_with_small_png(image_index)
+        oembed_content = json.dumps(
+            {
+                "version": "1.0",
+                "type": "photo",
+                "url": "http://cdn.twitter.com/matrixdotorg",
+            }
+        ).encode("utf-8")
+        self._respond(
+            oembed_index,
+            b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\n"
+            b"Content-Type: application/json\r\n\r\n" % (len(oembed_content),)
+            + oembed_content,
+        )
+
+        # The oEmbed response has the same image, so it isn't fetched again.
+        self.assertEqual(len(self.reactor.tcpClients), 3)
+        self.assertEqual(channel.code, 200)
+        self._assert_small_png(channel.json_body)
+
+    def test_redirect_caches_final_url(self) -> None:
+        """Previews are also cached under the URL which was redirected to."""
+        self.lookups["short.matrix.org"] = [(IPv4Address, "10.1.2.3")]
+        self.lookups["matrix.org"] = [(IPv4Address, "10.1.2.4")]
+
+        channel = self.make_request(
+            "GET",
+            "preview_url?url=http://short.matrix.org/abc",
+            shorthand=False,
+            await_result=False,
+        )
+        self.pump()
+
+        self._respond(
+            0,
+            b"HTTP/1.0 302 Found\r\nLocation: http://matrix.org/long\r\n"
+            b"Content-Length: 0\r\n\r\n",
+        )
+        self._respond(
+            1,
+            b"HTTP/1.0 200 OK\r\nContent-Length: %d\r\nContent-Type: text/html\r\n\r\n"
+            % (len(self.end_content),)
+            + self.end_content,
+        )
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.json_body["og:title"], "~matrix~")
+
+        # Previewing the final URL is served from the cache.
+        channel = self.make_request(
+            "GET",
+            "preview_url?url=http://matrix.org/long",
+            shorthand=False,
+        )
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.json_body["og:title"], "~matrix~")
+        self.assertEqual(len(self.reactor.tcpClients), 2)
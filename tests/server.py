@@ -79,6 +79,7 @@ from synapse.http.site import SynapseRequest
 from synapse.logging.context import ContextResourceUsage
 from synapse.server import HomeServer
 from synapse.storage import DataStore
+from synapse.storage.connection_partitions import ConnectionPartitions
 from synapse.storage.engines import PostgresEngine, create_engine
 from synapse.types import ISynapseReactor, JsonDict
 from synapse.util import Clock
@@ -204,6 +205,10 @@ class FakeChannel:
         self.unregisterProducer()
         self.transport.loseConnection()
 
+    def abortConnection(self) -> None:
+        self.unregisterProducer()
+        self.result["aborted"] = True
+
     # Type ignore: mypy doesn't like the fact that producer isn't an IProducer.
     def registerProducer(self, producer: IProducer, streaming: bool) -> None:
         # TODO This should ensure that the IProducer is an IPushProducer or
@@ -636,6 +641,11 @@ def _make_test_homeserver_synchronous(server: HomeServer) -> None:
         pool.threadpool = ThreadPool(clock._reactor)  # type: ignore[assignment]
         pool.running = True
 
+        # Any database calls made before now went to the real connection pool,
+        # which never gets started, so will never complete. Don't let them hold
+        # on to connections in the partitions.
+        database._partitions = ConnectionPartitions(server, database._database_config)
+
     # We've just changed the Databases to run DB transactions on the same
     # thread, so we need to disable the dedicated thread behaviour.
     server.get_datastores().main.USE_DEDICATED_DB_THREADS_FOR_EVENT_FETCHING = False
@@ -12,8 +12,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import json
+import time
 from contextlib import contextmanager
-from typing import Generator, List, Tuple
+from typing import Any, Collection, Dict, Generator, List, Mapping, Tuple
 from unittest import mock
 
 from twisted.enterprise.adbapi import ConnectionPool
@@ -21,17 +22,22 @@ from twisted.internet.defer import CancelledError, Deferred, ensureDeferred
 from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.api.room_versions import EventFormatVersions, RoomVersions
-from synapse.events import make_event_from_dict
+from synapse.events import CompactEvent, _CompactEventDict, make_event_from_dict
 from synapse.logging.context import LoggingContext
 from synapse.rest import admin
 from synapse.rest.client import login, room
 from synapse.server import HomeServer
 from synapse.storage.databases.main.events_worker import (
+    EVENT_FETCH_MAX_LARGE_WAIT_S,
+    EVENT_FETCH_MIN_BATCH_SIZE,
     EVENT_QUEUE_THREADS,
+    EXTERNAL_EVENT_CACHE_NAME,
     EventsWorkerStore,
+    SharedEventCache,
+    _EventFetchRequest,
 )
 from synapse.storage.types import Connection
-from synapse.util import Clock
+from synapse.util import Clock, json_decoder, json_encoder
 from synapse.util.async_helpers import yieldable_gather_results
 
 from tests import unittest
@@ -238,6 +244,243 @@ class EventCacheTestCase(unittest.HomeserverTestCase):
             # We should have fetched the event from the DB
             self.assertEqual(ctx.get_resource_usage().evt_db_fetch_count, 1)
 
+    @unittest.override_config({"caches": {"compact_event_cache": True}})
+    def test_compact_events(self) -> None:
+        """Test that events are cached in the compact representation if enabled."""
+        event = self.get_success(self.store.get_event(self.event_id))
+        self.assertIsInstance(event, CompactEvent)
+        self.assertEqual(event.event_id, self.event_id)
+        self.assertEqual(event.room_id, self.room)
+        self.assertEqual(event.content["body"], "body_text_here")
+
+    @unittest.override_config({"caches": {"compact_event_cache": True}})
+    def test_compact_events_stay_compact(self) -> None:
+        """Test that loading compact events from the DB, which checks their
+        event IDs, doesn't leave them decoded in the cache."""
+        event_map = self.get_success(self.store._get_events_from_db([self.event_id]))
+        event = event_map[self.event_id].event
+        # This is the event which has been cached.
+        self.assertIs(self.store._event_ref[self.event_id], event)
+        assert isinstance(event, CompactEvent)
+
+        event_dict = event._dict
+        assert isinstance(event_dict, _CompactEventDict)
+        self.assertIsInstance(event_dict._body, bytes)
+        self.assertIsInstance(event._signatures, bytes)
+        self.assertFalse(hasattr(event, "__dict__"))
+
+
+class _FakeExternalCache:
+    """An in-memory stand in for the Redis-backed `ExternalCache`, which
+    round-trips values through JSON like the real thing does.
+    """
+
+    def __init__(self) -> None:
+        self.values: Dict[Tuple[str, str], str] = {}
+        # The `update_metrics` argument of each call to `get_many`.
+        self.get_many_update_metrics: List[bool] = []
+
+    async def get_many(
+        self, cache_name: str, keys: Collection[str], update_metrics: bool = True
+    ) -> Dict[str, Any]:
+        self.get_many_update_metrics.append(update_metrics)
+        return {
+            key: json_decoder.decode(self.values[(cache_name, key)])
+            for key in keys
+            if (cache_name, key) in self.values
+        }
+
+    async def set_many(
+        self, cache_name: str, values: Mapping[str, Any], expiry_ms: int
+    ) -> None:
+        for key, value in values.items():
+            self.values[(cache_name, key)] = json_encoder.encode(value)
+
+    async def delete(self, cache_name: str, key: str) -> None:
+        self.values.pop((cache_name, key), None)
+
+
+class SharedEventCacheTestCase(unittest.HomeserverTestCase):
+    """Test that events are shared via the external cache, if configured."""
+
+    servlets = [
+        admin.register_servlets,
+        room.register_servlets,
+        login.register_servlets,
+    ]
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.store: EventsWorkerStore = hs.get_datastores().main
+
+        self.external_cache = _FakeExternalCache()
+        self.store._get_event_cache = SharedEventCache(
+            external_cache=self.external_cache,  # type: ignore[arg-type]
+            expiry_ms=60 * 1000,
+            cache_name="*getEvent*",
+            max_size=100,
+        )
+
+        self.user = self.register_user("user", "pass")
+        self.token = self.login(self.user, "pass")
+
+        self.room = self.helper.create_room_as(self.user, tok=self.token)
+
+        res = self.helper.send(self.room, tok=self.token)
+        self.event_id = res["event_id"]
+
+    def _clear_local_caches(self) -> None:
+        """Drop the events this worker has in memory, as if it had restarted."""
+        self.store._get_event_cache.invalidate_local((self.event_id,))
+        self.store._event_ref.clear()
+
+    def test_event_is_shared(self) -> None:
+        """Test that events can be fetched from the external cache, rather than
+        the DB, once they've fallen out of the local caches.
+        """
+        event = self.get_success(self.store.get_event(self.event_id))
+        self.assertIn(
+            (EXTERNAL_EVENT_CACHE_NAME, self.event_id), self.external_cache.values
+        )
+
+        self._clear_local_caches()
+
+        with LoggingContext("test") as ctx:
+            shared_event = self.get_success(self.store.get_event(self.event_id))
+
+            # We shouldn't have needed to go to the DB.
+            self.assertEqual(ctx.get_resource_usage().evt_db_fetch_count, 0)
+
+        self.assertEqual(shared_event.get_dict(), event.get_dict())
+        self.assertEqual(
+            shared_event.internal_metadata.stream_ordering,
+            event.internal_metadata.stream_ordering,
+        )
+        self.assertEqual(
+            shared_event.internal_metadata.outlier, event.internal_metadata.outlier
+        )
+
+    def test_get_many_external_update_metrics(self) -> None:
+        """Test that lookups which shouldn't update the cache metrics don't update
+        those of the external cache either.
+        """
+        self.get_success(self.store.get_event(self.event_id))
+        self._clear_local_caches()
+        self.external_cache.get_many_update_metrics.clear()
+
+        cache = self.store._get_event_cache
+        entries = self.get_success(
+            cache.get_many_external([(self.event_id,)], update_metrics=False)
+        )
+        self.assertIn((self.event_id,), entries)
+        self.assertEqual(self.external_cache.get_many_update_metrics, [False])
+
+    def test_loaded_event_is_not_shared(self) -> None:
+        """Test that events loaded from the DB are only cached locally, so that a
+        worker can't write back a copy of an event from before it was redacted.
+        """
+        self.external_cache.values.clear()
+        self._clear_local_caches()
+
+        with LoggingContext("test") as ctx:
+            self.get_success(self.store.get_event(self.event_id))
+            self.assertEqual(ctx.get_resource_usage().evt_db_fetch_count, 1)
+
+        self.assertNotIn(
+            (EXTERNAL_EVENT_CACHE_NAME, self.event_id), self.external_cache.values
+        )
+
+        # It is still cached locally.
+        with LoggingContext("test") as ctx:
+            self.get_success(self.store.get_event(self.event_id))
+            self.assertEqual(ctx.get_resource_usage().evt_db_fetch_count, 0)
+
+    def test_redaction_invalidates_shared_event(self) -> None:
+        """Test that redacting an event removes it from the external cache, and
+        that the redacted event is not shared.
+        """
+        self.get_success(self.store.get_event(self.event_id))
+        channel = self.make_request(
+            "POST",
+            "/_matrix/client/r0/rooms/%s/redact/%s" % (self.room, self.event_id),
+            content={},
+            access_token=self.token,
+        )
+        self.assertEqual(channel.code, 200, channel.json_body)
+
+        self.assertNotIn(
+            (EXTERNAL_EVENT_CACHE_NAME, self.event_id), self.external_cache.values
+        )
+
+        self._clear_local_caches()
+
+        with LoggingContext("test") as ctx:
+            event = self.get_success(self.store.get_event(self.event_id))
+
+            # The redacted event isn't shared, so we should have gone to the DB.
+            self.assertEqual(ctx.get_resource_usage().evt_db_fetch_count, 1)
+
+        self.assertEqual(event.content, {})
+        self.assertNotIn(
+            (EXTERNAL_EVENT_CACHE_NAME, self.event_id), self.external_cache.values
+        )
+
+
+class EventFetchSchedulingTestCase(unittest.HomeserverTestCase):
+    """Test how queued requests for events are batched up."""
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.store: EventsWorkerStore = hs.get_datastores().main
+
+    def _enqueue(
+        self, num_events: int, lane: str, waited_s: float = 0.0
+    ) -> _EventFetchRequest:
+        request = _EventFetchRequest(
+            event_ids=["$event%d" % (i,) for i in range(num_events)],
+            deferred=Deferred(),
+            lane=lane,
+            enqueued_at=time.monotonic() - waited_s,
+        )
+        self.store._event_fetch_queues[lane].append(request)
+        return request
+
+    def _pop_batch(self) -> List[_EventFetchRequest]:
+        with self.store._event_fetch_lock:
+            return self.store._pop_event_fetch_batch()
+
+    def test_small_requests_first(self) -> None:
+        """Small requests should be fetched ahead of large ones."""
+        large = self._enqueue(50, "large")
+        small = self._enqueue(1, "small")
+
+        self.assertEqual(self._pop_batch(), [small, large])
+        self.assertEqual(self._pop_batch(), [])
+
+    def test_large_requests_are_not_starved(self) -> None:
+        """Large requests which have been waiting a while should be fetched
+        ahead of small ones.
+        """
+        small = self._enqueue(1, "small")
+        large = self._enqueue(
+            EVENT_FETCH_MIN_BATCH_SIZE,
+            "large",
+            waited_s=2 * EVENT_FETCH_MAX_LARGE_WAIT_S,
+        )
+
+        self.assertEqual(self._pop_batch(), [large])
+        self.assertEqual(self._pop_batch(), [small])
+
+    def test_batches_are_bounded(self) -> None:
+        """Requests should be split over batches, without splitting a request."""
+        # Make fetches look slow, so that we use the minimum batch size.
+        self.store._event_fetch_time_per_event_s = 1.0
+
+        first = self._enqueue(EVENT_FETCH_MIN_BATCH_SIZE - 1, "large")
+        second = self._enqueue(EVENT_FETCH_MIN_BATCH_SIZE + 1, "large")
+
+        self.assertEqual(self._pop_batch(), [first])
+        self.assertEqual(self._pop_batch(), [second])
+        self.assertEqual(self._pop_batch(), [])
+
 
 class DatabaseOutageTestCase(unittest.HomeserverTestCase):
     """Test event fetching during a database outage."""
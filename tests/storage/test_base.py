@@ -18,6 +18,7 @@ from unittest.mock import Mock
 
 from twisted.internet import defer
 
+from synapse.config.database import DatabaseConnectionConfig
 from synapse.storage._base import SQLBaseStore
 from synapse.storage.database import DatabasePool
 from synapse.storage.engines import create_engine
@@ -56,7 +57,9 @@ class SQLBaseStoreTestCase(unittest.TestCase):
         fake_engine = Mock(wraps=engine)
         fake_engine.in_transaction.return_value = False
 
-        db = DatabasePool(Mock(), Mock(config=sqlite_config), fake_engine)
+        db = DatabasePool(
+            Mock(), DatabaseConnectionConfig("master", sqlite_config), fake_engine
+        )
         db._db_pool = self.db_pool
 
         self.datastore = SQLBaseStore(db, None, hs)  # type: ignore[arg-type]
@@ -19,7 +19,20 @@ from twisted.internet import defer
 from twisted.internet.defer import CancelledError, Deferred
 from twisted.test.proto_helpers import MemoryReactor
 
+from synapse.config.database import (
+    BACKGROUND_PARTITION,
+    INTERACTIVE_PARTITION,
+    REPLICATION_PARTITION,
+    DatabaseConnectionConfig,
+)
+from synapse.logging.context import ContextRequest, LoggingContext
+from synapse.metrics.background_process_metrics import BackgroundProcessLoggingContext
 from synapse.server import HomeServer
+from synapse.storage.connection_partitions import (
+    ConnectionPartition,
+    ConnectionPartitions,
+    get_partition_for_context,
+)
 from synapse.storage.database import (
     DatabasePool,
     LoggingDatabaseConnection,
@@ -278,3 +291,193 @@ class CancellationTestCase(unittest.HomeserverTestCase):
             ]
         )
         self.assertEqual(exception_callback.call_count, 6)  # no additional calls
+
+
+def _make_request(url: str) -> ContextRequest:
+    return ContextRequest(
+        request_id="GET-1",
+        ip_address="127.0.0.1",
+        site_tag="test",
+        requester=None,
+        authenticated_entity=None,
+        method="GET",
+        url=url,
+        protocol="1.1",
+        user_agent="test",
+    )
+
+
+class ConnectionPartitionTestCase(unittest.TestCase):
+    """Tests for limiting the connections held by a partition."""
+
+    def test_get_partition_for_context(self) -> None:
+        """Test that database calls are assigned to the right partition."""
+        self.assertEqual(
+            get_partition_for_context(LoggingContext("test")), INTERACTIVE_PARTITION
+        )
+
+        with LoggingContext(
+            "request", request=_make_request("/_matrix/client/v3/sync")
+        ) as ctx:
+            self.assertEqual(get_partition_for_context(ctx), INTERACTIVE_PARTITION)
+
+        with LoggingContext(
+            "request", request=_make_request("/_synapse/replication/send_event/1")
+        ) as ctx:
+            self.assertEqual(get_partition_for_context(ctx), REPLICATION_PARTITION)
+
+        # Work nested inside a background purge counts as background work.
+        with BackgroundProcessLoggingContext("purge_history") as bg_ctx:
+            self.assertEqual(get_partition_for_context(bg_ctx), BACKGROUND_PARTITION)
+            with LoggingContext("child", parent_context=bg_ctx) as child_ctx:
+                self.assertEqual(
+                    get_partition_for_context(child_ctx), BACKGROUND_PARTITION
+                )
+
+        with BackgroundProcessLoggingContext("rotate_notifs") as bg_ctx:
+            self.assertEqual(get_partition_for_context(bg_ctx), INTERACTIVE_PARTITION)
+
+    def test_limit(self) -> None:
+        """Test that calls queue once the partition is at its limit, and are let
+        through in order as connections are released.
+        """
+        partition = ConnectionPartition("test", "background", 2)
+
+        d1 = defer.ensureDeferred(partition.acquire())
+        d2 = defer.ensureDeferred(partition.acquire())
+        d3 = defer.ensureDeferred(partition.acquire())
+        d4 = defer.ensureDeferred(partition.acquire())
+        self.assertTrue(d1.called)
+        self.assertTrue(d2.called)
+        self.assertFalse(d3.called)
+        self.assertFalse(d4.called)
+        self.assertEqual(partition.waiting, 2)
+
+        partition.release()
+        self.assertTrue(d3.called)
+        self.assertFalse(d4.called)
+
+        partition.release()
+        self.assertTrue(d4.called)
+        self.assertEqual(partition.in_use, 2)
+        self.assertEqual(partition.waiting, 0)
+
+    def test_lower_limit(self) -> None:
+        """Test that lowering the limit holds calls back until the partition is
+        under its new limit.
+        """
+        partition = ConnectionPartition("test", "background", 2)
+
+        defer.ensureDeferred(partition.acquire())
+        defer.ensureDeferred(partition.acquire())
+        partition.set_limit(1)
+
+        d = defer.ensureDeferred(partition.acquire())
+        partition.release()
+        self.assertFalse(d.called)
+
+        partition.release()
+        self.assertTrue(d.called)
+        self.assertEqual(partition.in_use, 1)
+
+    def test_cancel(self) -> None:
+        """Test that cancelling a queued call takes it out of the queue."""
+        partition = ConnectionPartition("test", "background", 1)
+
+        defer.ensureDeferred(partition.acquire())
+        d1 = defer.ensureDeferred(partition.acquire())
+        d2 = defer.ensureDeferred(partition.acquire())
+
+        d1.cancel()
+        self.failureResultOf(d1, CancelledError)
+        self.assertEqual(partition.waiting, 1)
+
+        partition.release()
+        self.assertTrue(d2.called)
+        self.assertEqual(partition.in_use, 1)
+
+
+class AdaptivePartitionsTestCase(unittest.HomeserverTestCase):
+    """Tests for adaptive sizing of connection partitions."""
+
+    def test_adapt_limits(self) -> None:
+        """Test that background work is shrunk while interactive calls are
+        queueing, and allowed to grow again once they aren't.
+        """
+        database_config = DatabaseConnectionConfig(
+            "test",
+            {
+                "name": "psycopg2",
+                "args": {"cp_max": 10},
+                "connection_partitions": {"background": {"max_connections": 8}},
+                "adaptive_connection_partitions": {
+                    "enabled": True,
+                    "target_queue_time": 100,
+                },
+            },
+        )
+        partitions = ConnectionPartitions(self.hs, database_config)
+        interactive = partitions.partitions[INTERACTIVE_PARTITION]
+        background = partitions.partitions[BACKGROUND_PARTITION]
+        replication = partitions.partitions[REPLICATION_PARTITION]
+
+        self.assertEqual(interactive.limit, 10)
+        self.assertEqual(background.limit, 8)
+        self.assertEqual(replication.limit, 10)
+
+        # Interactive calls are waiting longer than the target on average.
+        interactive.record_queue_time(0.05)
+        interactive.record_queue_time(0.25)
+        partitions.adapt_limits()
+        self.assertEqual(interactive.limit, 10)
+        self.assertEqual(background.limit, 4)
+        self.assertEqual(replication.limit, 5)
+
+        # The limits never drop below a single connection.
+        for _ in range(5):
+            interactive.record_queue_time(0.5)
+            partitions.adapt_limits()
+        self.assertEqual(background.limit, 1)
+        self.assertEqual(replication.limit, 1)
+
+        # Once interactive calls stop queueing the limits grow back.
+        interactive.record_queue_time(0.01)
+        partitions.adapt_limits()
+        self.assertEqual(background.limit, 2)
+
+        for _ in range(20):
+            partitions.adapt_limits()
+        self.assertEqual(background.limit, 8)
+        self.assertEqual(replication.limit, 10)
+
+
+class PartitionedRunInteractionTestCase(unittest.HomeserverTestCase):
+    """Tests that database calls are limited by their partition."""
+
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.store = hs.get_datastores().main
+        self.db_pool: DatabasePool = self.store.db_pool
+
+    def test_background_partition_full(self) -> None:
+        """Test that background work waits for a background connection, without
+        holding up requests.
+        """
+        background = self.db_pool._partitions.partitions[BACKGROUND_PARTITION]
+
+        # Use up all of the background connections.
+        for _ in range(background.limit):
+            self.get_success(background.acquire())
+
+        with BackgroundProcessLoggingContext("purge_history"):
+            background_d = defer.ensureDeferred(
+                self.db_pool.runInteraction("background", lambda txn: None)
+            )
+
+        self.pump()
+        self.assertFalse(background_d.called)
+
+        # Interactive calls are not affected.
+        self.get_success(self.db_pool.runInteraction("interactive", lambda txn: None))
+
+        background.release()
+        self.get_success(background_d)
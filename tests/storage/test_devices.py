@@ -336,3 +336,78 @@ class DeviceStoreTestCase(HomeserverTestCase):
             synapse.api.errors.StoreError,
         )
         self.assertEqual(404, exc.value.code)
+
+    def test_get_device_list_changes_in_rooms(self) -> None:
+        """Only changes in the given rooms since the given stream ID are
+        returned.
+        """
+        start = self.store.get_device_stream_token()
+
+        self.get_success(
+            self.store.add_device_change_to_streams(
+                "@user_id:test", ["device_1"], ["!room1:test", "!room2:test"]
+            )
+        )
+        middle = self.store.get_device_stream_token()
+        self.get_success(
+            self.store.add_device_change_to_streams(
+                "@other_user_id:test", ["device_2"], ["!room1:test"]
+            )
+        )
+
+        res = self.get_success(
+            self.store.get_device_list_changes_in_rooms(
+                ["!room1:test", "!room2:test", "!room3:test"], start + 1
+            )
+        )
+        self.assertEqual(res, {"@user_id:test", "@other_user_id:test"})
+
+        res = self.get_success(
+            self.store.get_device_list_changes_in_rooms(
+                ["!room2:test", "!room3:test"], middle + 1
+            )
+        )
+        self.assertEqual(res, set())
+
+    def test_get_all_device_list_room_changes_limited(self) -> None:
+        """The rooms a device change was in are returned in batches bounded by
+        the limit, without splitting the rooms of a single change between
+        batches.
+        """
+        start = self.store.get_device_stream_token()
+        stream_ids = []
+        for rooms in (["!a:test", "!b:test", "!c:test"], ["!a:test", "!b:test"]):
+            stream_id = self.get_success(
+                self.store.add_device_change_to_streams(
+                    "@user_id:test", ["device_1"], rooms
+                )
+            )
+            assert stream_id is not None
+            stream_ids.append(stream_id)
+        end = self.store.get_device_stream_token()
+
+        # The limit cuts off the second change, so none of its rooms are
+        # returned.
+        updates, token, limited = self.get_success(
+            self.store.get_all_device_list_room_changes(start, end, 4)
+        )
+        self.assertCountEqual(
+            updates,
+            [
+                (stream_ids[0], "!a:test"),
+                (stream_ids[0], "!b:test"),
+                (stream_ids[0], "!c:test"),
+            ],
+        )
+        self.assertEqual(token, stream_ids[0])
+        self.assertTrue(limited)
+
+        # A single change in more rooms than the limit is returned whole.
+        updates, token, limited = self.get_success(
+            self.store.get_all_device_list_room_changes(token, end, 1)
+        )
+        self.assertCountEqual(
+            updates, [(stream_ids[1], "!a:test"), (stream_ids[1], "!b:test")]
+        )
+        self.assertEqual(token, end)
+        self.assertFalse(limited)
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from unittest.mock import PropertyMock, patch
+
 from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.server import HomeServer
@@ -107,3 +109,95 @@ class EndToEndKeyStoreTestCase(HomeserverTestCase):
         self.assertIn("user2", res)
         self.assertNotIn("device1", res["user2"])
         self.assertIn("device2", res["user2"])
+
+    def _claim_one_time_keys(self) -> None:
+        now = 1470174257070
+
+        # user1 has two devices with one time keys, user2's device only has a
+        # fallback key.
+        self.get_success(
+            self.store.add_e2e_one_time_keys(
+                "user1",
+                "device1",
+                now,
+                [("alg1", "k1", "json11a"), ("alg1", "k2", "json11b")],
+            )
+        )
+        self.get_success(
+            self.store.add_e2e_one_time_keys(
+                "user1",
+                "device2",
+                now,
+                [("alg1", "k1", "json12"), ("alg2", "k1", "json12alg2")],
+            )
+        )
+        self.get_success(
+            self.store.set_e2e_fallback_keys(
+                "user2", "device1", {"alg1:fk1": "fallback21"}
+            )
+        )
+
+        res = self.get_success(
+            self.store.claim_e2e_one_time_keys(
+                [
+                    ("user1", "device1", "alg1"),
+                    ("user1", "device2", "alg1"),
+                    ("user1", "device2", "alg2"),
+                    ("user2", "device1", "alg1"),
+                    ("user2", "device2", "alg1"),
+                ]
+            )
+        )
+        self.assertEqual(
+            res,
+            {
+                "user1": {
+                    "device1": {"alg1:k1": "json11a"},
+                    "device2": {"alg1:k1": "json12", "alg2:k1": "json12alg2"},
+                },
+                "user2": {"device1": {"alg1:fk1": '"fallback21"'}},
+            },
+        )
+
+        # Only the claimed keys were removed, and the fallback key is now used.
+        self.assertEqual(
+            self.get_success(self.store.count_e2e_one_time_keys("user1", "device1")),
+            {"alg1": 1, "signed_curve25519": 0},
+        )
+        self.assertEqual(
+            self.get_success(self.store.count_e2e_one_time_keys("user1", "device2")),
+            {"signed_curve25519": 0},
+        )
+        self.assertEqual(
+            self.get_success(
+                self.store.get_e2e_unused_fallback_key_types("user2", "device1")
+            ),
+            [],
+        )
+
+        # Claiming again hands out the remaining key, and reuses the fallback key.
+        res = self.get_success(
+            self.store.claim_e2e_one_time_keys(
+                [("user1", "device1", "alg1"), ("user2", "device1", "alg1")]
+            )
+        )
+        self.assertEqual(
+            res,
+            {
+                "user1": {"device1": {"alg1:k2": "json11b"}},
+                "user2": {"device1": {"alg1:fk1": '"fallback21"'}},
+            },
+        )
+
+    def test_claim_one_time_keys(self) -> None:
+        self._claim_one_time_keys()
+
+    def test_claim_one_time_keys_without_returning(self) -> None:
+        """Claiming keys works on databases without support for RETURNING."""
+        with patch.object(
+            type(self.store.database_engine),
+            "supports_returning",
+            new_callable=PropertyMock,
+            return_value=False,
+        ):
+            self._claim_one_time_keys()
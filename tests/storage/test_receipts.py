@@ -18,7 +18,7 @@ from twisted.test.proto_helpers import MemoryReactor
 
 from synapse.api.constants import ReceiptTypes
 from synapse.server import HomeServer
-from synapse.types import UserID, create_requester
+from synapse.types import ReadReceipt, UserID, create_requester
 from synapse.util import Clock
 
 from tests.test_utils.event_injection import create_event
@@ -298,3 +298,102 @@ class ReceiptTestCase(HomeserverTestCase):
             [ReceiptTypes.READ, ReceiptTypes.READ_PRIVATE], room_id=self.room_id2
         )
         self.assertEqual(res, event2_1_id)
+
+    def test_insert_receipts_coalesces(self) -> None:
+        """Receipts in a batch which replace each other are coalesced, without
+        letting a receipt for an older event clobber one for a newer event.
+        """
+        event1_1_id = self.create_and_send_event(
+            self.room_id1, UserID.from_string(OTHER_USER_ID)
+        )
+        event1_2_id = self.create_and_send_event(
+            self.room_id1, UserID.from_string(OTHER_USER_ID)
+        )
+        event1_3_id = self.create_and_send_event(
+            self.room_id1, UserID.from_string(OTHER_USER_ID)
+        )
+
+        def make_receipt(event_id: str, thread_id: Optional[str] = None) -> ReadReceipt:
+            return ReadReceipt(
+                room_id=self.room_id1,
+                receipt_type=ReceiptTypes.READ,
+                user_id=OUR_USER_ID,
+                event_ids=[event_id],
+                thread_id=thread_id,
+                data={},
+            )
+
+        # The receipt for the first event is superseded by the one for the third
+        # event, which isn't clobbered by the later receipt for the second event.
+        unthreaded_latest = make_receipt(event1_3_id)
+        threaded_latest = make_receipt(event1_2_id, thread_id="$thread")
+        persisted, max_persisted_id = self.get_success(
+            self.store.insert_receipts(
+                [
+                    make_receipt(event1_1_id),
+                    make_receipt(event1_1_id, thread_id="$thread"),
+                    unthreaded_latest,
+                    threaded_latest,
+                    make_receipt(event1_2_id),
+                ]
+            )
+        )
+
+        self.assertEqual(
+            [receipt for receipt, _ in persisted],
+            [unthreaded_latest, threaded_latest],
+        )
+        self.assertEqual(max_persisted_id, max(stream_id for _, stream_id in persisted))
+        self.assertEqual(
+            self.get_last_unthreaded_receipt([ReceiptTypes.READ]), event1_3_id
+        )
+
+        # A receipt for an earlier event than the stored one isn't persisted.
+        persisted, _ = self.get_success(
+            self.store.insert_receipts([make_receipt(event1_2_id)])
+        )
+        self.assertEqual(persisted, [])
+        self.assertEqual(
+            self.get_last_unthreaded_receipt([ReceiptTypes.READ]), event1_3_id
+        )
+
+        # Whereas a threaded receipt for a later event replaces the stored one.
+        threaded_latest = make_receipt(event1_3_id, thread_id="$thread")
+        persisted, _ = self.get_success(self.store.insert_receipts([threaded_latest]))
+        self.assertEqual([receipt for receipt, _ in persisted], [threaded_latest])
+
+    def test_insert_receipts_skips_unrecognized_events(self) -> None:
+        """A receipt in a batch for events we don't know about doesn't stop the
+        other receipts in the batch from being persisted.
+        """
+        event1_1_id = self.create_and_send_event(
+            self.room_id1, UserID.from_string(OTHER_USER_ID)
+        )
+
+        local_receipt = ReadReceipt(
+            room_id=self.room_id1,
+            receipt_type=ReceiptTypes.READ,
+            user_id=OUR_USER_ID,
+            event_ids=[event1_1_id],
+            thread_id=None,
+            data={},
+        )
+        # A receipt from a remote server which points to several events, none
+        # of which we have.
+        remote_receipt = ReadReceipt(
+            room_id=self.room_id1,
+            receipt_type=ReceiptTypes.READ,
+            user_id="@remote:other",
+            event_ids=["$unknown1", "$unknown2"],
+            thread_id=None,
+            data={},
+        )
+
+        persisted, _ = self.get_success(
+            self.store.insert_receipts([remote_receipt, local_receipt])
+        )
+
+        self.assertEqual([receipt for receipt, _ in persisted], [local_receipt])
+        self.assertEqual(
+            self.get_last_unthreaded_receipt([ReceiptTypes.READ]), event1_1_id
+        )
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import logging
+from typing import Set
 
 from frozendict import frozendict
 
@@ -22,11 +23,15 @@ from synapse.api.constants import EventTypes, Membership
 from synapse.api.room_versions import RoomVersions
 from synapse.events import EventBase
 from synapse.server import HomeServer
+from synapse.storage.databases.state.store import (
+    MATERIALIZE_STATE_GROUPS_INTERVAL_MS,
+    STATE_GROUP_SNAPSHOT_HOPS,
+)
 from synapse.types import JsonDict, RoomID, StateMap, UserID
 from synapse.types.state import StateFilter
 from synapse.util import Clock
 
-from tests.unittest import HomeserverTestCase
+from tests.unittest import HomeserverTestCase, override_config
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +83,17 @@ class StateStoreTestCase(HomeserverTestCase):
 
         return event
 
+    def _get_state_groups_pending_snapshot(self) -> Set[int]:
+        return set(
+            self.get_success(
+                self.state_datastore.db_pool.simple_select_onecol(
+                    table="state_groups_pending_snapshot",
+                    keyvalues={},
+                    retcol="state_group",
+                )
+            )
+        )
+
     def assertStateMapEqual(
         self, s1: StateMap[EventBase], s2: StateMap[EventBase]
     ) -> None:
@@ -496,3 +512,157 @@ class StateStoreTestCase(HomeserverTestCase):
 
         self.assertEqual(is_all, True)
         self.assertDictEqual({(e5.type, e5.state_key): e5.event_id}, state_dict)
+
+    def test_long_delta_chains_are_cut_short(self) -> None:
+        """State groups at the end of long delta chains should be turned into full
+        snapshots in the background, without changing their state.
+        """
+        room_id = self.room.to_string()
+
+        state_group = self.get_success(
+            self.state_datastore.store_state_group(
+                "$create",
+                room_id,
+                prev_group=None,
+                delta_ids=None,
+                current_state_ids={(EventTypes.Create, ""): "$create"},
+            )
+        )
+        expected_state = {(EventTypes.Create, ""): "$create"}
+
+        # Build a chain of deltas long enough to queue the last state group.
+        for i in range(STATE_GROUP_SNAPSHOT_HOPS):
+            delta_ids = {(EventTypes.Member, "@user%d:test" % (i,)): "$member%d" % (i,)}
+            prev_group = state_group
+            state_group = self.get_success(
+                self.state_datastore.store_state_group(
+                    "$member%d" % (i,),
+                    room_id,
+                    prev_group=prev_group,
+                    delta_ids=delta_ids,
+                    current_state_ids=None,
+                )
+            )
+            expected_state.update(delta_ids)
+
+        # The state group should be queued to be turned into a snapshot.
+        self.assertIn(state_group, self._get_state_groups_pending_snapshot())
+        prev_groups = self.get_success(
+            self.state_datastore.get_previous_state_groups([prev_group])
+        )
+        self.assertEqual(prev_groups, {state_group: prev_group})
+
+        # Let the background process turn the state group into a snapshot.
+        self.reactor.advance(MATERIALIZE_STATE_GROUPS_INTERVAL_MS / 1000)
+
+        self.assertEqual(self._get_state_groups_pending_snapshot(), set())
+        prev_groups = self.get_success(
+            self.state_datastore.get_previous_state_groups([prev_group])
+        )
+        self.assertEqual(prev_groups, {})
+
+        # The state of the group should be unchanged, even when read straight
+        # from the database.
+        self.state_datastore._state_group_cache.invalidate_all()
+        self.state_datastore._state_group_members_cache.invalidate_all()
+        state_map = self.get_success(
+            self.state_datastore._get_state_for_groups([state_group])
+        )
+        self.assertDictEqual(dict(state_map[state_group]), expected_state)
+
+    def test_burst_of_long_delta_chains_writes_one_snapshot(self) -> None:
+        """When several state groups on the same long delta chain are queued before
+        the background process runs, only the first should be turned into a full
+        snapshot: that cuts the chain for the rest.
+        """
+        room_id = self.room.to_string()
+
+        state_group = self.get_success(
+            self.state_datastore.store_state_group(
+                "$create",
+                room_id,
+                prev_group=None,
+                delta_ids=None,
+                current_state_ids={(EventTypes.Create, ""): "$create"},
+            )
+        )
+
+        # Build a chain of deltas which goes a few state groups past the point
+        # where they start to be queued.
+        state_groups = []
+        for i in range(STATE_GROUP_SNAPSHOT_HOPS + 4):
+            state_group = self.get_success(
+                self.state_datastore.store_state_group(
+                    "$member%d" % (i,),
+                    room_id,
+                    prev_group=state_group,
+                    delta_ids={
+                        (EventTypes.Member, "@user%d:test" % (i,)): "$member%d" % (i,)
+                    },
+                    current_state_ids=None,
+                )
+            )
+            state_groups.append(state_group)
+
+        # The last few state groups should all have been queued.
+        pending_snapshot = self._get_state_groups_pending_snapshot()
+        first_queued = state_groups.index(min(pending_snapshot))
+        queued_state_groups = state_groups[first_queued:]
+        self.assertGreater(len(queued_state_groups), 1)
+        self.assertEqual(pending_snapshot, set(queued_state_groups))
+
+        self.reactor.advance(MATERIALIZE_STATE_GROUPS_INTERVAL_MS / 1000)
+        self.assertEqual(self._get_state_groups_pending_snapshot(), set())
+
+        # Only the first queued state group should have become a snapshot; the
+        # others are still deltas on top of it.
+        prev_groups = self.get_success(
+            self.state_datastore.get_previous_state_groups(
+                state_groups[first_queued - 1 :]
+            )
+        )
+        self.assertEqual(
+            prev_groups,
+            {
+                state_group: prev_group
+                for prev_group, state_group in zip(
+                    queued_state_groups, queued_state_groups[1:]
+                )
+            },
+        )
+
+    @override_config({"run_background_tasks_on": "other_worker"})
+    def test_long_delta_chains_queued_for_background_worker(self) -> None:
+        """State groups at the end of long delta chains are queued in the database
+        even if this process doesn't run background tasks, for the one which does
+        to turn into snapshots.
+        """
+        room_id = self.room.to_string()
+
+        state_group = self.get_success(
+            self.state_datastore.store_state_group(
+                "$create",
+                room_id,
+                prev_group=None,
+                delta_ids=None,
+                current_state_ids={(EventTypes.Create, ""): "$create"},
+            )
+        )
+        for i in range(STATE_GROUP_SNAPSHOT_HOPS):
+            state_group = self.get_success(
+                self.state_datastore.store_state_group(
+                    "$member%d" % (i,),
+                    room_id,
+                    prev_group=state_group,
+                    delta_ids={
+                        (EventTypes.Member, "@user%d:test" % (i,)): "$member%d" % (i,)
+                    },
+                    current_state_ids=None,
+                )
+            )
+
+        self.assertIn(state_group, self._get_state_groups_pending_snapshot())
+
+        # This process doesn't turn it into a snapshot itself.
+        self.reactor.advance(MATERIALIZE_STATE_GROUPS_INTERVAL_MS / 1000)
+        self.assertIn(state_group, self._get_state_groups_pending_snapshot())
@@ -0,0 +1,120 @@
+# Copyright 2023 The Matrix.org Foundation C.I.C.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import List
+
+from twisted.internet import defer
+from twisted.test.proto_helpers import MemoryReactor
+
+from synapse.server import HomeServer
+from synapse.types import StreamKeyType, StreamToken
+from synapse.util import Clock
+
+from tests import unittest
+
+ROOM_ID = "!room:test"
+
+
+class NotifierWakeupTestCase(unittest.HomeserverTestCase):
+    def prepare(self, reactor: MemoryReactor, clock: Clock, hs: HomeServer) -> None:
+        self.notifier = hs.get_notifier()
+        self.event_sources = hs.get_event_sources()
+
+    def _wait_for_events(self, num_users: int) -> "List[defer.Deferred[bool]]":
+        """Start a request for each of `num_users` users in the room, which
+        waits until there are new events.
+        """
+
+        async def callback(before: StreamToken, after: StreamToken) -> bool:
+            return before != after
+
+        from_token = self.event_sources.get_current_token()
+        return [
+            defer.ensureDeferred(
+                self.notifier.wait_for_events(
+                    "@user%d:test" % (i,),
+                    10000,
+                    callback,
+                    room_ids=[ROOM_ID],
+                    from_token=from_token,
+                )
+            )
+            for i in range(num_users)
+        ]
+
+    def _notify(self, typing_token: int) -> None:
+        self.notifier.on_new_event(StreamKeyType.TYPING, typing_token, rooms=[ROOM_ID])
+
+    def test_wake_immediately(self) -> None:
+        """By default, listeners are woken up as soon as they are notified."""
+        requests = self._wait_for_events(5)
+        self.assertFalse(any(d.called for d in requests))
+
+        self._notify(100)
+        self.assertTrue(all(d.called for d in requests))
+
+    @unittest.override_config({"notifier_max_wakeups_per_iteration": 2})
+    def test_wakeups_spread_over_reactor_iterations(self) -> None:
+        """If more listeners need waking up than are allowed in a single reactor
+        iteration, the rest are woken up later.
+        """
+        requests = self._wait_for_events(5)
+
+        self._notify(100)
+        self.assertEqual(sum(d.called for d in requests), 2)
+
+        self.reactor.advance(0)
+        self.assertTrue(all(d.called for d in requests))
+
+    @unittest.override_config({"notifier_wakeup_batch_window": 100})
+    def test_wakeups_coalesced(self) -> None:
+        """Notifications within the batch window are coalesced into a single
+        wake up, which sees the latest token.
+        """
+        requests = self._wait_for_events(5)
+
+        self._notify(100)
+        self._notify(101)
+        self.assertFalse(any(d.called for d in requests))
+
+        self.reactor.advance(0.1)
+        self.assertTrue(all(d.called for d in requests))
+
+        user_stream = self.notifier.user_to_user_stream["@user0:test"]
+        self.assertEqual(user_stream.current_token.typing_key, 101)
+
+    @unittest.override_config({"notifier_wakeup_batch_window": 100})
+    def test_new_listener_during_batch_window(self) -> None:
+        """A listener which starts behind the latest token returns straight away,
+        even if the wake up of existing listeners is still pending.
+        """
+        requests = self._wait_for_events(1)
+        from_token = self.event_sources.get_current_token()
+
+        self._notify(100)
+        self.assertFalse(requests[0].called)
+
+        result = self.get_success(
+            self.notifier.wait_for_events(
+                "@user0:test",
+                10000,
+                lambda before, after: defer.succeed(before != after),
+                from_token=from_token,
+            )
+        )
+        self.assertTrue(result)
+        self.assertFalse(requests[0].called)
+
+        self.reactor.advance(0.1)
+        self.assertTrue(requests[0].called)
@@ -14,9 +14,10 @@
 
 import re
 from http import HTTPStatus
-from typing import Awaitable, Callable, Dict, NoReturn, Optional, Tuple
+from typing import Awaitable, Callable, Dict, Iterator, List, NoReturn, Optional, Tuple
 
 from twisted.internet.defer import Deferred
+from twisted.internet.error import ConnectionDone
 from twisted.web.resource import Resource
 
 from synapse.api.errors import Codes, RedirectException, SynapseError
@@ -26,9 +27,15 @@ from synapse.http.server import (
     DirectServeJsonResource,
     JsonResource,
     OptionsResource,
+    respond_with_json_chunks,
 )
 from synapse.http.site import SynapseRequest, SynapseSite
-from synapse.logging.context import make_deferred_yieldable
+from synapse.logging.context import (
+    LoggingContext,
+    LoggingContextOrSentinel,
+    current_context,
+    make_deferred_yieldable,
+)
 from synapse.types import JsonDict
 from synapse.util import Clock
 from synapse.util.cancellation import cancellable
@@ -106,6 +113,185 @@ class JsonResourceTests(unittest.TestCase):
 
         self.assertEqual(channel.code, 500)
 
+    def test_json_chunks_response(self) -> None:
+        """
+        A callback can respond with JSON which is produced incrementally.
+        """
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            chunks = (b'{"rooms": [', b"1", b", 2", b"]}")
+            respond_with_json_chunks(request, 200, iter(chunks), send_cors=True)
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor, FakeSite(res, self.reactor), b"GET", b"/_matrix/foo"
+        )
+
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.json_body, {"rooms": [1, 2]})
+        self.assertEqual(
+            channel.headers.getRawHeaders(b"Content-Type"), [b"application/json"]
+        )
+
+    def test_json_chunks_response_logcontext(self) -> None:
+        """
+        JSON chunks are produced under the logcontext of the request.
+        """
+        contexts: List[LoggingContextOrSentinel] = []
+
+        def _chunks() -> Iterator[bytes]:
+            contexts.append(current_context())
+            yield b"{}"
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            respond_with_json_chunks(request, 200, _chunks())
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor, FakeSite(res, self.reactor), b"GET", b"/_matrix/foo"
+        )
+
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.json_body, {})
+
+        (context,) = contexts
+        assert isinstance(context, LoggingContext)
+        assert isinstance(channel.request, SynapseRequest)
+        assert context.request is not None
+        self.assertEqual(context.request.request_id, channel.request.get_request_id())
+
+    def test_json_chunks_response_error(self) -> None:
+        """
+        If producing the JSON chunks fails then an error is sent.
+        """
+
+        def _chunks() -> Iterator[bytes]:
+            yield b'{"rooms": ['
+            raise Exception("boo")
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            respond_with_json_chunks(request, 200, _chunks())
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor, FakeSite(res, self.reactor), b"GET", b"/_matrix/foo"
+        )
+
+        self.assertEqual(channel.code, 500)
+        self.assertEqual(channel.json_body["errcode"], Codes.UNKNOWN)
+
+    def test_json_chunks_response_streamed(self) -> None:
+        """
+        The JSON chunks are written to the client as they are produced, rather
+        than once the whole response has been encoded.
+        """
+        written_before_last_chunk: List[bytes] = []
+
+        def _chunks() -> Iterator[bytes]:
+            yield b'{"rooms": {"a": "' + b"x" * 70000 + b'"'
+            written_before_last_chunk.append(channel.result.get("body", b""))
+            yield b', "b": "y"}}'
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            respond_with_json_chunks(request, 200, _chunks())
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor,
+            FakeSite(res, self.reactor),
+            b"GET",
+            b"/_matrix/foo",
+            await_result=False,
+        )
+        channel.await_result()
+
+        self.assertEqual(channel.code, 200)
+        self.assertEqual(channel.json_body, {"rooms": {"a": "x" * 70000, "b": "y"}})
+
+        (written,) = written_before_last_chunk
+        self.assertTrue(written.startswith(b'{"rooms": {"a": "xxx'))
+
+    def test_json_chunks_response_error_after_writing(self) -> None:
+        """
+        If producing the JSON chunks fails after some of the response has been
+        written, the connection is dropped rather than the response finished.
+        """
+
+        def _chunks() -> Iterator[bytes]:
+            yield b'{"rooms": {"a": "' + b"x" * 70000 + b'"'
+            raise Exception("boo")
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            respond_with_json_chunks(request, 200, _chunks())
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor,
+            FakeSite(res, self.reactor),
+            b"GET",
+            b"/_matrix/foo",
+            await_result=False,
+        )
+        for _ in range(100):
+            self.reactor.advance(0.1)
+            if channel.result.get("aborted"):
+                break
+
+        self.assertEqual(channel.code, 200)
+        self.assertTrue(channel.result.get("aborted"))
+        self.assertFalse(channel.is_finished())
+
+    def test_json_chunks_response_client_disconnect(self) -> None:
+        """
+        A client disconnecting before the JSON chunks have been written is
+        handled cleanly.
+        """
+
+        def _callback(request: SynapseRequest, **kwargs: object) -> None:
+            respond_with_json_chunks(request, 200, iter((b'{"rooms": ', b"[]}")))
+
+        res = JsonResource(self.homeserver)
+        res.register_paths(
+            "GET", [re.compile("^/_matrix/foo$")], _callback, "test_servlet"
+        )
+
+        channel = make_request(
+            self.reactor,
+            FakeSite(res, self.reactor),
+            b"GET",
+            b"/_matrix/foo",
+            await_result=False,
+        )
+
+        # The chunks are encoded on a thread, so the response can't have been
+        # written yet.
+        self.assertFalse(channel.is_finished())
+
+        channel.request.connectionLost(reason=ConnectionDone())
+        self.reactor.advance(1)
+
+        self.assertNotIn("body", channel.result)
+
     def test_callback_indirect_exception(self) -> None:
         """
         If the web callback raises an uncaught exception in a Deferred, it will